@@ -0,0 +1,42 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { promises as fs } from 'fs';
+import path from 'path';
+import { proxyToDataService } from '@/lib/data-service-proxy';
+import { logger } from '@/lib/logger';
+
+// 讀取 data/historical 的 K 線：優先由資料服務回應（from/to、fields、ETag），否則直接讀檔
+export async function GET(request: NextRequest) {
+  try {
+    const { searchParams } = new URL(request.url);
+    const market = searchParams.get('market');
+    const symbol = searchParams.get('symbol');
+    const interval = searchParams.get('interval') || '1d';
+
+    if (!market || !symbol) {
+      return NextResponse.json({ success: false, error: 'market 和 symbol 參數為必填' }, { status: 400 });
+    }
+
+    const proxied = await proxyToDataService(request, '/historical');
+    if (proxied) return proxied;
+
+    if (!['US', 'TW'].includes(market) || !/^[\w.\-^=]+$/.test(symbol) || symbol.startsWith('.') || !/^\w+$/.test(interval)) {
+      return NextResponse.json({ success: false, error: '無效的參數' }, { status: 400 });
+    }
+    const filePath = path.join(process.cwd(), 'data', 'historical', market, symbol, `${interval}.json`);
+    let payload: any;
+    try {
+      payload = JSON.parse(await fs.readFile(filePath, 'utf-8'));
+    } catch {
+      return NextResponse.json({ success: false, error: `找不到股票: ${symbol} (${market})` }, { status: 404 });
+    }
+    const candles = Array.isArray(payload) ? payload : payload.data || [];
+    return NextResponse.json({
+      success: true,
+      data: candles,
+      metadata: { symbol, market, timeframe: interval, totalRecords: candles.length, lastUpdated: payload.lastUpdated ?? null }
+    });
+  } catch (error) {
+    logger.api.error('Historical data API error', error);
+    return NextResponse.json({ success: false, error: '歷史資料 API 錯誤' }, { status: 500 });
+  }
+}
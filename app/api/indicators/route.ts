@@ -1,6 +1,7 @@
 import { NextRequest, NextResponse } from 'next/server';
 import { TechnicalIndicatorsCache } from '@/lib/technical-indicators-cache';
 import { logger } from '@/lib/logger';
+import { proxyToDataService } from '@/lib/data-service-proxy';
 
 export async function GET(request: NextRequest) {
   try {
@@ -30,6 +31,16 @@ export async function GET(request: NextRequest) {
       });
     }
 
+    // 讀取已快取的指標（支援 from/to/fields），由資料服務回應
+    if (!action && market && symbol) {
+      const proxied = await proxyToDataService(request, '/indicators');
+      if (proxied) return proxied;
+      return NextResponse.json({
+        success: false,
+        error: `找不到技術指標: ${symbol} (${market})`
+      }, { status: 404 });
+    }
+
     return NextResponse.json({
       success: false,
       error: '無效的操作'
@@ -3,6 +3,7 @@ import { YahooFinanceService } from '@/lib/yahoo-finance';
 import { HistoricalDataManager } from '@/lib/historical-data-manager';
 import { Market, TimeFrame, OHLCResponse, ErrorResponse } from '@/types';
 import { logger } from '@/lib/logger';
+import { proxyToDataService } from '@/lib/data-service-proxy';
 
 export async function GET(request: NextRequest) {
   const startTime = Date.now();
@@ -42,6 +43,11 @@ export async function GET(request: NextRequest) {
       );
     }
 
+    // 本機庫存有未過期且涵蓋查詢區間的資料時直接由資料服務回應（區間查詢、ETag、快取）；
+    // 否則服務回 404，照原本流程向 Yahoo 取得
+    const proxied = await proxyToDataService(request, '/ohlc');
+    if (proxied) return proxied;
+
     let candles: any[] = [];
     let dataSource = '';
 
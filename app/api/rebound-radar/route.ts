@@ -1,4 +1,6 @@
 import { NextRequest, NextResponse } from 'next/server';
+import fs from 'fs/promises';
+import path from 'path';
 import { YahooFinanceCollector } from '@/lib/data/yahoo-finance-collector';
 import { DataConverter } from '@/lib/data/data-converter';
 import { StockRecommendationsManager } from '@/lib/data/stock-recommendations-manager';
@@ -30,12 +32,31 @@ function obv(closes:number[], volumes:number[]){ let v=0; const out:[number]=[0]
   for(let i=1;i<closes.length;i++){ if(closes[i]>closes[i-1]) v+=volumes[i];
     else if(closes[i]<closes[i-1]) v-=volumes[i]; out.push(v);} return out; }
 
+// 由 rebound_radar_batch.py 預先產生的排序候選名單（規則與下方 reboundSignal 相同）；
+// 檔案的 validUntil 依交易日曆算到下一個交易日資料更新完為止（週末、休市日仍有效），
+// 任一市場缺檔或超過 validUntil 時回傳 null 改走即時計算
+async function readPrecomputed(mkts: Mkt[]){
+  const rows:any[] = [];
+  for (const m of mkts) {
+    const file = path.join(process.cwd(), 'data', 'screeners', `rebound-${m}-latest.json`);
+    try {
+      const payload = JSON.parse(await fs.readFile(file, 'utf-8'));
+      if (!(Date.now() <= Date.parse(payload.validUntil))) return null;
+      rows.push(...(payload.data ?? []).map((r:any)=>({ ok:true, ...r, generatedAt: payload.generatedAt })));
+    } catch {
+      return null;
+    }
+  }
+  return rows.sort((a:any,b:any)=> b.score - a.score);
+}
+
 function normalizeCandles(raw:any[]){ return raw.map(c=>({
   time: typeof c.time==='number'? c.time : new Date(c.time).getTime(),
   open:c.open, high:c.high, low:c.low, close:c.close, volume:c.volume??0
 })); }
 
-function reboundSignal(closes:number[], volumes:number[]){
+// 規則與公式都與 rebound_radar_batch.py 的 RULES / compute_conditions 相同，修改時兩邊要一起改
+function reboundSignal(closes:number[], volumes:number[], opens:number[]){
   const n = closes.length;
   if (n < 40) return { score:0, reason:'資料不足' };
   const r = rsi(closes,14), m = macd(closes), _obv = obv(closes,volumes);
@@ -64,6 +85,18 @@ function reboundSignal(closes:number[], volumes:number[]){
   if (closes[last] > (e20[last] ?? closes[last])) { score += 2; reasons.push('收復 20EMA'); }
   else if (higherLow) { score += 1; reasons.push('出現 higher low'); }
 
+  // 5) RSI 底背離：價格貼近 20 日低點，但 RSI 已明顯高於同期低點
+  const low20 = Math.min(...closes.slice(-20)), rsiLow20 = Math.min(...r.slice(-20));
+  if (closes[last] <= low20 * 1.02 && r[last] > rsiLow20 + 5) { score += 3; reasons.push('RSI 底背離'); }
+
+  // 6) 放量收紅：量能高於前 20 根平均 1.5 個標準差（不含當根），且收紅
+  const prev = volumes.slice(-21, -1), mean = prev.reduce((a,v)=>a+v, 0)/20;
+  const std = Math.sqrt(Math.max(prev.reduce((a,v)=>a+v*v, 0)/20 - mean*mean, 0));
+  if (std > 0 && (volumes[last]-mean)/std > 1.5 && closes[last] > opens[last]) { score += 2; reasons.push('放量收紅'); }
+
+  // 7) 自 52 週（252 根）高點回檔逾 20%
+  if (closes[last] / Math.max(...closes.slice(-252)) - 1 <= -0.2) { score += 1; reasons.push('自52週高點回檔逾20%'); }
+
   return { score, reason: reasons.join('、') };
 }
 
@@ -75,6 +108,11 @@ export async function GET(req: NextRequest) {
     const topN = parseInt(searchParams.get('limit') ?? '20', 10);
 
     const mkts: Mkt[] = market === 'ALL' ? ['US','TW'] : (['US','TW'].includes(market) ? [market as Mkt] : ['US','TW']);
+    const precomputed = await readPrecomputed(mkts);
+    if (precomputed) {
+      return NextResponse.json({ success:true, total: precomputed.length, data: precomputed.slice(0, topN), source:'precomputed' });
+    }
+
     let symbols: { symbol:string; market:Mkt; name?:string }[] = [];
     for (const m of mkts) {
       const list = await StockRecommendationsManager.getSymbols(m);
@@ -87,7 +125,7 @@ export async function GET(req: NextRequest) {
       const candles = normalizeCandles(DataConverter.convertHistoricalToCandles(hist));
       const closes = candles.map(c=>c.close);
       const volumes = candles.map(c=>c.volume);
-      const sig = reboundSignal(closes, volumes);
+      const sig = reboundSignal(closes, volumes, candles.map(c=>c.open));
 
       return {
         ok: true,
@@ -132,7 +170,7 @@ export async function POST(request: NextRequest) {
       const candles = normalizeCandles(DataConverter.convertHistoricalToCandles(hist));
       const closes = candles.map(c=>c.close);
       const volumes = candles.map(c=>c.volume);
-      const sig = reboundSignal(closes, volumes);
+      const sig = reboundSignal(closes, volumes, candles.map(c=>c.open));
 
       return {
         ok: true,
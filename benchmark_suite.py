@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+離線效能基準測試
+以 repo 內現有的資料（test-data/、data/cache、data/full-market 與股票清單快照）量測
+清單解析與合併、NASDAQ 管線檔解析、ISIN HTML 解析、K 線載入、技術指標與評分的耗時，
+並與 benchmarks/baseline.json 比較，超過門檻即以非零狀態結束。
+
+各項耗時都除以同一台機器上的校正迴圈耗時再比較，基準值因此可以跨機器沿用。
+NASDAQ 管線檔與 ISIN HTML 沒有離線樣本，由 repo 內的股票清單快照組出相同格式的輸入。
+
+用法：
+    python3 benchmark_suite.py                    # 執行並與基準比較
+    python3 benchmark_suite.py --save-baseline    # 以本次結果更新基準
+    python3 benchmark_suite.py --only ohlcv_load indicators --rounds 10
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import platform
+import argparse
+import statistics
+from datetime import datetime
+
+import numpy as np
+
+BASELINE_PATH = os.path.join('benchmarks', 'baseline.json')
+DEFAULT_THRESHOLD = 0.30   # 比基準慢 30% 以上視為退步
+DEFAULT_ROUNDS = 7
+MIN_ROUND_TIME = 0.2
+TEST_DATA_DIR = 'test-data'
+
+BENCHMARKS = {}
+
+
+def benchmark(name, description):
+    """註冊基準測試：被裝飾的函式負責準備資料（不計時），並回傳要計時的無參數函式"""
+    def register(setup):
+        BENCHMARKS[name] = {'setup': setup, 'description': description}
+        return setup
+    return register
+
+
+class Skip(Exception):
+    """缺少所需資料時略過該項"""
+
+
+def _latest(pattern):
+    matches = sorted(glob.glob(pattern), key=os.path.basename)
+    if not matches:
+        raise Skip(f"找不到 {pattern}")
+    return matches[-1]
+
+
+def _snapshot(group):
+    return _latest(os.path.join('data', f"stocks_{group}_*.jsonl"))
+
+
+def _cache_series(market, limit=200):
+    from ohlcv_store import iter_series, list_symbols
+
+    symbols = list_symbols(market)[:limit]
+    if not symbols:
+        raise Skip(f"data/cache/{market} 沒有 K 線資料")
+    return [s for s in iter_series(market, symbols) if len(s['close']) >= 60]
+
+
+# ---- 校正 ----
+
+def calibrate(rounds=DEFAULT_ROUNDS):
+    """固定的純 Python 迴圈，代表這台機器的速度"""
+    def loop():
+        total = 0
+        for i in range(300000):
+            total += i * i % 7
+        return total
+    return _measure(loop, rounds)['min']
+
+
+# ---- 基準項目 ----
+
+@benchmark('universe_stream', '串流解析全市場清單 (US collectedStocks)')
+def bench_universe_stream():
+    from streaming_json import iter_collected_stocks
+
+    path = os.path.join('data', 'full-market', 'US-stocks-latest.json')
+    if not os.path.exists(path):
+        raise Skip(f"找不到 {path}")
+    return lambda: sum(1 for _ in iter_collected_stocks(path))
+
+
+@benchmark('snapshot_read', '讀取股票清單快照 (stocks_data_*.jsonl)')
+def bench_snapshot_read():
+    from serialization_codecs import read_records
+
+    path = _snapshot('data')
+    return lambda: read_records(path)
+
+
+@benchmark('universe_merge', '合併各來源清單並去除重複代號')
+def bench_universe_merge():
+    from serialization_codecs import read_records
+    from stock_data_collector import merge_unique_stocks
+
+    sources = [read_records(_snapshot(group)) for group in ('上市', 'nasdaq', 'other', 'sec')]
+    return lambda: merge_unique_stocks([s for source in sources for s in source])
+
+
+def nasdaq_listing_lines(records, market):
+    """以股票清單組出 nasdaqlisted.txt / otherlisted.txt 格式的內容"""
+    if market == 'NASDAQ':
+        lines = ['Symbol|Security Name|Market Category|Test Issue|Financial Status|Round Lot Size|ETF|NextShares']
+        lines += [f"{r['代號']}|{r['名稱']}|Q|N|N|100|{'Y' if r.get('ETF') else 'N'}|N" for r in records]
+    else:
+        lines = ['ACT Symbol|Security Name|Exchange|CQS Symbol|ETF|Round Lot Size|Test Issue|NASDAQ Symbol']
+        lines += [f"{r['代號']}|{r['名稱']}|N|{r['代號']}|{'Y' if r.get('ETF') else 'N'}|100|N|{r['代號']}"
+                  for r in records]
+    lines.append('File Creation Time: 0819202510:00|||||||')
+    return lines
+
+
+@benchmark('nasdaq_parse', '解析 NASDAQ Trader 管線檔 (nasdaqlisted + otherlisted)')
+def bench_nasdaq_parse():
+    from serialization_codecs import read_records
+    from stock_data_collector import parse_nasdaq_listing
+
+    nasdaq = nasdaq_listing_lines(read_records(_snapshot('nasdaq')), 'NASDAQ')
+    other = nasdaq_listing_lines(read_records(_snapshot('other')), 'Other')
+    return lambda: (parse_nasdaq_listing(nasdaq, 'NASDAQ'), parse_nasdaq_listing(other, 'Other'))
+
+
+def isin_html(records):
+    """以股票清單組出證交所 ISIN 頁面格式的 HTML 表格"""
+    rows = []
+    for r in records:
+        rows.append(
+            f"<tr><td bgcolor=#FAFAD2>{r['代號']}　{r['名稱']}</td><td bgcolor=#FAFAD2>{r['名稱']}</td>"
+            f"<td bgcolor=#FAFAD2>TW000{r['代號']}00</td><td bgcolor=#FAFAD2>2003/06/30</td>"
+            f"<td bgcolor=#FAFAD2>上市</td><td bgcolor=#FAFAD2>{r.get('產業') or 'ETF'}</td>"
+            f"<td bgcolor=#FAFAD2>CEOGEU</td><td bgcolor=#FAFAD2></td></tr>")
+    return '<table class="h4">' + '\n'.join(rows) + '</table>'
+
+
+@benchmark('isin_parse', '解析證交所 ISIN HTML 頁面')
+def bench_isin_parse():
+    from serialization_codecs import read_records
+    from etf_registry import parse_isin_board
+
+    records = read_records(_snapshot('上市'))
+    etfs = read_records(_latest(os.path.join('data', 'tw_etfs_complete_*.jsonl')))
+    html = isin_html((records + etfs) * 4)
+    return lambda: parse_isin_board(html, '上市')
+
+
+@benchmark('ohlcv_load', '載入 K 線並轉成陣列 (test-data + data/cache)')
+def bench_ohlcv_load():
+    from ohlcv_store import load_series, list_symbols, series_path
+
+    paths = sorted(glob.glob(os.path.join(TEST_DATA_DIR, '*', '*_data.json')))
+    paths += [series_path('TW', symbol) for symbol in list_symbols('TW')[:100]]
+    if not paths:
+        raise Skip('沒有 K 線檔案')
+    return lambda: [load_series(None, None, path=path) for path in paths]
+
+
+def _panel():
+    from rebound_radar_batch import build_panel
+
+    return build_panel(_cache_series('TW'))
+
+
+@benchmark('indicators', '計算技術指標矩陣 (SMA/EMA/RSI/MACD/OBV)')
+def bench_indicators():
+    import technical_indicators as ti
+
+    panel = _panel()
+    close, volume = panel['close'], panel['volume']
+
+    def run():
+        ti.sma(close, 20)
+        ti.ema(close, 20)
+        ti.rsi(close, 14)
+        ti.macd(close)
+        ti.obv(close, volume)
+        ti.volume_zscore(volume, 20)
+    return run
+
+
+@benchmark('scoring', '反轉雷達條件與評分')
+def bench_scoring():
+    from rebound_radar_batch import compute_conditions, score_latest
+
+    panel = _panel()
+    return lambda: score_latest(compute_conditions(panel))
+
+
+# ---- 執行與比較 ----
+
+def _measure(func, rounds):
+    """
+    先加倍每輪的呼叫次數直到單輪至少 MIN_ROUND_TIME 秒（同 timeit.autorange），
+    再跑 rounds 輪；回傳每次呼叫的最短與中位耗時
+    """
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - started >= MIN_ROUND_TIME:
+            break
+        number *= 2
+
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - started) / number)
+    return {'min': min(times), 'median': statistics.median(times)}
+
+
+def run_benchmarks(names=None, rounds=DEFAULT_ROUNDS):
+    """執行基準測試，回傳結果（秒數與相對於校正迴圈的倍數）"""
+    calibration = calibrate(rounds)
+    results = {}
+    for name in names or BENCHMARKS:
+        try:
+            func = BENCHMARKS[name]['setup']()
+        except Skip as e:
+            print(f"⏭️ {name}: {e}")
+            continue
+        timing = _measure(func, rounds)
+        results[name] = {
+            'min': round(timing['min'], 6),
+            'median': round(timing['median'], 6),
+            'relative': round(timing['min'] / calibration, 4),
+        }
+    return {
+        'generatedAt': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'calibration': round(calibration, 6),
+        'rounds': rounds,
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    與基準比較相對耗時；回傳每項的 (名稱, 基準, 本次, 比值, 狀態)
+    狀態為 regression / improved / ok / new
+    """
+    rows = []
+    base_results = (baseline or {}).get('results', {})
+    for name, result in current['results'].items():
+        base = base_results.get(name)
+        if not base:
+            rows.append((name, None, result['relative'], None, 'new'))
+            continue
+        ratio = result['relative'] / base['relative'] if base['relative'] else float('inf')
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 / (1 + threshold):
+            status = 'improved'
+        else:
+            status = 'ok'
+        rows.append((name, base['relative'], result['relative'], ratio, status))
+    return rows
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(current, path=BASELINE_PATH, names=None):
+    """寫入基準；只跑部分項目時保留其他項目原本的基準"""
+    baseline = load_baseline(path) if names else None
+    if baseline and baseline.get('calibration'):
+        merged = dict(baseline)
+        merged['results'] = dict(baseline['results'], **current['results'])
+        current = merged
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(current, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+
+def print_report(current, rows):
+    icons = {'regression': '❌', 'improved': '🚀', 'ok': '✅', 'new': '🆕'}
+    print(f"{'項目':<18}{'耗時(ms)':>12}{'相對':>10}{'基準':>10}{'比值':>8}")
+    for name, base, relative, ratio, status in rows:
+        result = current['results'][name]
+        base_text = f"{base:.2f}" if base is not None else '-'
+        ratio_text = f"{ratio:.2f}x" if ratio is not None else '-'
+        print(f"{icons[status]} {name:<16}{result['min'] * 1000:>12.2f}{relative:>10.2f}{base_text:>10}{ratio_text:>8}")
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='離線效能基準測試')
+    parser.add_argument('--only', nargs='*', choices=list(BENCHMARKS), help='只執行指定項目')
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='允許的變慢比例')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='以本次結果更新基準')
+    parser.add_argument('--output', help='將本次結果寫成 JSON')
+    parser.add_argument('--list', action='store_true', help='列出所有項目')
+    args = parser.parse_args()
+
+    if args.list:
+        for name, item in BENCHMARKS.items():
+            print(f"  {name:<18}{item['description']}")
+        return
+
+    print("🎯 離線效能基準測試")
+    print("=" * 60)
+
+    current = run_benchmarks(args.only, args.rounds)
+    print(f"📏 校正迴圈: {current['calibration'] * 1000:.2f} ms\n")
+    rows = compare(current, load_baseline(args.baseline), args.threshold)
+    print_report(current, rows)
+
+    regressions = [row[0] for row in rows if row[4] == 'regression']
+    if regressions and not args.save_baseline:
+        # 共用機器上偶有雜訊：退步的項目重跑一次，兩次都超過門檻才算
+        print(f"\n🔁 重新量測: {', '.join(regressions)}")
+        retry = run_benchmarks(regressions, args.rounds)
+        for name, result in retry['results'].items():
+            if result['relative'] < current['results'][name]['relative']:
+                current['results'][name] = result
+        rows = compare(current, load_baseline(args.baseline), args.threshold)
+        print_report(current, [row for row in rows if row[0] in regressions])
+        regressions = [row[0] for row in rows if row[4] == 'regression']
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        save_baseline(current, args.baseline, args.only)
+        print(f"\n📁 已更新基準: {args.baseline}")
+        return
+
+    if regressions:
+        print(f"\n❌ 效能退步超過 {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print("\n✅ 沒有超過門檻的退步")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+收集器執行指標
+記錄每個來源在 fetch / parse / merge / save 各階段的耗時、傳輸位元組、記錄數、錯誤與重試次數，
+執行結束後輸出 JSON 執行報告（data/metrics/<工作>-latest.json）以及 node_exporter
+textfile collector 可讀取的 Prometheus 文字格式檔。
+
+用法：
+    metrics = RunMetrics('stock_data_collector')
+    instrument_session(session, metrics)          # HTTP 回應的位元組與重試自動計入目前階段
+    with metrics.stage('fetch', 'twse_listed') as stage:
+        ...
+        stage.add_records(len(rows))
+    metrics.finish()
+    metrics.write_report()
+    metrics.write_prometheus('/var/lib/node_exporter/textfile_collector/stock_collector.prom')
+"""
+
+import os
+import json
+import time
+from datetime import datetime, timezone
+from contextlib import contextmanager
+
+METRICS_DIR = os.path.join('data', 'metrics')
+PROMETHEUS_PREFIX = 'stock_collector'
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+class StageMetrics:
+    """單一階段的計數器"""
+
+    def __init__(self, name, source=None):
+        self.name = name
+        self.source = source
+        self.started_at = _now_iso()
+        self.duration = 0.0
+        self.bytes = 0
+        self.records = 0
+        self.errors = 0
+        self.retries = 0
+        self.error = None
+
+    def add_bytes(self, count):
+        self.bytes += count
+
+    def add_records(self, count):
+        self.records += count
+
+    def add_error(self, error=None):
+        self.errors += 1
+        if error is not None:
+            self.error = str(error)
+
+    def add_retry(self, count=1):
+        self.retries += count
+
+    def to_dict(self):
+        per_second = (lambda value: round(value / self.duration, 2) if self.duration > 0 else None)
+        return {
+            'stage': self.name,
+            'source': self.source,
+            'startedAt': self.started_at,
+            'durationSeconds': round(self.duration, 6),
+            'bytes': self.bytes,
+            'records': self.records,
+            'errors': self.errors,
+            'retries': self.retries,
+            'recordsPerSecond': per_second(self.records),
+            'bytesPerSecond': per_second(self.bytes),
+            'status': 'error' if self.errors else 'ok',
+            'error': self.error,
+        }
+
+
+class RunMetrics:
+    """一次收集執行的所有階段指標"""
+
+    def __init__(self, job):
+        self.job = job
+        self.started_at = _now_iso()
+        self.finished_at = None
+        self._started = time.perf_counter()
+        self.duration = None
+        self.stages = []
+        self._active = []
+
+    @property
+    def current(self):
+        """目前執行中的（最內層）階段；沒有時為 None"""
+        return self._active[-1] if self._active else None
+
+    @contextmanager
+    def stage(self, name, source=None, accumulate=False):
+        """
+        記錄一個階段；區塊內丟出的例外會計為錯誤後照常往外拋，
+        讓收集器原本的 try/except 繼續處理。
+        accumulate=True 時同名同來源的階段合併成一筆（耗時累加），適合逐檔執行的大量小任務
+        """
+        stage = None
+        if accumulate:
+            stage = next((s for s in self.stages if s.name == name and s.source == source), None)
+        if stage is None:
+            stage = StageMetrics(name, source)
+            self.stages.append(stage)
+        self._active.append(stage)
+        started = time.perf_counter()
+        try:
+            yield stage
+        except Exception as e:
+            stage.add_error(e)
+            raise
+        finally:
+            stage.duration += time.perf_counter() - started
+            self._active.pop()
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+        self.finished_at = _now_iso()
+        return self
+
+    def totals(self):
+        return {field: sum(getattr(s, field) for s in self.stages)
+                for field in ('bytes', 'records', 'errors', 'retries')}
+
+    def to_dict(self):
+        if self.duration is None:
+            self.finish()
+        totals = self.totals()
+        return {
+            'job': self.job,
+            'startedAt': self.started_at,
+            'finishedAt': self.finished_at,
+            'durationSeconds': round(self.duration, 6),
+            'status': 'error' if totals['errors'] else 'ok',
+            'totals': totals,
+            'stages': [s.to_dict() for s in self.stages],
+        }
+
+    def summary(self):
+        """一行一個階段的文字摘要，供主程式結束時顯示"""
+        lines = []
+        for s in self.stages:
+            label = f"{s.name}:{s.source}" if s.source else s.name
+            rate = f"{s.records / s.duration:,.0f} 筆/秒" if s.duration > 0 and s.records else '-'
+            status = '❌' if s.errors else '✅'
+            lines.append(f"{status} {label:<28}{s.duration:>8.2f}s {s.records:>8} 筆 "
+                         f"{s.bytes / 1024:>10.1f} KB  {rate}")
+        return '\n'.join(lines)
+
+    # ---- 輸出 ----
+
+    def write_report(self, output_dir=METRICS_DIR):
+        """寫入 <工作>-<時間>.json 與 <工作>-latest.json，回傳 latest 路徑"""
+        os.makedirs(output_dir, exist_ok=True)
+        report = self.to_dict()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        for name in (f"{self.job}-{timestamp}.json", f"{self.job}-latest.json"):
+            path = os.path.join(output_dir, name)
+            _atomic_write(path, json.dumps(report, ensure_ascii=False, indent=2))
+        return path
+
+    def prometheus_text(self):
+        """Prometheus 文字格式（exposition format 0.0.4）"""
+        report = self.to_dict()
+        job = report['job']
+        metrics = {
+            'stage_duration_seconds': ('gauge', '階段耗時（秒）', 'durationSeconds'),
+            'stage_bytes': ('gauge', '階段傳輸位元組數', 'bytes'),
+            'stage_records': ('gauge', '階段處理的記錄數', 'records'),
+            'stage_errors': ('gauge', '階段錯誤次數', 'errors'),
+            'stage_retries': ('gauge', '階段重試次數', 'retries'),
+        }
+        lines = []
+        for metric, (kind, help_text, field) in metrics.items():
+            name = f"{PROMETHEUS_PREFIX}_{metric}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for stage in report['stages']:
+                labels = _labels(job=job, stage=stage['stage'], source=stage['source'] or '')
+                lines.append(f"{name}{{{labels}}} {stage[field]}")
+
+        run_metrics = (
+            ('run_duration_seconds', '整次執行耗時（秒）', report['durationSeconds']),
+            ('run_success', '最後一次執行是否沒有錯誤 (1/0)', int(report['status'] == 'ok')),
+            ('last_run_timestamp_seconds', '最後一次執行結束時間 (Unix 秒)', round(time.time(), 3)),
+        )
+        for metric, help_text, value in run_metrics:
+            name = f"{PROMETHEUS_PREFIX}_{metric}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name}{{{_labels(job=job)}}} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path=None):
+        """寫入 .prom 檔（先寫暫存檔再替換，node_exporter 不會讀到半份檔案）"""
+        path = path or os.path.join(METRICS_DIR, f"{self.job}.prom")
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        _atomic_write(path, self.prometheus_text())
+        return path
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{key}="{escape(value)}"' for key, value in labels.items())
+
+
+def _atomic_write(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def instrument_session(session, metrics):
+    """
+    在 requests.Session 加上 response hook：回應內容的位元組數與 urllib3 重試次數
+    自動計入當下執行中的階段
+    """
+    def record(response, *args, **kwargs):
+        stage = metrics.current
+        if stage is not None:
+            stage.add_bytes(len(response.content))
+            retries = getattr(response.raw, 'retries', None)
+            if retries is not None and retries.history:
+                stage.add_retry(len(retries.history))
+        return response
+
+    session.hooks['response'].append(record)
+    return session
+
+
+def add_metrics_arguments(parser):
+    """為收集器主程式加上指標輸出參數"""
+    parser.add_argument('--metrics-dir', default=METRICS_DIR, help='JSON 執行報告輸出目錄')
+    parser.add_argument('--metrics-textfile', help='Prometheus textfile 路徑（node_exporter textfile collector）')
+
+
+def write_run_outputs(metrics, args):
+    """主程式結束時輸出摘要、JSON 報告與 Prometheus 檔"""
+    metrics.finish()
+    print("\n⏱️ 階段指標:")
+    print(metrics.summary())
+    report_path = metrics.write_report(args.metrics_dir)
+    prom_path = metrics.write_prometheus(args.metrics_textfile or os.path.join(args.metrics_dir, f"{metrics.job}.prom"))
+    print(f"📁 執行報告: {report_path}")
+    print(f"📁 Prometheus: {prom_path}")
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分塊相關係數矩陣與產業分群
+以對齊後的日報酬面板計算全市場相關係數。矩陣依記憶體上限切成區塊 (tile) 逐塊計算，
+可選擇寫入 float32 的記憶體映射檔 (.npy)；分群時可利用全市場清單中的 sector / industry
+只計算同產業內的區塊，省去跨產業的大量運算。
+"""
+
+import os
+import json
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from ohlcv_store import iter_series, list_symbols, load_full_market_stocks
+from sampling_profiler import add_profile_arguments, profile_from_args
+
+OUTPUT_DIR = os.path.join('data', 'correlation')
+DEFAULT_BUDGET_MB = 512
+UNKNOWN_SECTOR = 'Unknown'
+
+try:
+    from scipy.cluster.hierarchy import linkage, fcluster
+    from scipy.spatial.distance import squareform
+except ImportError:  # 沒有 scipy 時改用門檻連通分群
+    linkage = None
+
+
+def build_return_panel(market, symbols=None, lookback=756, min_obs=120, base_dir='data'):
+    """
+    建立 (日期 x 股票) 的對數日報酬面板 (float32)
+
+    日期取所有股票最近 lookback 個交易日的聯集，缺值為 NaN；有效報酬少於 min_obs 的股票剔除。
+    回傳 (panel, symbols, dates)
+    """
+    if symbols is None:
+        symbols = list_symbols(market, base_dir=base_dir)
+
+    columns = {}
+    for series in iter_series(market, symbols, base_dir=base_dir):
+        close = series['close'][-(lookback + 1):]
+        time = series['time'][-(lookback + 1):]
+        if len(close) <= min_obs or not np.all(close > 0):        # 也排除缺值（NaN）
+            continue
+        columns[series['symbol']] = (time[1:], np.diff(np.log(close)))
+
+    if not columns:
+        return np.empty((0, 0), dtype=np.float32), [], np.array([], dtype='datetime64[D]')
+
+    dates = np.unique(np.concatenate([time for time, _ in columns.values()]))[-lookback:]
+    kept = sorted(columns)
+    panel = np.full((len(dates), len(kept)), np.nan, dtype=np.float32)
+    for col, symbol in enumerate(kept):
+        time, returns = columns[symbol]
+        mask = time >= dates[0]
+        rows = np.searchsorted(dates, time[mask])
+        panel[rows, col] = returns[mask]
+
+    return panel, kept, dates
+
+
+def standardize(panel):
+    """
+    將每欄標準化為平均 0、平方和 1，缺值補 0；兩欄內積即為相關係數
+    （缺值以平均值插補，兩檔皆完整時結果與 Pearson 相關係數相同）
+    """
+    panel = np.asarray(panel, dtype=np.float32)
+    valid = ~np.isnan(panel)
+    counts = valid.sum(axis=0)
+    mean = np.where(counts > 0, np.nansum(panel, axis=0) / np.maximum(counts, 1), 0)
+    centered = np.where(valid, panel - mean, 0).astype(np.float32)
+    norms = np.sqrt((centered * centered).sum(axis=0))
+    return centered / np.where(norms > 0, norms, 1)
+
+
+def tile_size_for_budget(n_days, n_symbols, budget_mb=DEFAULT_BUDGET_MB):
+    """
+    依記憶體上限決定區塊大小 b：兩個 (n_days x b) 的輸入區塊加一個 (b x b) 結果區塊
+    需放得進 budget_mb（float32）
+    """
+    budget = budget_mb * 1024 * 1024 / 4
+    # b^2 + 2 * n_days * b - budget = 0
+    b = int(-n_days + np.sqrt(n_days * n_days + budget))
+    return max(1, min(b, n_symbols))
+
+
+class BlockedCorrelation:
+    """分塊相關係數計算器"""
+
+    def __init__(self, panel, symbols, budget_mb=DEFAULT_BUDGET_MB):
+        self.z = standardize(panel)
+        self.symbols = list(symbols)
+        self.tile = tile_size_for_budget(self.z.shape[0], len(self.symbols), budget_mb)
+
+    def iter_tiles(self, columns=None):
+        """逐一產生上三角區塊 (row_slice, col_slice, tile)；columns 可限制在部分欄位（依序為欄位索引）"""
+        columns = np.arange(len(self.symbols)) if columns is None else np.asarray(columns)
+        starts = range(0, len(columns), self.tile)
+        for i in starts:
+            rows = columns[i:i + self.tile]
+            left = self.z[:, rows]
+            for j in starts:
+                if j < i:
+                    continue
+                cols = columns[j:j + self.tile]
+                yield rows, cols, np.clip(left.T @ self.z[:, cols], -1, 1)
+
+    def compute(self, out_path=None):
+        """
+        計算完整相關係數矩陣；指定 out_path 時寫入 float32 記憶體映射檔，
+        不會一次把整個矩陣放進記憶體
+        """
+        n = len(self.symbols)
+        if out_path:
+            os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+            matrix = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.float32, shape=(n, n))
+        else:
+            matrix = np.empty((n, n), dtype=np.float32)
+
+        for rows, cols, tile in self.iter_tiles():
+            matrix[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1] = tile
+            matrix[cols[0]:cols[-1] + 1, rows[0]:rows[-1] + 1] = tile.T
+
+        if out_path:
+            matrix.flush()
+        return matrix
+
+    def block(self, columns):
+        """計算指定欄位之間的相關係數小矩陣（供產業內分群使用）"""
+        columns = np.asarray(columns)
+        sub = self.z[:, columns]
+        return np.clip(sub.T @ sub, -1, 1)
+
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = np.arange(n)
+
+    def find(self, x):
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+    def labels(self):
+        return np.array([self.find(i) for i in range(len(self.parent))])
+
+
+def threshold_clusters(engine, threshold=0.7, columns=None):
+    """以相關係數門檻做連通分群（single linkage），逐塊處理，適用整個市場"""
+    columns = np.arange(len(engine.symbols)) if columns is None else np.asarray(columns)
+    position = {col: k for k, col in enumerate(columns)}
+    uf = _UnionFind(len(columns))
+    for rows, cols, tile in engine.iter_tiles(columns):
+        for r, c in zip(*np.nonzero(tile >= threshold)):
+            if rows[r] != cols[c]:
+                uf.union(position[rows[r]], position[cols[c]])
+    return uf.labels()
+
+
+def hierarchical_clusters(corr, threshold=0.7):
+    """平均連結的階層式分群；沒有 scipy 時退回門檻連通分群"""
+    n = corr.shape[0]
+    if n < 2:
+        return np.zeros(n, dtype=np.int64)
+    if linkage is None:
+        uf = _UnionFind(n)
+        for r, c in zip(*np.nonzero(np.triu(corr >= threshold, 1))):
+            uf.union(r, c)
+        return uf.labels()
+
+    distance = np.clip(1 - corr.astype(np.float64), 0, 2)
+    np.fill_diagonal(distance, 0)
+    tree = linkage(squareform(distance, checks=False), method='average')
+    return fcluster(tree, t=1 - threshold, criterion='distance')
+
+
+def sector_groups(symbols, stocks, level='sector'):
+    """依全市場清單的 sector（或 industry）將欄位分組；未知產業歸在 Unknown"""
+    lookup = {s['symbol']: s.get(level) or UNKNOWN_SECTOR for s in stocks}
+    groups = {}
+    for col, symbol in enumerate(symbols):
+        groups.setdefault(lookup.get(symbol, UNKNOWN_SECTOR), []).append(col)
+    return groups
+
+
+def cluster_by_sector(engine, stocks, threshold=0.7, level='sector'):
+    """
+    產業內分群：只計算同產業內的相關係數區塊，運算量由 N^2 降為各產業大小平方和。
+    Unknown 產業通常很大，改以分塊門檻分群處理
+    """
+    clusters = []
+    for sector, columns in sorted(sector_groups(engine.symbols, stocks, level).items()):
+        if sector == UNKNOWN_SECTOR or len(columns) > engine.tile:
+            labels = threshold_clusters(engine, threshold, columns)
+        else:
+            labels = hierarchical_clusters(engine.block(columns), threshold)
+
+        members = {}
+        for col, label in zip(columns, labels):
+            members.setdefault(int(label), []).append(engine.symbols[col])
+        for group in members.values():
+            if len(group) > 1:
+                clusters.append({'sector': sector, 'size': len(group), 'symbols': sorted(group)})
+
+    clusters.sort(key=lambda c: (-c['size'], c['sector']))
+    return clusters
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='分塊相關係數矩陣與產業分群')
+    parser.add_argument('--market', default='US')
+    parser.add_argument('--lookback', type=int, default=756, help='使用的交易日數')
+    parser.add_argument('--budget-mb', type=int, default=DEFAULT_BUDGET_MB)
+    parser.add_argument('--threshold', type=float, default=0.7)
+    parser.add_argument('--level', choices=['sector', 'industry'], default='sector')
+    parser.add_argument('--matrix', action='store_true', help='輸出完整相關係數矩陣 (float32 .npy)')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, 'correlation_engine')
+
+    print("🎯 分塊相關係數與產業分群")
+    print("=" * 60)
+
+    panel, symbols, dates = build_return_panel(args.market, lookback=args.lookback)
+    engine = BlockedCorrelation(panel, symbols, args.budget_mb)
+    print(f"📊 {len(symbols)} 檔股票 x {len(dates)} 個交易日，區塊大小 {engine.tile}")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    if args.matrix:
+        matrix_path = os.path.join(OUTPUT_DIR, f"{args.market}-corr.npy")
+        engine.compute(matrix_path)
+        with open(os.path.join(OUTPUT_DIR, f"{args.market}-corr-symbols.json"), 'w', encoding='utf-8') as f:
+            json.dump(symbols, f)
+        print(f"✅ 已寫入相關係數矩陣: {matrix_path}")
+
+    clusters = cluster_by_sector(engine, load_full_market_stocks(args.market), args.threshold, args.level)
+    output = os.path.join(OUTPUT_DIR, f"{args.market}-clusters.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'generatedAt': datetime.now().isoformat(),
+            'market': args.market,
+            'threshold': args.threshold,
+            'level': args.level,
+            'from': str(dates[0]) if len(dates) else None,
+            'to': str(dates[-1]) if len(dates) else None,
+            'clusters': clusters,
+        }, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ 共 {len(clusters)} 個群組")
+    print(f"📁 已儲存: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+K 線資料品質檢查
+一次檢查 data/cache 與 data/historical 下所有日 K：多檔股票串接成一組平坦陣列，
+所有檢查都是整批的 NumPy 運算，再以 bincount 依股票彙總，不逐根迴圈。
+
+錯誤（列入隔離清單）：
+    unsorted         time 未遞增
+    duplicate        重複日期
+    highBelowLow     最高價低於最低價
+    closeOutOfRange  收盤價不在 [最低, 最高] 之間
+    missingPrice     開高低收有缺值（原始資料的 null，載入後為 NaN）
+    nonPositive      開高低收有零或負值
+警告：
+    zeroVolume       成交量為零
+    outlier          單日報酬異常（超過該股票其餘報酬標準差的 OUTLIER_Z 倍，且絕對值大於 MIN_JUMP）
+    gap              兩根 K 線之間缺了交易日：交易日曆已驗證的年份只要缺一個交易日就算，
+                     其餘年份以平日近似，缺超過 MAX_GAP_DAYS 個平日才算
+
+結果寫到 data/quality/quality-report.json（每檔股票一筆）與 quarantine.json。
+報告記錄每個檔案的 mtime / 大小，重跑時只重新檢查有變動的檔案，因此每次更新後執行的成本
+只與當次更新的股票數成正比。
+
+用法：
+    python3 data_quality.py                    # 檢查全部
+    python3 data_quality.py --markets TW --full
+"""
+
+import os
+import json
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from ohlcv_store import DATA_DIR, list_symbols, load_series, series_path
+from trading_calendar import calendar as trading_calendar
+
+REPORT_NAME = 'quality-report.json'
+QUARANTINE_NAME = 'quarantine.json'
+STORES = ('cache', 'historical')
+MARKETS = ('TW', 'US')
+
+ERROR_CHECKS = ('unsorted', 'duplicate', 'highBelowLow', 'closeOutOfRange', 'missingPrice', 'nonPositive')
+WARNING_CHECKS = ('zeroVolume', 'outlier', 'gap')
+MAX_GAP_DAYS = 10            # 農曆年休市最長約 7 個平日
+OUTLIER_Z = 8.0
+MIN_JUMP = 0.25              # 對數報酬，約 ±25%
+PRICE_TOLERANCE = 1e-6       # 收盤價與高低價比較時容許的相對誤差（浮點數捨入）
+BATCH_SIZE = 500             # 每批串接的股票數，限制記憶體用量
+
+
+def validate_batch(series_list, max_gap_days=MAX_GAP_DAYS, outlier_z=OUTLIER_Z, min_jump=MIN_JUMP, calendar=None):
+    """
+    檢查一批序列（ohlcv_store.load_series 的格式），回傳與輸入同順序的結果：
+    {'rows', 'start', 'end', 'issues': {檢查: {'count', 'first'}}, 'status'}
+    calendar 為這批股票所屬市場的 TradingCalendar 時，缺漏以實際交易日計算
+    """
+    n = len(series_list)
+    lengths = np.array([len(s['time']) for s in series_list], dtype=np.int64)
+    if n == 0:
+        return []
+    seg = np.repeat(np.arange(n), lengths)
+    time = np.concatenate([s['time'] for s in series_list]).astype('datetime64[D]')
+    cols = {field: np.concatenate([s[field] for s in series_list]).astype(np.float64)
+            for field in ('open', 'high', 'low', 'close', 'volume')}
+    o, h, l, c, v = (cols[f] for f in ('open', 'high', 'low', 'close', 'volume'))
+
+    # 相鄰兩列屬於同一檔股票時才比較
+    same = seg[1:] == seg[:-1]
+    day = time.astype(np.int64)
+    delta = np.diff(day)
+
+    flags = {}
+    flags['unsorted'] = _pad(same & (delta < 0))
+    flags['duplicate'] = _pad(same & (delta == 0))
+    flags['highBelowLow'] = h < l
+    flags['closeOutOfRange'] = (h >= l) & ((c > h * (1 + PRICE_TOLERANCE)) | (c < l * (1 - PRICE_TOLERANCE)))
+    flags['missingPrice'] = np.isnan(o) | np.isnan(h) | np.isnan(l) | np.isnan(c)
+    flags['nonPositive'] = (o <= 0) | (h <= 0) | (l <= 0) | (c <= 0)
+    flags['zeroVolume'] = v == 0
+
+    forward = same & (delta > 0)
+    missing = np.zeros(len(delta), dtype=np.int64)
+    missing[forward] = np.busday_count(time[:-1][forward], time[1:][forward]) - 1
+    gap = missing > max_gap_days
+    if calendar is not None:
+        prev, cur = day[:-1], day[1:]
+        verified = forward & (prev >= calendar.verified_start) & (cur <= calendar.verified_end)
+        between = (np.searchsorted(calendar.sessions, cur[verified], 'left')
+                   - np.searchsorted(calendar.sessions, prev[verified], 'right'))
+        gap[verified] = between > 0
+    flags['gap'] = _pad(gap)
+
+    # 報酬離群值：尺度為該股票「其餘」報酬的標準差（不含自己，避免單一大跳空把標準差撐大而漏掉）
+    usable = forward & (c[1:] > 0) & (c[:-1] > 0)
+    returns = np.zeros(len(delta))
+    returns[usable] = np.log(c[1:][usable] / c[:-1][usable])
+    ret_seg = seg[1:]
+    count = np.bincount(ret_seg, weights=usable, minlength=n)[ret_seg] - 1
+    total = np.bincount(ret_seg, weights=returns, minlength=n)[ret_seg] - returns
+    squares = np.bincount(ret_seg, weights=returns ** 2, minlength=n)[ret_seg] - returns ** 2
+    safe = np.maximum(count, 1)
+    mean = total / safe
+    std = np.sqrt(np.maximum(squares / safe - mean ** 2, 0))
+    limit = np.maximum(outlier_z * std, min_jump)
+    flags['outlier'] = _pad(usable & (count > 0) & (np.abs(returns - mean) > limit))
+
+    counts = {name: np.bincount(seg, weights=mask, minlength=n).astype(np.int64) for name, mask in flags.items()}
+    firsts = {}
+    for name, mask in flags.items():
+        rows = np.flatnonzero(mask)
+        segments, index = np.unique(seg[rows], return_index=True)
+        firsts[name] = dict(zip(segments.tolist(), time[rows[index]].astype(str).tolist()))
+
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    results = []
+    for i in range(n):
+        if lengths[i] == 0:
+            results.append({'rows': 0, 'start': None, 'end': None,
+                            'issues': {'empty': {'count': 1, 'first': None}}, 'status': 'quarantine'})
+            continue
+        issues = {name: {'count': int(counts[name][i]), 'first': firsts[name].get(i)}
+                  for name in ERROR_CHECKS + WARNING_CHECKS if counts[name][i]}
+        if any(name in issues for name in ERROR_CHECKS):
+            status = 'quarantine'
+        elif issues:
+            status = 'warning'
+        else:
+            status = 'ok'
+        results.append({
+            'rows': int(lengths[i]),
+            'start': str(time[offsets[i]]),
+            'end': str(time[offsets[i + 1] - 1]),
+            'issues': issues,
+            'status': status,
+        })
+    return results
+
+
+def _pad(pair_mask):
+    """相鄰列的比較結果對應到後一列"""
+    return np.concatenate([[False], pair_mask])
+
+
+def series_key(store, market, symbol):
+    return f"{store}/{market}/{symbol}"
+
+
+class QualityValidator:
+    """檢查 K 線檔並維護品質報告與隔離清單"""
+
+    def __init__(self, base_dir=DATA_DIR, output_dir=None, stores=STORES, batch_size=BATCH_SIZE,
+                 max_gap_days=MAX_GAP_DAYS, outlier_z=OUTLIER_Z, min_jump=MIN_JUMP):
+        self.base_dir = base_dir
+        self.output_dir = output_dir or os.path.join(base_dir, 'quality')
+        self.stores = stores
+        self.batch_size = batch_size
+        self.options = {'max_gap_days': max_gap_days, 'outlier_z': outlier_z, 'min_jump': min_jump}
+
+    def report_path(self):
+        return os.path.join(self.output_dir, REPORT_NAME)
+
+    def load_report(self):
+        try:
+            with open(self.report_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'symbols': {}}
+
+    def files(self, markets):
+        """列出要檢查的 (key, store, market, symbol, 路徑)"""
+        for store in self.stores:
+            for market in markets:
+                for symbol in list_symbols(market, store=store, base_dir=self.base_dir):
+                    yield (series_key(store, market, symbol), store, market, symbol,
+                           series_path(market, symbol, store=store, base_dir=self.base_dir))
+
+    def run(self, markets=MARKETS, incremental=True):
+        """
+        檢查指定市場；incremental 時沿用報告中檔案未變動的結果。
+        其他市場的既有結果保留在報告中。回傳報告
+        """
+        previous = self.load_report()
+        reuse = previous['symbols'] if incremental and previous.get('options') == self.options else {}
+        symbols = {key: item for key, item in previous['symbols'].items()
+                   if key.split('/')[1] not in markets}
+
+        pending = []
+        checked = reused = 0
+        for key, store, market, symbol, path in self.files(markets):
+            stat = os.stat(path)
+            version = [stat.st_mtime_ns, stat.st_size]
+            if reuse.get(key, {}).get('version') == version:
+                symbols[key] = reuse[key]
+                reused += 1
+                continue
+            pending.append((key, version, store, market, symbol, path))
+            if len(pending) >= self.batch_size:
+                checked += self._check(pending, symbols)
+                pending = []
+        checked += self._check(pending, symbols)
+
+        report = {
+            'generatedAt': datetime.now().isoformat(),
+            'options': self.options,
+            'summary': summarize(symbols),
+            'checked': checked,
+            'reused': reused,
+            'symbols': dict(sorted(symbols.items())),
+        }
+        self._write(REPORT_NAME, report)
+        self._write(QUARANTINE_NAME, quarantine_list(report))
+        return report
+
+    def _check(self, pending, symbols):
+        """檢查一批檔案；依市場分組，各自套用該市場的交易日曆"""
+        by_market = {}
+        for item in pending:
+            by_market.setdefault(item[3], []).append(item)
+        for market, items in by_market.items():
+            self._check_market(market, items, symbols)
+        return len(pending)
+
+    def _check_market(self, market, pending, symbols):
+        try:
+            calendar = trading_calendar(market)
+        except KeyError:
+            calendar = None
+        loaded, keys = [], []
+        for key, version, store, market, symbol, path in pending:
+            try:
+                series = load_series(market, symbol, store=store, base_dir=self.base_dir, path=path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                symbols[key] = {'version': version, 'rows': 0, 'issues': {'unreadable': {'count': 1, 'first': None}},
+                                'status': 'quarantine', 'error': str(e)}
+                continue
+            loaded.append(series)
+            keys.append((key, version))
+
+        for (key, version), result in zip(keys, validate_batch(loaded, calendar=calendar, **self.options)):
+            symbols[key] = dict(result, version=version)
+
+    def _write(self, name, payload):
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+
+def summarize(symbols):
+    summary = {'total': len(symbols), 'ok': 0, 'warning': 0, 'quarantine': 0, 'issues': {}}
+    for item in symbols.values():
+        summary[item['status']] += 1
+        for name in item['issues']:
+            summary['issues'][name] = summary['issues'].get(name, 0) + 1
+    return summary
+
+
+def quarantine_list(report):
+    """從報告取出需隔離的股票與原因"""
+    entries = []
+    for key, item in report['symbols'].items():
+        if item['status'] != 'quarantine':
+            continue
+        store, market, symbol = key.split('/')
+        entries.append({'store': store, 'market': market, 'symbol': symbol,
+                        'reasons': sorted(item['issues']), 'first': {k: v['first'] for k, v in item['issues'].items()}})
+    return {'generatedAt': report['generatedAt'], 'count': len(entries), 'symbols': entries}
+
+
+def load_quarantine(market=None, base_dir=DATA_DIR):
+    """讀取隔離清單，回傳 {(store, market, symbol)} 集合；尚未產生時為空集合"""
+    try:
+        with open(os.path.join(base_dir, 'quality', QUARANTINE_NAME), 'r', encoding='utf-8') as f:
+            entries = json.load(f)['symbols']
+    except (OSError, ValueError, KeyError):
+        return set()
+    return {(e['store'], e['market'], e['symbol']) for e in entries if market is None or e['market'] == market}
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='K 線資料品質檢查')
+    parser.add_argument('--markets', nargs='*', default=list(MARKETS))
+    parser.add_argument('--stores', nargs='*', default=list(STORES))
+    parser.add_argument('--full', action='store_true', help='忽略上次的結果，全部重新檢查')
+    parser.add_argument('--max-gap-days', type=int, default=MAX_GAP_DAYS)
+    parser.add_argument('--outlier-z', type=float, default=OUTLIER_Z)
+    parser.add_argument('--min-jump', type=float, default=MIN_JUMP)
+    args = parser.parse_args()
+
+    print("🔍 K 線資料品質檢查")
+    print("=" * 60)
+    validator = QualityValidator(stores=tuple(args.stores), max_gap_days=args.max_gap_days,
+                                 outlier_z=args.outlier_z, min_jump=args.min_jump)
+    report = validator.run(tuple(args.markets), incremental=not args.full)
+    summary = report['summary']
+    print(f"📊 共 {summary['total']} 檔（本次檢查 {report['checked']}，沿用 {report['reused']}）："
+          f"正常 {summary['ok']}，警告 {summary['warning']}，隔離 {summary['quarantine']}")
+    for name, count in sorted(summary['issues'].items(), key=lambda item: -item[1]):
+        print(f"   {name}: {count} 檔")
+    print(f"📁 報告已儲存: {validator.report_path()}")
+
+
+if __name__ == "__main__":
+    main()
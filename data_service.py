@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+K 線與技術指標資料服務
+以 asyncio 提供本機資料庫存（data/cache、data/historical、data/indicators）的 HTTP 查詢，
+Next.js 的 /api/ohlc、/api/indicators、/api/historical 只需轉發到這裡：
+
+    GET /ohlc?market=TW&symbol=2330&tf=1d&from=2024-01-01&to=2024-12-31&fields=close,volume
+    GET /historical?market=US&symbol=AAPL&interval=1w
+    GET /indicators?market=TW&symbol=2330&interval=1d&from=2024-01-01&fields=rsi,macd.histogram
+    GET /health
+    GET /stats
+
+- 解析後的檔案保留在行程內的熱快取（series_cache 的 W-TinyLFU，記憶體預算制），檔案 mtime/大小改變時自動重新載入
+- from/to 以二分搜尋切出區間，fields 只回傳指定欄位
+- K 線檔的 lastUpdated 超過 STALE_AFTER（與 lib/stock-cache.ts 的快取期限相同），或 from/to 超出檔案涵蓋的日期時回 404，
+  讓 API 改走原本向 Yahoo 更新的流程，不會一直回應停在最後一次寫入的資料
+- 回應帶 ETag 與 Cache-Control，If-None-Match 相符時回 304；用戶端接受時以 gzip 壓縮
+- 相同查詢的編碼結果（含 gzip 版本）另有快取，重複請求不需重新序列化；
+  這份快取以位元組計算，與檔案熱快取合計不超過 --cache-mb
+
+用法：
+    python3 data_service.py --port 8765
+"""
+
+import os
+import json
+import gzip
+import time
+import asyncio
+import hashlib
+import argparse
+from datetime import datetime
+from bisect import bisect_left, bisect_right
+from urllib.parse import urlsplit, parse_qs
+
+from series_cache import SeriesCache
+
+try:
+    import orjson
+except ImportError:  # 沒有 orjson 時使用標準函式庫
+    orjson = None
+
+DATA_DIR = 'data'
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+CACHE_MB = 512            # 熱快取的記憶體預算（檔案與已編碼回應合計）
+RESPONSE_SHARE = 0.25     # 預算中分給已編碼回應的比例
+PARSED_SIZE_FACTOR = 6    # 解析成 Python 物件後約為檔案大小的倍數
+MAX_RECORDS = 5000        # 與 /api/ohlc 相同的回傳筆數上限
+STALE_AFTER = 24 * 3600   # 與 lib/stock-cache.ts 的 CACHE_EXPIRY_HOURS 相同，超過時交回 API 重新向 Yahoo 取得
+GZIP_MIN_BYTES = 1024
+CACHE_CONTROL = 'public, max-age=60'
+MARKETS = ('TW', 'US')
+TIMEFRAMES = ('1d', '1w', '1M')
+# 指標快取檔以 D / W / M 命名，對應的 K 線檔為 1d / 1w / 1M
+INDICATOR_INTERVALS = {'1d': 'D', '1w': 'W', '1M': 'M'}
+
+STATUS_TEXT = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+def dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class RequestError(Exception):
+    """回傳給用戶端的錯誤（帶 HTTP 狀態碼）"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LoadedFile:
+    """解析後的資料檔與其時間索引"""
+
+    def __init__(self, path, stat, payload, times):
+        self.path = path
+        self.version = (stat.st_mtime_ns, stat.st_size)
+        self.payload = payload
+        self.times = times
+
+    def window(self, start=None, end=None):
+        """以二分搜尋取得 [start, end] 對應的列範圍（日期字串可直接比較）"""
+        lo = bisect_left(self.times, start) if start else 0
+        hi = bisect_right(self.times, end + '\uffff') if end else len(self.times)
+        return lo, hi
+
+
+class SeriesStore:
+    """資料檔熱快取：依 mtime 與大小判斷是否需要重新載入，以 series_cache 的 W-TinyLFU 在記憶體預算內淘汰"""
+
+    def __init__(self, base_dir=DATA_DIR, cache_mb=CACHE_MB):
+        self.base_dir = base_dir
+        self.cache = SeriesCache(int(cache_mb * 1024 * 1024))
+        self.loading = {}
+
+    def ohlcv_path(self, store, market, symbol, interval):
+        return os.path.join(self.base_dir, store, market, symbol, f"{interval}.json")
+
+    def indicator_path(self, market, symbol, interval):
+        return os.path.join(self.base_dir, 'indicators', market, symbol, f"{INDICATOR_INTERVALS[interval]}_indicators.json")
+
+    async def get(self, path, times_of=None):
+        """
+        取得解析後的檔案；times_of(payload) 產生時間索引。
+        同一檔案同時有多個請求時只解析一次
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.cache.invalidate(path)
+            return None
+
+        version = (stat.st_mtime_ns, stat.st_size)
+        cached = self.cache.get(path, version)
+        if cached is not None:
+            return cached
+
+        if path in self.loading:
+            return await self.loading[path]
+
+        future = asyncio.get_running_loop().create_future()
+        self.loading[path] = future
+        try:
+            payload = await asyncio.to_thread(_read_json, path)
+            loaded = LoadedFile(path, stat, payload, times_of(payload) if times_of else [])
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # 等待中的請求會各自收到例外，避免 "never retrieved" 警告
+            raise
+        finally:
+            del self.loading[path]
+
+        self.cache.put(path, loaded, stat.st_size * PARSED_SIZE_FACTOR, version)
+        future.set_result(loaded)
+        return loaded
+
+
+def _read_json(path):
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def _candle_times(payload):
+    return [c['time'] for c in _candles(payload)]
+
+
+def _candles(payload):
+    return payload.get('data', []) if isinstance(payload, dict) else payload
+
+
+def _age(timestamp, now):
+    """ISO 時間字串距今的秒數；無法解析時視為無限久"""
+    try:
+        return now - datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return float('inf')
+
+
+def _slice_values(value, lo, hi):
+    """指標值可能是陣列或 {子指標: 陣列}"""
+    if isinstance(value, dict):
+        return {key: _slice_values(sub, lo, hi) for key, sub in value.items()}
+    return value[lo:hi]
+
+
+def _project_indicators(indicators, fields):
+    if not fields:
+        return indicators
+    selected = {}
+    for field in fields:
+        name, _, sub = field.partition('.')
+        if name not in indicators:
+            raise RequestError(400, f"未知的指標: {name}")
+        if sub:
+            if not isinstance(indicators[name], dict) or sub not in indicators[name]:
+                raise RequestError(400, f"未知的指標: {field}")
+            selected.setdefault(name, {})[sub] = indicators[name][sub]
+        else:
+            selected[name] = indicators[name]
+    return selected
+
+
+class DataService:
+    """處理查詢並產生回應"""
+
+    def __init__(self, base_dir=DATA_DIR, cache_control=CACHE_CONTROL, cache_mb=CACHE_MB, stale_after=STALE_AFTER,
+                 clock=time.time):
+        self.store = SeriesStore(base_dir, cache_mb * (1 - RESPONSE_SHARE))
+        self.cache_control = cache_control
+        self.stale_after = stale_after
+        self.clock = clock
+        self.responses = SeriesCache(int(cache_mb * RESPONSE_SHARE * 1024 * 1024))
+        self.requests = 0
+        self.not_modified = 0
+        self.started = time.time()
+
+    # ---- 參數 ----
+
+    @staticmethod
+    def _params(query):
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+        market, symbol = params.get('market'), params.get('symbol')
+        if not market or not symbol:
+            raise RequestError(400, 'market 和 symbol 參數為必填')
+        if market not in MARKETS:
+            raise RequestError(400, 'market 必須是 US 或 TW')
+        if '/' in symbol or '\\' in symbol or symbol.startswith('.'):
+            raise RequestError(400, f"無效的股票代號: {symbol}")
+        interval = params.get('tf') or params.get('interval') or '1d'
+        if interval not in TIMEFRAMES:
+            raise RequestError(400, '時間框架必須是 1d (日K)、1w (週K) 或 1M (月K)')
+        fields = [f for f in params.get('fields', '').split(',') if f]
+        return market, symbol, interval, params.get('from'), params.get('to'), fields
+
+    def _unusable(self, loaded, start, end):
+        """K 線檔不能代替 API 原本流程的原因（過期或未涵蓋查詢區間）；可以使用時回傳 None"""
+        updated = loaded.payload.get('lastUpdated') if isinstance(loaded.payload, dict) else None
+        if _age(updated, self.clock()) >= self.stale_after:
+            return f"本機資料已過期（lastUpdated: {updated}）"
+        first, last = (loaded.times[0][:10], loaded.times[-1][:10]) if loaded.times else (None, None)
+        if (start or end) and first is None:
+            return '本機資料沒有 K 線'
+        if (start and start < first) or (end and end > last):
+            return f"查詢區間超出本機資料範圍（{first} ~ {last}）"
+        return None
+
+    # ---- 端點 ----
+
+    async def ohlc(self, query, stores=('cache', 'historical')):
+        market, symbol, interval, start, end, fields = self._params(query)
+        reason = f"找不到股票: {symbol} ({market})"
+        for store in stores:
+            loaded = await self.store.get(self.store.ohlcv_path(store, market, symbol, interval), _candle_times)
+            if loaded is None:
+                continue
+            reason = self._unusable(loaded, start, end)
+            if reason is None:
+                break
+        else:
+            raise RequestError(404, reason)
+
+        def build():
+            lo, hi = loaded.window(start, end)
+            hi = min(hi, lo + MAX_RECORDS)
+            candles = _candles(loaded.payload)[lo:hi]
+            if fields:
+                keep = ('time',) + tuple(fields)
+                candles = [{key: c[key] for key in keep if key in c} for c in candles]
+            return {
+                'success': True,
+                'data': candles,
+                'metadata': {
+                    'symbol': symbol,
+                    'market': market,
+                    'timeframe': interval,
+                    'totalRecords': len(candles),
+                    'earliestDate': candles[0]['time'] if candles else None,
+                    'latestDate': candles[-1]['time'] if candles else None,
+                    'lastUpdated': loaded.payload.get('lastUpdated') if isinstance(loaded.payload, dict) else None,
+                    'dataSource': f"data-service ({store})",
+                },
+            }
+        return (loaded.path, loaded.version, query), build
+
+    async def historical(self, query):
+        return await self.ohlc(query, stores=('historical',))
+
+    async def indicators(self, query):
+        market, symbol, interval, start, end, fields = self._params(query)
+        loaded = await self.store.get(self.store.indicator_path(market, symbol, interval))
+        if loaded is None:
+            raise RequestError(404, f"找不到技術指標: {symbol} ({market})")
+        # 指標陣列與同週期的 K 線快取逐列對齊，用 K 線的時間做區間查詢
+        series = await self.store.get(self.store.ohlcv_path('cache', market, symbol, interval), _candle_times)
+        times = series.times if series is not None else []
+
+        def build():
+            indicators = _project_indicators(loaded.payload.get('indicators', {}), fields)
+            length = max((len(v) for v in indicators.values() if isinstance(v, list)), default=0)
+            aligned = len(times) == length
+            lo, hi = series.window(start, end) if aligned and (start or end) else (0, length)
+            return {
+                'success': True,
+                'data': {
+                    'market': market,
+                    'symbol': symbol,
+                    'interval': interval,
+                    'lastUpdated': loaded.payload.get('lastUpdated'),
+                    'time': times[lo:hi] if aligned else None,
+                    'indicators': {name: _slice_values(value, lo, hi) for name, value in indicators.items()},
+                },
+            }
+        version = (loaded.version, series.version if series is not None else None)
+        return (loaded.path, version, query), build
+
+    def stats(self):
+        return {
+            'uptimeSeconds': round(time.time() - self.started),
+            'requests': self.requests,
+            'notModified': self.not_modified,
+            'responseCache': self.responses.stats(),
+            'fileCache': self.store.cache.stats(),
+        }
+
+    # ---- 回應 ----
+
+    async def handle(self, method, target, headers):
+        """回傳 (status, 標頭 dict, body bytes)"""
+        self.requests += 1
+        if method not in ('GET', 'HEAD'):
+            return self._error(405, '只支援 GET')
+        parts = urlsplit(target)
+        route = parts.path.rstrip('/') or '/'
+        try:
+            if route == '/health':
+                return self._json(200, {'status': 'ok'}, cache=False)
+            if route == '/stats':
+                return self._json(200, self.stats(), cache=False)
+            endpoint = {'/ohlc': self.ohlc, '/historical': self.historical, '/indicators': self.indicators}.get(route)
+            if endpoint is None:
+                return self._error(404, f"未知的路徑: {route}")
+            key, build = await endpoint(parts.query)
+            return self._cached_response(key, build, headers)
+        except RequestError as e:
+            return self._error(e.status, str(e))
+        except Exception as e:
+            return self._error(500, f"伺服器錯誤: {e}")
+
+    def _cached_response(self, key, build, headers):
+        gzip_ok = 'gzip' in headers.get('accept-encoding', '')
+        entry = self.responses.get(key)
+        if entry is None:
+            body = dumps(build())
+            etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+            entry = {'etag': etag, 'body': body, 'gzip': None}
+            self.responses.put(key, entry, len(body))
+
+        response_headers = {'ETag': entry['etag'], 'Cache-Control': self.cache_control, 'Vary': 'Accept-Encoding'}
+        if entry['etag'] in [tag.strip() for tag in headers.get('if-none-match', '').split(',')]:
+            self.not_modified += 1
+            return 304, response_headers, b''
+
+        body = entry['body']
+        if gzip_ok and len(body) >= GZIP_MIN_BYTES:
+            if entry['gzip'] is None:
+                entry['gzip'] = gzip.compress(body, compresslevel=5)
+                self.responses.put(key, entry, len(body) + len(entry['gzip']))     # 重新計入壓縮版本的大小
+            body = entry['gzip']
+            response_headers['Content-Encoding'] = 'gzip'
+        response_headers['Content-Type'] = 'application/json; charset=utf-8'
+        return 200, response_headers, body
+
+    @staticmethod
+    def _json(status, value, cache=True):
+        headers = {'Content-Type': 'application/json; charset=utf-8'}
+        if not cache:
+            headers['Cache-Control'] = 'no-store'
+        return status, headers, dumps(value)
+
+    def _error(self, status, message):
+        return self._json(status, {'success': False, 'error': message}, cache=False)
+
+
+async def handle_connection(service, reader, writer):
+    """最小的 HTTP/1.1 實作：支援 keep-alive，不支援請求本文（只有 GET）"""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, target, version = request_line.decode('latin-1').split()
+            except ValueError:
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            status, response_headers, body = await service.handle(method, target, headers)
+            keep_alive = (headers.get('connection', '').lower() != 'close'
+                          and (version == 'HTTP/1.1' or headers.get('connection', '').lower() == 'keep-alive'))
+            response_headers['Content-Length'] = str(len(body))
+            response_headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+            head = f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            head += ''.join(f"{name}: {value}\r\n" for name, value in response_headers.items()) + '\r\n'
+            writer.write(head.encode('latin-1') + (b'' if method == 'HEAD' else body))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, base_dir=DATA_DIR, cache_mb=CACHE_MB):
+    service = DataService(base_dir, cache_mb=cache_mb)
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port)
+    print(f"🚀 資料服務啟動: http://{host}:{port}（資料目錄 {base_dir}）")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='K 線與技術指標資料服務')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--cache-mb', type=int, default=CACHE_MB, help='熱快取的記憶體預算 (MB，含已編碼回應)')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.data_dir, args.cache_mb))
+    except KeyboardInterrupt:
+        print("\n👋 資料服務已停止")
+
+
+if __name__ == "__main__":
+    main()
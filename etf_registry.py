@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ETF 註冊表
+所有收集器共用的 ETF 清單，取代各收集器內寫死的 ETF 列表。資料來源：
+
+    twse / tpex      證交所 ISIN 頁面（上市 strMode=2、上櫃 strMode=4）中「ETF」區段的所有列
+    nasdaq / other   NASDAQ Trader 的 nasdaqlisted.txt / otherlisted.txt 中 ETF 欄為 Y 者（排除測試代號）
+
+結果寫入 data/etf/registry.json（含格式版本與產生時間），超過 REGISTRY_TTL 才重新抓取；
+某個來源抓取失敗時沿用該來源上次的資料；全部失敗時繼續使用過期的檔案，並記錄 retryAfter，
+RETRY_INTERVAL 內不再重試，避免網路中斷時每次查詢都卡在逾時。
+載入後建成唯讀的雜湊索引（代號與 Yahoo 代號皆可查），同一個行程內共用一份：
+
+    from etf_registry import is_etf, etf_info
+    is_etf('0050')          # True
+    is_etf('00679B.TWO')    # True
+    etf_info('QQQ')         # {'代號': 'QQQ', '名稱': ..., '交易所': 'US', ...}
+
+用法：
+    python3 etf_registry.py                 # 過期才更新，列出各來源筆數
+    python3 etf_registry.py --refresh       # 強制重新抓取
+    python3 etf_registry.py --show 0050 QQQ
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from types import MappingProxyType
+
+import requests
+
+from ohlcv_store import DATA_DIR
+
+REGISTRY_PATH = os.path.join(DATA_DIR, 'etf', 'registry.json')
+REGISTRY_VERSION = 1
+DAY = 86400
+REGISTRY_TTL = 7 * DAY
+RETRY_INTERVAL = 3600         # 所有來源都失敗時，隔這麼久才再試（期間沿用舊資料）
+
+ISIN_URL = 'https://isin.twse.com.tw/isin/C_public.jsp?strMode={mode}'
+NASDAQ_URL = 'https://www.nasdaqtrader.com/dynamic/SymDir/{filename}'
+
+# 來源名稱 -> (種類, 網址, 市場別)；市場別沿用收集器的 '市場' 欄位
+SOURCES = {
+    'twse': ('isin', ISIN_URL.format(mode=2), '上市'),
+    'tpex': ('isin', ISIN_URL.format(mode=4), '上櫃'),
+    'nasdaq': ('nasdaq', NASDAQ_URL.format(filename='nasdaqlisted.txt'), 'NASDAQ'),
+    'other': ('nasdaq', NASDAQ_URL.format(filename='otherlisted.txt'), 'Other'),
+}
+YAHOO_SUFFIX = {'上市': '.TW', '上櫃': '.TWO'}
+
+# 一次掃過整頁的每一列：資料列為「代號　名稱」、ISIN、上市日、市場別、產業別（代號欄後允許多一欄，
+# 部分轉存的頁面把名稱另列一欄）；只有一欄的列是區段標題（如 <B> ETF <B>）
+ISIN_PATTERN = re.compile(
+    r'<tr[^>]*>\s*<td[^>]*>(?:'
+    r'([0-9][0-9A-Z]{3,5})[ \u3000]+([^<]*)</td>\s*(?:<td[^>]*>[^<]*</td>\s*)??'
+    r'<td[^>]*>([A-Z]{2}[0-9A-Z]{9,10})</td>\s*<td[^>]*>([^<]*)</td>\s*<td[^>]*>[^<]*</td>\s*<td[^>]*>([^<]*)</td>'
+    r'|(?:\s|<[^>]*>)*([^<]*?)\s*(?:<[^>]*>\s*)*</td>\s*</tr>)')
+
+
+def parse_isin_board(text, market='上市'):
+    """
+    從證交所 ISIN 頁面擷取 ETF。頁面依商品種類分區，每區以單欄的標題列（如「 ETF 」）開頭；
+    資料列第一欄為「代號　名稱」（全形空白分隔），之後依序為 ISIN、上市日、市場別、產業別。
+    沒有區段標題的頁面（只含部分列）退回以代號 00 開頭判斷。
+    """
+    etfs = []
+    section = None
+    suffix = YAHOO_SUFFIX.get(market, '.TW')
+    for code, name, isin, listed, industry, header in ISIN_PATTERN.findall(text):
+        if not code:
+            section = header
+            continue
+        if not ('ETF' in section if section is not None else code.startswith('00')):
+            continue
+        etfs.append({
+            '代號': code,
+            '名稱': name.strip(),
+            '市場': market,
+            '交易所': 'TW',
+            'yahoo_symbol': f"{code}{suffix}",
+            'ISIN': isin,
+            '上市日期': listed.strip(),
+            '產業': industry.strip() or 'ETF',
+            'ETF': True
+        })
+    return etfs
+
+
+def parse_nasdaq_etfs(lines, market):
+    """nasdaqlisted.txt / otherlisted.txt 中 ETF 欄為 Y 的列；兩個檔案的欄位順序不同，以標題列定位"""
+    if not lines:
+        return []
+    header = lines[0].split('|')
+    etf_at = header.index('ETF')
+    test_at = header.index('Test Issue') if 'Test Issue' in header else None
+    etfs = []
+    for line in lines[1:]:
+        parts = line.split('|')
+        if len(parts) <= etf_at or not parts[0] or parts[0].startswith('File Creation Time'):
+            continue
+        if parts[etf_at] != 'Y' or (test_at is not None and parts[test_at] == 'Y'):
+            continue
+        etfs.append({
+            '代號': parts[0],
+            '名稱': parts[1],
+            '市場': market,
+            '交易所': 'US',
+            'yahoo_symbol': parts[0],
+            'ETF': True
+        })
+    return etfs
+
+
+def fetch_source(name, session, timeout=30):
+    """抓取並解析單一來源"""
+    kind, url, market = SOURCES[name]
+    response = session.get(url, timeout=timeout)
+    response.raise_for_status()
+    if kind == 'isin':
+        response.encoding = 'cp950'                             # Big5 的微軟擴充，涵蓋較多的罕用字
+        return parse_isin_board(response.text, market)
+    return parse_nasdaq_etfs(response.text.splitlines(), market)
+
+
+class ETFRegistry:
+    """唯讀的 ETF 索引：代號與 Yahoo 代號（不分大小寫）對到同一筆紀錄"""
+
+    def __init__(self, sources=None, generated_at=0.0, retry_after=0.0):
+        self.sources = sources or {}
+        self.generated_at = generated_at
+        self.retry_after = retry_after
+        index = {}
+        for name in SOURCES:                                    # 同一代號以來源順序較前者為準
+            for record in self.sources.get(name, {}).get('records', []):
+                frozen = MappingProxyType(dict(record))
+                for key in (record['代號'].upper(), record['yahoo_symbol'].upper()):
+                    index.setdefault(key, frozen)
+        self._index = MappingProxyType(index)
+        self._records = tuple(sorted({id(r): r for r in index.values()}.values(),
+                                     key=lambda r: (r['交易所'], r['代號'])))
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, symbol):
+        return self.is_etf(symbol)
+
+    def is_etf(self, symbol, exchange=None):
+        record = self._index.get(symbol.strip().upper())
+        return record is not None and (exchange is None or record['交易所'] == exchange)
+
+    def etf_info(self, symbol):
+        """查詢 ETF 資料；不是 ETF 時回傳 None"""
+        record = self._index.get(symbol.strip().upper())
+        return dict(record) if record is not None else None
+
+    def records(self, exchange=None):
+        """收集器格式的 ETF 清單（依代號排序），exchange 為 'TW' / 'US' 時只列該地區"""
+        return [dict(r) for r in self._records if exchange is None or r['交易所'] == exchange]
+
+    def age(self, clock=time.time):
+        """距上次更新的秒數；空的註冊表視為無限久"""
+        return clock() - self.generated_at if self.sources else float('inf')
+
+    def counts(self):
+        return {name: len(source.get('records', [])) for name, source in self.sources.items()}
+
+    @classmethod
+    def load(cls, path=REGISTRY_PATH):
+        """讀取註冊表檔案；檔案不存在或格式版本不符時回傳空的註冊表"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                document = json.load(f)
+        except (OSError, ValueError):
+            return cls()
+        if document.get('version') != REGISTRY_VERSION:
+            return cls()
+        return cls(document.get('sources', {}), document.get('generatedAt', 0.0), document.get('retryAfter', 0.0))
+
+    def save(self, path=REGISTRY_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': REGISTRY_VERSION, 'generatedAt': self.generated_at, 'retryAfter': self.retry_after,
+                       'sources': self.sources}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+
+def refresh_registry(previous=None, session=None, fetch=None, clock=time.time):
+    """
+    重新抓取所有來源並回傳 (新註冊表, {來源: 錯誤})。
+    失敗的來源沿用 previous 中的資料；全部失敗時回傳 previous 的資料，並設定 RETRY_INTERVAL 後才能再試。
+    """
+    previous = previous or ETFRegistry()
+    fetch = fetch or fetch_source
+    session = session or requests.Session()
+    sources = {}
+    errors = {}
+    for name in SOURCES:
+        try:
+            sources[name] = {'fetchedAt': clock(), 'records': fetch(name, session)}
+        except Exception as e:
+            errors[name] = e
+            if name in previous.sources:
+                sources[name] = previous.sources[name]
+    if len(errors) == len(SOURCES):
+        return ETFRegistry(previous.sources, previous.generated_at, clock() + RETRY_INTERVAL), errors
+    return ETFRegistry(sources, clock()), errors
+
+
+_shared = {}
+
+
+def load_registry(path=REGISTRY_PATH, session=None, refresh=None, ttl=REGISTRY_TTL, fetch=None, clock=time.time):
+    """
+    取得共用的註冊表。refresh=None 時檔案過期（或不存在）且不在重試等待期間才重新抓取，True 強制抓取，False 只讀檔。
+    同一個路徑在行程內只載入一次。
+    """
+    registry = _shared.get(path)
+    if registry is None:
+        registry = ETFRegistry.load(path)
+    if refresh or (refresh is None and registry.age(clock) >= ttl and clock() >= registry.retry_after):
+        registry, errors = refresh_registry(registry, session, fetch, clock)
+        for name, error in errors.items():
+            print(f"⚠️ ETF 來源 {name} 抓取失敗，沿用上次資料: {error}")
+        registry.save(path)                                     # 全部失敗時也寫入，讓其他行程一樣等到 retryAfter
+    _shared[path] = registry
+    return registry
+
+
+def is_etf(symbol, exchange=None):
+    """代號（0050、0050.TW、QQQ）是否為 ETF"""
+    return load_registry().is_etf(symbol, exchange)
+
+
+def etf_info(symbol):
+    """ETF 的代號、名稱、市場、ISIN 等資料；不是 ETF 時回傳 None"""
+    return load_registry().etf_info(symbol)
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='ETF 註冊表（證交所 ISIN + NASDAQ ETF 旗標）')
+    parser.add_argument('--path', default=REGISTRY_PATH)
+    parser.add_argument('--refresh', action='store_true', help='不論是否過期都重新抓取')
+    parser.add_argument('--ttl-days', type=float, default=REGISTRY_TTL / DAY, help='超過幾天重新抓取')
+    parser.add_argument('--show', nargs='*', default=[], help='查詢代號')
+    args = parser.parse_args()
+
+    print("📇 ETF 註冊表")
+    print("=" * 60)
+    registry = load_registry(args.path, refresh=True if args.refresh else None, ttl=args.ttl_days * DAY)
+    if not len(registry):
+        print("❌ 註冊表是空的，且無法從來源取得資料")
+        sys.exit(1)
+
+    print(f"✅ 共 {len(registry)} 檔 ETF（{registry.age() / 3600:.1f} 小時前更新）")
+    for name, count in registry.counts().items():
+        print(f"   {name}: {count} 檔")
+    for symbol in args.show:
+        info = registry.etf_info(symbol)
+        if info:
+            print(f"🔎 {symbol}: {info['代號']} {info['名稱']}（{info['市場']}，{info['yahoo_symbol']}）")
+        else:
+            print(f"🔎 {symbol}: 不是 ETF")
+
+
+if __name__ == "__main__":
+    main()
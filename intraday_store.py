@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+盤中 K 線（1 分 / 5 分）的精簡儲存
+以市場當地日期分檔：data/intraday/<市場>/<代號>/<週期>/<年>/<YYYY-MM-DD>.bars
+
+每個檔案是一個小檔頭加上壓縮過的整數欄位：
+    time      與前一根的間隔（以週期為單位，連續的 K 線都是 1）；時間必須是週期秒數的整數倍，否則拋出 ValueError
+    close     以最小跳動單位（10^-decimals）表示的整數，與前一根收盤的差
+    open/high/low  與同一根收盤的差
+    volume    整數
+差分後的整數大多只有一兩個位元組的有效值，zstd（未安裝時用 zlib）壓縮後每根 K 線約數個位元組，
+同樣的資料存成 JSON 約 100 位元組。
+
+讀取時可直接彙總成 15m / 30m / 1h / 1d：盤中週期以當日開盤時間為起點切分（美股 1h 為 9:30、10:30…），
+彙總以 np.maximum.reduceat 等向量運算完成。
+
+用法：
+    store = IntradayStore()
+    store.append('TW', '2330', '1m', bars)                       # bars: time(Unix 秒)/open/high/low/close/volume
+    bars = store.read('TW', '2330', '1m', '2025-08-01', '2025-08-26', target='1h')
+
+    python3 intraday_store.py fetch              # 以 Yahoo chart API 抓關注清單的 1m / 5m
+    python3 intraday_store.py stats
+"""
+
+import os
+import zlib
+import struct
+import argparse
+from datetime import date, datetime, time as dtime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+try:
+    import zstandard as zstd
+except ImportError:  # 沒有 zstandard 時改用 zlib
+    zstd = None
+
+INTRADAY_DIR = os.path.join('data', 'intraday')
+SUFFIX = '.bars'
+MAGIC = b'IBAR'
+VERSION = 1
+# magic、版本、壓縮方式、價格小數位數、週期秒數、根數、第一根的時間
+HEADER = struct.Struct('<4sBBBxIIq')
+COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_ZSTD = 0, 1, 2
+ZSTD_LEVEL = 10
+
+STORED_INTERVALS = {'1m': 60, '5m': 300}
+TARGET_INTERVALS = {'1m': 60, '5m': 300, '15m': 900, '30m': 1800, '1h': 3600, '1d': 86400}
+FIELDS = ('time', 'open', 'high', 'low', 'close', 'volume')
+MARKET_TZ = {'TW': 'Asia/Taipei', 'US': 'America/New_York'}
+SESSION_OPEN = {'TW': dtime(9, 0), 'US': dtime(9, 30)}
+DEFAULT_DECIMALS = {'TW': 2, 'US': 4}      # 台股最小跳動 0.01，美股低價股到 0.0001
+MAX_DECIMALS = 8
+
+
+def market_of(symbol):
+    """由代號判斷市場：.TW / .TWO 結尾或純數字為台股"""
+    base = symbol.split('.')[0]
+    return 'TW' if symbol.upper().endswith(('.TW', '.TWO')) or base.isdigit() else 'US'
+
+
+def _decimals_for(prices, minimum):
+    """找出能無損表示所有價格的最少小數位數"""
+    for decimals in range(minimum, MAX_DECIMALS + 1):
+        scaled = prices * 10 ** decimals
+        if np.all(np.abs(scaled - np.round(scaled)) < 1e-6):
+            return decimals
+    return MAX_DECIMALS
+
+
+def encode_bars(bars, interval, decimals=2, compression=None):
+    """將一天的 K 線（依時間排序）編碼成 bytes；時間沒有對齊週期時拋出 ValueError（以週期為單位儲存會失真）"""
+    times = np.asarray(bars['time'], dtype=np.int64)
+    count = len(times)
+    unaligned = times % interval != 0
+    if unaligned.any():
+        raise ValueError(f"K 線時間 {int(times[unaligned][0])} 沒有對齊 {interval} 秒的週期")
+    prices = np.stack([np.asarray(bars[f], dtype=np.float64) for f in ('open', 'high', 'low', 'close')])
+    decimals = _decimals_for(prices, decimals) if count else decimals
+    ticks = np.round(prices * 10 ** decimals).astype(np.int64)
+    close = ticks[3]
+
+    columns = [
+        np.diff(times, prepend=times[:1]) // interval if count else times,
+        np.diff(close, prepend=0),
+        ticks[0] - close, ticks[1] - close, ticks[2] - close,
+        np.round(np.asarray(bars['volume'], dtype=np.float64)).astype(np.int64),
+    ]
+    payload = b''.join(_pack(column) for column in columns)
+
+    if compression is None:
+        compression = COMPRESSION_ZSTD if zstd is not None else COMPRESSION_ZLIB
+    if compression == COMPRESSION_ZSTD:
+        payload = zstd.ZstdCompressor(level=ZSTD_LEVEL).compress(payload)
+    elif compression == COMPRESSION_ZLIB:
+        payload = zlib.compress(payload, 9)
+    first = int(times[0]) if count else 0
+    return HEADER.pack(MAGIC, VERSION, compression, decimals, interval, count, first) + payload
+
+
+def _pack(column):
+    """依數值範圍選 int8 / int16 / int32 / int64，前面加 1 位元組的寬度"""
+    for width, dtype in ((1, np.int8), (2, np.int16), (4, np.int32), (8, np.int64)):
+        info = np.iinfo(dtype)
+        if not len(column) or (column.min() >= info.min and column.max() <= info.max):
+            return bytes([width]) + column.astype(dtype).tobytes()
+    raise ValueError('欄位超出 int64 範圍')
+
+
+def _unpack(payload, offset, count):
+    width = payload[offset]
+    dtype = {1: np.int8, 2: np.int16, 4: np.int32, 8: np.int64}[width]
+    end = offset + 1 + width * count
+    return np.frombuffer(payload, dtype=dtype, count=count, offset=offset + 1).astype(np.int64), end
+
+
+def decode_bars(data):
+    """encode_bars 的反向；回傳 {time, open, high, low, close, volume} 陣列"""
+    magic, version, compression, decimals, interval, count, first = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('不是盤中 K 線檔')
+    payload = data[HEADER.size:]
+    if compression == COMPRESSION_ZSTD:
+        if zstd is None:
+            raise ImportError('此檔以 zstd 壓縮，需要安裝 zstandard')
+        payload = zstd.ZstdDecompressor().decompress(payload)
+    elif compression == COMPRESSION_ZLIB:
+        payload = zlib.decompress(payload)
+
+    offset = 0
+    columns = []
+    for _ in range(6):
+        column, offset = _unpack(payload, offset, count)
+        columns.append(column)
+    steps, close_delta, open_off, high_off, low_off, volume = columns
+
+    time = first + np.cumsum(steps) * interval if count else np.array([], dtype=np.int64)
+    close = np.cumsum(close_delta)
+    scale = 10.0 ** -decimals
+    return {
+        'time': time,
+        'open': (close + open_off) * scale,
+        'high': (close + high_off) * scale,
+        'low': (close + low_off) * scale,
+        'close': close * scale,
+        'volume': volume.astype(np.float64),
+    }
+
+
+def _empty():
+    return {field: np.array([], dtype=np.int64 if field == 'time' else np.float64) for field in FIELDS}
+
+
+def _concat(parts):
+    parts = [p for p in parts if len(p['time'])]
+    if not parts:
+        return _empty()
+    return {field: np.concatenate([p[field] for p in parts]) for field in FIELDS}
+
+
+def _take(bars, index):
+    return {field: bars[field][index] for field in FIELDS}
+
+
+def aggregate(bars, seconds, market):
+    """
+    將 K 線彙總成 seconds 秒的週期；盤中週期以當日開盤時間為起點切分，86400 為日 K（time 為當地午夜）
+    """
+    times = bars['time']
+    if not len(times):
+        return _empty()
+    tz = ZoneInfo(MARKET_TZ[market])
+    days = local_days(times, tz)
+    unique_days, day_index = np.unique(days, return_inverse=True)
+    if seconds >= 86400:
+        anchors = np.array([datetime.combine(d.astype(date), dtime(0), tzinfo=tz).timestamp()
+                            for d in unique_days], dtype=np.int64)
+        buckets = anchors[day_index]
+    else:
+        opens = np.array([datetime.combine(d.astype(date), SESSION_OPEN[market], tzinfo=tz).timestamp()
+                          for d in unique_days], dtype=np.int64)
+        anchor = opens[day_index]
+        buckets = anchor + (times - anchor) // seconds * seconds
+
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(times)] - 1
+    return {
+        'time': buckets[starts],
+        'open': bars['open'][starts],
+        'high': np.maximum.reduceat(bars['high'], starts),
+        'low': np.minimum.reduceat(bars['low'], starts),
+        'close': bars['close'][ends],
+        'volume': np.add.reduceat(bars['volume'], starts),
+    }
+
+
+def local_days(times, tz):
+    """Unix 秒數陣列轉成市場當地日期（datetime64[D]）；以當日 UTC 偏移量向量化換算"""
+    times = np.asarray(times, dtype=np.int64)
+    utc_days = np.unique(times // 86400)
+    offsets = {}
+    for day in utc_days:
+        # 同一個 UTC 日內偏移量只在夏令時間切換日變動，以當日中午為準已足夠（切換在凌晨，無交易）
+        moment = datetime.fromtimestamp(int(day) * 86400 + 43200, tz)
+        offsets[int(day)] = int(moment.utcoffset().total_seconds())
+    shift = np.array([offsets[int(d)] for d in times // 86400], dtype=np.int64) if len(utc_days) > 1 \
+        else np.full(len(times), offsets[int(utc_days[0])], dtype=np.int64)
+    return ((times + shift) // 86400).astype('datetime64[D]')
+
+
+class IntradayStore:
+    """依市場 / 代號 / 週期 / 日期分檔的盤中 K 線庫"""
+
+    def __init__(self, base_dir=INTRADAY_DIR, compression=None):
+        self.base_dir = base_dir
+        self.compression = compression
+
+    def day_path(self, market, symbol, interval, day):
+        day = str(day)
+        return os.path.join(self.base_dir, market, symbol, interval, day[:4], f"{day}{SUFFIX}")
+
+    def days(self, market, symbol, interval, start=None, end=None):
+        """已有資料的日期（'YYYY-MM-DD'，依序）"""
+        root = os.path.join(self.base_dir, market, symbol, interval)
+        if not os.path.isdir(root):
+            return []
+        found = []
+        for year in sorted(os.listdir(root)):
+            if (start and year < start[:4]) or (end and year > end[:4]):
+                continue
+            for name in sorted(os.listdir(os.path.join(root, year))):
+                if name.endswith(SUFFIX):
+                    day = name[:-len(SUFFIX)]
+                    if (not start or day >= start) and (not end or day <= end):
+                        found.append(day)
+        return found
+
+    def read_day(self, market, symbol, interval, day):
+        with open(self.day_path(market, symbol, interval, day), 'rb') as f:
+            return decode_bars(f.read())
+
+    def write_day(self, market, symbol, interval, day, bars):
+        path = self.day_path(market, symbol, interval, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = encode_bars(bars, STORED_INTERVALS[interval], DEFAULT_DECIMALS.get(market, 2), self.compression)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return len(data)
+
+    def append(self, market, symbol, interval, bars):
+        """
+        寫入 K 線（可跨多日、可與既有資料重疊；同一時間以新資料為準）。回傳更新的日期
+        """
+        if interval not in STORED_INTERVALS:
+            raise ValueError(f"只儲存 {', '.join(STORED_INTERVALS)}，其他週期請讀取時彙總")
+        times = np.asarray(bars['time'], dtype=np.int64)
+        if not len(times):
+            return []
+        bars = {field: np.asarray(bars[field], dtype=np.int64 if field == 'time' else np.float64) for field in FIELDS}
+        days = local_days(times, ZoneInfo(MARKET_TZ[market]))
+        updated = []
+        for day in np.unique(days):
+            fresh = _take(bars, days == day)
+            day = str(day)
+            if os.path.exists(self.day_path(market, symbol, interval, day)):
+                fresh = _concat([self.read_day(market, symbol, interval, day), fresh])
+            # 依時間排序、去除重複（保留最後寫入的）
+            order = np.argsort(fresh['time'], kind='stable')
+            merged = _take(fresh, order)
+            keep = np.r_[merged['time'][1:] != merged['time'][:-1], True]
+            self.write_day(market, symbol, interval, day, _take(merged, keep))
+            updated.append(day)
+        return updated
+
+    def read(self, market, symbol, interval='1m', start=None, end=None, target=None):
+        """
+        讀取 [start, end]（當地日期，含）的 K 線；target 為 15m / 1h / 1d 等時即時彙總
+        """
+        parts = [self.read_day(market, symbol, interval, day) for day in self.days(market, symbol, interval, start, end)]
+        bars = _concat(parts)
+        if target and target != interval:
+            seconds = TARGET_INTERVALS[target]
+            if seconds % STORED_INTERVALS[interval]:
+                raise ValueError(f"{interval} 無法彙總成 {target}")
+            bars = aggregate(bars, seconds, market)
+        return bars
+
+    def best_interval(self, market, symbol, target):
+        """能彙總成 target 的最粗儲存週期（讀得最少）"""
+        seconds = TARGET_INTERVALS[target]
+        for interval, stored in sorted(STORED_INTERVALS.items(), key=lambda item: -item[1]):
+            if seconds % stored == 0 and self.days(market, symbol, interval):
+                return interval
+        return None
+
+    def stats(self):
+        """每個市場 / 週期的檔案數、K 線根數與位元組數"""
+        totals = {}
+        for root, _, files in os.walk(self.base_dir):
+            for name in files:
+                if not name.endswith(SUFFIX):
+                    continue
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, self.base_dir).split(os.sep)
+                key = (rel[0], rel[2])
+                with open(path, 'rb') as f:
+                    count = HEADER.unpack(f.read(HEADER.size))[5]
+                item = totals.setdefault(key, {'files': 0, 'bars': 0, 'bytes': 0, 'symbols': set()})
+                item['files'] += 1
+                item['bars'] += count
+                item['bytes'] += os.path.getsize(path)
+                item['symbols'].add(rel[1])
+        return totals
+
+
+class BarSink:
+    """
+    tick_stream.TickAggregator 的 on_bar：把收盤的 1m / 5m K 線暫存，flush() 時依日期寫入。
+    代號以 market_of 判斷市場，並去掉 .TW / .TWO 後綴
+    """
+
+    def __init__(self, store=None, flush_bars=5000):
+        self.store = store or IntradayStore()
+        self.flush_bars = flush_bars
+        self.pending = {}
+        self.count = 0
+
+    def __call__(self, symbol, interval, bar, indicators=None):
+        name = {60: '1m', 300: '5m'}.get(interval)
+        if name is None:
+            return
+        market = market_of(symbol)
+        self.pending.setdefault((market, symbol.split('.')[0], name), []).append(list(bar))
+        self.count += 1
+        if self.count >= self.flush_bars:
+            self.flush()
+
+    def flush(self):
+        for (market, symbol, interval), rows in self.pending.items():
+            rows = np.array(rows)
+            self.store.append(market, symbol, interval, {field: rows[:, i] for i, field in enumerate(FIELDS)})
+        self.pending = {}
+        self.count = 0
+
+
+def parse_intraday_chart(payload):
+    """Yahoo chart API（interval=1m / 5m）的回應轉成 K 線陣列；略過不完整的 K 線"""
+    results = (payload.get('chart') or {}).get('result') or []
+    if not results or not results[0].get('timestamp'):
+        return _empty()
+    result = results[0]
+    quote = (result.get('indicators', {}).get('quote') or [{}])[0]
+    n = len(result['timestamp'])
+    columns = {'time': np.array(result['timestamp'], dtype=np.int64)}
+    for field in ('open', 'high', 'low', 'close', 'volume'):
+        columns[field] = np.array([np.nan if v is None else v for v in (quote.get(field) or [None] * n)], dtype=np.float64)
+    valid = ~np.isnan(columns['close']) & ~np.isnan(columns['open'])
+    columns['volume'] = np.nan_to_num(columns['volume'])
+    return _take(columns, valid)
+
+
+def fetch_watchlist(store, watchlist, ranges=None, rate=2.0):
+    """以 Yahoo chart API 抓關注清單的盤中 K 線（Yahoo 的 1m 只保留約 7 天、5m 約 60 天）"""
+    import requests
+    from refresh_scheduler import CHART_URL, MARKETS, RateLimiter
+
+    ranges = ranges or {'1m': '7d', '5m': '60d'}
+    limiter = RateLimiter(rate)
+    session = requests.Session()
+    session.headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    written = 0
+    for market, symbol in watchlist:
+        for interval, span in ranges.items():
+            limiter.acquire()
+            try:
+                response = session.get(CHART_URL.format(symbol=MARKETS[market].yahoo_symbol(symbol)),
+                                       params={'interval': interval, 'range': span}, timeout=15)
+                response.raise_for_status()
+                bars = parse_intraday_chart(response.json())
+            except (requests.RequestException, ValueError) as e:
+                print(f"⚠️ {market} {symbol} {interval} 抓取失敗: {e}")
+                continue
+            # Yahoo 盤中最後一根可能是未收盤的即時值，時間是最新成交的時刻；對齊到該根的起始時間後寫入，
+            # 下次抓取時同一時間的完整 K 線會覆蓋它
+            bars['time'] -= bars['time'] % STORED_INTERVALS[interval]
+            store.append(market, symbol, interval, bars)
+            written += len(bars['time'])
+            print(f"  {market} {symbol} {interval}: {len(bars['time'])} 根")
+    return written
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='盤中 K 線儲存')
+    parser.add_argument('--dir', default=INTRADAY_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    fetch = sub.add_parser('fetch', help='抓取關注清單（或指定代號）的 1m / 5m K 線')
+    fetch.add_argument('--symbols', nargs='*', metavar='MARKET:SYMBOL', help='例如 TW:2330 US:AAPL')
+    fetch.add_argument('--rate', type=float, default=2.0)
+    sub.add_parser('stats', help='各市場、週期的儲存量')
+    show = sub.add_parser('show', help='讀出並彙總一段期間')
+    show.add_argument('market')
+    show.add_argument('symbol')
+    show.add_argument('--interval', default='1m', choices=list(STORED_INTERVALS))
+    show.add_argument('--target', default=None, choices=list(TARGET_INTERVALS))
+    show.add_argument('--start', default=(date.today() - timedelta(days=7)).isoformat())
+    show.add_argument('--end', default=None)
+    args = parser.parse_args()
+
+    store = IntradayStore(args.dir)
+    print("🕐 盤中 K 線儲存")
+    print("=" * 60)
+
+    if args.command == 'fetch':
+        if args.symbols:
+            watchlist = [tuple(item.split(':', 1)) for item in args.symbols]
+        else:
+            from refresh_scheduler import load_watchlist, HOT_SYMBOLS
+            watchlist = load_watchlist() or [(m, s) for m, symbols in HOT_SYMBOLS.items() for s in symbols]
+        written = fetch_watchlist(store, watchlist, rate=args.rate)
+        print(f"✅ 共寫入 {written:,} 根 K 線")
+    elif args.command == 'stats':
+        for (market, interval), item in sorted(store.stats().items()):
+            per_bar = item['bytes'] / item['bars'] if item['bars'] else 0
+            print(f"  {market} {interval}: {len(item['symbols'])} 檔、{item['files']} 個日檔、"
+                  f"{item['bars']:,} 根、{item['bytes'] / 1024 / 1024:.2f} MB（每根 {per_bar:.1f} 位元組）")
+    elif args.command == 'show':
+        bars = store.read(args.market, args.symbol, args.interval, args.start, args.end, args.target)
+        tz = ZoneInfo(MARKET_TZ[args.market])
+        for i in range(len(bars['time'])):
+            moment = datetime.fromtimestamp(int(bars['time'][i]), tz)
+            print(f"  {moment:%Y-%m-%d %H:%M}  O {bars['open'][i]:.2f}  H {bars['high'][i]:.2f}  "
+                  f"L {bars['low'][i]:.2f}  C {bars['close'][i]:.2f}  V {bars['volume'][i]:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可中斷續跑的持久化工作佇列
+以 SQLite（WAL 模式）記錄每個任務（一檔股票或一個資料來源）的狀態：
+
+    pending    等待執行（not_before 之後才能領取）
+    in_flight  已被某個 worker 領取，租約到期前不會再被領取
+    done       完成
+    failed     超過最大嘗試次數
+
+worker 以 claim() 成批領取任務，完成後 complete()，失敗則 fail()（退避後重試）；
+complete() / fail() 只對自己仍持有租約的任務生效，租約過期後被別人重新領取的任務以新的持有者為準。
+程式中途當掉時，未完成的任務租約到期後會被重新領取；重新執行時 enqueue() 不會覆蓋既有任務，
+因此會從上次停下的地方繼續。
+
+用法：
+    queue = JobQueue()
+    queue.enqueue('refresh', [('TW:2330', {'symbol': '2330'})])
+    for task in queue.claim('refresh', 'worker-1', limit=20):
+        ...
+        queue.complete('refresh', [task.key], 'worker-1')
+
+    python3 job_queue.py status
+    python3 job_queue.py reset refresh --status failed
+"""
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import argparse
+from collections import namedtuple
+
+DB_PATH = os.path.join('data', 'queue', 'jobs.sqlite')
+DEFAULT_LEASE = 300          # 租約秒數
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 30           # 第 n 次失敗後等待 RETRY_BACKOFF * 2^(n-1) 秒再重試
+STATUSES = ('pending', 'in_flight', 'done', 'failed')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    queue       TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    payload     TEXT,
+    priority    INTEGER NOT NULL DEFAULT 0,
+    not_before  REAL NOT NULL DEFAULT 0,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_until REAL,
+    last_error  TEXT,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL,
+    PRIMARY KEY (queue, key)
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_claim ON tasks (queue, status, priority, not_before);
+"""
+
+Task = namedtuple('Task', 'key payload priority attempts')
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue:
+    """SQLite 持久化工作佇列；同一個資料庫可放多個以 queue 名稱區分的佇列"""
+
+    def __init__(self, db_path=DB_PATH, max_attempts=DEFAULT_MAX_ATTEMPTS, clock=time.time):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.clock = clock
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        # isolation_level=None：交易由 _write() 以 BEGIN IMMEDIATE 明確控制
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _write(self, fn):
+        """在 BEGIN IMMEDIATE 交易中執行，確保多個 worker 領取任務時不會互相覆蓋"""
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = fn()
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+        return result
+
+    # ---- 寫入 ----
+
+    def enqueue(self, queue, tasks):
+        """
+        加入任務；tasks 為 (key, payload[, priority[, not_before]]) 的序列。
+        已存在的 key 保持原狀（含已完成者），回傳實際新增的筆數
+        """
+        now = self.clock()
+        rows = []
+        for task in tasks:
+            key, payload = task[0], task[1]
+            priority = task[2] if len(task) > 2 else 0
+            not_before = task[3] if len(task) > 3 else 0
+            rows.append((queue, key, json.dumps(payload, ensure_ascii=False), priority, not_before, now, now))
+
+        def insert():
+            before = self.conn.total_changes
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO tasks (queue, key, payload, priority, not_before, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            return self.conn.total_changes - before
+        return self._write(insert)
+
+    def claim(self, queue, worker=None, limit=50, lease=DEFAULT_LEASE):
+        """
+        領取最多 limit 筆可執行的任務（pending 且已到 not_before，或租約已過期的 in_flight），
+        依 priority、not_before 排序；回傳 Task 列表
+        """
+        worker = worker or default_worker_id()
+        now = self.clock()
+
+        def take():
+            # 租約過期且已用完嘗試次數的任務直接標為失敗
+            self.conn.execute(
+                "UPDATE tasks SET status = 'failed', last_error = 'lease expired', updated_at = ? "
+                "WHERE queue = ? AND status = 'in_flight' AND lease_until < ? AND attempts >= ?",
+                (now, queue, now, self.max_attempts))
+            rows = self.conn.execute(
+                "SELECT key, payload, priority, attempts FROM tasks "
+                "WHERE queue = ? AND ((status = 'pending' AND not_before <= ?) "
+                "OR (status = 'in_flight' AND lease_until < ?)) "
+                "ORDER BY priority, not_before, key LIMIT ?",
+                (queue, now, now, limit)).fetchall()
+            self.conn.executemany(
+                "UPDATE tasks SET status = 'in_flight', attempts = attempts + 1, lease_owner = ?, "
+                "lease_until = ?, updated_at = ? WHERE queue = ? AND key = ?",
+                [(worker, now + lease, now, queue, row['key']) for row in rows])
+            return [Task(row['key'], json.loads(row['payload']), row['priority'], row['attempts'] + 1)
+                    for row in rows]
+        return self._write(take)
+
+    def heartbeat(self, queue, keys, worker=None, lease=DEFAULT_LEASE):
+        """延長自己持有任務的租約"""
+        worker = worker or default_worker_id()
+        now = self.clock()
+        self._write(lambda: self.conn.executemany(
+            "UPDATE tasks SET lease_until = ?, updated_at = ? "
+            "WHERE queue = ? AND key = ? AND status = 'in_flight' AND lease_owner = ?",
+            [(now + lease, now, queue, key, worker) for key in keys]))
+
+    def complete(self, queue, keys, worker=None):
+        """
+        將自己持有的任務標為完成，回傳實際更新的筆數。
+        租約已過期且被其他 worker 重新領取的任務不受影響（以新的持有者為準）
+        """
+        worker = worker or default_worker_id()
+        now = self.clock()
+
+        def update():
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "UPDATE tasks SET status = 'done', lease_owner = NULL, lease_until = NULL, last_error = NULL, "
+                "updated_at = ? WHERE queue = ? AND key = ? AND status = 'in_flight' AND lease_owner = ?",
+                [(now, queue, key, worker) for key in keys])
+            return self.conn.total_changes - before
+        return self._write(update)
+
+    def fail(self, queue, key, error=None, worker=None):
+        """
+        記錄自己持有任務的失敗；未超過最大嘗試次數時退避後重新排入，否則標為 failed。
+        回傳新狀態；任務已不屬於 worker（租約過期後被重新領取）時回傳 None
+        """
+        worker = worker or default_worker_id()
+        now = self.clock()
+
+        def update():
+            row = self.conn.execute(
+                "SELECT attempts FROM tasks WHERE queue = ? AND key = ? AND status = 'in_flight' AND lease_owner = ?",
+                (queue, key, worker)).fetchone()
+            if row is None:
+                return None
+            attempts = row['attempts']
+            status = 'failed' if attempts >= self.max_attempts else 'pending'
+            not_before = now + RETRY_BACKOFF * 2 ** max(attempts - 1, 0)
+            self.conn.execute(
+                "UPDATE tasks SET status = ?, not_before = ?, lease_owner = NULL, lease_until = NULL, "
+                "last_error = ?, updated_at = ? WHERE queue = ? AND key = ?",
+                (status, not_before, None if error is None else str(error), now, queue, key))
+            return status
+        return self._write(update)
+
+    def reset(self, queue, statuses=('failed',)):
+        """將指定狀態的任務重新設為 pending（嘗試次數歸零）"""
+        now = self.clock()
+        marks = ','.join('?' * len(statuses))
+        return self._write(lambda: self.conn.execute(
+            f"UPDATE tasks SET status = 'pending', attempts = 0, not_before = 0, lease_owner = NULL, "
+            f"lease_until = NULL, updated_at = ? WHERE queue = ? AND status IN ({marks})",
+            (now, queue, *statuses)).rowcount)
+
+    def prune(self, queue, older_than, statuses=('done',)):
+        """刪除 updated_at 早於 older_than 秒以前、且為指定狀態的任務"""
+        cutoff = self.clock() - older_than
+        marks = ','.join('?' * len(statuses))
+        return self._write(lambda: self.conn.execute(
+            f"DELETE FROM tasks WHERE queue = ? AND updated_at < ? AND status IN ({marks})",
+            (queue, cutoff, *statuses)).rowcount)
+
+    # ---- 查詢 ----
+
+    def stats(self, queue):
+        counts = dict.fromkeys(STATUSES, 0)
+        for row in self.conn.execute('SELECT status, COUNT(*) AS n FROM tasks WHERE queue = ? GROUP BY status', (queue,)):
+            counts[row['status']] = row['n']
+        return counts
+
+    def next_due(self, queue):
+        """下一個可領取任務的時間（pending 的 not_before 或 in_flight 的租約到期）；沒有未完成任務時回傳 None"""
+        row = self.conn.execute(
+            "SELECT MIN(CASE status WHEN 'pending' THEN not_before ELSE lease_until END) AS due "
+            "FROM tasks WHERE queue = ? AND status IN ('pending', 'in_flight')", (queue,)).fetchone()
+        return row['due']
+
+    def failures(self, queue, limit=20):
+        return [dict(row) for row in self.conn.execute(
+            "SELECT key, attempts, last_error FROM tasks WHERE queue = ? AND status = 'failed' "
+            "ORDER BY updated_at DESC LIMIT ?", (queue, limit))]
+
+    def queues(self):
+        return [row['queue'] for row in self.conn.execute('SELECT DISTINCT queue FROM tasks ORDER BY queue')]
+
+
+def main():
+    """主程式：查看與維護佇列"""
+    parser = argparse.ArgumentParser(description='持久化工作佇列')
+    parser.add_argument('--db', default=DB_PATH)
+    sub = parser.add_subparsers(dest='command', required=True)
+    status = sub.add_parser('status', help='各佇列的任務狀態統計')
+    status.add_argument('queue', nargs='?')
+    reset = sub.add_parser('reset', help='將失敗（或指定狀態）的任務重新排入')
+    reset.add_argument('queue')
+    reset.add_argument('--status', nargs='+', default=['failed'], choices=STATUSES)
+    prune = sub.add_parser('prune', help='刪除已完成的舊任務')
+    prune.add_argument('queue')
+    prune.add_argument('--days', type=float, default=7)
+    args = parser.parse_args()
+
+    queue = JobQueue(args.db)
+    if args.command == 'status':
+        for name in ([args.queue] if args.queue else queue.queues()):
+            counts = queue.stats(name)
+            print(f"📋 {name}: " + '，'.join(f"{status} {counts[status]}" for status in STATUSES))
+            for failure in queue.failures(name, limit=5):
+                print(f"   ❌ {failure['key']}（{failure['attempts']} 次）: {failure['last_error']}")
+    elif args.command == 'reset':
+        print(f"🔄 已重新排入 {queue.reset(args.queue, args.status)} 筆")
+    elif args.command == 'prune':
+        print(f"🧹 已刪除 {queue.prune(args.queue, args.days * 86400)} 筆")
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { logger } from '@/lib/logger';
+
+// Python 資料服務 (data_service.py) 的位址，未設定時各 API 維持原本的讀檔流程
+const DATA_SERVICE_URL = process.env.DATA_SERVICE_URL;
+const DATA_SERVICE_TIMEOUT_MS = 3000;
+const FORWARDED_HEADERS = ['etag', 'cache-control', 'content-type', 'vary'];
+
+/**
+ * 將查詢轉發到資料服務。
+ * 回傳 null 表示應改走原本的流程：未設定服務、服務無法連線，或本機庫存沒有該資料 (404)。
+ */
+export async function proxyToDataService(request: NextRequest, path: string): Promise<NextResponse | null> {
+  if (!DATA_SERVICE_URL) return null;
+
+  const { searchParams } = new URL(request.url);
+  const url = `${DATA_SERVICE_URL.replace(/\/$/, '')}${path}?${searchParams.toString()}`;
+  const headers: Record<string, string> = {};
+  const ifNoneMatch = request.headers.get('if-none-match');
+  if (ifNoneMatch) headers['if-none-match'] = ifNoneMatch;
+
+  try {
+    const response = await fetch(url, {
+      headers,
+      cache: 'no-store',
+      signal: AbortSignal.timeout(DATA_SERVICE_TIMEOUT_MS),
+    });
+    if (response.status === 404) return null;
+
+    const responseHeaders = new Headers();
+    for (const name of FORWARDED_HEADERS) {
+      const value = response.headers.get(name);
+      if (value) responseHeaders.set(name, value);
+    }
+    // fetch 已自動解壓縮，body 以原文轉回，壓縮交給 Next.js 處理
+    const body = response.status === 304 ? null : await response.text();
+    return new NextResponse(body, { status: response.status, headers: responseHeaders });
+  } catch (error) {
+    logger.api.warn(`Data service unavailable, falling back: ${url}`, error);
+    return null;
+  }
+}
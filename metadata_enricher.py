@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全市場清單的產業 / 市值補齊
+data/full-market/<市場>-stocks-latest.json 中 sector / industry 為 Unknown（台股為產業代碼）或 marketCap 為 0 的股票，
+以 Yahoo Finance 成批補齊：
+
+    quote    v7/finance/quote 一次查 QUOTE_BATCH 檔，取得市值與 quoteType
+    profile  v10/finance/quoteSummary?modules=assetProfile 取得 sector / industry（上游只支援單檔，以執行緒池並行）
+
+所有請求共用同一個 token bucket 限速，並行數由 --concurrency 控制。
+查詢結果寫入 data/enrichment/metadata-cache.json，依種類有不同的有效期限：
+市值 QUOTE_TTL、產業 PROFILE_TTL；查無資料的股票（下市、ETF 等沒有產業資料者）也會記錄，NEGATIVE_TTL 內不再查詢。
+只有快取過期或未知的股票才會送出請求，其餘直接由快取補上。
+補齊後的產業與市值也會寫入元資料庫（metadata_store，--metadata-db）。
+
+用法：
+    python3 metadata_enricher.py                        # 補齊台美股清單
+    python3 metadata_enricher.py --markets US --plan    # 只列出需要查詢的數量
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import requests
+
+from ohlcv_store import DATA_DIR, FULL_MARKET_DIR
+from refresh_scheduler import MARKETS, RateLimiter
+from metadata_store import DB_PATH as METADATA_DB, MetadataStore
+from collector_metrics import RunMetrics, instrument_session, add_metrics_arguments, write_run_outputs
+from sampling_profiler import add_profile_arguments, profile_from_args
+
+COOKIE_URL = 'https://fc.yahoo.com'
+CRUMB_URL = 'https://query1.finance.yahoo.com/v1/test/getcrumb'
+QUOTE_URL = 'https://query1.finance.yahoo.com/v7/finance/quote'
+PROFILE_URL = 'https://query2.finance.yahoo.com/v10/finance/quoteSummary/{symbol}'
+CACHE_PATH = os.path.join(DATA_DIR, 'enrichment', 'metadata-cache.json')
+
+QUOTE_BATCH = 100             # v7 quote 每次查詢的代號數
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RATE = 8.0            # 每秒請求數
+DAY = 86400
+QUOTE_TTL = 1 * DAY           # 市值每天更新
+PROFILE_TTL = 30 * DAY        # 產業很少變動
+NEGATIVE_TTL = 7 * DAY        # 查無資料者隔一週再試
+TTL = {'quote': QUOTE_TTL, 'profile': PROFILE_TTL}
+UNKNOWN = 'Unknown'
+# 這些商品沒有 assetProfile，quote 階段即可記為查無產業
+NO_PROFILE_TYPES = {'ETF', 'MUTUALFUND', 'INDEX', 'CURRENCY', 'CRYPTOCURRENCY', 'FUTURE', 'OPTION'}
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def _age(timestamp, now):
+    """ISO 時間字串距今的秒數；無法解析時視為無限久"""
+    try:
+        return now - datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return float('inf')
+
+
+def is_unknown(value):
+    """空值、Unknown，或台股清單中尚未轉換的產業代碼（如 '28'）"""
+    return value in (None, '', UNKNOWN) or (isinstance(value, str) and value.isdigit())
+
+
+def yahoo_symbol(market, symbol):
+    """清單代號轉成 Yahoo 代號；美股的 BRK.B 在 Yahoo 為 BRK-B"""
+    if market == 'US':
+        return symbol.replace('.', '-')
+    return MARKETS[market].yahoo_symbol(symbol)
+
+
+class MetadataCache:
+    """以 '<市場>:<代號>' 為鍵的查詢結果，每筆分 quote / profile 兩種紀錄，各自帶查詢時間"""
+
+    def __init__(self, path=CACHE_PATH, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.entries = {}
+        self.dirty = False
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get('entries', {})
+
+    def get(self, market, symbol, kind):
+        return self.entries.get(f"{market}:{symbol}", {}).get(kind)
+
+    def fresh(self, market, symbol, kind):
+        """紀錄存在且未過期（查無資料的紀錄以 NEGATIVE_TTL 計）"""
+        record = self.get(market, symbol, kind)
+        if not record:
+            return False
+        ttl = NEGATIVE_TTL if record.get('missing') else TTL[kind]
+        return self.clock() - record['at'] < ttl
+
+    def put(self, market, symbol, kind, data=None, missing=None):
+        record = {'at': self.clock()}
+        if missing:
+            record['missing'] = missing
+        else:
+            record.update(data)
+        self.entries.setdefault(f"{market}:{symbol}", {})[kind] = record
+        self.dirty = True
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'entries': self.entries}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+class YahooClient:
+    """Yahoo Finance quote / quoteSummary；兩者都需要 cookie + crumb，401 時重新取得一次"""
+
+    def __init__(self, session=None, limiter=None, timeout=15):
+        self.session = session or requests.Session()
+        self.session.headers.setdefault('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
+        self.limiter = limiter or RateLimiter(DEFAULT_RATE)
+        self.timeout = timeout
+        self._crumb = None
+        self._crumb_lock = threading.Lock()
+
+    def crumb(self, refresh=False):
+        with self._crumb_lock:
+            if self._crumb is None or refresh:
+                try:
+                    self.session.get(COOKIE_URL, timeout=self.timeout)      # 回應 404，但會設定 cookie
+                except requests.RequestException:
+                    pass
+                response = self.session.get(CRUMB_URL, timeout=self.timeout)
+                response.raise_for_status()
+                self._crumb = response.text.strip()
+            return self._crumb
+
+    def _get(self, url, params):
+        for attempt in range(2):
+            self.limiter.acquire()
+            response = self.session.get(url, params={**params, 'crumb': self.crumb(refresh=attempt > 0)},
+                                        timeout=self.timeout)
+            if response.status_code != 401:
+                break
+        return response
+
+    def quotes(self, symbols):
+        """多檔報價；回傳 {Yahoo 代號: quote}，查無的代號不會出現"""
+        response = self._get(QUOTE_URL, {'symbols': ','.join(symbols)})
+        response.raise_for_status()
+        results = (response.json().get('quoteResponse') or {}).get('result') or []
+        return {quote['symbol']: quote for quote in results if quote.get('symbol')}
+
+    def profile(self, symbol):
+        """單檔產業資料；沒有產業資料時回傳 None"""
+        response = self._get(PROFILE_URL.format(symbol=symbol), {'modules': 'assetProfile'})
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        results = (response.json().get('quoteSummary') or {}).get('result') or []
+        profile = (results[0] or {}).get('assetProfile') if results else None
+        if not profile or not profile.get('sector'):
+            return None
+        return {'sector': profile['sector'], 'industry': profile.get('industry') or UNKNOWN}
+
+
+class MetadataEnricher:
+    """規劃、查詢並把快取套用回全市場清單"""
+
+    def __init__(self, client=None, cache=None, concurrency=DEFAULT_CONCURRENCY, batch_size=QUOTE_BATCH, metrics=None):
+        self.client = client or YahooClient()
+        self.cache = cache if cache is not None else MetadataCache()
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.metrics = metrics or RunMetrics('metadata_enricher')
+        if metrics is not None:
+            instrument_session(self.client.session, metrics)
+
+    def plan(self, market, stocks):
+        """回傳 (需要查市值的代號, 需要查產業的代號)；快取未過期者不列入"""
+        now = self.cache.clock()
+        quotes, profiles = [], []
+        for stock in stocks:
+            symbol = stock['symbol']
+            if not self.cache.fresh(market, symbol, 'quote') and \
+                    (not stock.get('marketCap') or _age(stock.get('lastUpdated'), now) >= QUOTE_TTL):
+                quotes.append(symbol)
+            if (is_unknown(stock.get('sector')) or is_unknown(stock.get('industry'))) and \
+                    not self.cache.fresh(market, symbol, 'profile'):
+                profiles.append(symbol)
+        return quotes, profiles
+
+    def fetch_quotes(self, market, symbols):
+        """成批查詢市值；非股票類的商品同時記為沒有產業資料。回傳失敗的批次數"""
+        batches = [symbols[i:i + self.batch_size] for i in range(0, len(symbols), self.batch_size)]
+        failed = 0
+        with self.metrics.stage('quote', market) as stage, ThreadPoolExecutor(self.concurrency) as pool:
+            futures = {pool.submit(self.client.quotes, [yahoo_symbol(market, s) for s in batch]): batch
+                       for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    found = future.result()
+                except (requests.RequestException, ValueError) as e:
+                    failed += 1
+                    stage.add_error(e)
+                    continue
+                for symbol in batch:
+                    quote = found.get(yahoo_symbol(market, symbol))
+                    if quote is None:
+                        self.cache.put(market, symbol, 'quote', missing='not found')
+                        self.cache.put(market, symbol, 'profile', missing='not found')
+                        continue
+                    quote_type = quote.get('quoteType')
+                    self.cache.put(market, symbol, 'quote', {'marketCap': quote.get('marketCap') or 0,
+                                                              'quoteType': quote_type,
+                                                              'name': quote.get('longName') or quote.get('shortName')})
+                    if quote_type in NO_PROFILE_TYPES:
+                        self.cache.put(market, symbol, 'profile', missing=quote_type.lower())
+                stage.add_records(len(batch))
+        return failed
+
+    def fetch_profiles(self, market, symbols):
+        """並行查詢產業資料（quote 階段已判定沒有產業者略過）。回傳失敗數"""
+        symbols = [s for s in symbols if not self.cache.fresh(market, s, 'profile')]
+        failed = 0
+        with self.metrics.stage('profile', market) as stage, ThreadPoolExecutor(self.concurrency) as pool:
+            futures = {pool.submit(self.client.profile, yahoo_symbol(market, s)): s for s in symbols}
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    profile = future.result()
+                except (requests.RequestException, ValueError) as e:
+                    failed += 1                    # 暫時性錯誤不寫快取，下次再試
+                    stage.add_error(e)
+                    continue
+                if profile is None:
+                    self.cache.put(market, symbol, 'profile', missing='no profile')
+                else:
+                    self.cache.put(market, symbol, 'profile', profile)
+                stage.add_records(1)
+        return len(symbols), failed
+
+    def apply(self, market, stocks):
+        """以快取內容補上清單欄位；回傳有變動的筆數"""
+        updated = 0
+        now = _now_iso()
+        for stock in stocks:
+            changed = False
+            quote = self.cache.get(market, stock['symbol'], 'quote')
+            if quote and not quote.get('missing') and quote.get('marketCap') and \
+                    stock.get('marketCap') != quote['marketCap']:
+                stock['marketCap'] = quote['marketCap']
+                changed = True
+            profile = self.cache.get(market, stock['symbol'], 'profile')
+            if profile and not profile.get('missing'):
+                for field in ('sector', 'industry'):
+                    if stock.get(field) != profile[field]:
+                        stock[field] = profile[field]
+                        changed = True
+            if changed:
+                stock['lastUpdated'] = now
+                updated += 1
+        return updated
+
+    def enrich(self, market, stocks):
+        quotes, profiles = self.plan(market, stocks)
+        stats = {'stocks': len(stocks), 'quotes': len(quotes), 'quoteBatchesFailed': 0,
+                 'profiles': 0, 'profilesFailed': 0}
+        try:
+            if quotes:
+                stats['quoteBatchesFailed'] = self.fetch_quotes(market, quotes)
+            if profiles:
+                stats['profiles'], stats['profilesFailed'] = self.fetch_profiles(market, profiles)
+        finally:
+            self.cache.save()           # 中途中斷也保留已查到的結果
+        stats['updated'] = self.apply(market, stocks)
+        stats['unknown'] = sum(1 for s in stocks if is_unknown(s.get('sector')))
+        return stats
+
+
+def load_market_file(path):
+    """讀取全市場清單；檔案尾端的多餘字元（舊版收集器偶爾會多寫一個 }）會被忽略"""
+    with open(path, 'r', encoding='utf-8') as f:
+        document, _ = json.JSONDecoder().raw_decode(f.read())
+    return document
+
+
+def save_market_file(path, document):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='成批補齊全市場清單的產業與市值')
+    parser.add_argument('--markets', nargs='*', default=list(MARKETS), choices=list(MARKETS))
+    parser.add_argument('--full-market-dir', default=FULL_MARKET_DIR)
+    parser.add_argument('--cache', default=CACHE_PATH)
+    parser.add_argument('--metadata-db', default=METADATA_DB, help='同步寫入的元資料庫；空字串表示不寫')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='同時進行的請求數')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='每秒請求數上限')
+    parser.add_argument('--batch-size', type=int, default=QUOTE_BATCH, help='每次 quote 查詢的代號數')
+    parser.add_argument('--limit', type=int, default=None, help='每個市場最多處理幾檔（測試用）')
+    parser.add_argument('--plan', action='store_true', help='只列出需要查詢的數量')
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, 'metadata_enricher')
+
+    metrics = RunMetrics('metadata_enricher')
+    enricher = MetadataEnricher(YahooClient(limiter=RateLimiter(args.rate)), MetadataCache(args.cache),
+                                concurrency=args.concurrency, batch_size=args.batch_size, metrics=metrics)
+
+    print("🏷️ 全市場清單產業 / 市值補齊")
+    print("=" * 60)
+    failed = False
+    for market in args.markets:
+        path = os.path.join(args.full_market_dir, f"{market}-stocks-latest.json")
+        if not os.path.exists(path):
+            print(f"⚠️ 找不到 {path}")
+            continue
+        document = load_market_file(path)
+        stocks = document.get('collectedStocks', [])[:args.limit]
+
+        if args.plan:
+            quotes, profiles = enricher.plan(market, stocks)
+            print(f"📋 {market}: {len(stocks)} 檔，市值 {len(quotes)} 檔（{-(-len(quotes) // args.batch_size)} 次請求）、"
+                  f"產業最多 {len(profiles)} 檔")
+            continue
+
+        started = time.perf_counter()
+        stats = enricher.enrich(market, stocks)
+        if stats['updated']:
+            document['lastUpdated'] = _now_iso()
+            save_market_file(path, document)
+            if args.metadata_db:
+                store = MetadataStore(args.metadata_db)
+                store.import_full_market(market, args.full_market_dir)
+                store.close()
+        failed = failed or stats['quoteBatchesFailed'] or stats['profilesFailed']
+        print(f"✅ {market}: 查詢市值 {stats['quotes']} 檔、產業 {stats['profiles']} 檔，更新 {stats['updated']} 檔，"
+              f"仍未知產業 {stats['unknown']} 檔（{time.perf_counter() - started:.1f} 秒）")
+        if stats['quoteBatchesFailed'] or stats['profilesFailed']:
+            print(f"   ⚠️ 失敗：quote {stats['quoteBatchesFailed']} 批、profile {stats['profilesFailed']} 檔，下次執行會重試")
+
+    if not args.plan:
+        write_run_outputs(metrics, args)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+股票元資料庫
+以 SQLite（WAL 模式）取代單一的 data/stock-metadata.json：每檔股票一列，
+symbol 為主鍵，另有 market、exchange、(market, sector, industry) 索引，查詢單檔只走 B-tree，不必解析整個檔案。
+yahooData 以 JSON 字串存在同一列，更新時只寫有變動的列。
+
+寫入以 BEGIN IMMEDIATE 的交易成批 upsert；WAL 模式下讀取端（其他行程的連線）讀的是已提交的快照，
+不會擋住寫入，也不會被寫入擋住。
+export_json() 輸出與 lib/stock-metadata.ts 相同格式的 stock-metadata.json，讓既有前端照常讀取。
+
+用法：
+    store = MetadataStore()
+    store.upsert_many([{'symbol': '2330', 'market': 'TW', 'name': '台積電', ...}])
+    store.get('2330')
+
+    python3 metadata_store.py import data/stock-metadata.json     # 由舊檔匯入
+    python3 metadata_store.py import-full-market                  # 由全市場清單補上產業與市值
+    python3 metadata_store.py export                              # 輸出 data/stock-metadata.json
+    python3 metadata_store.py get 2330 AAPL
+    python3 metadata_store.py search 台積
+    python3 metadata_store.py stats
+"""
+
+import os
+import json
+import time
+import sqlite3
+import argparse
+from datetime import datetime, timezone
+
+from ohlcv_store import DATA_DIR, FULL_MARKET_DIR
+from streaming_json import iter_collected_stocks, iter_object, read_value
+
+DB_PATH = os.path.join(DATA_DIR, 'metadata', 'metadata.sqlite')
+JSON_PATH = os.path.join(DATA_DIR, 'stock-metadata.json')
+VERSION = '1.0.0'
+BATCH_SIZE = 1000
+CLEANUP_DAYS = 30
+
+# (JSON 欄位, 資料表欄位, 新股票的預設值)；預設值與 StockMetadataManager.setStockMetadata 相同
+COLUMNS = (
+    ('symbol', 'symbol', None),
+    ('name', 'name', ''),
+    ('market', 'market', 'TW'),
+    ('category', 'category', 'stock'),
+    ('exchange', 'exchange', ''),
+    ('exchangeName', 'exchange_name', ''),
+    ('quoteType', 'quote_type', ''),
+    ('currency', 'currency', 'TWD'),
+    ('lastUpdated', 'last_updated', None),
+)
+# 新股票沒有提供幣別時依市場決定（COLUMNS 的 'TWD' 只是未知市場時的預設）
+MARKET_CURRENCY = {'TW': 'TWD', 'US': 'USD'}
+# 舊格式沒有的欄位：有值時才輸出
+EXTRA_COLUMNS = (
+    ('sector', 'sector'),
+    ('industry', 'industry'),
+    ('marketCap', 'market_cap'),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stocks (
+    symbol        TEXT PRIMARY KEY,
+    name          TEXT,
+    market        TEXT,
+    category      TEXT,
+    exchange      TEXT,
+    exchange_name TEXT,
+    quote_type    TEXT,
+    currency      TEXT,
+    last_updated  TEXT,
+    sector        TEXT,
+    industry      TEXT,
+    market_cap    REAL,
+    yahoo_data    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_stocks_market ON stocks (market, category);
+CREATE INDEX IF NOT EXISTS idx_stocks_exchange ON stocks (exchange);
+CREATE INDEX IF NOT EXISTS idx_stocks_sector ON stocks (market, sector, industry);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_ALL = [column for _, column, _ in COLUMNS] + [column for _, column in EXTRA_COLUMNS] + ['yahoo_data']
+_DEFAULTS = {column: default for _, column, default in COLUMNS if default is not None}
+
+
+def _insert_value(index, column):
+    if column == 'currency':
+        market = f"COALESCE(?{_ALL.index('market') + 1}, '{_DEFAULTS['market']}')"
+        cases = ' '.join(f"WHEN '{m}' THEN '{c}'" for m, c in MARKET_CURRENCY.items())
+        return f"COALESCE(?{index}, CASE {market} {cases} ELSE '{_DEFAULTS[column]}' END)"
+    if column in _DEFAULTS:
+        return f"COALESCE(?{index}, '{_DEFAULTS[column]}')"
+    return f"?{index}"
+
+
+# 新股票的空欄位填預設值；既有股票只覆蓋有提供的欄位（與 TS 版 { ...existing, ...metadata } 相同），lastUpdated 每次都更新
+UPSERT = (
+    f"INSERT INTO stocks ({', '.join(_ALL)}) "
+    f"VALUES ({', '.join(_insert_value(i, column) for i, column in enumerate(_ALL, 1))}) "
+    "ON CONFLICT(symbol) DO UPDATE SET "
+    + ', '.join(f"{column} = COALESCE(?{i}, {column})" for i, column in enumerate(_ALL, 1)
+                if column not in ('symbol', 'last_updated'))
+    + f", last_updated = ?{_ALL.index('last_updated') + 1}"
+)
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def _unknown_to_none(value):
+    """全市場清單的 Unknown、0 與台股產業代碼（如 '28'）都視為沒有資料"""
+    if value in ('', 'Unknown', 0) or (isinstance(value, str) and value.isdigit()):
+        return None
+    return value
+
+
+class MetadataStore:
+    """stocks 資料表的讀寫；每個行程（或執行緒）各自建立一個實例"""
+
+    def __init__(self, db_path=DB_PATH, clock=_now_iso):
+        self.db_path = db_path
+        self.clock = clock
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        # isolation_level=None：交易由 _write() 以 BEGIN IMMEDIATE 明確控制
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _write(self, fn):
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = fn()
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+        return result
+
+    # ---- 寫入 ----
+
+    def _row(self, record, now):
+        row = [record.get(key) for key, _, _ in COLUMNS]
+        row[-1] = record.get('lastUpdated') or now
+        row += [record.get(key) for key, _ in EXTRA_COLUMNS]
+        yahoo_data = record.get('yahooData')
+        row.append(None if yahoo_data is None else json.dumps(yahoo_data, ensure_ascii=False, separators=(',', ':')))
+        return row
+
+    def upsert_many(self, records, batch_size=BATCH_SIZE):
+        """
+        新增或更新多筆（JSON 格式的 dict，至少要有 symbol）；未提供或為 None 的欄位保留原值。
+        每 batch_size 筆一個交易，回傳處理筆數
+        """
+        now = self.clock()
+        count = 0
+        batch = []
+
+        def flush():
+            self._write(lambda: self.conn.executemany(UPSERT, batch))
+
+        for record in records:
+            batch.append(self._row(record, now))
+            if len(batch) >= batch_size:
+                flush()
+                count += len(batch)
+                batch = []
+        if batch:
+            flush()
+            count += len(batch)
+        if count:
+            self._write(lambda: self.conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('lastUpdated', ?)", (now,)))
+        return count
+
+    def upsert(self, record):
+        return self.upsert_many([record])
+
+    def delete(self, symbols):
+        return self._write(lambda: self.conn.executemany(
+            'DELETE FROM stocks WHERE symbol = ?', [(s,) for s in symbols]).rowcount)
+
+    def cleanup(self, days=CLEANUP_DAYS):
+        """刪除超過 days 天未更新的元資料（StockMetadataManager.cleanupOldMetadata）"""
+        cutoff = datetime.fromtimestamp(time.time() - days * 86400, timezone.utc)
+        cutoff = cutoff.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+        return self._write(lambda: self.conn.execute(
+            'DELETE FROM stocks WHERE last_updated < ?', (cutoff,)).rowcount)
+
+    # ---- 讀取 ----
+
+    @staticmethod
+    def to_record(row, with_yahoo=True):
+        """資料列轉回 stock-metadata.json 的格式"""
+        record = {}
+        for key, column, default in COLUMNS:
+            value = row[column]
+            record[key] = default if value is None and default is not None else value
+        for key, column in EXTRA_COLUMNS:
+            if row[column] is not None:
+                record[key] = row[column]
+        if with_yahoo and row['yahoo_data'] is not None:
+            record['yahooData'] = json.loads(row['yahoo_data'])
+        return record
+
+    def get(self, symbol, with_yahoo=True):
+        row = self.conn.execute('SELECT * FROM stocks WHERE symbol = ?', (symbol,)).fetchone()
+        return None if row is None else self.to_record(row, with_yahoo)
+
+    def get_many(self, symbols, with_yahoo=True):
+        """回傳 {symbol: record}，不存在的代號略過"""
+        found = {}
+        symbols = list(symbols)
+        for i in range(0, len(symbols), 500):             # SQLite 參數數量上限
+            chunk = symbols[i:i + 500]
+            rows = self.conn.execute(f"SELECT * FROM stocks WHERE symbol IN ({', '.join('?' * len(chunk))})", chunk)
+            found.update((row['symbol'], self.to_record(row, with_yahoo)) for row in rows)
+        return found
+
+    def query(self, market=None, category=None, exchange=None, sector=None, industry=None, limit=None,
+              with_yahoo=False):
+        """依索引欄位篩選；回傳依代號排序的 record 列表"""
+        conditions, params = [], []
+        for column, value in (('market', market), ('category', category), ('exchange', exchange),
+                              ('sector', sector), ('industry', industry)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        sql = 'SELECT * FROM stocks'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY symbol'
+        if limit:
+            sql += f' LIMIT {int(limit)}'
+        return [self.to_record(row, with_yahoo) for row in self.conn.execute(sql, params)]
+
+    def search(self, query, limit=10):
+        """代號或名稱包含 query；代號完全相同者排最前（StockMetadataManager.searchStocks）"""
+        pattern = f"%{query}%"
+        rows = self.conn.execute(
+            'SELECT * FROM stocks WHERE symbol LIKE ? OR name LIKE ? '
+            'ORDER BY (lower(symbol) = lower(?)) DESC, symbol LIMIT ?',
+            (pattern, pattern, query, limit))
+        return [self.to_record(row, with_yahoo=False) for row in rows]
+
+    def stats(self):
+        def counts(column):
+            return {row[0]: row[1] for row in self.conn.execute(
+                f'SELECT {column}, COUNT(*) FROM stocks GROUP BY {column} ORDER BY {column}')}
+        total = self.conn.execute('SELECT COUNT(*) FROM stocks').fetchone()[0]
+        return {'total': total, 'byMarket': counts('market'), 'byCategory': counts('category')}
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM stocks').fetchone()[0]
+
+    # ---- 匯入 / 匯出 ----
+
+    def import_json(self, path=JSON_PATH, batch_size=BATCH_SIZE):
+        """匯入舊版 stock-metadata.json（以串流方式逐筆解析），保留原本的 lastUpdated"""
+        count = self.upsert_many((record for _, record in iter_object(path, ('stocks',))), batch_size)
+        updated = read_value(path, ('lastUpdated',))
+        if updated:
+            self._write(lambda: self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('lastUpdated', ?)", (updated,)))
+        return count
+
+    def import_full_market(self, market, base_dir=FULL_MARKET_DIR, batch_size=BATCH_SIZE):
+        """由全市場清單補上名稱、交易所、產業與市值；Unknown 與 0 不覆蓋既有值"""
+        path = os.path.join(base_dir, f"{market}-stocks-latest.json")
+        if not os.path.exists(path):
+            return 0
+        records = ({'symbol': s['symbol'], 'market': s.get('market', market), 'exchange': s.get('exchange') or None,
+                    'currency': MARKET_CURRENCY.get(s.get('market', market)),
+                    'name': s.get('name') or None, 'sector': _unknown_to_none(s.get('sector')),
+                    'industry': _unknown_to_none(s.get('industry')), 'marketCap': _unknown_to_none(s.get('marketCap')),
+                    'lastUpdated': s.get('lastUpdated')}
+                   for s in iter_collected_stocks(path))
+        return self.upsert_many(records, batch_size)
+
+    def export_json(self, path=JSON_PATH):
+        """
+        輸出與 lib/stock-metadata.ts 相同格式（JSON.stringify(..., null, 2)）的檔案；
+        逐列寫出，不會把全部 yahooData 同時放在記憶體
+        """
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'lastUpdated'").fetchone()
+        header = {'version': VERSION, 'lastUpdated': row[0] if row else self.clock()}
+        tmp_path = f"{path}.tmp"
+        count = 0
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('{\n')
+            for key, value in header.items():
+                f.write(f'  {json.dumps(key)}: {json.dumps(value)},\n')
+            f.write('  "stocks": {')
+            for row in self.conn.execute('SELECT * FROM stocks ORDER BY rowid'):
+                body = json.dumps(self.to_record(row), ensure_ascii=False, indent=2).replace('\n', '\n    ')
+                f.write(f"{',' if count else ''}\n    {json.dumps(row['symbol'], ensure_ascii=False)}: {body}")
+                count += 1
+            f.write('\n  }\n}' if count else '}\n}')
+        os.replace(tmp_path, path)
+        return count
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='股票元資料庫（SQLite）')
+    parser.add_argument('--db', default=DB_PATH)
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help='匯入舊版 stock-metadata.json')
+    imp.add_argument('path', nargs='?', default=JSON_PATH)
+    full = sub.add_parser('import-full-market', help='由全市場清單補上產業與市值')
+    full.add_argument('--markets', nargs='*', default=['TW', 'US'])
+    exp = sub.add_parser('export', help='輸出相容舊格式的 stock-metadata.json')
+    exp.add_argument('path', nargs='?', default=JSON_PATH)
+    get = sub.add_parser('get', help='查詢代號')
+    get.add_argument('symbols', nargs='+')
+    search = sub.add_parser('search', help='依代號或名稱搜尋')
+    search.add_argument('query')
+    search.add_argument('--limit', type=int, default=10)
+    sub.add_parser('stats', help='依市場與類別統計')
+    cleanup = sub.add_parser('cleanup', help='刪除久未更新的元資料')
+    cleanup.add_argument('--days', type=float, default=CLEANUP_DAYS)
+    args = parser.parse_args()
+
+    store = MetadataStore(args.db)
+    print("🗂️ 股票元資料庫")
+    print("=" * 60)
+    started = time.perf_counter()
+    if args.command == 'import':
+        count = store.import_json(args.path)
+        print(f"✅ 匯入 {count:,} 筆（{time.perf_counter() - started:.2f} 秒）")
+    elif args.command == 'import-full-market':
+        for market in args.markets:
+            print(f"✅ {market}: {store.import_full_market(market):,} 筆")
+    elif args.command == 'export':
+        count = store.export_json(args.path)
+        print(f"✅ 輸出 {count:,} 筆到 {args.path}（{time.perf_counter() - started:.2f} 秒）")
+    elif args.command == 'get':
+        for symbol in args.symbols:
+            record = store.get(symbol)
+            print(json.dumps(record, ensure_ascii=False, indent=2) if record else f"⚠️ 找不到 {symbol}")
+    elif args.command == 'search':
+        for record in store.search(args.query, args.limit):
+            print(f"  {record['symbol']:<10} {record['market']:<3} {record['name']}")
+    elif args.command == 'stats':
+        stats = store.stats()
+        print(f"📊 共 {stats['total']:,} 筆")
+        print(f"   市場: {stats['byMarket']}")
+        print(f"   類別: {stats['byCategory']}")
+    elif args.command == 'cleanup':
+        print(f"🧹 已刪除 {store.cleanup(args.days)} 筆")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+美股公司名稱對齊
+同一家公司在各來源的寫法不同：
+
+    SEC       NVIDIA CORP                          （company_tickers.json 的 title，全大寫居多，CIK 為發行人）
+    NASDAQ    NVIDIA Corporation - Common Stock    （Security Name，含證券種類）
+    Yahoo     NVIDIA Corporation                   （longName，來自元資料庫與 metadata_enricher 的快取）
+
+名稱先正規化（小寫、去標點、去掉 Inc / Corp / Ltd 等公司型態與證券種類），再分區（blocking）比對，
+只在區塊內計算相似度，不做 16k × 16k 的全配對：
+
+    1. 依正規化後的代號分區（BRK.B、BRK/B、BRK-B、ABR$D → ABR-PD 視為同一個）
+       區塊內以 NASDAQ（現行掛牌）為準，其他來源相似度達門檻才算同一家
+    2. SEC 沒有的代號（權證、單位、特別股等）依名稱前一兩個 token 分區，找出 SEC 的發行人（CIK）
+
+相似度為正規化 token 的 Dice 係數與字元三連字 Dice 係數取大者；有安裝 rapidfuzz 時改用 token_set_ratio。
+每個商品輸出一個顯示名稱：依 Yahoo、NASDAQ、SEC 的順序取第一個相符來源
+（SEC 的全大寫名稱會轉成首字大寫），證券種類不是普通股時附在名稱後。
+台股名稱只有交易所一個來源，不需要對齊。
+
+用法：
+    python3 name_reconciler.py                 # 輸出 data/names/US-names.json
+    python3 name_reconciler.py --apply         # 同時更新全市場清單的 name
+    python3 name_reconciler.py --show NVDA BRK-B
+"""
+
+import os
+import re
+import json
+import time
+import argparse
+from collections import defaultdict
+from datetime import datetime, timezone
+
+try:
+    from rapidfuzz import fuzz
+except ImportError:  # 沒有 rapidfuzz 時使用內建的 Dice 係數
+    fuzz = None
+
+from ohlcv_store import DATA_DIR, FULL_MARKET_DIR
+
+NAMES_DIR = os.path.join(DATA_DIR, 'names')
+SEC_PATH = os.path.join(DATA_DIR, 'sec_stocks.jsonl')
+NASDAQ_PATHS = (os.path.join(DATA_DIR, 'nasdaq_ftp_stocks.jsonl'),)
+MATCH_THRESHOLD = 0.6
+MAX_BLOCK = 64                # 名稱區塊超過這個大小時改用前兩個 token 分區
+SOURCE_ORDER = ('nasdaq', 'yahoo', 'sec')       # 同一代號以哪個來源為準
+DISPLAY_ORDER = ('yahoo', 'nasdaq', 'sec')      # 顯示名稱優先取哪個來源
+
+# 比對時忽略的公司型態與虛詞
+LEGAL_TOKENS = {
+    'inc', 'incorporated', 'corp', 'corporation', 'co', 'company', 'cos', 'companies', 'ltd', 'limited',
+    'plc', 'llc', 'lp', 'l', 'p', 'sa', 'ag', 'nv', 'se', 'spa', 'ab', 'asa', 'oyj', 'bv', 'the', 'and',
+    'holdings', 'holding', 'group', 'adr', 'ads', 'new', 'de',
+}
+ABBREVIATIONS = {
+    'intl': 'international', 'hldgs': 'holdings', 'grp': 'group', 'tr': 'trust', 'svcs': 'services',
+    'natl': 'national', 'tech': 'technologies', 'technology': 'technologies', 'mfg': 'manufacturing',
+    'pharma': 'pharmaceuticals', 'pharmaceutical': 'pharmaceuticals', 'fin': 'financial', 'bk': 'bank',
+    'ctr': 'center', 'ctrs': 'centers', 'sys': 'systems', 'inds': 'industries', 'amer': 'american',
+}
+# 證券種類：「 - 」之後或名稱結尾的這些字樣不屬於公司名稱
+SECURITY_HEAD = re.compile(
+    r'^(class [a-z0-9]+\b|common|ordinary|american deposit[ao]ry|depositary|units?\b|warrants?\b|rights?\b|'
+    r'subordinate|series [a-z0-9]+\b|preferred|\d+(\.\d+)?%|shares of beneficial|beneficial interest|'
+    r'sponsored ads|closed end fund)', re.I)
+# 沒有「 - 」分隔時，名稱中間出現的證券種類字樣（如 'Arbor Realty Trust 6.375% Series D ... Preferred Stock'）
+SECURITY_INLINE = re.compile(
+    r'\s+(\d+(\.\d+)?%|series [a-z0-9]+\b|class [a-z]\b|depositary shares?|warrants?\b|units?\b|rights?\b|'
+    r'(class [a-z]\s+)?(common stock|common shares?|ordinary shares?)|american deposit[ao]ry shares?|'
+    r'shares of beneficial interest)', re.I)
+# 普通股與代表普通股的 ADS 不附在顯示名稱後
+COMMON_SECURITY = re.compile(
+    r'^((class [a-z]\s+)?(common stock|common shares?|ordinary shares?)$|american deposit[ao]ry shares?)', re.I)
+SEC_STATE = re.compile(r'\s*[/\\][A-Z]{2,3}[/\\]?\s*$')      # APPLE INC /CA/、BANK OF MONTREAL /CAN/
+DISPLAY_UPPER = {'INC': 'Inc.', 'CORP': 'Corp.', 'CO': 'Co.', 'LTD': 'Ltd.', 'PLC': 'plc', 'LLC': 'LLC',
+                 'LP': 'L.P.', 'NV': 'N.V.', 'SA': 'S.A.', 'AG': 'AG', 'SE': 'SE', 'ADR': 'ADR', 'II': 'II',
+                 'III': 'III', 'IV': 'IV', 'ETF': 'ETF', 'REIT': 'REIT', 'USA': 'USA', 'US': 'US'}
+TICKER_SUFFIX = {'-U': '-UN', '-W': '-WT', '-WS': '-WT', '-R': '-RT'}
+
+
+def normalize_ticker(symbol):
+    """BRK.B / BRK/B / BRK-B → BRK-B；NASDAQ 其他交易所清單的 ABR$D → ABR-PD、AACT.U → AACT-UN"""
+    symbol = (symbol or '').strip().upper()
+    symbol = re.sub(r'\$([A-Z]*)$', lambda m: f"-P{m.group(1)}", symbol)
+    symbol = re.sub(r'[./ ]', '-', symbol)
+    head, dash, tail = symbol.rpartition('-')
+    if dash and f"-{tail}" in TICKER_SUFFIX:
+        symbol = head + TICKER_SUFFIX[f"-{tail}"]
+    return symbol
+
+
+def _strip_new(issuer):
+    """NASDAQ 名稱常見的 'Inc. New'（公司重組後的新股）不屬於公司名稱"""
+    return re.sub(r'\s+new$', '', issuer, flags=re.I)
+
+
+def split_security(name):
+    """'NVIDIA Corporation - Common Stock' → ('NVIDIA Corporation', 'Common Stock')"""
+    name = ' '.join((name or '').split())
+    parts = name.split(' - ')
+    for i in range(1, len(parts)):
+        if SECURITY_HEAD.match(parts[i]):
+            return _strip_new(' - '.join(parts[:i])), ' - '.join(parts[i:])
+    match = SECURITY_INLINE.search(name)
+    if match and match.start() > 0:
+        return _strip_new(name[:match.start()].rstrip(' ,')), name[match.start():].strip(' ()')
+    return _strip_new(name), ''
+
+
+def name_tokens(name):
+    """比對用的 token：小寫、& 改 and、去標點與公司型態、展開常見縮寫"""
+    name = SEC_STATE.sub('', name).lower().replace('&', ' and ')
+    tokens = re.sub(r"[^a-z0-9]+", ' ', name.replace("'", '')).split()
+    tokens = [ABBREVIATIONS.get(t, t) for t in tokens]
+    core = [t for t in tokens if t not in LEGAL_TOKENS]
+    return tuple(core or tokens)
+
+
+def _trigrams(text):
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(a, b):
+    """兩組 token 的相似度（0~1）"""
+    return _dice(a, b, _trigrams(' '.join(a)) if a else None, _trigrams(' '.join(b)) if b else None)
+
+
+def _dice(a, b, grams_a, grams_b):
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    if fuzz is not None:
+        return fuzz.token_set_ratio(' '.join(a), ' '.join(b)) / 100
+    set_a, set_b = set(a), set(b)
+    token_dice = 2 * len(set_a & set_b) / (len(set_a) + len(set_b))
+    gram_dice = 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+    return max(token_dice, gram_dice)
+
+
+def display_case(name):
+    """SEC 的全大寫名稱轉成首字大寫；其他來源原樣保留"""
+    name = SEC_STATE.sub('', name).strip()
+    if name != name.upper():
+        return name
+    words = []
+    for word in name.split():
+        bare = word.strip(',.')
+        if bare in DISPLAY_UPPER:
+            words.append(word.replace(bare, DISPLAY_UPPER[bare]).replace('..', '.'))
+        elif len(bare) <= 3 and not re.search(r'[AEIOUY]', bare):
+            words.append(word)                  # IBM、JPM 類的縮寫保留大寫
+        else:
+            words.append('-'.join(part[:1] + part[1:].lower() for part in word.split('-')))
+    return ' '.join(words)
+
+
+class Candidate:
+    """單一來源的一筆名稱"""
+
+    __slots__ = ('source', 'symbol', 'raw', 'issuer', 'security', 'tokens', 'cik', '_grams')
+
+    def __init__(self, source, symbol, raw, cik=None):
+        self.source = source
+        self.symbol = symbol
+        self.raw = raw
+        self.issuer, self.security = split_security(raw)
+        self.tokens = name_tokens(self.issuer)
+        self.cik = int(cik) if cik else None
+        self._grams = None
+
+    def score(self, other):
+        """與另一筆的相似度；三連字集合只在第一次比對時建立"""
+        if self.tokens == other.tokens:
+            return 1.0 if self.tokens else 0.0
+        return _dice(self.tokens, other.tokens, self.grams(), other.grams())
+
+    def grams(self):
+        if self._grams is None:
+            self._grams = _trigrams(' '.join(self.tokens))
+        return self._grams
+
+
+class NameReconciler:
+    """收集各來源的名稱，依代號與名稱前綴分區後對齊"""
+
+    def __init__(self, threshold=MATCH_THRESHOLD, max_block=MAX_BLOCK):
+        self.threshold = threshold
+        self.max_block = max_block
+        self.by_ticker = defaultdict(list)
+
+    def add(self, source, symbol, name, cik=None):
+        if not symbol or not name:
+            return
+        self.by_ticker[normalize_ticker(symbol)].append(Candidate(source, symbol, name, cik))
+
+    def add_records(self, source, records, symbol_key='代號', name_key='名稱', cik_key='CIK'):
+        for record in records:
+            self.add(source, record.get(symbol_key), record.get(name_key), record.get(cik_key))
+
+    def _issuer_blocks(self):
+        """SEC 發行人依名稱第一個 token 與前兩個 token 分區（每個 CIK 只留一筆）"""
+        seen = set()
+        one, two = defaultdict(list), defaultdict(list)
+        for candidates in self.by_ticker.values():
+            for candidate in candidates:
+                if candidate.source != 'sec' or candidate.cik in seen or not candidate.tokens:
+                    continue
+                seen.add(candidate.cik)
+                one[candidate.tokens[0]].append(candidate)
+                two[candidate.tokens[:2]].append(candidate)
+        return one, two
+
+    def _link_issuer(self, candidate, blocks):
+        one, two = blocks
+        block = one.get(candidate.tokens[0], [])
+        if len(block) > self.max_block:
+            block = two.get(candidate.tokens[:2], [])
+        best, best_score = None, self.threshold
+        for issuer in block:
+            score = candidate.score(issuer)
+            if score >= best_score:
+                best, best_score = issuer, score
+        return best, best_score
+
+    def reconcile(self):
+        """回傳 {正規化代號: 結果}；結果含顯示名稱、發行人名稱、證券種類、CIK、各來源名稱與狀態"""
+        issuer_blocks = self._issuer_blocks()
+        source_rank = {source: i for i, source in enumerate(SOURCE_ORDER)}
+        display_rank = {source: i for i, source in enumerate(DISPLAY_ORDER)}
+        results = {}
+        for ticker, candidates in self.by_ticker.items():
+            anchor = min(candidates, key=lambda c: source_rank.get(c.source, len(source_rank)))
+            matched, score = [anchor], 1.0
+            for candidate in candidates:
+                if candidate is not anchor:
+                    value = anchor.score(candidate)
+                    score = min(score, value)
+                    if value >= self.threshold:
+                        matched.append(candidate)
+
+            if len(candidates) == 1:
+                status = 'single'
+            elif len(matched) == len(candidates):
+                status = 'matched'
+            else:
+                status = 'conflict'          # 例如公司改名、或 ETN 的 SEC 名稱是發行銀行
+            # SEC 的代號對應的 CIK 即使名稱不符也沿用；SEC 沒有這個代號時才依名稱找發行人
+            sec = next((c for c in candidates if c.source == 'sec'), None)
+            cik = sec.cik if sec else None
+            if sec is None and anchor.tokens:
+                issuer, link_score = self._link_issuer(anchor, issuer_blocks)
+                if issuer is not None:
+                    cik = issuer.cik
+                    status = 'linked' if status == 'single' else status
+                    score = min(score, link_score)
+
+            chosen = min(matched, key=lambda c: display_rank.get(c.source, len(display_rank)))
+            issuer_name = display_case(chosen.issuer)
+            security = next((c.security for c in matched if c.security), '')
+            name = issuer_name if not security or COMMON_SECURITY.match(security) else f"{issuer_name} - {security}"
+            results[ticker] = {
+                'symbol': ticker, 'name': name, 'issuer': issuer_name, 'security': security or None,
+                'cik': cik, 'status': status, 'score': round(score, 3),
+                'sources': {c.source: c.raw for c in candidates},
+            }
+        return results
+
+
+def _read_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_yahoo_names(metadata_db=None, cache_path=None):
+    """Yahoo 名稱：元資料庫的 yahooData.longName 與 metadata_enricher 快取的 quote 名稱"""
+    names = {}
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            for key, entry in json.load(f).get('entries', {}).items():
+                market, _, symbol = key.partition(':')
+                name = (entry.get('quote') or {}).get('name')
+                if market == 'US' and name:
+                    names[symbol] = name
+    if metadata_db and os.path.exists(metadata_db):
+        from metadata_store import MetadataStore
+        store = MetadataStore(metadata_db)
+        for record in store.query(market='US', with_yahoo=True):
+            yahoo = record.get('yahooData') or {}
+            if yahoo.get('longName') or yahoo.get('shortName'):
+                names[record['symbol']] = yahoo.get('longName') or yahoo['shortName']
+        store.close()
+    return names
+
+
+def build_reconciler(sec_path=SEC_PATH, nasdaq_paths=NASDAQ_PATHS, yahoo_names=None, **kwargs):
+    reconciler = NameReconciler(**kwargs)
+    if sec_path and os.path.exists(sec_path):
+        reconciler.add_records('sec', _read_jsonl(sec_path))
+    for path in nasdaq_paths:
+        if os.path.exists(path):
+            reconciler.add_records('nasdaq', _read_jsonl(path))
+    for symbol, name in (yahoo_names or {}).items():
+        reconciler.add('yahoo', symbol, name)
+    return reconciler
+
+
+def apply_to_full_market(results, path):
+    """以顯示名稱更新全市場清單的 name；回傳變動筆數"""
+    from metadata_enricher import load_market_file, save_market_file
+    document = load_market_file(path)
+    changed = 0
+    for stock in document.get('collectedStocks', []):
+        result = results.get(normalize_ticker(stock['symbol']))
+        if result and stock.get('name') != result['name']:
+            stock['name'] = result['name']
+            changed += 1
+    if changed:
+        save_market_file(path, document)
+    return changed
+
+
+def main():
+    """主程式"""
+    from metadata_store import DB_PATH
+    from metadata_enricher import CACHE_PATH
+
+    parser = argparse.ArgumentParser(description='對齊 SEC、NASDAQ 與 Yahoo 的公司名稱')
+    parser.add_argument('--sec', default=SEC_PATH)
+    parser.add_argument('--nasdaq', nargs='*', default=list(NASDAQ_PATHS),
+                        help='NASDAQ 清單（nasdaq_ftp_stocks.jsonl 或 stocks_nasdaq / stocks_other 快照）')
+    parser.add_argument('--metadata-db', default=DB_PATH)
+    parser.add_argument('--enrichment-cache', default=CACHE_PATH)
+    parser.add_argument('--threshold', type=float, default=MATCH_THRESHOLD)
+    parser.add_argument('--output', default=os.path.join(NAMES_DIR, 'US-names.json'))
+    parser.add_argument('--apply', action='store_true', help='同時更新 data/full-market/US-stocks-latest.json 的 name')
+    parser.add_argument('--show', nargs='*', default=[], help='列出這些代號的對齊結果')
+    args = parser.parse_args()
+
+    print("🔤 美股公司名稱對齊")
+    print("=" * 60)
+    started = time.perf_counter()
+    yahoo_names = load_yahoo_names(args.metadata_db, args.enrichment_cache)
+    reconciler = build_reconciler(args.sec, args.nasdaq, yahoo_names, threshold=args.threshold)
+    results = reconciler.reconcile()
+    elapsed = time.perf_counter() - started
+
+    counts = defaultdict(int)
+    for result in results.values():
+        counts[result['status']] += 1
+    print(f"✅ {len(results):,} 個代號（{elapsed:.2f} 秒）：" + '、'.join(f"{k} {v:,}" for k, v in sorted(counts.items())))
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    tmp_path = f"{args.output}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'generatedAt': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+                   'stats': dict(counts), 'instruments': results}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, args.output)
+    print(f"📁 {args.output}")
+
+    if args.apply:
+        path = os.path.join(FULL_MARKET_DIR, 'US-stocks-latest.json')
+        print(f"✏️ 全市場清單更新 {apply_to_full_market(results, path):,} 筆名稱")
+    for symbol in args.show:
+        print(json.dumps(results.get(normalize_ticker(symbol)), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NASDAQ Trader FTP 多檔下載器
+以少量的並行 FTP 連線下載 Symboldirectory / ETFData 下的檔案（預設 DEFAULT_FILES）：
+
+- 每條連線是一個工作執行緒，從共用的佇列取下一個檔案，大檔不會卡住其他檔案
+- 下載前以 SIZE / MDTM 查詢遠端大小與修改時間，與上次下載時相同（且本地檔案仍在）就略過
+- 下載的位元組邊寫入暫存檔邊交給該檔的解析器，完成後才換成正式檔名；略過的檔案改由本地檔案餵給解析器
+
+下載狀態記錄在 data/nasdaq-ftp/state.json，檔案存放在 data/nasdaq-ftp/<遠端路徑>。
+
+用法：
+    python3 nasdaq_ftp_fetcher.py                               # 下載預設檔案組
+    python3 nasdaq_ftp_fetcher.py --files Symboldirectory/options.txt --connections 1
+    python3 nasdaq_ftp_fetcher.py --force                       # 忽略狀態檔，全部重新下載
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import codecs
+import ftplib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from ohlcv_store import DATA_DIR
+from collector_metrics import RunMetrics, add_metrics_arguments, write_run_outputs
+from sampling_profiler import add_profile_arguments, profile_from_args
+
+FTP_HOST = 'ftp.nasdaqtrader.com'
+DOWNLOAD_DIR = os.path.join(DATA_DIR, 'nasdaq-ftp')
+STATE_FILE = 'state.json'
+DEFAULT_CONNECTIONS = 3
+CHUNK_SIZE = 64 * 1024
+
+NASDAQ_LISTED = 'Symboldirectory/nasdaqlisted.txt'
+OTHER_LISTED = 'Symboldirectory/otherlisted.txt'
+NASDAQ_TRADED = 'Symboldirectory/nasdaqtraded.txt'
+# 收集器更新股票清單用的檔案；nasdaqtraded.txt 補上兩份上市清單以外仍在 NASDAQ 交易的代號
+STOCK_FILES = (NASDAQ_LISTED, OTHER_LISTED, NASDAQ_TRADED)
+DEFAULT_FILES = STOCK_FILES + (
+    'Symboldirectory/bxtraded.txt',
+    'Symboldirectory/psxtraded.txt',
+    'Symboldirectory/options.txt',
+    'ETFData/ETFList.txt',
+)
+
+
+class LineParser:
+    """
+    把下載中的位元組區塊切成行（跨區塊的半行與多位元組字元留到下一塊），
+    結束時回傳所有行，或交給 transform（如 parse_nasdaq_listing）轉成紀錄
+    """
+
+    def __init__(self, transform=None, encoding='utf-8'):
+        self.transform = transform
+        self.lines = []
+        self._decoder = codecs.getincrementaldecoder(encoding)('replace')
+        self._tail = ''
+
+    def feed(self, data):
+        lines = (self._tail + self._decoder.decode(data)).split('\n')
+        self._tail = lines.pop()
+        self.lines.extend(line.rstrip('\r') for line in lines)
+
+    def close(self):
+        tail = self._tail + self._decoder.decode(b'', final=True)
+        if tail:
+            self.lines.append(tail.rstrip('\r'))
+        self._tail = ''
+        return self.transform(self.lines) if self.transform else self.lines
+
+
+def parse_nasdaq_traded(lines):
+    """
+    解析 nasdaqtraded.txt（所有在 NASDAQ 交易的代號，含 NYSE 等交易所上市者），排除測試代號。
+    Listing Exchange 為 Q 者市場記為 NASDAQ，其餘與 otherlisted.txt 相同記為 Other
+    """
+    if not lines:
+        return []
+    header = lines[0].split('|')
+    at = {name: header.index(name) for name in ('Symbol', 'Security Name', 'Listing Exchange', 'ETF', 'Test Issue')}
+    stocks = []
+    for line in lines[1:]:
+        parts = line.split('|')
+        if len(parts) < len(header) or line.startswith('File Creation Time') or parts[at['Test Issue']] == 'Y':
+            continue
+        symbol = parts[at['Symbol']]
+        stocks.append({
+            '代號': symbol,
+            '名稱': parts[at['Security Name']],
+            '市場': 'NASDAQ' if parts[at['Listing Exchange']] == 'Q' else 'Other',
+            '交易所': 'US',
+            'yahoo_symbol': symbol,
+            'ETF': parts[at['ETF']] == 'Y'
+        })
+    return stocks
+
+
+def remote_stat(ftp, path):
+    """遠端檔案的大小與修改時間；伺服器不支援 SIZE / MDTM 時回傳 None（每次都下載）"""
+    try:
+        size = ftp.size(path)
+        modified = ftp.voidcmd(f"MDTM {path}")[4:].strip()
+    except ftplib.error_perm:
+        return None
+    return {'size': size, 'modified': modified}
+
+
+class NasdaqFTPFetcher:
+    """以 connections 條並行連線下載多個檔案，大小與修改時間未變的檔案略過"""
+
+    def __init__(self, host=FTP_HOST, port=21, directory=DOWNLOAD_DIR, connections=DEFAULT_CONNECTIONS,
+                 user='anonymous', passwd='', timeout=60):
+        self.host = host
+        self.port = port
+        self.directory = directory
+        self.connections = connections
+        self.user = user
+        self.passwd = passwd
+        self.timeout = timeout
+        self.state_path = os.path.join(directory, STATE_FILE)
+        self.state = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f).get('files', {})
+
+    def local_path(self, remote):
+        return os.path.join(self.directory, *remote.split('/'))
+
+    def _connect(self):
+        ftp = ftplib.FTP(timeout=self.timeout)
+        ftp.connect(self.host, self.port)
+        ftp.login(self.user, self.passwd)
+        ftp.voidcmd('TYPE I')                                   # SIZE 需要二進位模式
+        return ftp
+
+    def _unchanged(self, remote, stat):
+        local = self.local_path(remote)
+        return (stat is not None and self.state.get(remote) == stat
+                and os.path.isfile(local) and os.path.getsize(local) == stat['size'])
+
+    def _fetch_one(self, ftp, remote, parser, force):
+        started = time.perf_counter()
+        local = self.local_path(remote)
+        stat = remote_stat(ftp, remote)
+        result = {'path': local, 'stat': stat, 'bytes': 0}
+
+        if not force and self._unchanged(remote, stat):
+            if parser is not None:
+                with open(local, 'rb') as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                        parser.feed(chunk)
+            result['status'] = 'unchanged'
+        else:
+            os.makedirs(os.path.dirname(local), exist_ok=True)
+            tmp_path = f"{local}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    def write(chunk):
+                        f.write(chunk)
+                        result['bytes'] += len(chunk)
+                        if parser is not None:
+                            parser.feed(chunk)
+
+                    ftp.retrbinary(f"RETR {remote}", write, blocksize=CHUNK_SIZE)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            os.replace(tmp_path, local)
+            result['status'] = 'downloaded'
+
+        result['parsed'] = parser.close() if parser is not None else None
+        result['seconds'] = time.perf_counter() - started
+        return result
+
+    def _worker(self, pending, parsers, force, results):
+        """一條連線：依序處理佇列中的檔案直到清空；連線中斷時下一個檔案重新連線"""
+        ftp = None
+        while True:
+            try:
+                remote = pending.get_nowait()
+            except queue.Empty:
+                break
+            factory = parsers.get(remote)
+            try:
+                if ftp is None:
+                    ftp = self._connect()
+                results[remote] = self._fetch_one(ftp, remote, factory() if factory else None, force)
+            except ftplib.error_perm as e:                     # 檔案不存在等，連線仍可用
+                results[remote] = {'path': self.local_path(remote), 'status': 'failed', 'error': str(e)}
+            except Exception as e:
+                results[remote] = {'path': self.local_path(remote), 'status': 'failed', 'error': str(e)}
+                if ftp is not None:
+                    ftp.close()
+                ftp = None
+        if ftp is not None:
+            try:
+                ftp.quit()
+            except Exception:
+                ftp.close()
+
+    def fetch(self, files=DEFAULT_FILES, parsers=None, force=False):
+        """
+        下載 files（遠端路徑）並回傳 {遠端路徑: 結果}，順序與 files 相同。
+        parsers 為 {遠端路徑: 產生解析器的函式}，解析器需有 feed(bytes) / close()，close() 的回傳值放在結果的 'parsed'
+        """
+        files = list(dict.fromkeys(files))
+        parsers = parsers or {}
+        pending = queue.Queue()
+        for remote in files:
+            pending.put(remote)
+        results = {}
+        workers = max(1, min(self.connections, len(files)))
+        with ThreadPoolExecutor(workers) as pool:
+            for future in [pool.submit(self._worker, pending, parsers, force, results) for _ in range(workers)]:
+                future.result()
+
+        for remote in files:
+            if results[remote]['status'] == 'downloaded' and results[remote]['stat'] is not None:
+                self.state[remote] = results[remote]['stat']
+        self.save_state()
+        return {remote: results[remote] for remote in files}
+
+    def save_state(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'files': self.state}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+
+def record_metrics(stage, results):
+    """把下載結果計入收集器指標的階段（工作執行緒不直接操作 RunMetrics）"""
+    for result in results.values():
+        stage.add_bytes(result.get('bytes', 0))
+        if result['status'] == 'failed':
+            stage.add_error(result['error'])
+        elif result.get('parsed') is not None:
+            stage.add_records(len(result['parsed']))
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='NASDAQ Trader FTP 多檔並行下載')
+    parser.add_argument('--host', default=FTP_HOST)
+    parser.add_argument('--port', type=int, default=21)
+    parser.add_argument('--dir', default=DOWNLOAD_DIR, help='下載目錄')
+    parser.add_argument('--files', nargs='*', default=list(DEFAULT_FILES), help='遠端路徑，如 Symboldirectory/options.txt')
+    parser.add_argument('--connections', type=int, default=DEFAULT_CONNECTIONS, help='並行連線數')
+    parser.add_argument('--force', action='store_true', help='忽略狀態檔，全部重新下載')
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, 'nasdaq_ftp_fetcher')
+
+    print("📡 NASDAQ Trader FTP 下載")
+    print("=" * 60)
+    metrics = RunMetrics('nasdaq_ftp_fetcher')
+    fetcher = NasdaqFTPFetcher(args.host, args.port, args.dir, args.connections)
+    started = time.perf_counter()
+    with metrics.stage('fetch', 'nasdaq_ftp') as stage:
+        results = fetcher.fetch(args.files, force=args.force)
+        record_metrics(stage, results)
+
+    icons = {'downloaded': '✅', 'unchanged': '⏭️', 'failed': '❌'}
+    for remote, result in results.items():
+        detail = result['error'] if result['status'] == 'failed' else f"{result['bytes'] / 1024:.0f} KB"
+        print(f"{icons[result['status']]} {remote}: {result['status']} ({detail})")
+    failed = sum(r['status'] == 'failed' for r in results.values())
+    print(f"⏱️ {len(results)} 個檔案，{args.connections} 條連線，耗時 {time.perf_counter() - started:.1f} 秒")
+
+    write_run_outputs(metrics, args)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
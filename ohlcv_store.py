@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OHLCV 資料存取
+讀取 data/cache 與 data/historical 下的 K 線檔案，轉成 NumPy 陣列；
+另提供 data/full-market 全市場清單的讀取
+"""
+
+import os
+import json
+import numpy as np
+
+from streaming_json import iter_collected_stocks
+from series_index import load_index, read_range
+
+DATA_DIR = 'data'
+FULL_MARKET_DIR = os.path.join(DATA_DIR, 'full-market')
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+PRICE_FIELDS = ('open', 'high', 'low', 'close')
+
+
+def series_path(market, symbol, interval='1d', store='cache', base_dir=DATA_DIR):
+    """取得 K 線檔案路徑，例如 data/cache/TW/2330/1d.json"""
+    return os.path.join(base_dir, store, market, symbol, f"{interval}.json")
+
+
+def list_symbols(market, interval='1d', store='cache', base_dir=DATA_DIR):
+    """列出某市場已有 K 線檔案的股票代號（依代號排序）"""
+    market_dir = os.path.join(base_dir, store, market)
+    if not os.path.isdir(market_dir):
+        return []
+
+    symbols = []
+    for symbol in sorted(os.listdir(market_dir)):
+        if os.path.isfile(os.path.join(market_dir, symbol, f"{interval}.json")):
+            symbols.append(symbol)
+    return symbols
+
+
+def candles_to_arrays(candles):
+    """
+    將 K 線 dict 列表轉成欄位陣列，time 為 datetime64[D]
+    缺值（null）的價格欄位轉成 NaN，不補 0，以免被當成真實價格算進報酬與均線；缺值的成交量為 0
+    """
+    arrays = {
+        'time': np.array([c['time'][:10] for c in candles], dtype='datetime64[D]')
+    }
+    for field in FIELDS:
+        missing = np.nan if field in PRICE_FIELDS else 0
+        arrays[field] = np.array([missing if c.get(field) is None else c[field] for c in candles], dtype=np.float64)
+    return arrays
+
+
+def load_payload(path):
+    """讀取 K 線檔案原始內容；test-data 的純陣列格式會包成同樣的結構"""
+    with open(path, 'r', encoding='utf-8') as f:
+        payload = json.load(f)
+    if isinstance(payload, list):
+        payload = {'data': payload}
+    return payload
+
+
+def load_series(market, symbol, interval='1d', store='cache', base_dir=DATA_DIR, path=None, start=None, end=None):
+    """
+    讀取單一股票的 K 線並轉成陣列；指定 start / end（YYYY-MM-DD）時透過日期索引只解析該區間
+
+    回傳 dict：market、symbol、interval、lastUpdated 以及 time/open/high/low/close/volume 陣列
+    """
+    path = path or series_path(market, symbol, interval, store, base_dir)
+    if start or end:
+        index = load_index(path)
+        payload = dict(index['meta'], data=read_range(path, start, end, index))
+    else:
+        payload = load_payload(path)
+
+    series = candles_to_arrays(payload.get('data', []))
+    series.update({
+        'market': payload.get('market', market),
+        'symbol': payload.get('symbol', symbol),
+        'interval': payload.get('interval', interval),
+        'lastUpdated': payload.get('lastUpdated'),
+    })
+    return series
+
+
+def iter_series(market, symbols=None, interval='1d', store='cache', base_dir=DATA_DIR):
+    """逐檔讀取 K 線，讀取失敗的檔案會略過"""
+    if symbols is None:
+        symbols = list_symbols(market, interval, store, base_dir)
+
+    for symbol in symbols:
+        try:
+            yield load_series(market, symbol, interval, store, base_dir)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ 讀取 {market}/{symbol} 失敗: {e}")
+
+
+def load_full_market_stocks(market, base_dir=FULL_MARKET_DIR, limit=None):
+    """
+    讀取 <市場>-stocks-latest.json 的 collectedStocks（可只取前 limit 筆）
+
+    以串流方式逐筆解析，不會載入整個檔案；檔案尾端若有多餘字元也不影響
+    """
+    path = os.path.join(base_dir, f"{market}-stocks-latest.json")
+    if not os.path.exists(path):
+        return []
+    return list(iter_collected_stocks(path, limit))
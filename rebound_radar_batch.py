@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+反轉雷達批次掃描
+以串流方式一次掃過資料庫內所有歷史 K 線，將「止跌回升」條件計算成整個市場的布林矩陣，
+並輸出依分數排序的候選名單 data/screeners/rebound-<市場>-latest.json，
+/api/rebound-radar 直接讀取此檔即可，不必在請求時逐檔計算。
+檔案記錄名單所用的交易日（session）與有效期限（validUntil：下一個交易日的資料更新完為止），
+API 超過期限才改走即時計算。
+"""
+
+import os
+import json
+import argparse
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+import technical_indicators as ti
+from ohlcv_store import iter_series, list_symbols, load_full_market_stocks, FULL_MARKET_DIR
+from sampling_profiler import add_profile_arguments, profile_from_args
+from refresh_scheduler import MARKETS
+
+OUTPUT_DIR = os.path.join('data', 'screeners')
+
+WINDOW = 300          # 每檔股票保留的最近 K 線數（需涵蓋 52 週高點與指標暖身）
+MIN_BARS = 40         # 少於此筆數的股票不列入掃描（即時計算視為「資料不足」）
+CHUNK_SIZE = 500      # 每批同時放進矩陣的股票數，控制記憶體上限
+MIN_SCORE = 0         # 即時計算不過濾分數，預先計算的名單也保留全部已掃描的股票
+STALE_GRACE = timedelta(hours=1)   # 下一個交易日的資料更新完後，留給批次重新產生名單的時間
+
+# 條件 -> (分數, 顯示文字)；同組條件只取分數最高者。
+# 規則與公式都與 app/api/rebound-radar/route.ts 的 reboundSignal（即時計算的備援路徑）相同，修改時兩邊要一起改
+RULES = [
+    ('rsi_low_rebound', 3, 'RSI 低位回升', 'rsi'),
+    ('rsi_rebound', 2, 'RSI 回升', 'rsi'),
+    ('macd_cross', 3, 'MACD 金叉', 'macd'),
+    ('macd_rising', 2, 'MACD 柱體轉強', 'macd'),
+    ('obv_rising', 2, 'OBV 走高', 'obv'),
+    ('reclaim_ema20', 2, '收復 20EMA', 'price'),
+    ('higher_low', 1, '出現 higher low', 'price'),
+    ('bullish_divergence', 3, 'RSI 底背離', 'divergence'),
+    ('volume_confirm', 2, '放量收紅', 'volume'),
+    ('deep_drawdown', 1, '自52週高點回檔逾20%', 'drawdown'),
+]
+
+
+def build_panel(series_chunk, window=WINDOW):
+    """
+    將一批股票的最近 window 根 K 線靠右對齊成 (時間 x 股票) 矩陣；較短的序列以第一筆資料補齊。
+    panel['start'] 記錄每檔第一根實際 K 線所在的列，指標從這一列起算，補齊的部分不影響結果
+    """
+    n = len(series_chunk)
+    panel = {field: np.empty((window, n)) for field in ('open', 'high', 'low', 'close', 'volume')}
+    start = np.zeros(n, dtype=np.int64)
+
+    for col, series in enumerate(series_chunk):
+        length = min(window, len(series['close']))
+        pad = window - length
+        start[col] = pad
+        for field, matrix in panel.items():
+            values = series[field][-length:]
+            matrix[pad:, col] = values
+            matrix[:pad, col] = 0.0 if field == 'volume' else values[0]
+    panel['start'] = start
+    return panel
+
+
+def _shift(matrix, periods=1):
+    out = np.full(matrix.shape, np.nan)
+    out[periods:] = matrix[:-periods]
+    return out
+
+
+def _ema(matrix, period, start):
+    """與 route.ts 的 ema 相同：以第一根實際 K 線為種子（technical_indicators.ema 以 SMA 為種子，數值不同）"""
+    k = 2.0 / (period + 1)
+    out = np.empty(matrix.shape)
+    out[0] = matrix[0]
+    late = int(start.max(initial=0))
+    for i in range(1, matrix.shape[0]):
+        out[i] = matrix[i] * k + out[i - 1] * (1 - k)
+        if i <= late:                                           # 仍在補齊區的股票保持原值，直到第一根實際 K 線
+            seeding = i <= start
+            out[i, seeding] = matrix[i, seeding]
+    return out
+
+
+def _rsi(close, start, period=14):
+    """
+    與 route.ts 的 rsi 相同：前 period 根為 50，平均跌幅為 0 時以 1e-9 代替；
+    種子之後沿用 route.ts 以漲跌「總和」起算的 Wilder 平滑（technical_indicators.rsi 以平均起算）
+    """
+    out = np.full(close.shape, 50.0)
+    gain = np.zeros(close.shape[1])
+    loss = np.zeros(close.shape[1])
+    warmup = int(start.max(initial=0)) + period                 # 此列之後所有股票都已進入平滑階段
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for i in range(1, close.shape[0]):
+            change = close[i] - close[i - 1]
+            up, down = np.maximum(change, 0), np.maximum(-change, 0)
+            if i > warmup:
+                gain = (gain * (period - 1) + up) / period
+                loss = (loss * (period - 1) + down) / period
+                out[i] = 100 - 100 / (1 + gain / np.where(loss != 0, loss, 1e-9))
+                continue
+            bar = i - start
+            seeding = (bar >= 1) & (bar <= period)
+            smoothing = bar > period
+            gain = np.where(seeding, gain + up, np.where(smoothing, (gain * (period - 1) + up) / period, gain))
+            loss = np.where(seeding, loss + down, np.where(smoothing, (loss * (period - 1) + down) / period, loss))
+            seed_rs = (gain / period) / (np.where(loss != 0, loss, 1e-9) / period)
+            rs = gain / np.where(loss != 0, loss, 1e-9)
+            out[i] = np.where(bar == period, 100 - 100 / (1 + seed_rs),
+                              np.where(smoothing, 100 - 100 / (1 + rs), 50.0))
+    return out
+
+
+def compute_conditions(panel):
+    """計算所有條件的布林矩陣，形狀皆為 (時間, 股票)"""
+    close, open_, volume, start = panel['close'], panel['open'], panel['volume'], panel['start']
+
+    rsi = _rsi(close, start, 14)
+    diff = _ema(close, 12, start) - _ema(close, 26, start)
+    signal = _ema(diff, 9, start)
+    hist = diff - signal
+    obv = ti.obv(close, volume)
+    ema20 = _ema(close, 20, start)
+    volz = ti.volume_zscore(volume, 20)
+    high52 = ti.rolling_max(close, 252)
+    low20 = ti.rolling_min(close, 20)
+    rsi_low20 = ti.rolling_min(rsi, 20)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rsi_up = (rsi > _shift(rsi)) & (_shift(rsi) > _shift(rsi, 2))
+
+        prior_low = np.fmin(_shift(close, 3), _shift(close, 4))
+        recent_low = np.fmin(_shift(close, 1), _shift(close, 2))
+
+        return {
+            'rsi_low_rebound': rsi_up & (rsi < 35),
+            'rsi_rebound': rsi_up & (rsi < 45),
+            'macd_cross': (_shift(diff) <= _shift(signal)) & (diff > signal),
+            'macd_rising': (hist > _shift(hist)) & (_shift(hist) > _shift(hist, 2)),
+            'obv_rising': (obv > _shift(obv)) & (_shift(obv) > _shift(obv, 2)),
+            'reclaim_ema20': close > ema20,
+            'higher_low': recent_low > prior_low,
+            # 價格貼近 20 日低點，但 RSI 已明顯高於同期低點
+            'bullish_divergence': (close <= low20 * 1.02) & (rsi > rsi_low20 + 5),
+            'volume_confirm': (volz > 1.5) & (close > open_),
+            'deep_drawdown': close / high52 - 1 <= -0.20,
+        }
+
+
+def score_latest(conditions):
+    """以最後一根 K 線的條件計算分數，回傳 (分數陣列, 每檔觸發的規則)"""
+    n = next(iter(conditions.values())).shape[1]
+    scores = np.zeros(n, dtype=np.int64)
+    taken = {}
+    reasons = [[] for _ in range(n)]
+
+    for name, points, label, group in RULES:
+        hit = conditions[name][-1]
+        used = taken.setdefault(group, np.zeros(n, dtype=bool))
+        hit = hit & ~used
+        used |= hit
+        scores += hit * points
+        for col in np.flatnonzero(hit):
+            reasons[col].append(label)
+    return scores, reasons
+
+
+def _iso(moment):
+    return moment.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def valid_until(market, session):
+    """
+    以 session（名單所用的最後一個交易日）計算的有效期限：下一個交易日收盤、K 線更新完（結算加上分散更新的時間窗）
+    再寬限 STALE_GRACE。週末與休市日之間名單仍然有效，不會每次請求都改走即時計算
+    """
+    market_session = MARKETS[market]
+    following = market_session.calendar.next_session(session)
+    return market_session.refresh_at(following) + timedelta(minutes=market_session.spread_minutes) + STALE_GRACE
+
+
+def load_stock_names(market, base_dir=FULL_MARKET_DIR):
+    """從全市場清單取得股票名稱"""
+    return {s['symbol']: s.get('name', s['symbol']) for s in load_full_market_stocks(market, base_dir)}
+
+
+class ReboundRadarBatch:
+    """全市場反轉雷達批次掃描器"""
+
+    def __init__(self, window=WINDOW, chunk_size=CHUNK_SIZE, min_score=MIN_SCORE, base_dir='data'):
+        self.window = window
+        self.chunk_size = chunk_size
+        self.min_score = min_score
+        self.base_dir = base_dir
+
+    def _scan_chunk(self, chunk, names):
+        panel = build_panel(chunk, self.window)
+        scores, reasons = score_latest(compute_conditions(panel))
+
+        rows = []
+        for col, series in enumerate(chunk):
+            if scores[col] < self.min_score:
+                continue
+            rows.append({
+                'symbol': series['symbol'],
+                'market': series['market'],
+                'name': names.get(series['symbol'], series['symbol']),
+                'score': int(scores[col]),
+                'reason': '、'.join(reasons[col]),
+                'rules': reasons[col],
+                'price': float(series['close'][-1]),
+                'date': str(series['time'][-1]),
+            })
+        return rows
+
+    def scan_market(self, market, symbols=None):
+        """串流掃描整個市場；每累積 chunk_size 檔就計算一次並釋放"""
+        names = load_stock_names(market, os.path.join(self.base_dir, 'full-market'))
+        if symbols is None:
+            symbols = list_symbols(market, base_dir=self.base_dir)
+
+        candidates, chunk, scanned, session = [], [], 0, None
+        for series in iter_series(market, symbols, base_dir=self.base_dir):
+            if len(series['close']) < MIN_BARS:
+                continue
+            chunk.append(series)
+            scanned += 1
+            session = max(session, str(series['time'][-1])) if session else str(series['time'][-1])
+            if len(chunk) >= self.chunk_size:
+                candidates.extend(self._scan_chunk(chunk, names))
+                chunk = []
+        if chunk:
+            candidates.extend(self._scan_chunk(chunk, names))
+
+        candidates.sort(key=lambda row: (-row['score'], row['symbol']))
+        return {
+            'generatedAt': _iso(datetime.now(timezone.utc)),
+            'market': market,
+            'session': session,
+            'validUntil': _iso(valid_until(market, session)) if session else None,
+            'scanned': scanned,
+            'total': len(candidates),
+            'data': candidates,
+        }
+
+    def save(self, result, output_dir=OUTPUT_DIR):
+        """寫入 rebound-<市場>-latest.json（先寫暫存檔再替換，避免 API 讀到半份檔案）"""
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"rebound-{result['market']}-latest.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='反轉雷達批次掃描')
+    parser.add_argument('--markets', nargs='*', default=['TW', 'US'])
+    parser.add_argument('--min-score', type=int, default=MIN_SCORE)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, 'rebound_radar_batch')
+
+    print("🎯 反轉雷達批次掃描")
+    print("=" * 60)
+
+    radar = ReboundRadarBatch(min_score=args.min_score)
+    for market in args.markets:
+        started = datetime.now()
+        result = radar.scan_market(market)
+        path = radar.save(result)
+        elapsed = (datetime.now() - started).total_seconds()
+        print(f"✅ {market}: 掃描 {result['scanned']} 檔，候選 {result['total']} 檔 ({elapsed:.1f}s)")
+        print(f"📁 已儲存: {path}")
+
+
+if __name__ == "__main__":
+    main()
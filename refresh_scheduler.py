@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+收盤後增量更新排程器
+常駐執行，依台股（Asia/Taipei 13:30 收盤）與美股（America/New_York 16:00 收盤）的交易日曆，
+在每個交易日收盤後規劃 data/cache/<市場>/<代號>/1d.json 的增量更新：
+
+    tier 0  熱門：關注清單、最新篩選結果、評分前段與常用代號，收盤後立即更新
+    tier 1  其餘已有 K 線檔案的股票，平均分散在 spread_minutes 的時間窗內
+    tier 2  （--include-uncached）全市場清單中尚無 K 線檔案者，排在最後
+
+所有請求經過同一個 token bucket 限速；假日與週末不排程。計畫寫入 job_queue 的持久化佇列
+（data/queue/jobs.sqlite），中途重啟會從未完成的任務繼續；已包含當日 K 線的檔案也會直接略過。
+每個交易日更新完後以 data_quality 檢查有變動的 K 線檔（--skip-validate 可略過）。
+
+用法：
+    python3 refresh_scheduler.py                     # 常駐執行
+    python3 refresh_scheduler.py --plan              # 只列出下一次的更新計畫
+    python3 refresh_scheduler.py --once --markets TW # 立即更新最近一個交易日後結束
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import namedtuple
+from datetime import datetime, date, time as dtime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import requests
+
+from ohlcv_store import DATA_DIR, series_path, list_symbols
+from data_quality import QualityValidator
+from trading_calendar import calendar
+from streaming_json import iter_collected_stocks
+from collector_metrics import RunMetrics, instrument_session, add_metrics_arguments, write_run_outputs
+from sampling_profiler import add_profile_arguments, profile_from_args
+from job_queue import JobQueue
+from series_index import write_series
+
+CHART_URL = 'https://query1.finance.yahoo.com/v8/finance/chart/{symbol}'
+WATCHLIST_PATH = os.path.join(DATA_DIR, 'watchlist.json')
+DEFAULT_RATE = 2.0            # 每秒請求數
+DEFAULT_BURST = 5
+OVERLAP_SESSIONS = 5          # 增量抓取時往前重疊的交易日數，用來修正前幾天的還原價
+INITIAL_RANGE = '2y'          # 尚無 K 線檔案時第一次抓取的範圍
+TOP_SCORES = 50               # 評分檔前幾名列為熱門
+QUEUE_NAME = 'refresh'
+CLAIM_BATCH = 20
+QUEUE_RETENTION_DAYS = 14     # 已完成任務保留天數
+
+TIER_HOT, TIER_CACHED, TIER_UNCACHED = 0, 1, 2
+TIER_NAMES = {TIER_HOT: 'hot', TIER_CACHED: 'cached', TIER_UNCACHED: 'uncached'}
+
+# 常用代號：即使不在關注清單也優先更新
+HOT_SYMBOLS = {
+    'TW': ['2330', '0050', '0056', '2317', '2454', '00878'],
+    'US': ['AAPL', 'NVDA', 'TSLA', 'MSFT', 'AMZN', 'SPY', 'QQQ'],
+}
+
+RefreshTask = namedtuple('RefreshTask', 'due tier market symbol session')
+
+
+class MarketSession:
+    """單一市場的收盤時間與交易日判斷（休市日與半日市來自 trading_calendar）"""
+
+    def __init__(self, market, tz, close, settle_minutes, spread_minutes, yahoo_suffix=''):
+        self.market = market
+        self.tz = ZoneInfo(tz)
+        self.close = close
+        self.calendar = calendar(market)
+        self.settle_minutes = settle_minutes      # 收盤後等資料源結算的時間
+        self.spread_minutes = spread_minutes      # 非熱門股分散更新的時間窗
+        self.yahoo_suffix = yahoo_suffix
+
+    def is_trading_day(self, day):
+        return self.calendar.is_session(day)
+
+    def close_at(self, day):
+        return datetime.combine(day, self.calendar.close_time(day) or self.close, tzinfo=self.tz)
+
+    def refresh_at(self, day):
+        """該交易日開始更新的時間（收盤 + 結算時間）"""
+        return self.close_at(day) + timedelta(minutes=self.settle_minutes)
+
+    def last_session(self, now):
+        """已到更新時間的最近一個交易日"""
+        day = self.calendar.last_session(now.astimezone(self.tz).date())
+        if self.refresh_at(day) > now:
+            day = self.calendar.shift(day, -1)
+        return day
+
+    def next_session(self, now):
+        """尚未到更新時間的下一個交易日"""
+        day = self.last_session(now)
+        return self.calendar.next_session(day)
+
+    def yahoo_symbol(self, symbol):
+        if self.yahoo_suffix and '.' not in symbol:
+            return f"{symbol}{self.yahoo_suffix}"
+        return symbol
+
+
+MARKETS = {
+    'TW': MarketSession('TW', 'Asia/Taipei', dtime(13, 30), settle_minutes=15, spread_minutes=180, yahoo_suffix='.TW'),
+    'US': MarketSession('US', 'America/New_York', dtime(16, 0), settle_minutes=20, spread_minutes=240),
+}
+
+
+class RateLimiter:
+    """token bucket 限速；rate 為每秒請求數，burst 為可累積的最大額度。可由多個執行緒共用"""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # 等待時持有鎖，讓其他執行緒依序排隊
+        with self._lock:
+            while True:
+                now = self._clock()
+                self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                self._sleep((1 - self.tokens) / self.rate)
+
+
+def load_watchlist(path=WATCHLIST_PATH):
+    """
+    讀取關注清單，格式與前端 WatchlistItem 相同：[{"symbol": "2330", "market": "TW", ...}]
+    檔案不存在時回傳空列表
+    """
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        items = json.load(f)
+    return [(item['market'], item['symbol']) for item in items if item.get('symbol') and item.get('market')]
+
+
+def _strip_suffix(symbol):
+    return symbol.split('.', 1)[0] if symbol.endswith(('.TW', '.TWO')) else symbol
+
+
+def hot_symbols(market, watchlist=(), base_dir=DATA_DIR, top_scores=TOP_SCORES):
+    """熱門代號（依優先順序、不重複）：關注清單 → 篩選結果 → 評分前段 → 常用代號"""
+    symbols = [symbol for m, symbol in watchlist if m == market]
+
+    # 篩選器（market-scanner.ts）寫在 results；反轉雷達（rebound_radar_batch.py）寫在 data，
+    # 且保留全部掃描過的股票（依分數排序），只取有分數的前段
+    for name, key, limit in ((f"{market}-latest.json", 'results', None),
+                             (f"rebound-{market}-latest.json", 'data', top_scores)):
+        path = os.path.join(base_dir, 'screeners', name)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                rows = [r for r in json.load(f).get(key, []) if limit is None or r.get('score', 1) > 0][:limit]
+            symbols.extend(_strip_suffix(r['symbol']) for r in rows)
+
+    path = os.path.join(base_dir, 'scores', f"{market}-scores-latest.json")
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            scores = json.load(f).get('scores', [])
+        scores.sort(key=lambda s: s.get('overallScore') or 0, reverse=True)
+        symbols.extend(s['symbol'] for s in scores[:top_scores])
+
+    symbols.extend(HOT_SYMBOLS.get(market, []))
+    return list(dict.fromkeys(symbols))
+
+
+def parse_chart(payload, tz):
+    """將 Yahoo chart API 回應轉成 K 線 dict 列表（time 為市場當地日期）"""
+    results = (payload.get('chart') or {}).get('result') or []
+    if not results:
+        return []
+    result = results[0]
+    timestamps = result.get('timestamp') or []
+    quote = (result.get('indicators', {}).get('quote') or [{}])[0]
+    adjclose = (result.get('indicators', {}).get('adjclose') or [{}])[0].get('adjclose')
+
+    candles = []
+    for i, ts in enumerate(timestamps):
+        values = [quote.get(field, [None] * len(timestamps))[i] for field in ('open', 'high', 'low', 'close')]
+        if any(v is None for v in values):
+            continue
+        candle = {
+            'time': datetime.fromtimestamp(ts, tz).date().isoformat(),
+            'open': values[0],
+            'high': values[1],
+            'low': values[2],
+            'close': values[3],
+            'volume': (quote.get('volume') or [0] * len(timestamps))[i] or 0,
+        }
+        if adjclose is not None and adjclose[i] is not None:
+            candle['adj_close'] = adjclose[i]
+        candles.append(candle)
+    return candles
+
+
+def merge_candles(existing, fresh):
+    """合併 K 線，同日期以新資料為準，依日期排序"""
+    by_time = {c['time']: c for c in existing}
+    by_time.update((c['time'], c) for c in fresh)
+    return [by_time[t] for t in sorted(by_time)]
+
+
+class DailyBarRefresher:
+    """抓取單一股票的日 K 並增量寫入 K 線檔案"""
+
+    def __init__(self, session=None, limiter=None, base_dir=DATA_DIR, store='cache', metrics=None):
+        self.session = session or requests.Session()
+        self.session.headers.setdefault('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
+        self.limiter = limiter or RateLimiter()
+        self.base_dir = base_dir
+        self.store = store
+        self.metrics = metrics
+        # hook 一律記到「目前」的 self.metrics：排程器每次執行（每個交易日）會換一份 RunMetrics
+        instrument_session(self.session, self)
+
+    @property
+    def current(self):
+        """目前執行中的指標階段（instrument_session 的 hook 由此取得）"""
+        return self.metrics.current if self.metrics is not None else None
+
+    def load(self, market, symbol):
+        path = series_path(market, symbol, store=self.store, base_dir=self.base_dir)
+        if not os.path.exists(path):
+            return path, None
+        with open(path, 'r', encoding='utf-8') as f:
+            return path, json.load(f)
+
+    def fetch(self, market_session, symbol, start=None, end=None):
+        """抓取 [start, end] 的日 K；start 為 None 時抓 INITIAL_RANGE"""
+        params = {'interval': '1d', 'includeAdjustedClose': 'true'}
+        if start is None:
+            params['range'] = INITIAL_RANGE
+        else:
+            params['period1'] = int(datetime.combine(start, dtime(0), tzinfo=market_session.tz).timestamp())
+            params['period2'] = int(datetime.combine(end + timedelta(days=1), dtime(0), tzinfo=market_session.tz).timestamp())
+        self.limiter.acquire()
+        url = CHART_URL.format(symbol=market_session.yahoo_symbol(symbol))
+        response = self.session.get(url, params=params, timeout=15)
+        response.raise_for_status()
+        return parse_chart(response.json(), market_session.tz)
+
+    def refresh(self, market_session, symbol, session_day):
+        """
+        更新到 session_day 為止；回傳 'fresh'（已是最新，未發出請求）、'updated' 或 'empty'。
+        只抓最後一根 K 線之後缺少的交易日（加上 OVERLAP_SESSIONS 個重疊日）；中間只隔了假日時不發請求
+        """
+        path, payload = self.load(market_session.market, symbol)
+        candles = payload.get('data', []) if payload else []
+        start = end = None
+        if candles:
+            span = market_session.calendar.fetch_range([candles[-1]['time'][:10]], session_day, OVERLAP_SESSIONS)
+            if span is None:
+                return 'fresh'
+            start, end = span
+
+        fresh = self.fetch(market_session, symbol, start, end)
+        if not fresh:
+            return 'empty'
+
+        payload = payload or {'market': market_session.market, 'symbol': symbol, 'interval': '1d'}
+        payload['data'] = merge_candles(candles, fresh)
+        payload['lastUpdated'] = datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+        write_series(path, payload)
+        return 'updated'
+
+
+class RefreshScheduler:
+    """規劃並執行各市場收盤後的更新"""
+
+    def __init__(self, markets=('TW', 'US'), refresher=None, watchlist=(), base_dir=DATA_DIR,
+                 include_uncached=False, rate=DEFAULT_RATE, clock=None, sleep=time.sleep, queue=None,
+                 validator=None):
+        self.markets = [MARKETS[m] for m in markets]
+        self.refresher = refresher or DailyBarRefresher(base_dir=base_dir)
+        self.watchlist = list(watchlist)
+        self.base_dir = base_dir
+        self.include_uncached = include_uncached
+        self.rate = rate
+        self.clock = clock or (lambda: datetime.now(timezone.utc))
+        self.sleep = sleep
+        self.queue = queue or JobQueue(os.path.join(base_dir, 'queue', 'jobs.sqlite'),
+                                       clock=lambda: self.clock().timestamp())
+        self.validator = validator
+
+    def universe(self, market):
+        """依 tier 分組的代號：{tier: [symbol, ...]}"""
+        cached = list_symbols(market, store=self.refresher.store, base_dir=self.base_dir)
+        hot = hot_symbols(market, self.watchlist, self.base_dir)
+        hot_set = set(hot)
+        tiers = {
+            TIER_HOT: hot,
+            TIER_CACHED: [s for s in cached if s not in hot_set],
+            TIER_UNCACHED: [],
+        }
+        if self.include_uncached:
+            path = os.path.join(self.base_dir, 'full-market', f"{market}-stocks-latest.json")
+            if os.path.exists(path):
+                known = hot_set | set(cached)
+                tiers[TIER_UNCACHED] = [s['symbol'] for s in iter_collected_stocks(path) if s['symbol'] not in known]
+        return tiers
+
+    def plan(self, market_session, session_day, start=None):
+        """
+        產生某交易日的更新計畫：熱門股從 start 起依限速連續排入；
+        其餘股票平均分散到熱門股結束後的 spread_minutes 時間窗
+        """
+        start = start or market_session.refresh_at(session_day)
+        tiers = self.universe(market_session.market)
+        tasks = []
+        for i, symbol in enumerate(tiers[TIER_HOT]):
+            tasks.append(RefreshTask(start + timedelta(seconds=i / self.rate), TIER_HOT,
+                                     market_session.market, symbol, session_day))
+
+        rest = [(TIER_CACHED, s) for s in tiers[TIER_CACHED]] + [(TIER_UNCACHED, s) for s in tiers[TIER_UNCACHED]]
+        if rest:
+            spread_start = start + timedelta(seconds=len(tiers[TIER_HOT]) / self.rate)
+            window = max(market_session.spread_minutes * 60, len(rest) / self.rate)
+            step = window / len(rest)
+            for i, (tier, symbol) in enumerate(rest):
+                tasks.append(RefreshTask(spread_start + timedelta(seconds=i * step), tier,
+                                         market_session.market, symbol, session_day))
+        return tasks
+
+    def enqueue(self, tasks):
+        """將計畫寫入持久化佇列；已存在（含已完成）的任務不會重複加入"""
+        return self.queue.enqueue(QUEUE_NAME, [
+            (f"{t.market}:{t.session.isoformat()}:{t.symbol}",
+             {'market': t.market, 'symbol': t.symbol, 'session': t.session.isoformat(), 'tier': t.tier},
+             t.tier, t.due.timestamp())
+            for t in tasks])
+
+    def run_tasks(self, tasks, metrics=None):
+        """
+        將任務加入佇列後依 due 時間成批領取執行，直到佇列清空；回傳各狀態的計數。
+        中途中斷後重新執行，已完成的任務不會再跑
+        """
+        metrics = metrics or RunMetrics('refresh_scheduler')
+        self.refresher.metrics = metrics
+        self.enqueue(tasks)
+        counts = {}
+        while True:
+            claimed = self.queue.claim(QUEUE_NAME, limit=CLAIM_BATCH)
+            if not claimed:
+                due = self.queue.next_due(QUEUE_NAME)
+                if due is None:
+                    return counts
+                self.sleep(max(due - self.clock().timestamp(), 0.1))
+                continue
+
+            for task in claimed:
+                payload = task.payload
+                market_session = MARKETS[payload['market']]
+                source = f"{payload['market']}:{TIER_NAMES[payload['tier']]}"
+                try:
+                    with metrics.stage('refresh', source, accumulate=True) as stage:
+                        status = self.refresher.refresh(market_session, payload['symbol'],
+                                                        date.fromisoformat(payload['session']))
+                        if status == 'updated':
+                            stage.add_records(1)
+                    self.queue.complete(QUEUE_NAME, [task.key])
+                except Exception as e:
+                    status = self.queue.fail(QUEUE_NAME, task.key, e)
+                    if status == 'failed':
+                        print(f"❌ {payload['market']} {payload['symbol']} 更新失敗: {e}")
+                    else:
+                        status = 'retry'
+                counts[status] = counts.get(status, 0) + 1
+
+    def validate(self, markets, metrics=None):
+        """更新後檢查資料品質（只重新檢查有變動的檔案）；回傳摘要，未設定 validator 時回傳 None"""
+        if self.validator is None:
+            return None
+        metrics = metrics or RunMetrics('refresh_scheduler')
+        with metrics.stage('validate', ','.join(markets)) as stage:
+            report = self.validator.run(tuple(markets))
+            stage.add_records(report['checked'])
+        summary = report['summary']
+        if summary['quarantine']:
+            print(f"⚠️ 資料品質: {summary['quarantine']} 檔列入隔離清單（{self.validator.output_dir}）")
+        return summary
+
+    def run_once(self, metrics=None):
+        """立即更新每個市場最近一個交易日"""
+        metrics = metrics or RunMetrics('refresh_scheduler')
+        now = self.clock()
+        tasks = []
+        for market_session in self.markets:
+            tasks.extend(self.plan(market_session, market_session.last_session(now), start=now))
+        counts = self.run_tasks(tasks, metrics)
+        self.validate([m.market for m in self.markets], metrics)
+        return counts
+
+    def next_run(self):
+        """下一個要執行的 (市場, 交易日)"""
+        now = self.clock()
+        candidates = [(m.refresh_at(m.next_session(now)), m, m.next_session(now)) for m in self.markets]
+        return min(candidates, key=lambda c: c[0])[1:]
+
+    def run_forever(self, on_session=None):
+        """
+        常駐迴圈：等到下一個市場的更新時間，執行該交易日的計畫。
+        啟動時若佇列中還有上次未完成的任務，先把它們做完
+        """
+        if self.queue.next_due(QUEUE_NAME) is not None:
+            print(f"🔄 繼續上次未完成的任務: {self.queue.stats(QUEUE_NAME)}")
+            metrics = RunMetrics('refresh_scheduler_resume')
+            self.run_tasks([], metrics)
+            if on_session:
+                on_session(metrics)
+
+        while True:
+            market_session, session_day = self.next_run()
+            refresh_at = market_session.refresh_at(session_day)
+            print(f"⏰ 下一次更新: {market_session.market} {session_day}（{refresh_at.isoformat()}）")
+            wait = (refresh_at - self.clock()).total_seconds()
+            if wait > 0:
+                self.sleep(wait)
+            metrics = RunMetrics(f"refresh_scheduler_{market_session.market}")
+            counts = self.run_tasks(self.plan(market_session, session_day), metrics)
+            print(f"✅ {market_session.market} {session_day} 更新完成: {counts}")
+            self.validate([market_session.market], metrics)
+            self.queue.prune(QUEUE_NAME, QUEUE_RETENTION_DAYS * 86400)
+            if on_session:
+                on_session(metrics)
+
+
+def print_plan(tasks):
+    by_tier = {}
+    for task in tasks:
+        by_tier.setdefault((task.market, task.tier), []).append(task)
+    for (market, tier), items in sorted(by_tier.items()):
+        print(f"  {market} {TIER_NAMES[tier]:<9}{len(items):>6} 檔  "
+              f"{items[0].due.astimezone(MARKETS[market].tz):%m-%d %H:%M:%S} → "
+              f"{items[-1].due.astimezone(MARKETS[market].tz):%H:%M:%S}  "
+              f"例: {', '.join(t.symbol for t in items[:5])}")
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='收盤後增量更新排程器')
+    parser.add_argument('--markets', nargs='*', default=list(MARKETS), choices=list(MARKETS))
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='每秒請求數上限')
+    parser.add_argument('--watchlist', default=WATCHLIST_PATH, help='關注清單 JSON（前端 WatchlistItem 格式）')
+    parser.add_argument('--include-uncached', action='store_true', help='也更新全市場清單中尚無 K 線檔案的股票')
+    parser.add_argument('--once', action='store_true', help='立即更新最近一個交易日後結束')
+    parser.add_argument('--plan', action='store_true', help='只列出下一次的更新計畫')
+    parser.add_argument('--skip-validate', action='store_true', help='更新後不執行資料品質檢查')
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, 'refresh_scheduler')
+
+    limiter = RateLimiter(args.rate)
+    scheduler = RefreshScheduler(args.markets, DailyBarRefresher(limiter=limiter), load_watchlist(args.watchlist),
+                                 include_uncached=args.include_uncached, rate=args.rate,
+                                 validator=None if args.skip_validate else QualityValidator())
+
+    print("🎯 收盤後增量更新排程器")
+    print("=" * 60)
+
+    if args.plan:
+        market_session, session_day = scheduler.next_run()
+        print(f"📋 {market_session.market} {session_day} 的更新計畫:")
+        print_plan(scheduler.plan(market_session, session_day))
+        return
+
+    if args.once:
+        metrics = RunMetrics('refresh_scheduler')
+        counts = scheduler.run_once(metrics)
+        print(f"✅ 更新完成: {counts}")
+        write_run_outputs(metrics, args)
+        sys.exit(1 if counts.get('failed') else 0)
+
+    try:
+        scheduler.run_forever(on_session=lambda metrics: write_run_outputs(metrics, args))
+    except KeyboardInterrupt:
+        print("\n👋 排程器已停止")
+
+
+if __name__ == "__main__":
+    main()
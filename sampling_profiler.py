@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+內建取樣式效能分析
+以背景執行緒定期讀取 sys._current_frames() 取樣呼叫堆疊（不使用 sys.setprofile，額外負擔低），
+結束時輸出：
+
+    stacks.collapsed    折疊堆疊格式，可直接交給 flamegraph.pl / speedscope / inferno
+    summary.txt         最常出現的函式（self 與含子呼叫的 total 取樣數）
+    memory.txt          tracemalloc 依程式行統計的記憶體配置前幾名
+    memory.tracemalloc  tracemalloc 快照，可用 tracemalloc.Snapshot.load() 進一步分析
+
+收集器與批次程式加上 --profile 即可啟用，輸出在 data/profiles/<工作>-<時間>/。
+也可以單獨使用：
+    python3 sampling_profiler.py rebound_radar_batch.py --markets TW
+"""
+
+import os
+import sys
+import time
+import atexit
+import runpy
+import argparse
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+PROFILE_DIR = os.path.join('data', 'profiles')
+DEFAULT_INTERVAL = 0.005   # 取樣間隔（秒）
+DEFAULT_TOP = 30
+TRACEMALLOC_FRAMES = 1
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame):
+    """將 frame 往上走到最外層，回傳由外而內、以 ; 串接的堆疊字串"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class SamplingProfiler:
+    """取樣式分析器；預設只取樣啟動它的執行緒，all_threads=True 時取樣所有執行緒"""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, all_threads=False, trace_memory=True):
+        self.interval = interval
+        self.all_threads = all_threads
+        self.trace_memory = trace_memory
+        self.stacks = Counter()
+        self.samples = 0
+        self.memory_snapshot = None
+        self.memory_peak = None
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+        self.duration = 0.0
+
+    def start(self):
+        self._target = threading.get_ident()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return self
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.duration = time.perf_counter() - self._started
+        if self.trace_memory and tracemalloc.is_tracing():
+            self.memory_snapshot = tracemalloc.take_snapshot()
+            self.memory_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.all_threads:
+                targets = [(ident, frame) for ident, frame in frames.items() if ident != own]
+            else:
+                targets = [(self._target, frames[self._target])] if self._target in frames else []
+            for ident, frame in targets:
+                stack = collapse_stack(frame)
+                if self.all_threads:
+                    if ident not in names:
+                        names = {t.ident: t.name for t in threading.enumerate()}
+                    stack = f"{names.get(ident, ident)};{stack}"
+                self.stacks[stack] += 1
+            self.samples += 1
+
+    # ---- 統計 ----
+
+    def top_functions(self, n=DEFAULT_TOP):
+        """
+        回傳 [(函式, self 取樣數, total 取樣數)]，依 total 排序
+        self 為堆疊最內層的次數；total 為出現在堆疊中的次數（同一堆疊只算一次）
+        """
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+        ranked = sorted(total, key=lambda label: (-total[label], -own[label]))
+        return [(label, own[label], total[label]) for label in ranked[:n]]
+
+    def top_self(self, n=DEFAULT_TOP):
+        """依 self 取樣數排序的熱點（實際花時間的函式）"""
+        own = Counter()
+        for stack, count in self.stacks.items():
+            own[stack.rsplit(';', 1)[-1]] += count
+        return own.most_common(n)
+
+    # ---- 輸出 ----
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def summary(self, n=DEFAULT_TOP):
+        total_stacks = sum(self.stacks.values()) or 1
+        lines = [
+            f"取樣時間 {self.duration:.2f}s，間隔 {self.interval * 1000:.1f}ms，"
+            f"取樣 {self.samples} 次，堆疊 {sum(self.stacks.values())} 筆",
+            '',
+            f"依 self 取樣數（前 {n} 名）",
+            f"{'self':>8}{'%':>8}  函式",
+        ]
+        for label, count in self.top_self(n):
+            lines.append(f"{count:>8}{count / total_stacks:>8.1%}  {label}")
+        lines += ['', f"依 total 取樣數（前 {n} 名）", f"{'total':>8}{'%':>8}{'self':>8}  函式"]
+        for label, own, total in self.top_functions(n):
+            lines.append(f"{total:>8}{total / total_stacks:>8.1%}{own:>8}  {label}")
+        return '\n'.join(lines) + '\n'
+
+    def memory_summary(self, n=DEFAULT_TOP):
+        if self.memory_snapshot is None:
+            return '未啟用 tracemalloc\n'
+        snapshot = self.memory_snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        stats = snapshot.statistics('lineno')
+        total = sum(stat.size for stat in stats)
+        lines = [f"結束時仍配置的記憶體 {total / 1048576:.2f} MB（前 {n} 名，依程式行）"]
+        if self.memory_peak is not None:
+            lines.append(f"執行期間配置高峰 {self.memory_peak / 1048576:.2f} MB")
+        lines.append('')
+        for stat in stats[:n]:
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size / 1024:>12.1f} KB {stat.count:>9} 個  {frame.filename}:{frame.lineno}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, output_dir, top=DEFAULT_TOP):
+        """寫出所有結果檔，回傳輸出目錄"""
+        os.makedirs(output_dir, exist_ok=True)
+        outputs = {
+            'stacks.collapsed': self.collapsed(),
+            'summary.txt': self.summary(top),
+            'memory.txt': self.memory_summary(top),
+        }
+        for name, text in outputs.items():
+            with open(os.path.join(output_dir, name), 'w', encoding='utf-8') as f:
+                f.write(text)
+        if self.memory_snapshot is not None:
+            self.memory_snapshot.dump(os.path.join(output_dir, 'memory.tracemalloc'))
+        return output_dir
+
+
+def add_profile_arguments(parser):
+    """為主程式加上 --profile 相關參數"""
+    group = parser.add_argument_group('效能分析')
+    group.add_argument('--profile', action='store_true', help='以取樣式分析器執行，結果寫到 --profile-dir')
+    group.add_argument('--profile-interval', type=float, default=DEFAULT_INTERVAL, help='取樣間隔（秒）')
+    group.add_argument('--profile-dir', default=PROFILE_DIR)
+    group.add_argument('--profile-top', type=int, default=DEFAULT_TOP, help='摘要列出的函式數')
+    group.add_argument('--profile-all-threads', action='store_true', help='取樣所有執行緒')
+    group.add_argument('--profile-no-memory', action='store_true', help='不啟用 tracemalloc（記憶體追蹤會讓配置密集的程式慢數倍）')
+
+
+def profile_from_args(args, job):
+    """
+    若指定 --profile 則啟動分析器並在程式結束時（含 sys.exit 與例外）寫出結果；
+    未指定時回傳 None
+    """
+    if not getattr(args, 'profile', False):
+        return None
+
+    profiler = SamplingProfiler(args.profile_interval, args.profile_all_threads,
+                                trace_memory=not args.profile_no_memory)
+    output_dir = os.path.join(args.profile_dir, f"{job}-{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+
+    def finish():
+        profiler.stop().write(output_dir, args.profile_top)
+        print(f"\n🔬 效能分析結果: {output_dir}")
+        print('\n'.join(profiler.summary(10).splitlines()[:15]))
+
+    atexit.register(finish)
+    print(f"🔬 效能分析已啟用（間隔 {args.profile_interval * 1000:.1f}ms）")
+    return profiler.start()
+
+
+def main():
+    """主程式：以分析器執行任意 Python 腳本"""
+    parser = argparse.ArgumentParser(description='取樣式效能分析', usage='%(prog)s [選項] script.py [參數 ...]')
+    add_profile_arguments(parser)
+    parser.add_argument('script')
+    parser.add_argument('script_args', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    args.profile = True
+
+    sys.argv = [args.script] + args.script_args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    profile_from_args(args, os.path.splitext(os.path.basename(args.script))[0])
+    runpy.run_path(args.script, run_name='__main__')
+
+
+if __name__ == "__main__":
+    main()
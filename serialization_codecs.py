@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+收集器輸出的序列化格式
+收集器的 save_* 方法都透過這裡寫檔，可依輸出選擇格式：
+
+    json     標準函式庫 JSON Lines（預設，與原本的 .jsonl 完全相容）
+    orjson   同樣是 JSON Lines，改用 orjson 編解碼（未安裝時退回標準函式庫）；與 json 可互相讀取，
+             但位元組不同（orjson 在 , 與 : 後不加空白）
+    msgpack  MessagePack 記錄串流 (.msgpack)
+    arrow    Arrow IPC 檔案 (.arrow)，可直接給 pandas / DuckDB / Polars 讀取
+
+讀取一律使用 read_records()，依副檔名（以及 Arrow 檔頭）判斷格式；
+路徑也可以是 snapshot_archive 的封存路徑（data/archive/stocks_<市場>.zpack#<時間>）。
+msgpack 與 pyarrow 為選用套件，只有選用該格式時才需要安裝。
+
+用法：
+    python3 serialization_codecs.py                # 以現有的股票清單檔做基準測試
+    python3 serialization_codecs.py data/*.jsonl --repeat 5
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+
+from snapshot_archive import is_reference, read_reference, write_reference
+
+try:
+    import orjson
+except ImportError:  # 沒有 orjson 時 orjson 格式退回標準函式庫
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:
+    pa = None
+
+DEFAULT_CODEC = 'json'
+ARROW_MAGIC = b'ARROW1'
+
+
+class JSONLinesCodec:
+    """標準函式庫 JSON Lines，一行一筆記錄，保留中文不轉義"""
+
+    name = 'json'
+    extension = '.jsonl'
+    requires = None
+
+    def available(self):
+        return True
+
+    def encode(self, records):
+        return ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records).encode('utf-8')
+
+    def decode(self, data):
+        text = data.decode('utf-8')
+        if text.lstrip().startswith('['):
+            return json.loads(text)
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+class OrjsonLinesCodec(JSONLinesCodec):
+    """
+    orjson 版 JSON Lines，快得多；與 json 格式解碼相容（兩者寫的檔案可互相讀取），
+    但輸出位元組不同：orjson 在分隔符號後不加空白，比對檔案內容時要先解碼
+    """
+
+    name = 'orjson'
+    requires = 'orjson'
+
+    def encode(self, records):
+        if orjson is None:
+            return super().encode(records)
+        return b''.join(orjson.dumps(r, option=orjson.OPT_APPEND_NEWLINE) for r in records)
+
+    def decode(self, data):
+        if orjson is None or data.lstrip().startswith(b'['):
+            return super().decode(data)
+        return [orjson.loads(line) for line in data.splitlines() if line.strip()]
+
+
+class MessagePackCodec:
+    """MessagePack 記錄串流：逐筆 pack 後串接，讀取時以 Unpacker 依序解開"""
+
+    name = 'msgpack'
+    extension = '.msgpack'
+    requires = 'msgpack'
+
+    def available(self):
+        return msgpack is not None
+
+    def encode(self, records):
+        packer = msgpack.Packer(use_bin_type=True)
+        return b''.join(packer.pack(r) for r in records)
+
+    def decode(self, data):
+        unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+        unpacker.feed(data)
+        return list(unpacker)
+
+
+class ArrowIPCCodec:
+    """Arrow IPC 檔案格式（欄式儲存）；欄位取所有記錄 key 的聯集，缺值為 null"""
+
+    name = 'arrow'
+    extension = '.arrow'
+    requires = 'pyarrow'
+
+    def available(self):
+        return pa is not None
+
+    def encode(self, records):
+        columns = {}
+        for record in records:
+            for key in record:
+                columns.setdefault(key, None)
+        table = pa.table({key: [r.get(key) for r in records] for key in columns})
+        sink = pa.BufferOutputStream()
+        with pa_ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    def decode(self, data):
+        return pa_ipc.open_file(pa.py_buffer(data)).read_all().to_pylist()
+
+
+CODECS = {codec.name: codec for codec in (JSONLinesCodec(), OrjsonLinesCodec(), MessagePackCodec(), ArrowIPCCodec())}
+
+
+def get_codec(name=None):
+    """取得格式；未安裝所需套件時丟出 ImportError"""
+    name = name or DEFAULT_CODEC
+    if name not in CODECS:
+        raise ValueError(f"不支援的格式: {name}（可用: {', '.join(CODECS)}）")
+    codec = CODECS[name]
+    if not codec.available():
+        raise ImportError(f"{name} 格式需要安裝 {codec.requires}")
+    return codec
+
+
+def available_codecs():
+    return [name for name, codec in CODECS.items() if codec.available()]
+
+
+def codec_for_path(path, data=None):
+    """依副檔名（或 Arrow 檔頭）判斷檔案格式；.jsonl / .json 以 orjson 讀取（若可用）"""
+    if data is not None and data[:len(ARROW_MAGIC)] == ARROW_MAGIC:
+        return get_codec('arrow')
+    extension = os.path.splitext(path)[1].lower()
+    for codec in CODECS.values():
+        if codec.extension == extension and codec.name != 'json':
+            return get_codec(codec.name)
+    return CODECS['orjson']
+
+
+def with_extension(path, codec):
+    """將檔名的副檔名換成格式對應的副檔名"""
+    return os.path.splitext(path)[0] + get_codec(codec).extension
+
+
+def write_records(records, path, codec=None):
+    """
+    以指定格式寫入記錄列表（先寫暫存檔再替換），回傳實際寫入的路徑
+    codec 未指定時依副檔名判斷，無法判斷則使用預設的 JSON Lines。
+    path 為快照封存路徑（stocks_<市場>.zpack#<時間>）時改為壓縮後附加到封存檔
+    """
+    records = list(records)
+    if is_reference(path):
+        codec = get_codec(codec)
+        return write_reference(path, codec.encode(records), codec.extension, len(records))
+
+    codec = get_codec(codec) if codec else codec_for_path(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(codec.encode(records))
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_records(path):
+    """讀取任一格式寫出的記錄檔（含快照封存中的快照），回傳 dict 列表"""
+    if is_reference(path):
+        data, extension = read_reference(path)
+        return codec_for_path(extension, data).decode(data)
+    with open(path, 'rb') as f:
+        data = f.read()
+    return codec_for_path(path, data).decode(data)
+
+
+def benchmark(records, codecs=None, repeat=3):
+    """測量各格式的編碼、解碼時間（取最佳值）與輸出大小"""
+    results = []
+    for name in codecs or available_codecs():
+        codec = get_codec(name)
+        encode_times, decode_times = [], []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            data = codec.encode(records)
+            encode_times.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            decoded = codec.decode(data)
+            decode_times.append(time.perf_counter() - started)
+        results.append({
+            'codec': name,
+            'records': len(decoded),
+            'bytes': len(data),
+            'encodeMs': round(min(encode_times) * 1000, 2),
+            'decodeMs': round(min(decode_times) * 1000, 2),
+        })
+    return results
+
+
+def default_benchmark_files():
+    """預設測試檔：最新的股票清單快照、ETF 清單與全市場清單"""
+    files = []
+    for pattern in ('stocks_data_*.jsonl', os.path.join('data', 'tw_etfs_complete_*.jsonl')):
+        matches = sorted(glob.glob(pattern))
+        if matches:
+            files.append(matches[-1])
+    files.extend(sorted(glob.glob(os.path.join('data', 'full-market', '*-stocks-latest.json'))))
+    return files
+
+
+def load_benchmark_records(path):
+    """全市場清單取 collectedStocks，其他檔案以 read_records 讀取"""
+    if path.endswith('-stocks-latest.json'):
+        from streaming_json import iter_collected_stocks
+        return list(iter_collected_stocks(path))
+    return read_records(path)
+
+
+def main():
+    """主程式：以實際的股票清單檔比較各格式"""
+    parser = argparse.ArgumentParser(description='收集器輸出格式基準測試')
+    parser.add_argument('files', nargs='*', help='記錄檔（預設為現有的股票清單檔）')
+    parser.add_argument('--codecs', nargs='*', help=f"要比較的格式（預設為已安裝者: {', '.join(available_codecs())}）")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='將結果寫成 JSON')
+    args = parser.parse_args()
+
+    files = args.files or default_benchmark_files()
+    if not files:
+        print("❌ 找不到可測試的檔案")
+        sys.exit(1)
+
+    print("🎯 序列化格式基準測試")
+    print("=" * 72)
+
+    report = {}
+    for path in files:
+        records = load_benchmark_records(path)
+        print(f"\n📊 {path}（{len(records)} 筆）")
+        print(f"  {'格式':<10}{'大小(KB)':>12}{'編碼(ms)':>12}{'解碼(ms)':>12}")
+        report[path] = benchmark(records, args.codecs, args.repeat)
+        for row in report[path]:
+            print(f"  {row['codec']:<10}{row['bytes'] / 1024:>12.1f}{row['encodeMs']:>12.2f}{row['decodeMs']:>12.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n📁 已儲存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
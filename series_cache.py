@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+行程內的 K 線與技術指標快取
+常駐服務與批次程式反覆讀取同一批熱門股（2330、0050、AAPL、NVDA、TSLA…）時，
+解碼後的陣列直接留在記憶體：
+
+- 以位元組預算限制總大小（numpy 陣列的 nbytes），而不是筆數
+- W-TinyLFU 淘汰策略：新項目先進小的 LRU 視窗，要進入主區時與主區最舊的項目比較
+  Count-Min Sketch 估計的近期存取頻率，頻率較高者留下。一次性的全市場掃描因此不會把熱門股擠出去
+- 檔案改寫（lastUpdated 更新後 mtime / 大小必然改變）時自動失效重新載入
+- 命中、未命中、淘汰與拒絕次數的統計
+
+用法：
+    series = cached_series('TW', '2330')          # 與 ohlcv_store.load_series 相同的回傳格式
+    rsi = cached_indicators('TW', '2330')['rsi']
+    print(default_cache().stats())
+"""
+
+import os
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ohlcv_store import DATA_DIR, series_path, load_series
+
+DEFAULT_BUDGET = int(os.environ.get('SERIES_CACHE_MB', '256')) * 1024 * 1024
+WINDOW_RATIO = 0.01          # LRU 視窗佔總預算的比例
+PROTECTED_RATIO = 0.8        # 主區中 protected 段的比例
+AVERAGE_ENTRY_BYTES = 200 * 1024   # 用來決定 sketch 大小的平均項目大小估計
+ENTRY_OVERHEAD = 256         # 每個項目在陣列之外的估計額外成本
+# 指標快取檔以 D / W / M 命名
+INDICATOR_INTERVALS = {'1d': 'D', '1w': 'W', '1M': 'M'}
+
+
+class FrequencySketch:
+    """
+    Count-Min Sketch（4 列、每格上限 15）；累計次數達 sample_size 時所有計數減半，
+    讓頻率反映近期的存取而不是歷史總數
+    """
+
+    DEPTH = 4
+    SEEDS = (0x9E3779B9, 0x85EBCA6B, 0xC2B2AE35, 0x27D4EB2F)
+
+    MAX_WIDTH = 1 << 20
+    HALVE = bytes(value >> 1 for value in range(256))
+
+    def __init__(self, width):
+        self.width = 16
+        while self.width < min(width, self.MAX_WIDTH):
+            self.width <<= 1
+        self.mask = self.width - 1
+        self.table = [bytearray(self.width) for _ in range(self.DEPTH)]
+        self.sample_size = 10 * self.width
+        self.additions = 0
+
+    def _indexes(self, key):
+        h = hash(key)
+        return [((h ^ seed) * 0x01000193 >> 7) & self.mask for seed in self.SEEDS]
+
+    def increment(self, key):
+        for row, index in zip(self.table, self._indexes(key)):
+            if row[index] < 15:
+                row[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._age()
+
+    def frequency(self, key):
+        return min(row[index] for row, index in zip(self.table, self._indexes(key)))
+
+    def _age(self):
+        for row in self.table:
+            row[:] = row.translate(self.HALVE)
+        self.additions //= 2
+
+
+class _Entry:
+    __slots__ = ('value', 'weight', 'version')
+
+    def __init__(self, value, weight, version):
+        self.value = value
+        self.weight = weight
+        self.version = version
+
+
+def estimate_size(value):
+    """估計值佔用的位元組：numpy 陣列以 nbytes 計，dict / list 遞迴加總"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return ENTRY_OVERHEAD + sum(estimate_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return ENTRY_OVERHEAD + sum(estimate_size(v) for v in value)
+    return 64
+
+
+class SeriesCache:
+    """位元組預算的 W-TinyLFU 快取；可在多執行緒間共用"""
+
+    def __init__(self, max_bytes=DEFAULT_BUDGET, window_ratio=WINDOW_RATIO, protected_ratio=PROTECTED_RATIO):
+        self.max_bytes = max_bytes
+        self.window_bytes = max(int(max_bytes * window_ratio), 1)
+        self.main_bytes = max_bytes - self.window_bytes
+        self.protected_bytes = int(self.main_bytes * protected_ratio)
+        self.window = OrderedDict()
+        self.probation = OrderedDict()
+        self.protected = OrderedDict()
+        self.sizes = {'window': 0, 'probation': 0, 'protected': 0}
+        self.sketch = FrequencySketch(max_bytes // AVERAGE_ENTRY_BYTES)
+        self.lock = threading.RLock()
+        self.hits = self.misses = self.evictions = self.rejections = self.invalidations = 0
+
+    # ---- 查詢 ----
+
+    def _segment(self, key):
+        for name in ('window', 'probation', 'protected'):
+            segment = getattr(self, name)
+            if key in segment:
+                return name, segment
+        return None, None
+
+    def get(self, key, version=None):
+        """取得快取值；不存在或 version 不符（檔案已改寫）時回傳 None"""
+        with self.lock:
+            self.sketch.increment(key)
+            name, segment = self._segment(key)
+            if segment is None:
+                self.misses += 1
+                return None
+            entry = segment[key]
+            if version is not None and entry.version != version:
+                self._remove(name, segment, key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            if name == 'probation':
+                # 在 probation 再次命中：升級到 protected，超出時把 protected 最舊的降回 probation
+                del segment[key]
+                self.sizes['probation'] -= entry.weight
+                self.protected[key] = entry
+                self.sizes['protected'] += entry.weight
+                while self.sizes['protected'] > self.protected_bytes and len(self.protected) > 1:
+                    old_key, old = self.protected.popitem(last=False)
+                    self.sizes['protected'] -= old.weight
+                    self.probation[old_key] = old
+                    self.sizes['probation'] += old.weight
+            else:
+                segment.move_to_end(key)
+            return entry.value
+
+    def __contains__(self, key):
+        with self.lock:
+            return self._segment(key)[1] is not None
+
+    def __len__(self):
+        return len(self.window) + len(self.probation) + len(self.protected)
+
+    # ---- 寫入 ----
+
+    def put(self, key, value, weight=None, version=None):
+        weight = estimate_size(value) if weight is None else weight
+        with self.lock:
+            name, segment = self._segment(key)
+            if segment is not None:
+                self._remove(name, segment, key)
+            if weight > self.main_bytes:
+                self.rejections += 1
+                return
+            self.window[key] = _Entry(value, weight, version)
+            self.sizes['window'] += weight
+            while self.sizes['window'] > self.window_bytes and self.window:
+                candidate_key, candidate = self.window.popitem(last=False)
+                self.sizes['window'] -= candidate.weight
+                self._admit(candidate_key, candidate)
+
+    def _admit(self, key, entry):
+        """視窗淘汰出的項目與主區的淘汰候選比較頻率，決定誰留下"""
+        frequency = self.sketch.frequency(key)
+        while self.sizes['probation'] + self.sizes['protected'] + entry.weight > self.main_bytes:
+            victims = self.probation or self.protected
+            victim_key = next(iter(victims))
+            if self.sketch.frequency(victim_key) >= frequency:
+                self.rejections += 1
+                return
+            victim = victims.pop(victim_key)
+            self.sizes['probation' if victims is self.probation else 'protected'] -= victim.weight
+            self.evictions += 1
+        self.probation[key] = entry
+        self.sizes['probation'] += entry.weight
+
+    def _remove(self, name, segment, key):
+        entry = segment.pop(key)
+        self.sizes[name] -= entry.weight
+
+    def get_or_load(self, key, loader, version=None, sizeof=estimate_size):
+        value = self.get(key, version)
+        if value is None:
+            value = loader()
+            self.put(key, value, sizeof(value), version)
+        return value
+
+    def invalidate(self, key):
+        with self.lock:
+            name, segment = self._segment(key)
+            if segment is not None:
+                self._remove(name, segment, key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            for name in self.sizes:
+                getattr(self, name).clear()
+                self.sizes[name] = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self),
+                'bytes': sum(self.sizes.values()),
+                'maxBytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRatio': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'rejections': self.rejections,
+                'invalidations': self.invalidations,
+            }
+
+
+_default_cache = None
+
+
+def default_cache():
+    """行程共用的快取（預算由環境變數 SERIES_CACHE_MB 決定，預設 256 MB）"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = SeriesCache()
+    return _default_cache
+
+
+def file_version(path):
+    """以 mtime 與大小作為版本；寫入端更新 lastUpdated 時必然改寫檔案"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def cached_series(market, symbol, interval='1d', store='cache', base_dir=DATA_DIR, cache=None):
+    """與 ohlcv_store.load_series 相同，但經過快取"""
+    cache = cache if cache is not None else default_cache()
+    path = series_path(market, symbol, interval, store, base_dir)
+    return cache.get_or_load(('ohlcv', path), lambda: load_series(market, symbol, interval, store, base_dir, path=path),
+                             file_version(path))
+
+
+def indicators_to_arrays(indicators):
+    """指標快取的 list（含 null）轉成 float64 陣列（null 為 NaN）；巢狀指標遞迴處理"""
+    arrays = {}
+    for name, values in indicators.items():
+        if isinstance(values, dict):
+            arrays[name] = indicators_to_arrays(values)
+        else:
+            arrays[name] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    return arrays
+
+
+def cached_indicators(market, symbol, interval='1d', base_dir=DATA_DIR, cache=None):
+    """讀取 data/indicators/<市場>/<代號>/<D|W|M>_indicators.json 的指標陣列（經過快取）"""
+    cache = cache if cache is not None else default_cache()
+    path = os.path.join(base_dir, 'indicators', market, symbol, f"{INDICATOR_INTERVALS.get(interval, interval)}_indicators.json")
+
+    def load():
+        with open(path, 'r', encoding='utf-8') as f:
+            return indicators_to_arrays(json.load(f).get('indicators', {}))
+    return cache.get_or_load(('indicators', path), load, file_version(path))
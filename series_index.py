@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+K 線檔的日期索引
+在每個 K 線檔旁放一個 sidecar 索引（data/cache/TW/2330/1d.json → 1d.idx），
+記錄每個月（或每年）第一根 K 線在 data 陣列中的列號與檔案位元組偏移量。
+查詢一段日期時只讀取並解析涵蓋該區間的那幾個月，成本與區間長度成正比，而不是整個歷史。
+
+    write_series(path, payload)           寫入 K 線檔並同時產生索引（寫入端使用）
+    read_range(path, '2024-01-01', '2024-12-31')   只解析區間內的 K 線
+    build_index(path)                     為既有檔案（例如前端寫的）建立索引
+
+索引記錄來源檔的大小與 mtime；檔案被其他程式改寫後索引失效，讀取時自動重建。
+索引副檔名為 .idx（不是 .json），不會被掃描 *.json 的程式誤讀。
+
+用法：
+    python3 series_index.py data/cache data/historical      # 為所有 K 線檔建立索引
+"""
+
+import os
+import sys
+import json
+import argparse
+from bisect import bisect_left, bisect_right
+
+from streaming_json import JSONStreamReader, read_value
+
+try:
+    import orjson
+except ImportError:  # 沒有 orjson 時使用標準函式庫
+    orjson = None
+
+INDEX_SUFFIX = '.idx'
+INDEX_VERSION = 1
+GRANULARITY = {'month': 7, 'year': 4}     # 以 time 字串前幾個字元分段
+DEFAULT_GRANULARITY = 'month'
+META_KEYS = ('market', 'symbol', 'interval', 'lastUpdated')
+
+
+def index_path(path):
+    return os.path.splitext(path)[0] + INDEX_SUFFIX
+
+
+def _loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _source_stat(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtimeNs': stat.st_mtime_ns}
+
+
+def _entries(rows, width):
+    """rows 為 (time, 位元組偏移量)，回傳每段第一列的 [段, 列號, 偏移量]"""
+    entries = []
+    for row, (time, offset) in enumerate(rows):
+        key = time[:width]
+        if not entries or entries[-1][0] != key:
+            entries.append([key, row, offset])
+    return entries
+
+
+def _write_index(path, index):
+    tmp_path = f"{index_path(path)}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, index_path(path))
+
+
+def _make_index(path, meta, rows, end, granularity):
+    return {
+        'version': INDEX_VERSION,
+        'source': _source_stat(path),
+        'granularity': granularity,
+        'meta': meta,
+        'rows': len(rows),
+        'first': rows[0][0] if rows else None,
+        'last': rows[-1][0] if rows else None,
+        'end': end,
+        'entries': _entries(rows, GRANULARITY[granularity]),
+    }
+
+
+def write_series(path, payload, granularity=DEFAULT_GRANULARITY):
+    """
+    寫入 K 線檔（data 放在最後、每根 K 線一行）並產生索引；先寫暫存檔再替換。
+    payload 與原本的格式相同：{market, symbol, interval, lastUpdated, ..., data: [...]}
+    """
+    header = {key: value for key, value in payload.items() if key != 'data'}
+    parts = [b'{\n']
+    for key, value in header.items():
+        parts.append(f"  {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)},\n".encode('utf-8'))
+    parts.append(b'  "data": [')
+    offset = sum(len(p) for p in parts)
+
+    rows = []
+    candles = payload.get('data', [])
+    for i, candle in enumerate(candles):
+        prefix = b'\n    ' if i == 0 else b',\n    '
+        encoded = json.dumps(candle, ensure_ascii=False, separators=(', ', ': ')).encode('utf-8')
+        rows.append((candle['time'], offset + len(prefix)))
+        parts.append(prefix + encoded)
+        offset += len(prefix) + len(encoded)
+    closing = b'\n  ]\n}\n' if candles else b']\n}\n'
+    end = offset + (3 if candles else 0)     # data 陣列結束的 ']' 位置
+    parts.append(closing)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(b''.join(parts))
+    os.replace(tmp_path, path)
+
+    meta = {key: header[key] for key in META_KEYS if key in header}
+    _write_index(path, _make_index(path, meta, rows, end, granularity))
+    return path
+
+
+def build_index(path, granularity=DEFAULT_GRANULARITY, save=True):
+    """掃描既有的 K 線檔建立索引（只解析每根 K 線，不建立整個檔案的物件）"""
+    rows = []
+    with open(path, 'rb') as f:
+        # test-data 的純陣列格式沒有外層物件
+        key_path = () if f.read(64).lstrip().startswith(b'[') else ('data',)
+        reader = JSONStreamReader(f)
+        reader.enter(key_path)
+        for offset, candle in reader.iter_array(with_offsets=True):
+            rows.append((candle['time'], offset))
+        end = reader.offset() - 1
+
+    meta = {}
+    if key_path:
+        for key in META_KEYS:
+            try:
+                meta[key] = read_value(path, (key,))
+            except KeyError:
+                pass
+
+    index = _make_index(path, meta, rows, end, granularity)
+    if save:
+        try:
+            _write_index(path, index)
+        except OSError:
+            pass
+    return index
+
+
+def load_index(path, rebuild=True):
+    """讀取索引；不存在或與來源檔不符時重建（rebuild=False 時回傳 None）"""
+    try:
+        with open(index_path(path), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') == INDEX_VERSION and index.get('source') == _source_stat(path):
+            return index
+    except (OSError, ValueError):
+        pass
+    return build_index(path) if rebuild else None
+
+
+def read_range(path, start=None, end=None, index=None):
+    """
+    讀取 [start, end]（含）之間的 K 線，只解析涵蓋區間的分段。
+    start / end 為 'YYYY-MM-DD'，省略表示不設限
+    """
+    index = index or load_index(path)
+    entries = index['entries']
+    if not entries:
+        return []
+    keys = [entry[0] for entry in entries]
+    width = GRANULARITY[index['granularity']]
+
+    lo = max(bisect_right(keys, start[:width]) - 1, 0) if start else 0
+    hi = bisect_right(keys, end[:width]) if end else len(entries)
+    if hi <= lo:
+        return []
+    begin = entries[lo][2]
+    stop = entries[hi][2] if hi < len(entries) else index['end']
+
+    with open(path, 'rb') as f:
+        f.seek(begin)
+        chunk = f.read(stop - begin)
+    candles = _loads(b'[' + chunk.rstrip().rstrip(b',') + b']')
+
+    times = [c['time'] for c in candles]
+    first = bisect_left(times, start) if start else 0
+    last = bisect_right(times, end + '\uffff') if end else len(times)
+    return candles[first:last]
+
+
+def main():
+    """主程式：為目錄下所有 K 線檔建立索引"""
+    parser = argparse.ArgumentParser(description='建立 K 線檔的日期索引')
+    parser.add_argument('dirs', nargs='*', default=[os.path.join('data', 'cache'), os.path.join('data', 'historical')])
+    parser.add_argument('--granularity', choices=list(GRANULARITY), default=DEFAULT_GRANULARITY)
+    parser.add_argument('--force', action='store_true', help='即使索引仍有效也重建')
+    args = parser.parse_args()
+
+    built = skipped = failed = 0
+    for base in args.dirs:
+        for root, _, files in os.walk(base):
+            for name in files:
+                if name not in ('1d.json', '1w.json', '1M.json'):
+                    continue
+                path = os.path.join(root, name)
+                if not args.force and load_index(path, rebuild=False) is not None:
+                    skipped += 1
+                    continue
+                try:
+                    build_index(path, args.granularity)
+                    built += 1
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"⚠️ {path}: {e}")
+                    failed += 1
+
+    print(f"✅ 已建立 {built} 個索引，略過 {skipped} 個（仍有效），失敗 {failed} 個")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨行程共用的市場面板
+把一個市場所有股票的開高低收量對齊成 (日期 x 股票) 矩陣，只解碼一次，
+寫成 .npy 檔後由各個 worker 以 mmap 唯讀掛載。作業系統的 page cache 在行程間共用，
+N 個 worker 只佔約一份資料的記憶體，也不必各自重新解析 JSON。
+
+目錄結構（data/panels/<市場>/）：
+
+    panel.json        登錄檔：目前的世代、shape、dtype、欄位與股票順序
+    g000003/          一個世代的矩陣（time.npy、close.npy ...）
+
+矩陣以 Fortran 順序儲存，單一股票的整段歷史（一欄）在記憶體中是連續的；缺值為 NaN。
+
+更新流程：新世代先寫在暫存目錄，完成後改名為 gNNNNNN，再以 os.replace 原子地替換登錄檔。
+已掛載舊世代的 worker 不受影響（檔案刪除後 mmap 仍有效），可用 is_stale() 檢查並 reload()；
+只保留最近 keep 個世代。
+
+用法：
+    python3 shared_panel.py TW US            # 建立 / 更新面板（K 線更新後執行）
+    panel = attach_panel('TW')               # worker 端，同一行程重複呼叫只掛載一次
+    close = panel.fields['close'][:, panel.column('2330')]
+    series = panel.series('2330')            # 與 ohlcv_store.load_series 相同的欄位
+"""
+
+import os
+import json
+import shutil
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from ohlcv_store import DATA_DIR, FIELDS, iter_series, list_symbols
+
+PANEL_DIR = os.environ.get('PANEL_DIR', os.path.join(DATA_DIR, 'panels'))
+PANEL_FIELDS = FIELDS
+REGISTRY_NAME = 'panel.json'
+REGISTRY_VERSION = 1
+DEFAULT_KEEP = 2             # 保留的世代數（含目前世代）
+
+
+def market_dir(market, panel_dir=PANEL_DIR):
+    return os.path.join(panel_dir, market)
+
+
+def registry_path(market, panel_dir=PANEL_DIR):
+    return os.path.join(market_dir(market, panel_dir), REGISTRY_NAME)
+
+
+def generation_name(generation):
+    return f"g{generation:06d}"
+
+
+def read_registry(market, panel_dir=PANEL_DIR):
+    """讀取登錄檔；尚未建立時回傳 None"""
+    try:
+        with open(registry_path(market, panel_dir), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def build_panel(series_iter, fields=PANEL_FIELDS, dtype=np.float64, lookback=None):
+    """
+    將多檔股票的 K 線對齊成 (日期 x 股票) 矩陣；日期為所有股票日期的聯集（可只取最近 lookback 天）
+    回傳 (dates, symbols, {欄位: 矩陣})
+    """
+    columns = [s for s in series_iter if len(s['time'])]
+    if not columns:
+        return np.array([], dtype='datetime64[D]'), [], {f: np.empty((0, 0), dtype=dtype, order='F') for f in fields}
+
+    dates = np.unique(np.concatenate([s['time'] for s in columns]))
+    if lookback:
+        dates = dates[-lookback:]
+    symbols = [s['symbol'] for s in columns]
+    matrices = {field: np.full((len(dates), len(columns)), np.nan, dtype=dtype, order='F') for field in fields}
+    for col, series in enumerate(columns):
+        mask = series['time'] >= dates[0]
+        rows = np.searchsorted(dates, series['time'][mask])
+        for field, matrix in matrices.items():
+            matrix[rows, col] = series[field][mask]
+    return dates, symbols, matrices
+
+
+def publish_panel(market, symbols=None, panel_dir=PANEL_DIR, base_dir=DATA_DIR, fields=PANEL_FIELDS,
+                  dtype='float64', lookback=None, keep=DEFAULT_KEEP):
+    """建立新世代的面板並原子地替換登錄檔；回傳新的登錄內容"""
+    if symbols is None:
+        symbols = list_symbols(market, base_dir=base_dir)
+    dates, kept, matrices = build_panel(iter_series(market, symbols, base_dir=base_dir), fields,
+                                        np.dtype(dtype), lookback)
+
+    root = market_dir(market, panel_dir)
+    os.makedirs(root, exist_ok=True)
+    previous = read_registry(market, panel_dir)
+    generation = max([previous['generation'] if previous else 0] + _generations(root)) + 1
+    name = generation_name(generation)
+
+    registry = {
+        'version': REGISTRY_VERSION,
+        'market': market,
+        'generation': generation,
+        'directory': name,
+        'createdAt': datetime.now().isoformat(),
+        'shape': [len(dates), len(kept)],
+        'dtype': np.dtype(dtype).name,
+        'fields': list(fields),
+        'start': str(dates[0]) if len(dates) else None,
+        'end': str(dates[-1]) if len(dates) else None,
+        'symbols': kept,
+    }
+
+    tmp_dir = os.path.join(root, f".{name}.{os.getpid()}.tmp")
+    os.makedirs(tmp_dir)
+    try:
+        np.save(os.path.join(tmp_dir, 'time.npy'), dates.astype('datetime64[D]').astype(np.int64))
+        for field, matrix in matrices.items():
+            np.save(os.path.join(tmp_dir, f"{field}.npy"), matrix)
+        # 每個世代自帶一份登錄內容，掛載舊世代時不依賴 panel.json
+        with open(os.path.join(tmp_dir, REGISTRY_NAME), 'w', encoding='utf-8') as f:
+            json.dump(registry, f, ensure_ascii=False)
+        os.rename(tmp_dir, os.path.join(root, name))
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    tmp_path = f"{registry_path(market, panel_dir)}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(registry, f, ensure_ascii=False)
+    os.replace(tmp_path, registry_path(market, panel_dir))
+
+    _prune(root, generation, keep)
+    return registry
+
+
+def _generations(root):
+    found = []
+    for entry in os.listdir(root):
+        if entry.startswith('g') and entry[1:].isdigit():
+            found.append(int(entry[1:]))
+    return found
+
+
+def _prune(root, current, keep):
+    """刪除較舊的世代；仍掛載著的行程不受影響"""
+    for generation in sorted(_generations(root)):
+        if generation <= current - keep:
+            shutil.rmtree(os.path.join(root, generation_name(generation)), ignore_errors=True)
+
+
+class SharedPanel:
+    """唯讀掛載的面板；fields 的矩陣皆為 mmap 的 NumPy 唯讀視圖"""
+
+    def __init__(self, market, panel_dir=PANEL_DIR, generation=None):
+        self.market = market
+        self.panel_dir = panel_dir
+        if generation is None:
+            registry = read_registry(market, panel_dir)
+            if registry is None:
+                raise FileNotFoundError(f"尚未建立 {market} 面板，請先執行 shared_panel.py {market}")
+            generation = registry['generation']
+        directory = os.path.join(market_dir(market, panel_dir), generation_name(generation))
+        try:
+            with open(os.path.join(directory, REGISTRY_NAME), 'r', encoding='utf-8') as f:
+                registry = json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"{market} 面板世代 {generation} 已被清除") from None
+
+        self.registry = registry
+        self.generation = registry['generation']
+        self.symbols = registry['symbols']
+        self._columns = {symbol: col for col, symbol in enumerate(self.symbols)}
+        self.dates = np.load(os.path.join(directory, 'time.npy'), mmap_mode='r').view('datetime64[D]')
+        self.fields = {field: np.load(os.path.join(directory, f"{field}.npy"), mmap_mode='r')
+                       for field in registry['fields']}
+
+    @property
+    def shape(self):
+        return tuple(self.registry['shape'])
+
+    def __contains__(self, symbol):
+        return symbol in self._columns
+
+    def column(self, symbol):
+        return self._columns[symbol]
+
+    def series(self, symbol):
+        """
+        取出單一股票有資料的列，格式與 ohlcv_store.load_series 相同；
+        沒有中間缺值時為面板的唯讀視圖（不複製），否則為複本
+        """
+        col = self._columns[symbol]
+        valid = ~np.isnan(self.fields['close'][:, col])
+        rows = np.flatnonzero(valid)
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            rows = slice(rows[0], rows[-1] + 1)
+        series = {'time': self.dates[rows]}
+        for field, matrix in self.fields.items():
+            series[field] = matrix[rows, col]
+        series.update({'market': self.market, 'symbol': symbol, 'interval': '1d', 'generation': self.generation})
+        return series
+
+    def is_stale(self):
+        """登錄檔已指向較新的世代"""
+        registry = read_registry(self.market, self.panel_dir)
+        return registry is not None and registry['generation'] != self.generation
+
+    def reload(self):
+        """回傳登錄檔目前世代的面板（本物件仍指向原世代）"""
+        return attach_panel(self.market, self.panel_dir)
+
+
+# 每個行程掛載過的面板，(目錄, 市場, 世代) -> SharedPanel
+_ATTACHED = {}
+
+
+def attach_panel(market, panel_dir=PANEL_DIR, generation=None):
+    """
+    在目前行程掛載面板（同一世代只掛載一次）；generation 省略時使用登錄檔目前的世代。
+    可直接作為 ProcessPoolExecutor 的 initializer
+    """
+    if generation is None:
+        registry = read_registry(market, panel_dir)
+        if registry is None:
+            raise FileNotFoundError(f"尚未建立 {market} 面板，請先執行 shared_panel.py {market}")
+        generation = registry['generation']
+    key = (panel_dir, market, generation)
+    if key not in _ATTACHED:
+        _ATTACHED[key] = SharedPanel(market, panel_dir, generation)
+    return _ATTACHED[key]
+
+
+def main():
+    """主程式：建立或更新市場面板"""
+    parser = argparse.ArgumentParser(description='建立跨行程共用的市場面板')
+    parser.add_argument('markets', nargs='*', default=['TW', 'US'])
+    parser.add_argument('--panel-dir', default=PANEL_DIR)
+    parser.add_argument('--lookback', type=int, default=None, help='只保留最近幾個交易日')
+    parser.add_argument('--dtype', choices=['float64', 'float32'], default='float64')
+    parser.add_argument('--keep', type=int, default=DEFAULT_KEEP, help='保留的世代數')
+    args = parser.parse_args()
+
+    print("🧱 建立共用市場面板")
+    print("=" * 60)
+    for market in args.markets:
+        registry = publish_panel(market, panel_dir=args.panel_dir, dtype=args.dtype,
+                                 lookback=args.lookback, keep=args.keep)
+        days, count = registry['shape']
+        size = days * count * len(registry['fields']) * np.dtype(registry['dtype']).itemsize
+        print(f"✅ {market} 世代 {registry['generation']}: {count} 檔 x {days} 天"
+              f"（{registry['start']} ~ {registry['end']}），{size / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
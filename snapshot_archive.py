@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+股票清單快照封存
+將 stocks_<市場>_<時間>.jsonl 等快照壓縮成 zstd frame，依市場（上市、nasdaq、other、sec，
+以及合併的 data）各自附加到 data/archive/stocks_<市場>.zpack。每個市場使用自己訓練的
+壓縮字典（以該市場的一份快照作為 raw content 字典：欄位名稱、交易所字串與大部分記錄
+在各次執行之間都相同），索引檔記錄每個快照的位置。每個快照都是獨立的 frame，只依賴
+市場字典，可依時間直接讀出單一快照而不必解壓整個封存檔或前面的快照。
+
+封存中的快照可用 serialization_codecs.read_records() 直接讀取，路徑寫成：
+    data/archive/stocks_data.zpack#20250819_200643   （指定時間；找不到時取該時間以前最近的一份）
+    data/archive/stocks_data.zpack                    （最新一份）
+
+用法：
+    python3 snapshot_archive.py add stocks_*.jsonl data/stocks_*.jsonl --remove
+    python3 snapshot_archive.py list
+    python3 snapshot_archive.py extract data 20250819_200643 -o restored/
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import bisect
+import hashlib
+import argparse
+from datetime import datetime
+
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
+
+ARCHIVE_DIR = os.path.join('data', 'archive')
+ARCHIVE_SUFFIX = '.zpack'
+LEVEL = 19
+DICT_SIZE = 8 * 1024 * 1024     # 市場字典上限
+MAX_WINDOW_LOG = 27
+
+SNAPSHOT_NAME = re.compile(r'^stocks_(?P<group>.+)_(?P<timestamp>\d{8}_\d{6})(?P<extension>\.[A-Za-z0-9]+)$')
+
+
+def parse_snapshot_name(path):
+    """由檔名 stocks_<市場>_<YYYYmmdd_HHMMSS>.<副檔名> 取得 (市場, 時間, 副檔名)，不符合時回傳 None"""
+    match = SNAPSHOT_NAME.match(os.path.basename(path))
+    if not match:
+        return None
+    return match.group('group'), match.group('timestamp'), match.group('extension')
+
+
+def split_reference(ref):
+    """將 'data/archive/stocks_data.zpack#20250819_200643' 拆成 (封存目錄, 市場, 時間)"""
+    path, _, timestamp = ref.partition('#')
+    name = os.path.basename(path)
+    if not (name.startswith('stocks_') and name.endswith(ARCHIVE_SUFFIX)):
+        raise ValueError(f"不是快照封存路徑: {ref}")
+    group = name[len('stocks_'):-len(ARCHIVE_SUFFIX)]
+    return os.path.dirname(path) or '.', group, timestamp or None
+
+
+def is_reference(path):
+    return ARCHIVE_SUFFIX in os.path.basename(path.partition('#')[0])
+
+
+class SnapshotArchive:
+    """以市場分組、依時間隨機存取的 zstd 快照封存"""
+
+    def __init__(self, archive_dir=ARCHIVE_DIR, level=LEVEL):
+        if zstd is None:
+            raise ImportError("快照封存需要安裝 zstandard")
+        self.archive_dir = archive_dir
+        self.level = level
+        self._indexes = {}
+        self._dicts = {}
+
+    # ---- 路徑與索引 ----
+
+    def pack_path(self, group):
+        return os.path.join(self.archive_dir, f"stocks_{group}{ARCHIVE_SUFFIX}")
+
+    def index_path(self, group):
+        return os.path.join(self.archive_dir, f"stocks_{group}.index.json")
+
+    def dict_path(self, group, dict_id):
+        return os.path.join(self.archive_dir, 'dicts', f"{group}-{dict_id}.dict.zst")
+
+    def groups(self):
+        pattern = os.path.join(self.archive_dir, f"stocks_*{ARCHIVE_SUFFIX}")
+        return sorted(os.path.basename(p)[len('stocks_'):-len(ARCHIVE_SUFFIX)] for p in glob.glob(pattern))
+
+    def index(self, group):
+        if group not in self._indexes:
+            path = self.index_path(group)
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._indexes[group] = json.load(f)
+            else:
+                self._indexes[group] = {'group': group, 'dictId': 0, 'snapshots': {}}
+        return self._indexes[group]
+
+    def _save_index(self, group):
+        path = self.index_path(group)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._indexes[group], f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def timestamps(self, group):
+        return sorted(self.index(group)['snapshots'])
+
+    def resolve(self, group, timestamp=None):
+        """取得 timestamp 當時（含之前）最新的快照時間；只給日期 (YYYYmmdd) 時取當天最後一份"""
+        stamps = self.timestamps(group)
+        if not stamps:
+            raise KeyError(f"封存中沒有 {group} 的快照")
+        if timestamp is None:
+            return stamps[-1]
+        if len(timestamp) == 8:
+            timestamp += '_999999'
+        position = bisect.bisect_right(stamps, timestamp)
+        if position == 0:
+            raise KeyError(f"{group} 沒有 {timestamp} 以前的快照")
+        return stamps[position - 1]
+
+    # ---- 字典 ----
+
+    def _dictionary(self, group, dict_id):
+        if not dict_id:
+            return None
+        key = (group, dict_id)
+        if key not in self._dicts:
+            with open(self.dict_path(group, dict_id), 'rb') as f:
+                content = zstd.ZstdDecompressor().decompress(f.read())
+            self._dicts[key] = zstd.ZstdCompressionDict(content, dict_type=zstd.DICT_TYPE_RAWCONTENT)
+        return self._dicts[key]
+
+    def train(self, group, blobs):
+        """
+        建立市場字典：取這批快照中最新的一份（最多 DICT_SIZE）作為 raw content 字典。
+        同市場各次執行的內容大多相同，新快照幾乎都能以字典內容的參照表示。
+        之後新增的快照改用新字典，舊快照仍以原字典解壓
+        """
+        blobs = [data for data in blobs if data]
+        if not blobs:
+            return 0
+        content = blobs[-1][-DICT_SIZE:]
+        dict_id = int(hashlib.sha1(content).hexdigest()[:8], 16) or 1
+        os.makedirs(os.path.dirname(self.dict_path(group, dict_id)), exist_ok=True)
+        with open(self.dict_path(group, dict_id), 'wb') as f:
+            f.write(zstd.ZstdCompressor(level=self.level).compress(content))
+        self._dicts[(group, dict_id)] = zstd.ZstdCompressionDict(content, dict_type=zstd.DICT_TYPE_RAWCONTENT)
+        self.index(group)['dictId'] = dict_id
+        self._save_index(group)
+        return dict_id
+
+    def _compressor(self, dictionary, size):
+        # 視窗需涵蓋字典加上整份快照，長距離比對才找得到字典中的相同片段；
+        # 市場的第一份快照是空檔時還沒有字典（dictId 為 0），該 frame 不使用字典
+        dict_size = len(dictionary.as_bytes()) if dictionary is not None else 0
+        window_log = min(max(dict_size + size, 1 << 20).bit_length(), MAX_WINDOW_LOG)
+        params = zstd.ZstdCompressionParameters.from_level(
+            self.level, source_size=size, window_log=window_log, enable_ldm=True,
+            write_content_size=True, write_checksum=True)
+        return zstd.ZstdCompressor(dict_data=dictionary, compression_params=params)
+
+    # ---- 寫入 ----
+
+    def add_bytes(self, group, timestamp, data, extension='.jsonl', records=None):
+        """將一份快照壓縮成單一 zstd frame 附加到封存檔；同一時間已存在時略過，回傳是否有寫入"""
+        index = self.index(group)
+        if timestamp in index['snapshots']:
+            return False
+        os.makedirs(self.archive_dir, exist_ok=True)
+        if not index['dictId']:
+            self.train(group, [data])
+
+        dict_id = index['dictId']
+        frame = self._compressor(self._dictionary(group, dict_id), len(data)).compress(data)
+
+        with open(self.pack_path(group), 'ab') as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(frame)
+        index['snapshots'][timestamp] = {
+            'offset': offset,
+            'length': len(frame),
+            'size': len(data),
+            'records': data.count(b'\n') if records is None else records,
+            'extension': extension,
+            'dictId': dict_id,
+            'sha1': hashlib.sha1(data).hexdigest(),
+            'archivedAt': datetime.now().isoformat(),
+        }
+        self._save_index(group)
+        return True
+
+    def add_file(self, path, remove=False):
+        """封存一個快照檔；檔名需符合 stocks_<市場>_<時間>.<副檔名>"""
+        parsed = parse_snapshot_name(path)
+        if parsed is None:
+            raise ValueError(f"無法由檔名判斷市場與時間: {path}")
+        group, timestamp, extension = parsed
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        added = self.add_bytes(group, timestamp, data, extension)
+        if not added and self.index(group)['snapshots'][timestamp]['sha1'] != hashlib.sha1(data).hexdigest():
+            raise ValueError(f"{group} {timestamp} 已封存但內容不同: {path}")
+        if remove:
+            os.remove(path)
+        return added
+
+    def add_files(self, paths, remove=False):
+        """封存多個快照；同市場的字典尚未建立時，先以這批檔案中最新的一份建立字典"""
+        by_group = {}
+        for path in paths:
+            parsed = parse_snapshot_name(path)
+            if parsed:
+                by_group.setdefault(parsed[0], []).append(path)
+
+        added = 0
+        for group, group_paths in sorted(by_group.items()):
+            group_paths.sort(key=lambda p: parse_snapshot_name(p)[1])
+            if not self.index(group)['dictId']:
+                with open(group_paths[-1], 'rb') as f:
+                    self.train(group, [f.read()])
+            for path in group_paths:
+                added += self.add_file(path, remove)
+        return added
+
+    # ---- 讀取 ----
+
+    def entry(self, group, timestamp=None):
+        timestamp = self.resolve(group, timestamp)
+        return timestamp, self.index(group)['snapshots'][timestamp]
+
+    def read_bytes(self, group, timestamp=None):
+        """只讀出並解壓指定時間的那一個 frame"""
+        _, entry = self.entry(group, timestamp)
+        with open(self.pack_path(group), 'rb') as f:
+            f.seek(entry['offset'])
+            frame = f.read(entry['length'])
+        dictionary = self._dictionary(group, entry['dictId'])
+        return zstd.ZstdDecompressor(dict_data=dictionary, max_window_size=1 << MAX_WINDOW_LOG).decompress(frame)
+
+    def extract(self, group, timestamp=None, output_dir='.'):
+        """還原成原本的快照檔，回傳路徑"""
+        timestamp, entry = self.entry(group, timestamp)
+        path = os.path.join(output_dir, f"stocks_{group}_{timestamp}{entry['extension']}")
+        with open(path, 'wb') as f:
+            f.write(self.read_bytes(group, timestamp))
+        return path
+
+    def stats(self):
+        """各市場的快照數、原始大小與封存大小（含字典）"""
+        rows = []
+        for group in self.groups():
+            snapshots = self.index(group)['snapshots'].values()
+            raw = sum(s['size'] for s in snapshots)
+            dict_ids = {s['dictId'] for s in snapshots if s['dictId']}
+            stored = os.path.getsize(self.pack_path(group)) + sum(
+                os.path.getsize(self.dict_path(group, dict_id)) for dict_id in dict_ids)
+            rows.append({'group': group, 'snapshots': len(snapshots), 'raw': raw, 'stored': stored,
+                         'ratio': raw / stored if stored else 0})
+        return rows
+
+
+def reference(group, timestamp=None, archive_dir=ARCHIVE_DIR):
+    """組出封存路徑，例如 data/archive/stocks_data.zpack#20250819_200643"""
+    path = os.path.join(archive_dir, f"stocks_{group}{ARCHIVE_SUFFIX}")
+    return f"{path}#{timestamp}" if timestamp else path
+
+
+def read_reference(ref):
+    """讀取封存路徑（stocks_<市場>.zpack[#時間]）所指的快照，回傳 (原始位元組, 原副檔名)"""
+    archive_dir, group, timestamp = split_reference(ref)
+    archive = SnapshotArchive(archive_dir)
+    timestamp, entry = archive.entry(group, timestamp)
+    return archive.read_bytes(group, timestamp), entry['extension']
+
+
+def write_reference(ref, data, extension, records=None):
+    """將已編碼的快照寫入封存路徑所指的市場與時間（未指定時間時使用現在時間）"""
+    archive_dir, group, timestamp = split_reference(ref)
+    timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+    SnapshotArchive(archive_dir).add_bytes(group, timestamp, data, extension, records)
+    return reference(group, timestamp, archive_dir)
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='股票清單快照封存')
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    parser.add_argument('--level', type=int, default=LEVEL)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    add = sub.add_parser('add', help='封存快照檔')
+    add.add_argument('files', nargs='+')
+    add.add_argument('--remove', action='store_true', help='封存後刪除原檔')
+    add.add_argument('--retrain', action='store_true', help='以這批檔案重新訓練市場字典')
+    sub.add_parser('list', help='列出封存內容')
+    extract = sub.add_parser('extract', help='還原快照')
+    extract.add_argument('group')
+    extract.add_argument('timestamp', nargs='?')
+    extract.add_argument('-o', '--output-dir', default='.')
+    args = parser.parse_args()
+
+    try:
+        archive = SnapshotArchive(args.archive_dir, args.level)
+    except ImportError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    if args.command == 'add':
+        if args.retrain:
+            for group in {parse_snapshot_name(p)[0] for p in args.files if parse_snapshot_name(p)}:
+                archive.index(group)['dictId'] = 0
+        added = archive.add_files(args.files, args.remove)
+        print(f"✅ 已封存 {added} 份快照")
+        args.command = 'list'
+
+    if args.command == 'list':
+        print(f"{'市場':<10}{'快照數':>8}{'原始(MB)':>12}{'封存(MB)':>12}{'壓縮比':>8}")
+        for row in archive.stats():
+            print(f"{row['group']:<10}{row['snapshots']:>8}{row['raw'] / 1048576:>12.2f}"
+                  f"{row['stored'] / 1048576:>12.2f}{row['ratio']:>7.1f}x")
+    elif args.command == 'extract':
+        path = archive.extract(args.group, args.timestamp, args.output_dir)
+        print(f"📁 已還原: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+嵌入式 SQL 查詢層
+將股票清單、data/cache 日線、技術指標快取與 data/scores 評分匯入本地 SQLite 資料庫
+（WAL 模式、依 market/symbol 建立索引），臨時性的分析問題可以直接下 SQL，
+不必再寫掃描上千個 JSON 檔的腳本。來源檔案依大小與修改時間增量更新。
+
+用法：
+    python3 stock_query.py refresh
+    python3 stock_query.py query "SELECT * FROM ohlcv_stats WHERE market = 'TW' LIMIT 5"
+"""
+
+import os
+import csv
+import sys
+import glob
+import json
+import sqlite3
+import argparse
+
+import numpy as np
+
+from ohlcv_store import load_payload, candles_to_arrays
+from streaming_json import iter_collected_stocks, read_value
+from serialization_codecs import CODECS, read_records
+from snapshot_archive import ARCHIVE_DIR, SnapshotArchive, parse_snapshot_name, reference
+
+DATA_DIR = 'data'
+DB_PATH = os.path.join(DATA_DIR, 'query', 'stocks.sqlite')
+MARKETS = ('TW', 'US')
+SOURCE_TABLES = ('universe', 'listings', 'ohlcv', 'ohlcv_stats', 'indicators', 'scores')
+
+# 來源檔案變動時以 source 刪除舊資料（_delete_source），每個表都附 source 索引，避免每檔都全表掃描
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS _sources (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS universe (
+    market TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    name TEXT,
+    exchange TEXT,
+    sector TEXT,
+    industry TEXT,
+    market_cap REAL,
+    last_updated TEXT,
+    source TEXT NOT NULL,
+    PRIMARY KEY (market, symbol)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_universe_sector ON universe (market, sector, industry);
+CREATE TABLE IF NOT EXISTS listings (
+    symbol TEXT NOT NULL,
+    name TEXT,
+    board TEXT,
+    market TEXT,
+    yahoo_symbol TEXT,
+    etf INTEGER,
+    industry TEXT,
+    cik INTEGER,
+    source TEXT NOT NULL,
+    PRIMARY KEY (market, symbol)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_listings_etf ON listings (market, etf);
+CREATE TABLE IF NOT EXISTS ohlcv (
+    market TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    time TEXT NOT NULL,
+    open REAL, high REAL, low REAL, close REAL, volume REAL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (market, symbol, time)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_ohlcv_time ON ohlcv (time);
+CREATE TABLE IF NOT EXISTS ohlcv_stats (
+    market TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    first_time TEXT,
+    last_time TEXT,
+    bars INTEGER,
+    last_close REAL,
+    high_52w REAL,
+    low_52w REAL,
+    drawdown_52w REAL,
+    return_1m REAL,
+    avg_volume_20d REAL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (market, symbol)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS indicators (
+    market TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    name TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    value REAL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (market, symbol, interval, name, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS scores (
+    market TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    date TEXT,
+    name TEXT,
+    overallScore REAL,
+    fundamentalScore REAL,
+    technicalScore REAL,
+    riskLevel TEXT,
+    recommendedStrategy TEXT,
+    confidence REAL,
+    sector TEXT,
+    industry TEXT,
+    price REAL,
+    changePct REAL,
+    volume REAL,
+    marketCap REAL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (market, symbol)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_scores_overall ON scores (market, overallScore);
+CREATE VIEW IF NOT EXISTS indicators_latest AS
+    SELECT i.market, i.symbol, i.interval, i.name, i.value
+    FROM indicators i
+    JOIN (SELECT market, symbol, interval, name, MAX(idx) AS idx
+          FROM indicators GROUP BY market, symbol, interval, name) last
+      USING (market, symbol, interval, name, idx);
+""" + ''.join(f"CREATE INDEX IF NOT EXISTS idx_{table}_source ON {table} (source);\n" for table in SOURCE_TABLES)
+
+# listings 表使用收集器輸出的中文欄位；交易所地區 (TW/US) 對應到 market
+LISTING_FIELDS = {
+    '代號': 'symbol', '名稱': 'name', '市場': 'board', '交易所': 'market',
+    'yahoo_symbol': 'yahoo_symbol', 'ETF': 'etf', '產業': 'industry', 'CIK': 'cik',
+}
+
+
+def latest_snapshot(base_dirs=('.', DATA_DIR), archive_dir=ARCHIVE_DIR):
+    """找出最新的 stocks_data_<時間> 快照（任一輸出格式皆可，也包含快照封存中的快照）"""
+    extensions = {codec.extension for codec in CODECS.values()}
+    candidates = {}
+    for base in base_dirs:
+        for path in glob.glob(os.path.join(base, 'stocks_data_*')):
+            parsed = parse_snapshot_name(path)
+            if parsed and parsed[2] in extensions:
+                candidates[parsed[1]] = path
+    if os.path.exists(reference('data', archive_dir=archive_dir)):
+        for timestamp in SnapshotArchive(archive_dir).timestamps('data'):
+            candidates.setdefault(timestamp, reference('data', timestamp, archive_dir))
+    return candidates[max(candidates)] if candidates else None
+
+
+def _flatten_indicators(indicators, prefix=''):
+    for name, values in indicators.items():
+        if isinstance(values, dict):
+            yield from _flatten_indicators(values, f"{prefix}{name}.")
+        elif isinstance(values, list):
+            yield f"{prefix}{name}", values
+
+
+def series_stats(arrays):
+    """計算日線摘要：52 週高低點、回檔幅度、近一月報酬與 20 日均量"""
+    close, volume = arrays['close'], arrays['volume']
+    if len(close) == 0:
+        return None
+    last_year = close[-252:]
+    high, low = float(np.nanmax(last_year)), float(np.nanmin(last_year))
+    month_ago = close[-22] if len(close) >= 22 else close[0]
+    return {
+        'first_time': str(arrays['time'][0]),
+        'last_time': str(arrays['time'][-1]),
+        'bars': int(len(close)),
+        'last_close': float(close[-1]),
+        'high_52w': high,
+        'low_52w': low,
+        'drawdown_52w': float(close[-1] / high - 1) if high > 0 else None,
+        'return_1m': float(close[-1] / month_ago - 1) if month_ago > 0 else None,
+        'avg_volume_20d': float(np.mean(volume[-20:])),
+    }
+
+
+class StockQueryEngine:
+    """股票資料 SQL 查詢引擎"""
+
+    def __init__(self, db_path=DB_PATH, data_dir=DATA_DIR, snapshot_dirs=('.', DATA_DIR)):
+        self.db_path = db_path
+        self.data_dir = data_dir
+        self.snapshot_dirs = snapshot_dirs
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # ---- 匯入 ----
+
+    def discover_sources(self):
+        """列出所有要匯入的來源檔案 (kind, path)"""
+        sources = []
+        for market in MARKETS:
+            path = os.path.join(self.data_dir, 'full-market', f"{market}-stocks-latest.json")
+            if os.path.exists(path):
+                sources.append(('universe', path))
+            path = os.path.join(self.data_dir, 'scores', f"{market}-scores-latest.json")
+            if os.path.exists(path):
+                sources.append(('scores', path))
+
+        snapshot = latest_snapshot(self.snapshot_dirs)
+        if snapshot:
+            sources.append(('listings', snapshot))
+
+        pattern = os.path.join(self.data_dir, 'cache', '*', '*', '1d.json')
+        sources.extend(('ohlcv', path) for path in sorted(glob.glob(pattern)))
+        pattern = os.path.join(self.data_dir, 'indicators', '*', '*', '*_indicators.json')
+        sources.extend(('indicators', path) for path in sorted(glob.glob(pattern)))
+        return sources
+
+    def refresh(self, force=False):
+        """增量匯入：只處理新增或變動的來源檔案，並移除已不存在的來源"""
+        if force:
+            with self.conn:
+                for table in SOURCE_TABLES + ('_sources',):
+                    self.conn.execute(f'DELETE FROM {table}')
+
+        known = {row['path']: row for row in self.conn.execute('SELECT * FROM _sources')}
+        sources = self.discover_sources()
+        stats = {'loaded': 0, 'skipped': 0, 'removed': 0}
+
+        for kind, path in sources:
+            stat = os.stat(path.partition('#')[0])
+            row = known.pop(path, None)
+            if row and row['size'] == stat.st_size and row['mtime'] == stat.st_mtime:
+                stats['skipped'] += 1
+                continue
+            with self.conn:
+                if row:
+                    self._delete_source(path)
+                getattr(self, f"_load_{kind}")(path)
+                self.conn.execute('INSERT OR REPLACE INTO _sources VALUES (?, ?, ?, ?)',
+                                  (path, kind, stat.st_size, stat.st_mtime))
+            stats['loaded'] += 1
+
+        for path in known:
+            with self.conn:
+                self._delete_source(path)
+                self.conn.execute('DELETE FROM _sources WHERE path = ?', (path,))
+            stats['removed'] += 1
+
+        self.conn.execute('ANALYZE')
+        return stats
+
+    def _delete_source(self, path):
+        for table in SOURCE_TABLES:
+            self.conn.execute(f'DELETE FROM {table} WHERE source = ?', (path,))
+
+    def _load_universe(self, path):
+        market = read_value(path, ('market',))
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO universe VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            ((s.get('market', market), s['symbol'], s.get('name'), s.get('exchange'),
+              s.get('sector'), s.get('industry'), s.get('marketCap'), s.get('lastUpdated'), path)
+             for s in iter_collected_stocks(path)))
+
+    def _load_listings(self, path):
+        rows = []
+        for item in read_records(path):
+            row = {column: item.get(key) for key, column in LISTING_FIELDS.items()}
+            row['etf'] = None if row['etf'] is None else int(bool(row['etf']))
+            row['cik'] = None if row['cik'] is None else int(row['cik'])
+            row['market'] = row['market'] or ''
+            rows.append((row['symbol'], row['name'], row['board'], row['market'],
+                         row['yahoo_symbol'], row['etf'], row['industry'], row['cik'], path))
+        self.conn.executemany('INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def _load_ohlcv(self, path):
+        payload = load_payload(path)
+        parts = os.path.normpath(path).split(os.sep)
+        market = payload.get('market', parts[-3])
+        symbol = payload.get('symbol', parts[-2])
+        candles = payload.get('data', [])
+
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO ohlcv VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [(market, symbol, c['time'][:10], c.get('open'), c.get('high'), c.get('low'),
+              c.get('close'), c.get('volume'), path) for c in candles])
+
+        stats = series_stats(candles_to_arrays(candles)) if candles else None
+        if stats:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO ohlcv_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (market, symbol, stats['first_time'], stats['last_time'], stats['bars'],
+                 stats['last_close'], stats['high_52w'], stats['low_52w'], stats['drawdown_52w'],
+                 stats['return_1m'], stats['avg_volume_20d'], path))
+
+    def _load_indicators(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        interval = os.path.basename(path).replace('_indicators.json', '')
+        rows = []
+        for name, values in _flatten_indicators(payload.get('indicators', {})):
+            rows.extend((payload['market'], payload['symbol'], interval, name, idx, value, path)
+                        for idx, value in enumerate(values))
+        self.conn.executemany('INSERT OR REPLACE INTO indicators VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def _load_scores(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        rows = []
+        for s in payload.get('scores', []):
+            quote = s.get('quote') or {}
+            rows.append((s.get('market', payload.get('market')), s['symbol'], payload.get('date'),
+                         s.get('name'), s.get('overallScore'), s.get('fundamentalScore'),
+                         s.get('technicalScore'), s.get('riskLevel'), s.get('recommendedStrategy'),
+                         s.get('confidence'), s.get('sector'), s.get('industry'), quote.get('price'),
+                         quote.get('changePct'), quote.get('volume'), quote.get('marketCap'), path))
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    # ---- 查詢 ----
+
+    def query(self, sql, params=()):
+        """執行 SQL 並回傳 dict 列表"""
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def query_df(self, sql, params=()):
+        """執行 SQL 並回傳 pandas DataFrame"""
+        import pandas as pd
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def tables(self):
+        return [row['name'] for row in self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'view') AND name NOT LIKE '\\_%' ESCAPE '\\'")]
+
+
+def print_rows(rows, fmt='table'):
+    """輸出查詢結果"""
+    if fmt == 'json':
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return
+    if not rows:
+        print('(0 rows)')
+        return
+    if fmt == 'csv':
+        writer = csv.DictWriter(sys.stdout, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+        return
+
+    columns = list(rows[0])
+    widths = [max(len(str(c)), *(len(str(r[c])) for r in rows)) for c in columns]
+    print('  '.join(str(c).ljust(w) for c, w in zip(columns, widths)))
+    print('  '.join('-' * w for w in widths))
+    for row in rows:
+        print('  '.join(str(row[c]).ljust(w) for c, w in zip(columns, widths)))
+    print(f"({len(rows)} rows)")
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='股票資料 SQL 查詢層')
+    parser.add_argument('--db', default=DB_PATH)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    refresh = sub.add_parser('refresh', help='匯入或增量更新資料庫')
+    refresh.add_argument('--force', action='store_true', help='忽略修改時間，全部重新匯入')
+
+    query = sub.add_parser('query', help='執行 SQL 查詢')
+    query.add_argument('sql')
+    query.add_argument('--format', choices=['table', 'json', 'csv'], default='table')
+
+    sub.add_parser('tables', help='列出可查詢的資料表')
+    args = parser.parse_args()
+
+    engine = StockQueryEngine(args.db)
+    try:
+        if args.command == 'refresh':
+            print("📊 匯入查詢資料庫...")
+            stats = engine.refresh(force=args.force)
+            print(f"✅ 匯入 {stats['loaded']} 個檔案，略過 {stats['skipped']} 個未變動檔案，移除 {stats['removed']} 個")
+        elif args.command == 'query':
+            print_rows(engine.query(args.sql), args.format)
+        else:
+            for name in engine.tables():
+                print(name)
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()
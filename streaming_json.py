@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+串流 JSON 讀取器
+不必把整個檔案 json.load 進記憶體，就能逐筆讀出陣列元素（例如全市場清單的 collectedStocks），
+或直接跳到某個 key（例如指標快取中的 indicators.macd.histogram）只解析那一段。
+跳過的內容只做位元組層級的括號與字串掃描，不會建立任何 Python 物件。
+
+JSON 的結構字元都是 ASCII，而 UTF-8 多位元組字元不會包含 ASCII 位元組，
+因此可以直接在位元組上掃描，locate() 回傳的位置即為檔案的位元組偏移量。
+"""
+
+import re
+import json
+import itertools
+
+CHUNK_SIZE = 64 * 1024
+
+_NON_WS = re.compile(rb'\S')
+_STRING_END = re.compile(rb'["\\]')
+# 一次吃掉括號以外的內容（含完整字串）；停在引號上表示字串被緩衝區切斷
+_PLAIN = re.compile(rb'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+_SCALAR_END = re.compile(rb'[,\]}\s]')
+
+_QUOTE, _BACKSLASH = ord('"'), ord('\\')
+_OPEN = (ord('['), ord('{'))
+_COMMA, _COLON = ord(','), ord(':')
+_ARRAY_END, _OBJECT_END = ord(']'), ord('}')
+
+
+class JSONStreamReader:
+    """在檔案物件（二進位模式）上逐段讀取 JSON"""
+
+    def __init__(self, fileobj, chunk_size=CHUNK_SIZE, offset=0):
+        self.f = fileobj
+        self.chunk_size = chunk_size
+        self.seek(offset)
+
+    def seek(self, offset):
+        """移到檔案中的指定位元組位置（通常是先前 locate() 的結果）"""
+        self.f.seek(offset)
+        self.buf = b''
+        self.pos = 0
+        self.base = offset
+        self.mark = None
+        self.eof = False
+
+    # ---- 緩衝區 ----
+
+    def _fill(self):
+        """讀入下一段資料；mark 之前（沒有 mark 時為 pos 之前）的內容會被丟棄，記憶體用量因此有上限"""
+        if self.eof:
+            return False
+        keep = self.pos if self.mark is None else self.mark
+        if keep:
+            self.buf = self.buf[keep:]
+            self.base += keep
+            self.pos -= keep
+            if self.mark is not None:
+                self.mark = 0
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf += chunk
+        return True
+
+    def _error(self, message):
+        return ValueError(f"{message}（位置 {self.base + self.pos}）")
+
+    def _peek(self):
+        """跳過空白並回傳下一個位元組；檔案結束時回傳 None"""
+        while True:
+            match = _NON_WS.search(self.buf, self.pos)
+            if match:
+                self.pos = match.start()
+                return self.buf[self.pos]
+            self.pos = len(self.buf)
+            if not self._fill():
+                return None
+
+    def _expect(self, byte):
+        if self._peek() != byte:
+            raise self._error(f"預期 {chr(byte)!r}")
+        self.pos += 1
+
+    # ---- 略過 ----
+
+    def _skip_string(self):
+        self.pos += 1
+        while True:
+            match = _STRING_END.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+            elif self.buf[match.start()] == _BACKSLASH:
+                if match.end() < len(self.buf):
+                    self.pos = match.end() + 1
+                    continue
+                self.pos = match.start()
+            else:
+                self.pos = match.end()
+                return
+            if not self._fill():
+                raise self._error('字串未結束')
+
+    def _skip_container(self):
+        depth = 0
+        while True:
+            self.pos = _PLAIN.match(self.buf, self.pos).end()
+            if self.pos >= len(self.buf) or self.buf[self.pos] == _QUOTE:
+                if not self._fill():
+                    raise self._error('陣列或物件未結束')
+                continue
+            depth += 1 if self.buf[self.pos] in _OPEN else -1
+            self.pos += 1
+            if depth == 0:
+                return
+
+    def _skip_scalar(self):
+        while True:
+            match = _SCALAR_END.search(self.buf, self.pos)
+            if match:
+                self.pos = match.start()
+                return
+            self.pos = len(self.buf)
+            if not self._fill():
+                return
+
+    def skip_value(self):
+        byte = self._peek()
+        if byte is None:
+            raise self._error('資料提早結束')
+        if byte == _QUOTE:
+            self._skip_string()
+        elif byte in _OPEN:
+            self._skip_container()
+        else:
+            self._skip_scalar()
+
+    def read_value(self):
+        """解析目前位置的一個值"""
+        self._peek()
+        self.mark = self.pos
+        try:
+            self.skip_value()
+            return json.loads(self.buf[self.mark:self.pos])
+        finally:
+            self.mark = None
+
+    def _after_item(self, end_byte):
+        """處理元素後的逗號；回傳 False 表示容器已結束"""
+        byte = self._peek()
+        if byte == _COMMA:
+            self.pos += 1
+            return True
+        if byte == end_byte:
+            self.pos += 1
+            return False
+        raise self._error('預期逗號或結束符號')
+
+    # ---- 導航 ----
+
+    def enter(self, key_path):
+        """從目前位置沿著 key_path（字串為物件 key，整數為陣列索引）移動到目標值的開頭"""
+        for key in key_path:
+            if isinstance(key, int):
+                self._expect(_OPEN[0])
+                for _ in range(key):
+                    if self._peek() == _ARRAY_END:
+                        raise IndexError(key)
+                    self.skip_value()
+                    self._after_item(_ARRAY_END)
+                if self._peek() == _ARRAY_END:
+                    raise IndexError(key)
+            else:
+                self._expect(_OPEN[1])
+                while True:
+                    if self._peek() == _OBJECT_END:
+                        raise KeyError(key)
+                    name = self.read_value()
+                    self._expect(_COLON)
+                    if name == key:
+                        break
+                    self.skip_value()
+                    if not self._after_item(_OBJECT_END):
+                        raise KeyError(key)
+        self._peek()
+
+    def offset(self):
+        """目前位置的檔案位元組偏移量"""
+        return self.base + self.pos
+
+    def iter_array(self, with_offsets=False):
+        """逐一產生目前位置陣列的元素；with_offsets=True 時產生 (元素起始位元組偏移量, 元素)"""
+        self._expect(_OPEN[0])
+        if self._peek() == _ARRAY_END:
+            self.pos += 1
+            return
+        while True:
+            if with_offsets:
+                self._peek()
+                offset = self.offset()
+                yield offset, self.read_value()
+            else:
+                yield self.read_value()
+            if not self._after_item(_ARRAY_END):
+                return
+
+    def iter_object(self):
+        """逐一產生目前位置物件的 (key, value)"""
+        self._expect(_OPEN[1])
+        if self._peek() == _OBJECT_END:
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self._expect(_COLON)
+            yield key, self.read_value()
+            if not self._after_item(_OBJECT_END):
+                return
+
+
+def _key_path(key_path):
+    if isinstance(key_path, str):
+        return tuple(key_path.split('.')) if key_path else ()
+    return tuple(key_path)
+
+
+def locate(path, key_path):
+    """回傳 key_path 所指的值在檔案中的位元組偏移量，可存起來供之後直接 seek"""
+    with open(path, 'rb') as f:
+        reader = JSONStreamReader(f)
+        reader.enter(_key_path(key_path))
+        return reader.offset()
+
+
+def read_value(path, key_path, offset=None):
+    """只解析 key_path 所指的值；提供 offset 時直接從該位置開始讀"""
+    with open(path, 'rb') as f:
+        reader = JSONStreamReader(f, offset=offset or 0)
+        if offset is None:
+            reader.enter(_key_path(key_path))
+        return reader.read_value()
+
+
+def iter_array(path, key_path, offset=None, chunk_size=CHUNK_SIZE):
+    """逐筆產生 key_path 所指陣列的元素，記憶體用量與單一元素大小相當"""
+    with open(path, 'rb') as f:
+        reader = JSONStreamReader(f, chunk_size, offset=offset or 0)
+        if offset is None:
+            reader.enter(_key_path(key_path))
+        yield from reader.iter_array()
+
+
+def iter_object(path, key_path=(), offset=None):
+    """逐筆產生 key_path 所指物件的 (key, value)"""
+    with open(path, 'rb') as f:
+        reader = JSONStreamReader(f, offset=offset or 0)
+        if offset is None:
+            reader.enter(_key_path(key_path))
+        yield from reader.iter_object()
+
+
+def iter_collected_stocks(path, limit=None):
+    """讀取全市場清單（data/full-market/*.json）的 collectedStocks，可只取前 limit 筆"""
+    return itertools.islice(iter_array(path, ('collectedStocks',)), limit)
+
+
+def read_indicator(path, name):
+    """讀取指標快取中的單一指標，例如 'rsi' 或 'macd.histogram'"""
+    return read_value(path, ('indicators',) + _key_path(name))
+
+
+def main():
+    """主程式：比較串流讀取與 json.load 的時間與記憶體"""
+    import sys
+    import time
+    import tracemalloc
+
+    path = sys.argv[1] if len(sys.argv) > 1 else 'data/full-market/US-stocks-latest.json'
+    key_path = sys.argv[2] if len(sys.argv) > 2 else 'collectedStocks'
+    limit = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+
+    def measure(label, func):
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"  {label:<24} {elapsed * 1000:8.1f} ms  峰值記憶體 {peak / 1024 / 1024:7.2f} MB  ({result} 筆)")
+
+    def full_load():
+        with open(path, 'rb') as f:
+            payload, _ = json.JSONDecoder().raw_decode(f.read().decode('utf-8'))
+        value = payload
+        for key in _key_path(key_path):
+            value = value[key]
+        return len(value[:limit])
+
+    print(f"📊 {path} -> {key_path}（前 {limit} 筆）")
+    measure('json 全檔載入', full_load)
+    measure('串流讀取', lambda: sum(1 for _ in itertools.islice(iter_array(path, key_path), limit)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+技術指標計算（NumPy 版）
+公式與 lib/screener/scoring.ts 一致；輸入可為一維序列，或以時間為第 0 軸的二維矩陣
+（每欄一支股票），尚未有足夠資料的位置填 NaN
+"""
+
+import numpy as np
+
+
+def _as_float(values):
+    return np.asarray(values, dtype=np.float64)
+
+
+def sma(values, period):
+    """簡單移動平均"""
+    values = _as_float(values)
+    out = np.full(values.shape, np.nan)
+    if values.shape[0] < period:
+        return out
+
+    csum = np.cumsum(values, axis=0)
+    out[period - 1] = csum[period - 1]
+    out[period:] = csum[period:] - csum[:-period]
+    out[period - 1:] /= period
+    return out
+
+
+def ema(values, period):
+    """指數移動平均，第一個值以前 period 筆的平均作為種子"""
+    values = _as_float(values)
+    out = np.full(values.shape, np.nan)
+    n = values.shape[0]
+    if n < period:
+        return out
+
+    k = 2.0 / (period + 1)
+    out[period - 1] = values[:period].mean(axis=0)
+    for i in range(period, n):
+        out[i] = values[i] * k + out[i - 1] * (1 - k)
+    return out
+
+
+def _rsi_value(avg_gain, avg_loss):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = 100 - 100 / (1 + avg_gain / avg_loss)
+    return np.where(avg_loss == 0, 100.0, value)
+
+
+def rsi(values, period=14):
+    """RSI（Wilder 平滑）"""
+    values = _as_float(values)
+    out = np.full(values.shape, np.nan)
+    n = values.shape[0]
+    if n <= period:
+        return out
+
+    diff = np.diff(values, axis=0)
+    gains = np.clip(diff, 0, None)
+    losses = np.clip(-diff, 0, None)
+
+    avg_gain = gains[:period].mean(axis=0)
+    avg_loss = losses[:period].mean(axis=0)
+    out[period] = _rsi_value(avg_gain, avg_loss)
+
+    for i in range(period + 1, n):
+        avg_gain = (avg_gain * (period - 1) + gains[i - 1]) / period
+        avg_loss = (avg_loss * (period - 1) + losses[i - 1]) / period
+        out[i] = _rsi_value(avg_gain, avg_loss)
+    return out
+
+
+def macd(values, fast=12, slow=26, signal=9):
+    """MACD：回傳 macd、signal、histogram 三條線"""
+    values = _as_float(values)
+    line = ema(values, fast) - ema(values, slow)
+
+    signal_line = np.full(values.shape, np.nan)
+    if values.shape[0] >= slow:
+        signal_line[slow - 1:] = ema(line[slow - 1:], signal)
+
+    return {
+        'macd': line,
+        'signal': signal_line,
+        'histogram': line - signal_line,
+    }
+
+
+def volume_zscore(volumes, period=20):
+    """成交量 Z-score：以前 period 筆（不含當日）的平均與標準差計算"""
+    volumes = _as_float(volumes)
+    out = np.full(volumes.shape, np.nan)
+    n = volumes.shape[0]
+    if n <= period:
+        return out
+
+    zeros = np.zeros((1,) + volumes.shape[1:])
+    csum = np.concatenate([zeros, np.cumsum(volumes, axis=0)])
+    csum2 = np.concatenate([zeros, np.cumsum(volumes * volumes, axis=0)])
+
+    window_sum = csum[period:n] - csum[:n - period]
+    window_sum2 = csum2[period:n] - csum2[:n - period]
+    mean = window_sum / period
+    std = np.sqrt(np.maximum(window_sum2 / period - mean * mean, 0))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (volumes[period:] - mean) / std
+    out[period:] = np.where(std > 0, z, 0.0)
+    return out
+
+
+def obv(close, volume):
+    """能量潮指標"""
+    close = _as_float(close)
+    volume = _as_float(volume)
+    out = np.zeros(close.shape)
+    if close.shape[0] > 1:
+        out[1:] = np.cumsum(np.sign(np.diff(close, axis=0)) * volume[1:], axis=0)
+    return out
+
+
+def rolling_max(values, period):
+    """滾動最高值（以 sliding window 向量化計算）"""
+    values = _as_float(values)
+    out = np.full(values.shape, np.nan)
+    if values.shape[0] < period:
+        return out
+    windows = np.lib.stride_tricks.sliding_window_view(values, period, axis=0)
+    out[period - 1:] = windows.max(axis=-1)
+    return out
+
+
+def rolling_min(values, period):
+    """滾動最低值"""
+    values = _as_float(values)
+    out = np.full(values.shape, np.nan)
+    if values.shape[0] < period:
+        return out
+    windows = np.lib.stride_tricks.sliding_window_view(values, period, axis=0)
+    out[period - 1:] = windows.min(axis=-1)
+    return out
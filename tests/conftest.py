@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""
+pytest 設定：讓 tests/ 內的測試可以直接 import 專案根目錄的模組
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
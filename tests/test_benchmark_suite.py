@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+離線效能基準測試的比較邏輯與解析函式測試
+"""
+
+import benchmark_suite as bs
+from etf_registry import parse_isin_board
+from stock_data_collector import merge_unique_stocks, parse_nasdaq_listing
+
+
+def result(**relative):
+    return {'calibration': 0.02, 'results': {name: {'min': 0.01, 'median': 0.01, 'relative': value}
+                                             for name, value in relative.items()}}
+
+
+def test_compare_flags_only_changes_beyond_threshold():
+    baseline = result(a=1.0, b=1.0, c=1.0)
+    rows = {row[0]: row[4] for row in bs.compare(result(a=1.2, b=1.5, c=0.5, d=1.0), baseline, 0.3)}
+    assert rows == {'a': 'ok', 'b': 'regression', 'c': 'improved', 'd': 'new'}
+
+
+def test_partial_baseline_update_keeps_other_entries(tmp_path):
+    path = str(tmp_path / 'baseline.json')
+    bs.save_baseline(result(a=1.0, b=2.0), path)
+    bs.save_baseline(result(b=3.0), path, names=['b'])
+    saved = bs.load_baseline(path)['results']
+    assert saved['a']['relative'] == 1.0 and saved['b']['relative'] == 3.0
+
+
+def test_generated_fixtures_round_trip_through_collector_parsers():
+    records = [{'代號': 'AAPL', '名稱': 'Apple Inc.', 'ETF': False}, {'代號': 'QQQ', '名稱': 'Invesco QQQ', 'ETF': True}]
+    stocks = parse_nasdaq_listing(bs.nasdaq_listing_lines(records, 'NASDAQ'), 'NASDAQ')
+    assert [s['代號'] for s in stocks] == ['AAPL', 'QQQ']
+    assert all(s['市場'] == 'NASDAQ' and s['交易所'] == 'US' for s in stocks)
+
+    etfs = parse_isin_board(bs.isin_html([{'代號': '0050', '名稱': '元大台灣50'}, {'代號': '2330', '名稱': '台積電'}]))
+    assert [(e['代號'], e['名稱'], e['ETF']) for e in etfs] == [('0050', '元大台灣50', True)]
+
+    merged = merge_unique_stocks(stocks + [{'代號': 'AAPL', '名稱': 'dup'}])
+    assert [s['名稱'] for s in merged] == ['Apple Inc.', 'Invesco QQQ']
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+收集器執行指標測試
+"""
+
+import json
+
+import pytest
+import requests
+
+from collector_metrics import RunMetrics, instrument_session
+import stock_data_collector
+from stock_data_collector import StockDataCollector
+from nasdaq_ftp_fetcher import NASDAQ_LISTED, OTHER_LISTED, NASDAQ_TRADED
+
+
+def test_stage_records_errors_and_reraises():
+    metrics = RunMetrics('job')
+    with metrics.stage('parse', 'sec') as stage:
+        stage.add_records(10)
+    with pytest.raises(ValueError):
+        with metrics.stage('fetch', 'sec'):
+            raise ValueError('boom')
+
+    report = metrics.to_dict()
+    assert report['status'] == 'error'
+    assert report['totals'] == {'bytes': 0, 'records': 10, 'errors': 1, 'retries': 0}
+    assert [(s['stage'], s['status'], s['error']) for s in report['stages']] == [
+        ('parse', 'ok', None), ('fetch', 'error', 'boom')]
+
+
+def test_session_hook_counts_bytes_for_current_stage():
+    metrics = RunMetrics('job')
+    session = instrument_session(requests.Session(), metrics)
+    response = requests.Response()
+    response._content = b'{"a": 1}'
+
+    with metrics.stage('fetch', 'twse_listed') as stage:
+        session.hooks['response'][0](response)
+    session.hooks['response'][0](response)  # 沒有執行中的階段時不計
+    assert stage.bytes == len(b'{"a": 1}')
+
+
+def test_prometheus_textfile_and_collector_stages(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    files = {
+        NASDAQ_LISTED: b'Symbol|Security Name|Market Category|Test Issue|Financial Status|Round Lot Size|ETF|NextShares\r\n'
+                       b'AAPL|Apple "Inc"|Q|N|N|100|N|N\r\nFile Creation Time: x|||||||\r\n',
+        OTHER_LISTED: b'ACT Symbol|Security Name|Exchange|CQS Symbol|ETF|Round Lot Size|Test Issue|NASDAQ Symbol\r\n'
+                      b'SPY|SPDR S&P 500 ETF Trust|P|SPY|Y|100|N|SPY\r\nFile Creation Time: x|||||||\r\n',
+        NASDAQ_TRADED: b'Nasdaq Traded|Symbol|Security Name|Listing Exchange|Market Category|ETF|Round Lot Size|'
+                       b'Test Issue|Financial Status|CQS Symbol|NASDAQ Symbol|NextShares\r\n'
+                       b'Y|AAPL|Apple Inc.|Q|Q|N|100|N|N||AAPL|N\r\nY|BRK.B|Berkshire|N| |N|100|N||BRK.B|BRK=B|N\r\n',
+    }
+
+    class FakeFetcher:
+        """代替 NasdaqFTPFetcher：不連線，把各檔內容餵給對應的解析器"""
+        def fetch(self, remotes, parsers=None):
+            results = {}
+            for remote in remotes:
+                parser = parsers[remote]()
+                parser.feed(files[remote])
+                results[remote] = {'path': remote, 'status': 'downloaded', 'bytes': len(files[remote]),
+                                   'parsed': parser.close()}
+            return results
+
+    monkeypatch.setattr(stock_data_collector, 'NasdaqFTPFetcher', FakeFetcher)
+    collector = StockDataCollector()
+    stocks = collector.get_nasdaq_ftp_stocks()
+    collector.save_stocks_data([{'代號': 'AAPL', '市場': 'NASDAQ'}], filename='all.jsonl')
+
+    metrics = collector.metrics.finish()
+    stages = {(s.name, s.source): s for s in metrics.stages}
+    assert [(s['代號'], s['ETF']) for s in stocks] == [('AAPL', False), ('SPY', True), ('BRK.B', False)]
+    assert stages[('fetch', 'nasdaq_ftp')].records == 4               # record_metrics 計入各檔解析出的筆數
+    assert stages[('fetch', 'nasdaq_ftp')].bytes == sum(len(content) for content in files.values())
+    assert stages[('save', 'data')].bytes == (tmp_path / 'all.jsonl').stat().st_size
+
+    prom = metrics.write_prometheus(str(tmp_path / 'collector.prom'))
+    text = open(prom, encoding='utf-8').read()
+    assert 'stock_collector_stage_records{job="stock_data_collector",stage="fetch",source="nasdaq_ftp"} 4' in text
+    assert 'stock_collector_run_success{job="stock_data_collector"} 1' in text
+
+    report = json.load(open(metrics.write_report(str(tmp_path / 'metrics')), encoding='utf-8'))
+    assert report['job'] == 'stock_data_collector' and len(report['stages']) == len(metrics.stages)
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+分塊相關係數測試（離線，使用合成報酬）
+"""
+
+import numpy as np
+
+from correlation_engine import BlockedCorrelation, tile_size_for_budget, cluster_by_sector
+
+
+def make_panel(n_days=250, n_symbols=40, seed=3):
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(0, 0.01, (n_days, 2))
+    loadings = np.zeros((2, n_symbols))
+    loadings[0, :n_symbols // 2] = 1
+    loadings[1, n_symbols // 2:] = 1
+    return (factors @ loadings + rng.normal(0, 0.004, (n_days, n_symbols))).astype(np.float32)
+
+
+def test_tile_size_respects_memory_budget():
+    b = tile_size_for_budget(756, 16000, budget_mb=64)
+    assert (b * b + 2 * 756 * b) * 4 <= 64 * 1024 * 1024
+    assert tile_size_for_budget(10, 5, budget_mb=64) == 5
+
+
+def test_blocked_matrix_matches_dense_corrcoef(tmp_path):
+    panel = make_panel()
+    symbols = [f"S{i}" for i in range(panel.shape[1])]
+    engine = BlockedCorrelation(panel, symbols)
+    engine.tile = 7
+
+    matrix = engine.compute(str(tmp_path / 'corr.npy'))
+    assert matrix.dtype == np.float32
+    np.testing.assert_allclose(matrix, np.corrcoef(panel.T), atol=1e-4)
+    np.testing.assert_allclose(np.load(tmp_path / 'corr.npy'), matrix)
+
+
+def test_sector_clustering_only_groups_within_sector():
+    panel = make_panel()
+    symbols = [f"S{i}" for i in range(panel.shape[1])]
+    stocks = [{'symbol': s, 'sector': 'Tech' if i % 2 else 'Energy'} for i, s in enumerate(symbols)]
+    engine = BlockedCorrelation(panel, symbols)
+
+    clusters = cluster_by_sector(engine, stocks, threshold=0.5)
+    assert len(clusters) == 4
+    for cluster in clusters:
+        indices = [int(s[1:]) for s in cluster['symbols']]
+        assert len({i % 2 for i in indices}) == 1
+        assert len({i < 20 for i in indices}) == 1
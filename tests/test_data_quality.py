@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+K 線資料品質檢查測試：各項檢查、依股票彙總與增量重跑
+"""
+
+import os
+import json
+
+import numpy as np
+
+from data_quality import validate_batch, QualityValidator, load_quarantine
+from ohlcv_store import load_series
+from trading_calendar import calendar
+
+
+def make_series(symbol, times, close, high=None, low=None, volume=None):
+    close = np.array(close, dtype=float)
+    return {
+        'symbol': symbol,
+        'time': np.array(times, dtype='datetime64[D]'),
+        'open': close.copy(),
+        'high': np.array(high, dtype=float) if high is not None else close + 1,
+        'low': np.array(low, dtype=float) if low is not None else close - 1,
+        'close': close,
+        'volume': np.array(volume, dtype=float) if volume is not None else np.full(len(close), 1000.0),
+    }
+
+
+def write_candles(base_dir, symbol, times, closes):
+    path = os.path.join(base_dir, 'cache', 'TW', symbol, '1d.json')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = [{'time': t, 'open': c, 'high': c + 1, 'low': max(c - 1, 0), 'close': c, 'volume': 100}
+            for t, c in zip(times, closes)]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'market': 'TW', 'symbol': symbol, 'data': data}, f)
+
+
+def test_checks_are_attributed_to_the_right_series():
+    weekdays = np.busday_offset('2024-01-01', np.arange(60), roll='forward')
+    clean = make_series('OK', weekdays, 100 + np.sin(np.arange(60)))
+    bad = make_series('BAD', ['2024-01-02', '2024-01-03', '2024-01-03', '2024-01-02', '2024-03-01'],
+                      [10, 11, 12, 0, 13], high=[11, 10, 13, 1, 12], low=[9, 10.5, 11, -1, 10],
+                      volume=[100, 0, 100, 100, 100])
+    jumpy = make_series('JUMP', weekdays, np.r_[np.full(30, 100.0), np.full(30, 300.0)])
+
+    ok, broken, jump = validate_batch([clean, bad, jumpy])
+    assert ok['status'] == 'ok' and ok['issues'] == {} and ok['rows'] == 60
+    assert broken['status'] == 'quarantine'
+    assert broken['issues']['duplicate'] == {'count': 1, 'first': '2024-01-03'}
+    assert broken['issues']['unsorted']['count'] == 1
+    assert broken['issues']['highBelowLow'] == {'count': 1, 'first': '2024-01-03'}
+    assert broken['issues']['closeOutOfRange']['count'] == 1
+    assert broken['issues']['nonPositive']['count'] == 1
+    assert broken['issues']['zeroVolume']['count'] == 1
+    assert broken['issues']['gap'] == {'count': 1, 'first': '2024-03-01'}
+    assert jump['status'] == 'warning' and jump['issues']['outlier']['count'] == 1
+
+
+def test_empty_series_is_quarantined():
+    empty = make_series('EMPTY', [], [])
+    assert validate_batch([empty])[0]['status'] == 'quarantine'
+
+
+def test_null_prices_load_as_nan_and_are_flagged_as_missing(tmp_path):
+    base = str(tmp_path)
+    days = [str(d) for d in np.busday_offset('2024-01-01', np.arange(5), roll='forward')]
+    write_candles(base, '2330', days, [500, 501, 502, 503, 504])
+    path = os.path.join(base, 'cache', 'TW', '2330', '1d.json')
+    with open(path, 'r', encoding='utf-8') as f:
+        payload = json.load(f)
+    payload['data'][2].update(close=None, volume=None)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f)
+
+    series = load_series('TW', '2330', base_dir=base)
+    assert np.isnan(series['close'][2]) and series['volume'][2] == 0
+    assert series['close'][3] == 503
+
+    result = validate_batch([series])[0]
+    assert result['status'] == 'quarantine'
+    assert result['issues']['missingPrice'] == {'count': 1, 'first': days[2]}
+    assert 'nonPositive' not in result['issues'] and 'outlier' not in result['issues']
+
+
+def test_incremental_run_rechecks_only_changed_files(tmp_path):
+    base = str(tmp_path)
+    days = [str(d) for d in np.busday_offset('2024-01-01', np.arange(20), roll='forward')]
+    write_candles(base, '2330', days, np.linspace(500, 520, 20))
+    write_candles(base, '2317', days, np.r_[np.linspace(100, 110, 19), 0])
+
+    validator = QualityValidator(base_dir=base, stores=('cache',))
+    report = validator.run(('TW',))
+    assert report['checked'] == 2 and report['summary']['quarantine'] == 1
+    assert load_quarantine('TW', base_dir=base) == {('cache', 'TW', '2317')}
+
+    write_candles(base, '2317', days, np.linspace(100, 110, 20))
+    again = validator.run(('TW',))
+    assert again['checked'] == 1 and again['reused'] == 1
+    assert again['summary']['quarantine'] == 0 and load_quarantine(base_dir=base) == set()
+
+
+def test_calendar_counts_single_missing_session_but_not_holidays():
+    cal = calendar('TW')
+    sessions = cal.expected_sessions('2024-07-15', '2024-08-09')
+    holey = make_series('HOLE', np.delete(sessions, 5), np.linspace(100, 110, len(sessions) - 1))
+    whole = make_series('WHOLE', sessions, np.linspace(100, 110, len(sessions)))
+    hole, complete = validate_batch([holey, whole], calendar=cal)
+    assert hole['issues']['gap'] == {'count': 1, 'first': str(sessions[6])}
+    assert complete['status'] == 'ok'     # 颱風假不算缺漏
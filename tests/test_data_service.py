@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+資料服務測試：區間查詢、欄位投影、ETag/304、gzip 與實際 HTTP 連線
+"""
+
+import json
+import gzip
+import asyncio
+from datetime import datetime, timezone
+
+from data_service import DataService, handle_connection, STALE_AFTER
+
+NOW = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def write_json(path, payload):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload))
+
+
+def make_store(tmp_path, **options):
+    times = [f"2024-01-{day:02d}" for day in range(1, 31)]
+    candles = [{'time': t, 'open': i, 'high': i + 1, 'low': i - 1, 'close': i + 0.5, 'volume': 100 * i}
+               for i, t in enumerate(times)]
+    write_json(tmp_path / 'cache' / 'TW' / '2330' / '1d.json',
+               {'market': 'TW', 'symbol': '2330', 'interval': '1d', 'lastUpdated': NOW, 'data': candles})
+    write_json(tmp_path / 'indicators' / 'TW' / '2330' / 'D_indicators.json', {
+        'market': 'TW', 'symbol': '2330', 'interval': 'D', 'lastUpdated': 'y',
+        'indicators': {'rsi': list(range(30)), 'macd': {'macd': list(range(30)), 'histogram': list(range(30))}},
+    })
+    return DataService(str(tmp_path), **options)
+
+
+def request(service, target, **headers):
+    status, response_headers, body = asyncio.run(service.handle('GET', target, headers))
+    if response_headers.get('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    return status, response_headers, json.loads(body) if body else None
+
+
+def test_ohlc_range_and_projection(tmp_path):
+    service = make_store(tmp_path)
+    status, headers, payload = request(service, '/ohlc?market=TW&symbol=2330&from=2024-01-10&to=2024-01-12&fields=close')
+    assert status == 200
+    assert payload['data'] == [{'time': '2024-01-10', 'close': 9.5}, {'time': '2024-01-11', 'close': 10.5},
+                               {'time': '2024-01-12', 'close': 11.5}]
+    assert payload['metadata']['totalRecords'] == 3
+    assert headers['Cache-Control'].startswith('public')
+
+
+def test_indicators_are_sliced_by_candle_time(tmp_path):
+    service = make_store(tmp_path)
+    status, _, payload = request(service, '/indicators?market=TW&symbol=2330&from=2024-01-29&fields=rsi,macd.histogram')
+    assert status == 200
+    assert payload['data']['time'] == ['2024-01-29', '2024-01-30']
+    assert payload['data']['indicators'] == {'rsi': [28, 29], 'macd': {'histogram': [28, 29]}}
+
+
+def test_etag_gzip_and_reload_on_change(tmp_path):
+    service = make_store(tmp_path)
+    target = '/ohlc?market=TW&symbol=2330'
+    status, headers, payload = request(service, target, **{'accept-encoding': 'gzip'})
+    assert status == 200 and headers['Content-Encoding'] == 'gzip'
+    assert request(service, target, **{'if-none-match': headers['ETag']})[0] == 304
+
+    path = tmp_path / 'cache' / 'TW' / '2330' / '1d.json'
+    data = json.loads(path.read_text())
+    data['data'] = data['data'][:5]
+    path.write_text(json.dumps(data))
+    status, new_headers, payload = request(service, target, **{'if-none-match': headers['ETag']})
+    assert status == 200 and new_headers['ETag'] != headers['ETag']
+    assert len(payload['data']) == 5
+
+
+def test_stale_or_uncovered_files_are_left_to_the_api(tmp_path):
+    service = make_store(tmp_path)
+    assert request(service, '/ohlc?market=TW&symbol=2330&from=2024-01-01&to=2024-01-30')[0] == 200
+    assert request(service, '/ohlc?market=TW&symbol=2330&from=2023-12-01')[0] == 404
+    status, _, payload = request(service, '/ohlc?market=TW&symbol=2330&to=2024-02-15')
+    assert status == 404 and '2024-01-30' in payload['error']
+
+    later = DataService(str(tmp_path), clock=lambda: datetime.now(timezone.utc).timestamp() + STALE_AFTER)
+    status, _, payload = request(later, '/ohlc?market=TW&symbol=2330')
+    assert status == 404 and '過期' in payload['error']
+
+
+def test_encoded_responses_stay_within_the_byte_budget(tmp_path):
+    service = make_store(tmp_path, cache_mb=0.02)
+    for day in range(1, 31):
+        for fields in ('', '&fields=close', '&fields=open,volume'):
+            status, _, _ = request(service, f"/ohlc?market=TW&symbol=2330&from=2024-01-{day:02d}{fields}",
+                                   **{'accept-encoding': 'gzip'})
+            assert status == 200
+    stats = service.stats()['responseCache']
+    assert stats['bytes'] <= stats['maxBytes'] < 0.02 * 1024 * 1024
+    assert stats['evictions'] + stats['rejections'] > 0
+
+
+def test_errors(tmp_path):
+    service = make_store(tmp_path)
+    assert request(service, '/ohlc?market=JP&symbol=1')[0] == 400
+    assert request(service, '/ohlc?market=TW&symbol=../x')[0] == 400
+    assert request(service, '/ohlc?market=TW&symbol=9999')[0] == 404
+    assert request(service, '/nope')[0] == 404
+
+
+def test_http_keep_alive_round_trip(tmp_path):
+    service = make_store(tmp_path)
+
+    async def run():
+        server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        bodies = []
+        for target in ('/health', '/ohlc?market=TW&symbol=2330&fields=close'):
+            writer.write(f"GET {target} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = int([line for line in head.split(b'\r\n') if line.lower().startswith(b'content-length')][0].split(b':')[1])
+            bodies.append(json.loads(await reader.readexactly(length)))
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return bodies
+
+    health, ohlc = asyncio.run(run())
+    assert health == {'status': 'ok'}
+    assert len(ohlc['data']) == 30
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+ETF 註冊表測試：證交所 ISIN 區段與 NASDAQ ETF 欄的解析、雜湊索引查詢、版本與過期更新
+"""
+
+import json
+
+import etf_registry
+from etf_registry import ETFRegistry, SOURCES, parse_isin_board, parse_nasdaq_etfs, refresh_registry, load_registry
+
+ISIN_PAGE = """<table class='h4'>
+<tr align=center><td bgcolor=#D5FFD5>有價證券代號及名稱 </td><td bgcolor=#D5FFD5>國際證券辨識號碼(ISIN Code)</td>
+<td bgcolor=#D5FFD5>上市日</td><td bgcolor=#D5FFD5>市場別</td><td bgcolor=#D5FFD5>產業別</td><td bgcolor=#D5FFD5>CFICode</td><td bgcolor=#D5FFD5>備註</td></tr>
+<tr><td bgcolor=#FAFAD2 colspan=7 ><B> 股票 <B> </td></tr>
+<tr><td bgcolor=#FAFAD2>2330　台積電</td><td bgcolor=#FAFAD2>TW0002330008</td><td bgcolor=#FAFAD2>1994/09/05</td><td bgcolor=#FAFAD2>上市</td><td bgcolor=#FAFAD2>半導體業</td><td bgcolor=#FAFAD2>ESVUFR</td><td bgcolor=#FAFAD2></td></tr>
+<tr><td bgcolor=#FAFAD2 colspan=7 ><B> ETF <B> </td></tr>
+<tr><td bgcolor=#FAFAD2>0050　元大台灣50</td><td bgcolor=#FAFAD2>TW0000050004</td><td bgcolor=#FAFAD2>2003/06/30</td><td bgcolor=#FAFAD2>上市</td><td bgcolor=#FAFAD2></td><td bgcolor=#FAFAD2>CEOGEU</td><td bgcolor=#FAFAD2></td></tr>
+<tr><td bgcolor=#FAFAD2>00878　國泰永續高股息</td><td bgcolor=#FAFAD2>TW00000878A5</td><td bgcolor=#FAFAD2>2020/07/20</td><td bgcolor=#FAFAD2>上市</td><td bgcolor=#FAFAD2></td><td bgcolor=#FAFAD2>CEOGEU</td><td bgcolor=#FAFAD2></td></tr>
+<tr><td bgcolor=#FAFAD2>00632R　元大台灣50反1</td><td bgcolor=#FAFAD2>TW00000632R7</td><td bgcolor=#FAFAD2>2014/10/31</td><td bgcolor=#FAFAD2>上市</td><td bgcolor=#FAFAD2></td><td bgcolor=#FAFAD2>CEOGEU</td><td bgcolor=#FAFAD2></td></tr>
+<tr><td bgcolor=#FAFAD2 colspan=7 ><B> ETN <B> </td></tr>
+<tr><td bgcolor=#FAFAD2>020000　富邦特選蘋果N</td><td bgcolor=#FAFAD2>TW0002000007</td><td bgcolor=#FAFAD2>2018/12/14</td><td bgcolor=#FAFAD2>上市</td><td bgcolor=#FAFAD2></td><td bgcolor=#FAFAD2>EMXXXB</td><td bgcolor=#FAFAD2></td></tr>
+</table>"""
+
+NASDAQ_LINES = ['Symbol|Security Name|Market Category|Test Issue|Financial Status|Round Lot Size|ETF|NextShares',
+                'AAPL|Apple Inc. - Common Stock|Q|N|N|100|N|N',
+                'QQQ|Invesco QQQ Trust, Series 1|G|N|N|100|Y|N',
+                'ZJZZT|NASDAQ TEST STOCK|G|Y|N|100|Y|N',
+                'File Creation Time: 0819202510:00|||||||']
+OTHER_LINES = ['ACT Symbol|Security Name|Exchange|CQS Symbol|ETF|Round Lot Size|Test Issue|NASDAQ Symbol',
+               'SPY|SPDR S&P 500 ETF Trust|P|SPY|Y|100|N|SPY',
+               'BRK.B|Berkshire Hathaway Inc. New Common Stock|N|BRK.B|N|100|N|BRK=B']
+
+
+def fake_fetch(name, session):
+    kind, _, market = SOURCES[name]
+    if kind == 'isin':
+        return parse_isin_board(ISIN_PAGE, market) if market == '上市' else []
+    return parse_nasdaq_etfs(NASDAQ_LINES if market == 'NASDAQ' else OTHER_LINES, market)
+
+
+def test_sources_are_parsed_by_section_and_column():
+    etfs = parse_isin_board(ISIN_PAGE)
+    assert [e['代號'] for e in etfs] == ['0050', '00878', '00632R']       # 5、6 碼代號完整保留，ETN 不算
+    assert etfs[1] == {'代號': '00878', '名稱': '國泰永續高股息', '市場': '上市', '交易所': 'TW',
+                       'yahoo_symbol': '00878.TW', 'ISIN': 'TW00000878A5', '上市日期': '2020/07/20',
+                       '產業': 'ETF', 'ETF': True}
+    assert parse_isin_board(ISIN_PAGE, '上櫃')[0]['yahoo_symbol'] == '0050.TWO'
+    assert [e['代號'] for e in parse_nasdaq_etfs(NASDAQ_LINES, 'NASDAQ')] == ['QQQ']    # 測試代號排除
+    assert [e['代號'] for e in parse_nasdaq_etfs(OTHER_LINES, 'Other')] == ['SPY']
+
+
+def test_lookup_by_code_and_yahoo_symbol():
+    registry, errors = refresh_registry(fetch=fake_fetch, clock=lambda: 1000.0)
+    assert not errors and len(registry) == 5
+    assert registry.is_etf('0050') and registry.is_etf('00878.tw') and registry.is_etf(' qqq ')
+    assert not registry.is_etf('2330') and not registry.is_etf('AAPL') and 'BRK.B' not in registry
+    assert registry.is_etf('SPY', 'US') and not registry.is_etf('SPY', 'TW')
+    assert registry.etf_info('00632R.TW')['名稱'] == '元大台灣50反1' and registry.etf_info('2330') is None
+
+    info = registry.etf_info('0050')
+    info['名稱'] = 'changed'                                            # 回傳的是複本，索引不受影響
+    assert registry.etf_info('0050')['名稱'] == '元大台灣50'
+    assert [r['代號'] for r in registry.records('TW')] == ['0050', '00632R', '00878']
+
+
+def test_persisted_with_version_and_refreshed_after_ttl(tmp_path, monkeypatch):
+    path = str(tmp_path / 'registry.json')
+    calls = []
+
+    def counting_fetch(name, session):
+        calls.append(name)
+        return fake_fetch(name, session)
+
+    monkeypatch.setattr(etf_registry, '_shared', {})
+    now = [1000.0]
+    assert len(load_registry(path, fetch=counting_fetch, clock=lambda: now[0])) == 5 and len(calls) == len(SOURCES)
+    assert json.load(open(path, encoding='utf-8'))['version'] == etf_registry.REGISTRY_VERSION
+
+    etf_registry._shared.clear()
+    now[0] += etf_registry.REGISTRY_TTL - 1                             # 未過期：只讀檔
+    assert load_registry(path, fetch=counting_fetch, clock=lambda: now[0]).is_etf('SPY') and len(calls) == len(SOURCES)
+
+    def failing_fetch(name, session):
+        if name == 'other':
+            raise OSError('timeout')
+        return fake_fetch(name, session)
+
+    now[0] += 2                                                         # 過期：失敗的來源沿用上次資料
+    registry = load_registry(path, fetch=failing_fetch, clock=lambda: now[0])
+    assert registry.generated_at == now[0] and registry.is_etf('SPY')
+    assert ETFRegistry.load(path).generated_at == now[0]
+
+
+def test_outage_backs_off_instead_of_refetching_on_every_lookup(tmp_path, monkeypatch):
+    path = str(tmp_path / 'registry.json')
+    calls = []
+
+    def down(name, session):
+        calls.append(name)
+        raise OSError('network unreachable')
+
+    monkeypatch.setattr(etf_registry, '_shared', {})
+    now = [1000.0]
+    registry = load_registry(path, fetch=down, clock=lambda: now[0])
+    assert len(registry) == 0 and len(calls) == len(SOURCES)
+    for _ in range(3):                                                  # 等待期間只查索引，不再連線
+        assert not load_registry(path, fetch=down, clock=lambda: now[0]).is_etf('0050')
+    assert len(calls) == len(SOURCES)
+
+    etf_registry._shared.clear()                                        # 其他行程從檔案讀到同一個等待時間
+    load_registry(path, fetch=down, clock=lambda: now[0])
+    assert len(calls) == len(SOURCES)
+
+    now[0] += etf_registry.RETRY_INTERVAL
+    assert load_registry(path, fetch=fake_fetch, clock=lambda: now[0]).is_etf('0050')
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+盤中 K 線儲存測試：無損往返、檔案大小、合併與讀取時彙總
+"""
+
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pytest
+
+from intraday_store import IntradayStore, BarSink, encode_bars, decode_bars, aggregate, market_of
+
+
+def make_session(market, day, minutes, seed=0, start_price=100.0):
+    """產生一天連續的 1 分 K（從開盤起算）"""
+    tz = ZoneInfo({'TW': 'Asia/Taipei', 'US': 'America/New_York'}[market])
+    hour, minute = (9, 0) if market == 'TW' else (9, 30)
+    open_ts = int(datetime(*day, hour, minute, tzinfo=tz).timestamp())
+    rng = np.random.default_rng(seed)
+    close = np.round(start_price + np.cumsum(rng.integers(-5, 6, minutes)) * 0.05, 2)
+    open_ = np.round(np.r_[start_price, close[:-1]], 2)
+    return {
+        'time': open_ts + 60 * np.arange(minutes),
+        'open': open_,
+        'high': np.maximum(open_, close) + 0.05,
+        'low': np.minimum(open_, close) - 0.05,
+        'close': close,
+        'volume': rng.integers(0, 50_000, minutes).astype(float),
+    }
+
+
+def test_encoding_round_trips_exactly_and_is_compact():
+    bars = make_session('TW', (2025, 8, 25), 270)
+    data = encode_bars(bars, 60, decimals=2)
+    decoded = decode_bars(data)
+    assert decoded['time'].tolist() == bars['time'].tolist()
+    for field in ('open', 'high', 'low', 'close', 'volume'):
+        np.testing.assert_allclose(decoded[field], bars[field], rtol=0, atol=1e-9)
+    assert len(data) / 270 < 12
+
+    # 小數位數不足時自動提高，仍然無損
+    bars['close'] = bars['close'] + 0.0001
+    np.testing.assert_allclose(decode_bars(encode_bars(bars, 60, decimals=2))['close'], bars['close'], atol=1e-9)
+
+
+def test_unaligned_times_are_rejected_instead_of_truncated(tmp_path):
+    bars = make_session('TW', (2025, 8, 25), 3)
+    start = int(bars['time'][0])
+    bars['time'] = start + np.array([0, 60, 97])                  # 最後一根是未收盤的即時值
+    with pytest.raises(ValueError, match='沒有對齊'):
+        encode_bars(bars, 60)
+
+    store = IntradayStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        store.append('TW', '2330', '1m', bars)
+    assert store.days('TW', '2330', '1m') == []
+
+    # fetch_watchlist 先對齊到該根的起始時間：與同一分鐘的 K 線合併，往返後時間不重複
+    bars['time'] -= bars['time'] % 60
+    store.append('TW', '2330', '1m', bars)
+    stored = store.read_day('TW', '2330', '1m', '2025-08-25')
+    assert stored['time'].tolist() == [start, start + 60]
+    assert stored['close'][-1] == pytest.approx(bars['close'][-1])
+
+
+def test_append_merges_partitions_and_splits_local_days(tmp_path):
+    store = IntradayStore(str(tmp_path))
+    day1 = make_session('US', (2025, 3, 7), 390, seed=1)
+    day2 = make_session('US', (2025, 3, 10), 390, seed=2)      # 夏令時間切換後的第一個交易日
+    assert store.append('US', 'AAPL', '1m', {k: np.r_[day1[k], day2[k][:100]] for k in day1}) == \
+        ['2025-03-07', '2025-03-10']
+
+    # 與既有資料重疊：同一時間以新資料為準
+    tail = {k: v[90:].copy() for k, v in day2.items()}
+    tail['close'][:10] += 1.0
+    store.append('US', 'AAPL', '1m', tail)
+    stored = store.read_day('US', 'AAPL', '1m', '2025-03-10')
+    assert len(stored['time']) == 390
+    np.testing.assert_allclose(stored['close'][90:100], day2['close'][90:100] + 1.0)
+
+    assert store.days('US', 'AAPL', '1m', start='2025-03-08') == ['2025-03-10']
+    with pytest.raises(ValueError):
+        store.append('US', 'AAPL', '1h', day1)
+
+
+def test_read_aggregates_to_higher_intervals(tmp_path):
+    store = IntradayStore(str(tmp_path))
+    bars = make_session('US', (2025, 8, 25), 390, seed=3)
+    store.append('US', 'NVDA', '1m', bars)
+
+    hourly = store.read('US', 'NVDA', '1m', '2025-08-25', '2025-08-25', target='1h')
+    assert len(hourly['time']) == 7                    # 9:30、10:30 … 15:30（最後一根只有 30 分鐘）
+    first = slice(0, 60)
+    assert hourly['time'][0] == bars['time'][0]
+    assert hourly['open'][0] == bars['open'][0] and hourly['close'][0] == bars['close'][59]
+    assert hourly['high'][0] == pytest.approx(bars['high'][first].max())
+    assert hourly['low'][0] == pytest.approx(bars['low'][first].min())
+    assert hourly['volume'][0] == bars['volume'][first].sum()
+
+    daily = store.read('US', 'NVDA', '1m', target='1d')
+    assert len(daily['time']) == 1 and daily['volume'][0] == bars['volume'].sum()
+    fifteen = aggregate(bars, 900, 'US')
+    assert len(fifteen['time']) == 26 and np.all(np.diff(fifteen['time']) == 900)
+
+
+def test_bar_sink_writes_closed_bars(tmp_path):
+    store = IntradayStore(str(tmp_path))
+    sink = BarSink(store)
+    bars = make_session('TW', (2025, 8, 25), 5)
+    for row in zip(*(bars[k] for k in ('time', 'open', 'high', 'low', 'close', 'volume'))):
+        sink('2330.TW', 60, list(row), {})
+    sink('2330.TW', 15, [0] * 6, {})                  # 非儲存週期略過
+    sink.flush()
+    assert market_of('2330.TW') == 'TW' and market_of('AAPL') == 'US'
+    assert store.read('TW', '2330', '1m')['close'].tolist() == bars['close'].tolist()
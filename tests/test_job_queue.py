@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+持久化工作佇列測試：領取、租約、重試與中斷續跑
+"""
+
+from job_queue import JobQueue
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_queue(tmp_path, clock, **kwargs):
+    return JobQueue(str(tmp_path / 'jobs.sqlite'), clock=clock, **kwargs)
+
+
+def test_claim_orders_by_priority_and_respects_not_before(tmp_path):
+    clock = FakeClock()
+    queue = make_queue(tmp_path, clock)
+    added = queue.enqueue('q', [('b', {'n': 2}, 1), ('a', {'n': 1}, 0), ('later', {}, 0, 2000.0)])
+    assert added == 3
+    assert queue.enqueue('q', [('a', {'n': 99})]) == 0
+
+    tasks = queue.claim('q', 'w1', limit=10)
+    assert [t.key for t in tasks] == ['a', 'b']
+    assert tasks[0].payload == {'n': 1} and tasks[0].attempts == 1
+    assert queue.claim('q', 'w2') == []
+    assert queue.next_due('q') == 1000.0 + 300   # 租約到期時間
+
+    clock.now = 1250.0
+    assert queue.complete('q', ['a', 'b'], 'w1') == 2
+    assert queue.next_due('q') == 2000.0
+    clock.now = 2000.0
+    assert [t.key for t in queue.claim('q', 'w2')] == ['later']
+
+
+def test_fail_retries_with_backoff_then_gives_up(tmp_path):
+    clock = FakeClock()
+    queue = make_queue(tmp_path, clock, max_attempts=2)
+    queue.enqueue('q', [('x', {})])
+
+    queue.claim('q', 'w')
+    assert queue.fail('q', 'x', 'timeout', 'w') == 'pending'
+    assert queue.claim('q', 'w') == []
+    clock.now += 30
+    assert [t.attempts for t in queue.claim('q', 'w')] == [2]
+    assert queue.fail('q', 'x', 'timeout', 'w') == 'failed'
+    assert queue.stats('q')['failed'] == 1
+    assert queue.failures('q')[0]['last_error'] == 'timeout'
+
+    assert queue.reset('q') == 1
+    assert queue.claim('q', 'w')[0].attempts == 1
+
+
+def test_restart_resumes_unfinished_tasks(tmp_path):
+    clock = FakeClock()
+    queue = make_queue(tmp_path, clock)
+    queue.enqueue('q', [(str(i), {}) for i in range(5)])
+    first = queue.claim('q', 'w1', limit=3)
+    queue.complete('q', [first[0].key], 'w1')
+    queue.close()   # worker 在處理剩下兩筆時當掉
+
+    queue = make_queue(tmp_path, clock)
+    assert queue.enqueue('q', [(str(i), {}) for i in range(5)]) == 0
+    assert [t.key for t in queue.claim('q', 'w2', limit=10)] == ['3', '4']
+    clock.now += 301   # 租約到期後當掉 worker 的任務可被重新領取
+    reclaimed = queue.claim('q', 'w2', limit=10)
+    assert sorted(t.key for t in reclaimed) == ['1', '2', '3', '4']
+    queue.complete('q', [t.key for t in reclaimed], 'w2')
+    assert queue.stats('q') == {'pending': 0, 'in_flight': 0, 'done': 5, 'failed': 0}
+    assert queue.next_due('q') is None
+
+
+def test_only_the_lease_owner_can_complete_or_fail(tmp_path):
+    clock = FakeClock()
+    queue = make_queue(tmp_path, clock)
+    queue.enqueue('q', [('a', {}), ('b', {})])
+    queue.claim('q', 'w1', limit=2)
+    clock.now += 301                      # w1 的租約過期，任務被 w2 重新領取
+    assert len(queue.claim('q', 'w2', limit=2)) == 2
+
+    # w1 後來才回報結果：不能把 w2 正在處理的任務標為完成或失敗
+    assert queue.complete('q', ['a'], 'w1') == 0
+    assert queue.fail('q', 'b', 'timeout', 'w1') is None
+    assert queue.stats('q')['in_flight'] == 2
+
+    assert queue.complete('q', ['a'], 'w2') == 1
+    assert queue.fail('q', 'b', 'timeout', 'w2') == 'pending'
+    assert queue.complete('q', ['a'], 'w2') == 0           # 已完成的任務不會重複計算
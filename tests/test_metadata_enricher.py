@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+產業 / 市值補齊測試：成批查詢、並行上限、快取有效期限與查無資料的快取
+"""
+
+import json
+import time
+import threading
+
+from metadata_enricher import (MetadataEnricher, MetadataCache, YahooClient, QUOTE_TTL, NEGATIVE_TTL,
+                               load_market_file, is_unknown)
+from refresh_scheduler import RateLimiter
+
+PROFILES = {'AAPL': ('Technology', 'Consumer Electronics'), 'JPM': ('Financial Services', 'Banks - Diversified'),
+            'BRK-B': ('Financial Services', 'Insurance - Diversified'), '2330.TW': ('Technology', 'Semiconductors')}
+QUOTE_TYPES = {'AAPL': 'EQUITY', 'JPM': 'EQUITY', 'BRK-B': 'EQUITY', 'SPY': 'ETF', 'NOPRO': 'EQUITY',
+               '2330.TW': 'EQUITY'}
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, text=''):
+        self.status_code = status_code
+        self.payload = payload
+        self.text = text
+        self.content = text.encode()
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(str(self.status_code))
+
+
+class FakeYahoo:
+    """模擬 crumb、多檔 quote 與單檔 quoteSummary，並記錄同時進行的請求數"""
+
+    def __init__(self):
+        self.headers = {}
+        self.hooks = {'response': []}
+        self.calls = []
+        self.active = self.peak = 0
+        self.lock = threading.Lock()
+
+    def get(self, url, params=None, timeout=None):
+        if 'getcrumb' in url:
+            return FakeResponse(200, text='crumb')
+        if 'fc.yahoo.com' in url:
+            return FakeResponse(404)
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.calls.append((url, params))
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+        if 'v7/finance/quote' in url:
+            result = [{'symbol': s, 'quoteType': QUOTE_TYPES[s], 'marketCap': 1000 + i}
+                      for i, s in enumerate(params['symbols'].split(',')) if s in QUOTE_TYPES]
+            return FakeResponse(200, {'quoteResponse': {'result': result}})
+        symbol = url.rsplit('/', 1)[1]
+        if symbol not in PROFILES:
+            return FakeResponse(404, {'quoteSummary': {'result': None}})
+        sector, industry = PROFILES[symbol]
+        return FakeResponse(200, {'quoteSummary': {'result': [{'assetProfile': {'sector': sector, 'industry': industry}}]}})
+
+
+def make_enricher(tmp_path, session, clock=time.time, batch_size=2, concurrency=3):
+    client = YahooClient(session, limiter=RateLimiter(1000, 1000))
+    return MetadataEnricher(client, MetadataCache(str(tmp_path / 'cache.json'), clock=clock),
+                            concurrency=concurrency, batch_size=batch_size)
+
+
+def stocks():
+    return [{'symbol': s, 'sector': 'Unknown', 'industry': 'Unknown', 'marketCap': 0, 'lastUpdated': '2025-08-26T00:00:00Z'}
+            for s in ('AAPL', 'JPM', 'BRK.B', 'SPY', 'NOPRO', 'GONE')]
+
+
+def test_batches_quotes_bounds_concurrency_and_fills_fields(tmp_path):
+    session = FakeYahoo()
+    enricher = make_enricher(tmp_path, session)
+    listed = stocks()
+    stats = enricher.enrich('US', listed)
+
+    quote_calls = [c for c in session.calls if 'v7' in c[0]]
+    profile_calls = [c[0].rsplit('/', 1)[1] for c in session.calls if 'quoteSummary' in c[0]]
+    assert len(quote_calls) == 3                               # 6 檔、每批 2 檔
+    assert sorted(profile_calls) == ['AAPL', 'BRK-B', 'JPM', 'NOPRO']   # ETF 與查無報價者不查產業
+    assert session.peak <= 3
+    by_symbol = {s['symbol']: s for s in listed}
+    assert by_symbol['BRK.B']['sector'] == 'Financial Services' and by_symbol['BRK.B']['marketCap'] > 0
+    assert by_symbol['SPY']['sector'] == 'Unknown' and by_symbol['SPY']['marketCap'] > 0
+    assert stats['updated'] == 5 and stats['unknown'] == 3
+
+
+def test_cache_ttl_and_negative_cache(tmp_path):
+    now = [1_760_000_000.0]
+    session = FakeYahoo()
+    make_enricher(tmp_path, session, clock=lambda: now[0]).enrich('US', stocks())
+
+    # 快取有效：不送出任何請求，直接由快取補上
+    session = FakeYahoo()
+    listed = stocks()
+    stats = make_enricher(tmp_path, session, clock=lambda: now[0]).enrich('US', listed)
+    assert session.calls == [] and stats['updated'] == 5
+
+    # 市值過期只重查市值；查無產業的 NOPRO 在 NEGATIVE_TTL 內不再查
+    now[0] += QUOTE_TTL + 1
+    session = FakeYahoo()
+    make_enricher(tmp_path, session, clock=lambda: now[0]).enrich('US', stocks())
+    assert session.calls and all('v7' in url for url, _ in session.calls)
+
+    now[0] += NEGATIVE_TTL
+    session = FakeYahoo()
+    make_enricher(tmp_path, session, clock=lambda: now[0]).enrich('US', stocks())
+    assert 'NOPRO' in [url.rsplit('/', 1)[1] for url, _ in session.calls if 'quoteSummary' in url]
+
+
+def test_market_file_helpers(tmp_path):
+    path = tmp_path / 'US-stocks-latest.json'
+    path.write_text(json.dumps({'market': 'US', 'collectedStocks': stocks()}) + '\n}')
+    assert len(load_market_file(str(path))['collectedStocks']) == 6
+    assert is_unknown('28') and is_unknown('Unknown') and not is_unknown('Technology')
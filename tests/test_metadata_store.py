@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+元資料庫測試：upsert 合併、索引查詢、相容舊格式的匯入匯出與 WAL 下的並行讀寫
+"""
+
+import json
+import sqlite3
+
+from metadata_store import MetadataStore
+
+LEGACY = {
+    'version': '1.0.0',
+    'lastUpdated': '2025-08-26T15:25:01.746Z',
+    'stocks': {
+        '2330': {'symbol': '2330', 'name': '台積電', 'market': 'TW', 'category': 'stock', 'exchange': 'TAI',
+                 'exchangeName': 'Taiwan', 'quoteType': 'EQUITY', 'currency': 'TWD',
+                 'lastUpdated': '2025-08-26T15:25:00.047Z',
+                 'yahooData': {'longName': 'Taiwan Semiconductor', 'fiftyTwoWeekRange': {'low': 780, 'high': 1200}}},
+        '0050': {'symbol': '0050', 'name': '元大台灣50', 'market': 'TW', 'category': 'etf', 'exchange': 'TAI',
+                 'exchangeName': 'Taiwan', 'quoteType': 'ETF', 'currency': 'TWD',
+                 'lastUpdated': '2025-08-20T01:00:00.000Z'},
+    },
+}
+
+
+def make_store(tmp_path):
+    return MetadataStore(str(tmp_path / 'metadata.sqlite'), clock=lambda: '2025-09-01T00:00:00.000Z')
+
+
+def test_json_round_trip_matches_legacy_format(tmp_path):
+    legacy = tmp_path / 'stock-metadata.json'
+    legacy.write_text(json.dumps(LEGACY, ensure_ascii=False, indent=2), encoding='utf-8')
+    store = make_store(tmp_path)
+    assert store.import_json(str(legacy)) == 2
+
+    exported = tmp_path / 'exported.json'
+    assert store.export_json(str(exported)) == 2
+    assert exported.read_text(encoding='utf-8') == legacy.read_text(encoding='utf-8')
+
+
+def test_upsert_merges_fields_and_indexes_are_used(tmp_path):
+    store = make_store(tmp_path)
+    store.upsert_many(LEGACY['stocks'].values())
+    store.upsert_many([{'symbol': '2330', 'sector': 'Technology', 'industry': 'Semiconductors', 'marketCap': 2.5e13},
+                       {'symbol': 'AAPL', 'market': 'US', 'currency': 'USD', 'sector': 'Technology'}], batch_size=1)
+
+    tsmc = store.get('2330')
+    assert tsmc['name'] == '台積電' and tsmc['sector'] == 'Technology'          # 未提供的欄位保留
+    assert tsmc['yahooData']['longName'] == 'Taiwan Semiconductor'
+    assert tsmc['lastUpdated'] == '2025-09-01T00:00:00.000Z'
+    assert store.get('AAPL')['category'] == 'stock' and 'yahooData' not in store.get('AAPL')
+    assert [r['symbol'] for r in store.query(market='TW', category='etf')] == ['0050']
+    assert [r['symbol'] for r in store.query(sector='Technology')] == ['2330', 'AAPL']
+    assert [r['symbol'] for r in store.search('台積')] == ['2330']
+    assert store.stats() == {'total': 3, 'byMarket': {'TW': 2, 'US': 1}, 'byCategory': {'etf': 1, 'stock': 2}}
+
+    plan = ' '.join(row[-1] for row in store.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM stocks WHERE market = 'TW' AND sector = 'Technology'"))
+    assert 'idx_stocks_sector' in plan
+    plan = ' '.join(row[-1] for row in store.conn.execute("EXPLAIN QUERY PLAN SELECT * FROM stocks WHERE symbol = '2330'"))
+    assert 'USING INDEX' in plan or 'PRIMARY KEY' in plan
+
+
+def test_readers_do_not_block_the_writer(tmp_path):
+    writer = make_store(tmp_path)
+    writer.upsert({'symbol': '2330', 'name': '台積電'})
+    reader = sqlite3.connect(str(tmp_path / 'metadata.sqlite'), timeout=0)
+
+    # 讀取端開著讀取交易時，寫入端仍能提交；讀取端看到的是交易開始時的快照
+    reader.execute('BEGIN')
+    assert reader.execute("SELECT name FROM stocks WHERE symbol = '2330'").fetchone() == ('台積電',)
+    writer.upsert({'symbol': '2330', 'name': 'TSMC'})
+    assert reader.execute("SELECT name FROM stocks WHERE symbol = '2330'").fetchone() == ('台積電',)
+    reader.execute('COMMIT')
+    assert reader.execute("SELECT name FROM stocks WHERE symbol = '2330'").fetchone() == ('TSMC',)
+
+
+def test_currency_follows_market_for_new_rows(tmp_path):
+    store = make_store(tmp_path)
+    store.upsert_many([{'symbol': 'MSFT', 'market': 'US'}, {'symbol': '2317'}])
+    assert store.get('MSFT')['currency'] == 'USD' and store.get('2317')['currency'] == 'TWD'
+
+    store.upsert({'symbol': 'NVDA', 'market': 'US', 'currency': 'TWD'})        # 舊版匯入留下的錯誤幣別
+    (tmp_path / 'US-stocks-latest.json').write_text(json.dumps({'collectedStocks': [
+        {'symbol': 'NVDA', 'market': 'US', 'name': 'NVIDIA'}, {'symbol': 'AMD', 'market': 'US', 'name': 'AMD'}]}))
+    assert store.import_full_market('US', str(tmp_path)) == 2
+    assert store.get('NVDA')['currency'] == store.get('AMD')['currency'] == 'USD'
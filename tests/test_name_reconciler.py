@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+公司名稱對齊測試：正規化、代號分區、名稱前綴分區與顯示名稱的選擇
+"""
+
+from name_reconciler import (NameReconciler, normalize_ticker, split_security, name_tokens, similarity,
+                             display_case)
+
+
+def test_normalization():
+    assert normalize_ticker('BRK.B') == normalize_ticker('brk/b') == 'BRK-B'
+    assert normalize_ticker('ABR$D') == 'ABR-PD' and normalize_ticker('AACT.U') == 'AACT-UN'
+    assert split_security('NVIDIA Corporation - Common Stock') == ('NVIDIA Corporation', 'Common Stock')
+    assert split_security('Berkshire Hathaway Inc. New Common Stock') == ('Berkshire Hathaway Inc.', 'Common Stock')
+    assert split_security('Alternative Access First Priority CLO Bond ETF')[1] == ''
+    assert name_tokens('NVIDIA CORP') == name_tokens('NVIDIA Corporation') == ('nvidia',)
+    assert name_tokens('AMAZON COM INC') == name_tokens('Amazon.com, Inc.')
+    assert similarity(name_tokens('Procter & Gamble Co'), name_tokens('PROCTER AND GAMBLE CO')) == 1.0
+    assert similarity(name_tokens('GE Aerospace'), name_tokens('GENERAL ELECTRIC CO')) < 0.6
+    assert display_case('BANK OF AMERICA CORP /DE/') == 'Bank Of America Corp.'
+
+
+def test_reconcile_by_ticker_block():
+    reconciler = NameReconciler()
+    reconciler.add('sec', 'NVDA', 'NVIDIA CORP', 1045810)
+    reconciler.add('nasdaq', 'NVDA', 'NVIDIA Corporation - Common Stock')
+    reconciler.add('yahoo', 'NVDA', 'NVIDIA Corporation')
+    reconciler.add('sec', 'BRK-B', 'BERKSHIRE HATHAWAY INC', 1067983)
+    reconciler.add('nasdaq', 'BRK.B', 'Berkshire Hathaway Inc. New Common Stock')
+    reconciler.add('sec', 'GE', 'GENERAL ELECTRIC CO', 40545)
+    reconciler.add('nasdaq', 'GE', 'GE Aerospace Common Stock')
+    reconciler.add('sec', 'XOM', 'EXXON MOBIL CORP', 34088)
+    results = reconciler.reconcile()
+
+    assert results['NVDA']['name'] == 'NVIDIA Corporation' and results['NVDA']['status'] == 'matched'
+    assert results['NVDA']['cik'] == 1045810
+    assert results['BRK-B']['name'] == 'Berkshire Hathaway Inc.'
+    # 公司改名：以現行掛牌的 NASDAQ 名稱為準，CIK 仍沿用 SEC 的代號對應
+    assert results['GE']['status'] == 'conflict' and results['GE']['name'] == 'GE Aerospace'
+    assert results['GE']['cik'] == 40545
+    assert results['XOM']['name'] == 'Exxon Mobil Corp.' and results['XOM']['status'] == 'single'
+
+
+def test_securities_without_sec_ticker_link_to_issuer_by_name_block():
+    reconciler = NameReconciler(max_block=2)
+    reconciler.add('sec', 'AACB', 'Artius II Acquisition Inc.', 2034334)
+    reconciler.add('nasdaq', 'AACBW', 'Artius II Acquisition Inc. - Warrant')
+    reconciler.add('nasdaq', 'AACBU', 'Artius II Acquisition Inc. - Units')
+    for i in range(3):                              # 同一個第一 token 的大區塊改用前兩個 token 分區
+        reconciler.add('sec', f"FT{i}", f"First Trust Fund {i}", 100 + i)
+    reconciler.add('sec', 'FCX', 'Freeport-McMoRan Inc.', 831259)
+    reconciler.add('nasdaq', 'FTXX', 'First Trust Fund 1 ETF')
+    results = reconciler.reconcile()
+
+    assert results['AACBW']['status'] == 'linked' and results['AACBW']['cik'] == 2034334
+    assert results['AACBU']['name'] == 'Artius II Acquisition Inc. - Units'
+    assert results['FTXX']['cik'] == 101
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+NASDAQ FTP 多檔下載測試：以本機 pyftpdlib 伺服器代替 ftp.nasdaqtrader.com，
+驗證並行下載、邊下載邊解析、未變動檔案略過與單檔失敗不影響其他檔案
+"""
+
+import os
+import threading
+
+import pytest
+
+pytest.importorskip('pyftpdlib')
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.servers import ThreadedFTPServer
+
+from nasdaq_ftp_fetcher import NasdaqFTPFetcher, LineParser, parse_nasdaq_traded, NASDAQ_LISTED, NASDAQ_TRADED
+from stock_data_collector import parse_nasdaq_listing
+
+LISTED = ('Symbol|Security Name|Market Category|Test Issue|Financial Status|Round Lot Size|ETF|NextShares\r\n'
+          'AAPL|Apple Inc. - Common Stock|Q|N|N|100|N|N\r\n'
+          'QQQ|Invesco QQQ Trust, Series 1|G|N|N|100|Y|N\r\n'
+          'File Creation Time: 0819202510:00|||||||\r\n')
+TRADED = ('Nasdaq Traded|Symbol|Security Name|Listing Exchange|Market Category|ETF|Round Lot Size|Test Issue|'
+          'Financial Status|CQS Symbol|NASDAQ Symbol|NextShares\r\n'
+          'Y|AAPL|Apple Inc. - Common Stock|Q|Q|N|100|N|N||AAPL|N\r\n'
+          'Y|SPY|SPDR S&P 500 ETF Trust|P| |Y|100|N||SPY|SPY|N\r\n'
+          'Y|ZXZZT|NASDAQ TEST STOCK|Q|G|N|100|Y|N||ZXZZT|N\r\n'
+          'File Creation Time: 0819202510:00|||||||||||\r\n')
+FILES = {NASDAQ_LISTED: LISTED, NASDAQ_TRADED: TRADED, 'Symboldirectory/options.txt': 'x' * 300000}
+
+
+@pytest.fixture
+def ftp_server(tmp_path):
+    root = tmp_path / 'ftp'
+    for remote, content in FILES.items():
+        path = root / remote
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content.encode())
+    logins = []
+    authorizer = DummyAuthorizer()
+    authorizer.add_anonymous(str(root))
+
+    class Handler(FTPHandler):
+        def on_login(self, username):
+            logins.append(username)
+
+    Handler.authorizer = authorizer
+    server = ThreadedFTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'timeout': 0.05, 'handle_exit': False}, daemon=True)
+    thread.start()
+    yield root, server.address[1], logins
+    server.close_all()
+    thread.join(5)
+
+
+def make_fetcher(tmp_path, port):
+    return NasdaqFTPFetcher('127.0.0.1', port, str(tmp_path / 'download'), connections=3, timeout=10)
+
+
+def test_line_parser_splits_across_chunks():
+    parser = LineParser()
+    data = '第一行\r\nsecond|line\nthird'.encode()
+    for i in range(len(data)):                          # 每次只餵一個位元組，中文字會被切開
+        parser.feed(data[i:i + 1])
+    assert parser.close() == ['第一行', 'second|line', 'third']
+
+    stocks = parse_nasdaq_traded(TRADED.splitlines())
+    assert [(s['代號'], s['市場'], s['ETF']) for s in stocks] == [('AAPL', 'NASDAQ', False), ('SPY', 'Other', True)]
+
+
+def test_parallel_download_streams_to_disk_and_parser(tmp_path, ftp_server):
+    root, port, logins = ftp_server
+    parsers = {NASDAQ_LISTED: lambda: LineParser(lambda lines: parse_nasdaq_listing(lines, 'NASDAQ')),
+               NASDAQ_TRADED: lambda: LineParser(parse_nasdaq_traded)}
+    results = make_fetcher(tmp_path, port).fetch(list(FILES) + ['ETFData/ETFList.txt'], parsers)
+
+    assert list(results) == list(FILES) + ['ETFData/ETFList.txt']
+    assert results['ETFData/ETFList.txt']['status'] == 'failed'          # 不存在的檔案不影響其他檔案
+    for remote, content in FILES.items():
+        assert results[remote]['status'] == 'downloaded' and results[remote]['bytes'] == len(content)
+        with open(results[remote]['path'], 'rb') as f:
+            assert f.read() == content.encode()
+    assert [s['代號'] for s in results[NASDAQ_LISTED]['parsed'] if s['ETF']] == ['QQQ']
+    assert [s['代號'] for s in results[NASDAQ_TRADED]['parsed']] == ['AAPL', 'SPY']
+    assert 1 <= len(logins) <= 3
+    assert not any(name.endswith('.tmp') for _, _, names in os.walk(tmp_path / 'download') for name in names)
+
+
+def test_unchanged_files_are_skipped_but_still_parsed(tmp_path, ftp_server):
+    root, port, logins = ftp_server
+    parsers = {NASDAQ_LISTED: lambda: LineParser(lambda lines: parse_nasdaq_listing(lines, 'NASDAQ'))}
+    make_fetcher(tmp_path, port).fetch(list(FILES), parsers)
+
+    results = make_fetcher(tmp_path, port).fetch(list(FILES), parsers)     # 新的實例從狀態檔讀回
+    assert all(r['status'] == 'unchanged' and r['bytes'] == 0 for r in results.values())
+    assert [s['代號'] for s in results[NASDAQ_LISTED]['parsed']] == ['AAPL', 'QQQ']
+
+    (root / NASDAQ_LISTED).write_bytes(LISTED.replace('AAPL', 'MSFT').encode())     # 大小不變，修改時間改變
+    stat = os.stat(root / NASDAQ_LISTED)
+    os.utime(root / NASDAQ_LISTED, (stat.st_atime, stat.st_mtime + 120))
+    results = make_fetcher(tmp_path, port).fetch(list(FILES), parsers)
+    assert results[NASDAQ_LISTED]['status'] == 'downloaded' and results[NASDAQ_TRADED]['status'] == 'unchanged'
+    assert [s['代號'] for s in results[NASDAQ_LISTED]['parsed']] == ['MSFT', 'QQQ']
+
+    assert make_fetcher(tmp_path, port).fetch([NASDAQ_TRADED], force=True)[NASDAQ_TRADED]['status'] == 'downloaded'
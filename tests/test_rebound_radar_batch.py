@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+反轉雷達批次掃描測試（離線，使用合成資料）
+"""
+
+import os
+import re
+import math
+
+import numpy as np
+
+from rebound_radar_batch import (build_panel, compute_conditions, score_latest, valid_until, ReboundRadarBatch,
+                                 RULES, MIN_SCORE, MIN_BARS, WINDOW)
+
+ROUTE_PATH = os.path.join(os.path.dirname(__file__), '..', 'app', 'api', 'rebound-radar', 'route.ts')
+
+
+def make_series(symbol, close):
+    close = np.asarray(close, dtype=float)
+    return {
+        'market': 'TW', 'symbol': symbol,
+        'time': np.datetime64('2024-01-01') + np.arange(len(close)),
+        'open': close * 0.99, 'high': close * 1.01, 'low': close * 0.98, 'close': close,
+        'volume': np.full(len(close), 1000.0),
+    }
+
+
+def make_ohlcv(rng, length):
+    close = 50 * np.cumprod(1 + rng.normal(0, 0.02, length))
+    series = make_series('X', close)
+    series['open'] = close * (1 + rng.normal(0, 0.01, length))
+    series['volume'] = rng.integers(1, 5000, length) * 100.0
+    series['volume'][-1] *= rng.choice([1, 8])                  # 部分樣本最後一根爆量
+    return series
+
+
+# ---- app/api/rebound-radar/route.ts 的 reboundSignal 逐行移植，作為數值比對的基準 ----
+
+def live_ema(values, period):
+    k = 2 / (period + 1)
+    e = values[0]
+    out = [e]
+    for v in values[1:]:
+        e = v * k + e * (1 - k)
+        out.append(e)
+    return out
+
+
+def live_rsi(values, period=14):
+    if len(values) < period + 1:
+        return [50] * len(values)
+    g = l = 0.0
+    for i in range(1, period + 1):
+        c = values[i] - values[i - 1]
+        if c >= 0:
+            g += c
+        else:
+            l -= c
+    rs = (g / period) / ((l or 1e-9) / period)
+    out = [50] * period + [100 - 100 / (1 + rs)]
+    for i in range(period + 1, len(values)):
+        c = values[i] - values[i - 1]
+        g = (g * (period - 1) + max(c, 0)) / period
+        l = (l * (period - 1) + max(-c, 0)) / period
+        rs = g / (l or 1e-9)
+        out.append(100 - 100 / (1 + rs))
+    return out
+
+
+def live_signal(closes, volumes, opens):
+    n = len(closes)
+    if n < 40:
+        return 0, []
+    r = live_rsi(closes)
+    e12, e26 = live_ema(closes, 12), live_ema(closes, 26)
+    diff = [a - b for a, b in zip(e12, e26)]
+    signal = live_ema(diff, 9)
+    hist = [d - s for d, s in zip(diff, signal)]
+    obv, v = [0], 0
+    for i in range(1, n):
+        v += volumes[i] if closes[i] > closes[i - 1] else -volumes[i] if closes[i] < closes[i - 1] else 0
+        obv.append(v)
+    last = n - 1
+    score, reasons = 0, []
+
+    def hit(points, label):
+        nonlocal score
+        score += points
+        reasons.append(label)
+
+    rsi_rise = r[last] < 45 and r[last] > r[last - 1] > r[last - 2]
+    if r[last] < 35 and rsi_rise:
+        hit(3, 'RSI 低位回升')
+    elif rsi_rise:
+        hit(2, 'RSI 回升')
+    if diff[last - 1] <= signal[last - 1] and diff[last] > signal[last]:
+        hit(3, 'MACD 金叉')
+    elif hist[last] > hist[last - 1] > hist[last - 2]:
+        hit(2, 'MACD 柱體轉強')
+    if obv[last] > obv[last - 1] > obv[last - 2]:
+        hit(2, 'OBV 走高')
+    if closes[last] > live_ema(closes, 20)[last]:
+        hit(2, '收復 20EMA')
+    elif min(closes[last - 1], closes[last - 2]) > min(closes[last - 3], closes[last - 4]):
+        hit(1, '出現 higher low')
+    if closes[last] <= min(closes[-20:]) * 1.02 and r[last] > min(r[-20:]) + 5:
+        hit(3, 'RSI 底背離')
+    prev = volumes[-21:-1]
+    mean = sum(prev) / 20
+    std = math.sqrt(max(sum(v * v for v in prev) / 20 - mean * mean, 0))
+    if std > 0 and (volumes[last] - mean) / std > 1.5 and closes[last] > opens[last]:
+        hit(2, '放量收紅')
+    if closes[last] / max(closes[-252:]) - 1 <= -0.2:
+        hit(1, '自52週高點回檔逾20%')
+    return score, reasons
+
+
+def test_short_series_are_left_padded_in_panel():
+    panel = build_panel([make_series('A', np.arange(1, 101)), make_series('B', np.arange(1, 51))], window=80)
+    assert panel['close'].shape == (80, 2)
+    assert panel['close'][-1, 1] == 50
+    assert np.all(panel['close'][:30, 1] == 1)
+    assert np.all(panel['volume'][:30, 1] == 0)
+    assert panel['start'].tolist() == [0, 30]
+
+
+def test_ema_reclaim_is_detected_on_last_bar():
+    falling = np.linspace(100, 60, 270)
+    recovering = np.concatenate([falling, [61, 63, 66, 70]])
+    conditions = compute_conditions(build_panel([make_series('R', recovering)], window=274))
+    assert conditions['reclaim_ema20'][-1, 0]
+
+    scores, reasons = score_latest(conditions)
+    assert scores[0] >= 2
+    assert '收復 20EMA' in reasons[0] and '出現 higher low' not in reasons[0]       # 同組只取分數高者
+
+
+def test_rules_match_the_live_api_fallback():
+    route = open(ROUTE_PATH, encoding='utf-8').read()
+    live = re.findall(r"score \+= (\d+); reasons\.push\('([^']+)'\)", route)
+    assert sorted(live) == sorted((str(points), label) for _, points, label, _ in RULES)
+    assert MIN_SCORE == 0 and "if (n < %d)" % MIN_BARS in route
+
+
+def test_scores_match_the_live_formulas_for_short_and_long_series():
+    rng = np.random.default_rng(11)
+    lengths = [MIN_BARS, 41, 55, 80, 120, 200, 251, 253, WINDOW - 1, WINDOW, WINDOW + 1, 420, 700]
+    universe = [make_ohlcv(rng, length) for length in lengths for _ in range(8)]
+    universe += [{field: values[:length] for field, values in universe[-1].items()}    # 同一檔的截斷版本
+                 for length in range(MIN_BARS, 700, 7)]
+    universe += [make_series('F', np.concatenate([np.linspace(100, 60, length - 2), [60.2, 60.5]]))    # RSI 低位回升
+                 for length in (MIN_BARS, 90, WINDOW + 50)]
+
+    scores, reasons = score_latest(compute_conditions(build_panel(universe)))
+    for col, series in enumerate(universe):
+        expected = live_signal(list(series['close']), list(series['volume']), list(series['open']))
+        assert (int(scores[col]), sorted(reasons[col])) == (expected[0], sorted(expected[1])), len(series['close'])
+
+
+def test_precomputed_file_stays_valid_until_the_next_session_is_refreshed():
+    # 週五的名單到下週一收盤、更新完之前都有效；2026-02-16 起台股春節休市，到下一個交易日 02-23
+    assert valid_until('TW', '2026-01-09').date().isoformat() == '2026-01-12'
+    assert valid_until('TW', '2026-02-11').date().isoformat() == '2026-02-23'
+    assert valid_until('US', '2026-07-02').date().isoformat() == '2026-07-06'
+
+
+def test_chunking_does_not_change_results(monkeypatch):
+    rng = np.random.default_rng(7)
+    universe = [make_series(f"S{i:02d}", 50 * np.cumprod(1 + rng.normal(0, 0.02, 320))) for i in range(12)]
+    monkeypatch.setattr('rebound_radar_batch.iter_series', lambda market, symbols, base_dir: iter(universe))
+    monkeypatch.setattr('rebound_radar_batch.load_stock_names', lambda market, base_dir: {})
+
+    whole = ReboundRadarBatch(chunk_size=100, min_score=0).scan_market('TW', symbols=[])
+    chunked = ReboundRadarBatch(chunk_size=5, min_score=0).scan_market('TW', symbols=[])
+    assert whole['data'] == chunked['data']
+    assert whole['scanned'] == 12
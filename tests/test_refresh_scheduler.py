@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+收盤後增量更新排程器測試（離線，使用假的 HTTP session）
+"""
+
+import json
+from datetime import datetime, date, timedelta, timezone
+
+import numpy as np
+
+from refresh_scheduler import (MARKETS, TIER_HOT, TIER_CACHED, DailyBarRefresher, RefreshScheduler, RefreshTask,
+                               RateLimiter, OVERLAP_SESSIONS, parse_chart, merge_candles, hot_symbols)
+from collector_metrics import RunMetrics
+from rebound_radar_batch import ReboundRadarBatch
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+        self.content = json.dumps(payload).encode()
+        self.raw = None
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    def __init__(self, payload):
+        self.payload = payload
+        self.headers = {}
+        self.hooks = {'response': []}
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append((url, params))
+        response = FakeResponse(self.payload)
+        for hook in self.hooks['response']:
+            hook(response)
+        return response
+
+
+def chart_payload(days, tz):
+    timestamps = [int(datetime.combine(d, datetime.min.time(), tzinfo=tz).replace(hour=9).timestamp()) for d in days]
+    closes = [100.0 + i for i in range(len(days))]
+    return {'chart': {'result': [{
+        'timestamp': timestamps,
+        'indicators': {'quote': [{'open': closes, 'high': closes, 'low': closes, 'close': closes,
+                                  'volume': [1000] * len(days)}]},
+    }]}}
+
+
+def write_series(base_dir, market, symbol, days):
+    path = base_dir / 'cache' / market / symbol / '1d.json'
+    path.parent.mkdir(parents=True)
+    data = [{'time': d.isoformat(), 'open': 1, 'high': 1, 'low': 1, 'close': 1, 'volume': 1} for d in days]
+    path.write_text(json.dumps({'market': market, 'symbol': symbol, 'interval': '1d', 'data': data}))
+    return path
+
+
+def no_limit():
+    return RateLimiter(rate=1e9, burst=1e9)
+
+
+def test_last_session_skips_weekends_and_holidays():
+    tw = MARKETS['TW']
+    # 2026-10-12（一）08:00 台北時間，最近一個已收盤的交易日是 10/08（10/09 國慶補假）
+    now = datetime(2026, 10, 12, 0, 0, tzinfo=timezone.utc)
+    assert tw.last_session(now) == date(2026, 10, 8)
+    # 收盤 + 結算後才算
+    assert tw.last_session(datetime(2026, 10, 12, 5, 40, tzinfo=timezone.utc)) == date(2026, 10, 8)
+    assert tw.last_session(datetime(2026, 10, 12, 5, 50, tzinfo=timezone.utc)) == date(2026, 10, 12)
+
+
+def test_us_early_close_moves_refresh_time():
+    us = MARKETS['US']
+    assert us.close_at(date(2026, 11, 27)).hour == 13
+    assert us.next_session(datetime(2026, 11, 25, 23, 0, tzinfo=timezone.utc)) == date(2026, 11, 27)
+
+
+def test_plan_puts_hot_first_and_spreads_the_rest(tmp_path):
+    days = [date(2026, 10, 1)]
+    for symbol in ('2330', '1101', '1102', '1103'):
+        write_series(tmp_path, 'TW', symbol, days)
+    scheduler = RefreshScheduler(['TW'], DailyBarRefresher(FakeSession({}), no_limit(), base_dir=tmp_path),
+                                 watchlist=[('TW', '1103')], base_dir=tmp_path, rate=2.0)
+    tw = MARKETS['TW']
+    tasks = scheduler.plan(tw, date(2026, 10, 8))
+
+    hot = [t for t in tasks if t.tier == TIER_HOT]
+    rest = [t for t in tasks if t.tier == TIER_CACHED]
+    assert hot[0].symbol == '1103' and hot[0].due == tw.refresh_at(date(2026, 10, 8))
+    assert {t.symbol for t in rest} == {'1101', '1102'}
+    assert rest[0].due >= hot[-1].due
+    assert rest[1].due - rest[0].due == timedelta(minutes=tw.spread_minutes / 2)
+
+
+def test_hot_symbols_include_screener_and_rebound_radar_outputs(tmp_path, monkeypatch):
+    (tmp_path / 'screeners').mkdir()
+    (tmp_path / 'screeners' / 'TW-latest.json').write_text(json.dumps({'results': [{'symbol': '2317.TW'}]}))
+    # 以 rebound_radar_batch 實際產生的檔案驗證（候選放在 'data'，不是 'results'）
+    def series(symbol, close):
+        return {'market': 'TW', 'symbol': symbol, 'time': np.datetime64('2026-01-01') + np.arange(len(close)),
+                'open': close, 'high': close * 1.01, 'low': close * 0.99, 'close': close,
+                'volume': np.full(len(close), 1e3)}
+
+    falling = np.linspace(100, 60, 300)
+    universe = [series('9999', np.concatenate([falling, [61, 63, 66, 70]])), series('8888', np.full(300, 60.0))]
+    monkeypatch.setattr('rebound_radar_batch.iter_series', lambda market, symbols, base_dir: iter(universe))
+    monkeypatch.setattr('rebound_radar_batch.load_stock_names', lambda market, base_dir: {})
+    radar = ReboundRadarBatch(min_score=0)
+    path = radar.save(radar.scan_market('TW', symbols=[]), output_dir=str(tmp_path / 'screeners'))
+    assert 'results' not in json.load(open(path, encoding='utf-8'))
+
+    symbols = hot_symbols('TW', watchlist=[('TW', '1103')], base_dir=str(tmp_path))
+    assert symbols[:3] == ['1103', '2317', '9999'] and '8888' not in symbols      # 0 分的股票不列為熱門
+
+
+def test_refresh_merges_new_bars_and_skips_fresh_files(tmp_path):
+    tw = MARKETS['TW']
+    path = write_series(tmp_path, 'TW', '2330', [date(2026, 10, 6), date(2026, 10, 7)])
+    session = FakeSession(chart_payload([date(2026, 10, 7), date(2026, 10, 8)], tw.tz))
+    refresher = DailyBarRefresher(session, no_limit(), base_dir=tmp_path)
+
+    assert refresher.refresh(tw, '2330', date(2026, 10, 8)) == 'updated'
+    assert session.calls[0][0].endswith('/2330.TW')
+    data = json.loads(path.read_text())['data']
+    assert [c['time'] for c in data] == ['2026-10-06', '2026-10-07', '2026-10-08']
+    assert data[1]['close'] == 100.0
+
+    assert refresher.refresh(tw, '2330', date(2026, 10, 8)) == 'fresh'
+    assert len(session.calls) == 1
+
+
+def test_refresh_requests_only_missing_sessions(tmp_path):
+    tw = MARKETS['TW']
+    write_series(tmp_path, 'TW', '2330', [date(2026, 10, 8)])
+    session = FakeSession(chart_payload([date(2026, 10, 12)], tw.tz))
+    refresher = DailyBarRefresher(session, no_limit(), base_dir=tmp_path)
+
+    # 10/9、10/10 休市：到 10/8 為止已是最新
+    assert refresher.refresh(tw, '2330', tw.calendar.last_session(date(2026, 10, 11))) == 'fresh'
+    assert session.calls == []
+
+    assert refresher.refresh(tw, '2330', date(2026, 10, 12)) == 'updated'
+    params = session.calls[0][1]
+    start = datetime.fromtimestamp(params['period1'], tw.tz)
+    end = datetime.fromtimestamp(params['period2'], tw.tz)
+    assert start.date() == tw.calendar.shift(date(2026, 10, 12), -OVERLAP_SESSIONS)
+    assert end.date() == date(2026, 10, 13)
+
+
+def test_parse_chart_drops_incomplete_bars_and_merge_prefers_new():
+    tz = MARKETS['US'].tz
+    payload = chart_payload([date(2026, 10, 7), date(2026, 10, 8)], tz)
+    payload['chart']['result'][0]['indicators']['quote'][0]['close'] = [101.0, None]
+    candles = parse_chart(payload, tz)
+    assert [c['time'] for c in candles] == ['2026-10-07']
+    merged = merge_candles([{'time': '2026-10-07', 'close': 1}], candles)
+    assert merged == candles
+
+
+def test_run_tasks_resumes_from_queue(tmp_path):
+    tw = MARKETS['TW']
+    session_day = date(2026, 10, 8)
+    for symbol in ('1101', '1102'):
+        write_series(tmp_path, 'TW', symbol, [session_day])
+    clock = [tw.refresh_at(session_day)]
+
+    def sleep(seconds):
+        clock[0] += timedelta(seconds=seconds)
+
+    refresher = DailyBarRefresher(FakeSession({}), no_limit(), base_dir=tmp_path)
+    scheduler = RefreshScheduler(['TW'], refresher, base_dir=tmp_path, clock=lambda: clock[0], sleep=sleep)
+
+    tasks = scheduler.plan(tw, session_day, start=clock[0])
+    counts = scheduler.run_tasks(tasks)
+    assert counts == {'fresh': 2, 'empty': len(tasks) - 2}
+    assert clock[0] >= tasks[-1].due
+    # 重新執行同一份計畫：任務都已完成，不會再跑
+    assert scheduler.run_tasks(tasks) == {}
+
+
+def test_http_bytes_are_recorded_in_each_runs_metrics(tmp_path):
+    tw = MARKETS['TW']
+    payload = chart_payload([date(2026, 10, 7), date(2026, 10, 8)], tw.tz)
+    # 與 main() 相同：refresher 建立時沒有指標，由 run_tasks 帶入
+    scheduler = RefreshScheduler(['TW'], DailyBarRefresher(FakeSession(payload), no_limit(), base_dir=tmp_path),
+                                 base_dir=tmp_path)
+    size = len(json.dumps(payload).encode())
+    day = date(2026, 10, 8)
+    for symbol in ('2330', '2317'):                                 # 每次執行換一份 RunMetrics（如 run_forever）
+        metrics = RunMetrics('refresh_scheduler')
+        assert scheduler.run_tasks([RefreshTask(tw.refresh_at(day), TIER_HOT, 'TW', symbol, day)], metrics) == \
+            {'updated': 1}
+        assert [(s.name, s.source, s.bytes) for s in metrics.stages] == [('refresh', 'TW:hot', size)]
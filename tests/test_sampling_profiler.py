@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+sampling_profiler 測試：取樣、折疊堆疊格式與輸出檔
+"""
+
+import time
+
+from sampling_profiler import SamplingProfiler
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(200))
+    return total
+
+
+def allocate():
+    return [bytes(1024) for _ in range(500)]
+
+
+def test_samples_busy_function():
+    with SamplingProfiler(interval=0.002, trace_memory=False) as profiler:
+        busy_loop(0.3)
+
+    assert profiler.samples > 0
+    labels = [label for label, _, _ in profiler.top_functions()]
+    assert any(label.startswith('busy_loop (test_sampling_profiler.py:') for label in labels)
+
+
+def test_collapsed_format():
+    with SamplingProfiler(interval=0.002, trace_memory=False) as profiler:
+        busy_loop(0.2)
+
+    lines = profiler.collapsed().splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(' ', 1)
+        assert int(count) > 0
+        assert all(frame for frame in stack.split(';'))
+    assert sum(int(line.rsplit(' ', 1)[1]) for line in lines) == sum(profiler.stacks.values())
+
+
+def test_write_outputs_with_memory(tmp_path):
+    with SamplingProfiler(interval=0.002) as profiler:
+        kept = allocate()
+        busy_loop(0.1)
+
+    output_dir = tmp_path / 'job'
+    assert profiler.write(str(output_dir)) == str(output_dir)
+    for name in ('stacks.collapsed', 'summary.txt', 'memory.txt', 'memory.tracemalloc'):
+        assert (output_dir / name).exists()
+    memory = (output_dir / 'memory.txt').read_text(encoding='utf-8')
+    assert 'test_sampling_profiler.py' in memory
+    assert profiler.memory_peak > 0
+    assert len(kept) == 500
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+序列化格式測試
+"""
+
+import json
+
+import pytest
+
+import serialization_codecs
+from serialization_codecs import CODECS, available_codecs, read_records, write_records, with_extension
+from stock_data_collector import StockDataCollector
+
+RECORDS = [
+    {'代號': '2330', '名稱': '台積電', '市場': '上市', 'ETF': None, 'CIK': None},
+    {'代號': 'AAPL', '名稱': 'Apple Inc. "Common"', '市場': 'NASDAQ', 'ETF': False, 'CIK': 320193},
+]
+
+
+@pytest.mark.parametrize('codec', available_codecs())
+def test_round_trip_through_single_reader(tmp_path, codec):
+    path = write_records(RECORDS, with_extension(str(tmp_path / 'stocks.jsonl'), codec), codec)
+    assert path.endswith(CODECS[codec].extension)
+    assert read_records(path) == RECORDS
+
+
+def test_json_codecs_keep_existing_jsonl_format(tmp_path):
+    path = write_records(RECORDS, str(tmp_path / 'out.jsonl'), 'json')
+    lines = open(path, encoding='utf-8').read().splitlines()
+    assert [json.loads(line) for line in lines] == RECORDS
+    assert '台積電' in lines[0]
+
+
+def test_orjson_is_decode_compatible_with_json():
+    # 兩個 JSON Lines 格式可互相讀取；位元組不保證相同（orjson 不在分隔符號後加空白）
+    assert CODECS['json'].decode(CODECS['orjson'].encode(RECORDS)) == RECORDS
+    assert CODECS['orjson'].decode(CODECS['json'].encode(RECORDS)) == RECORDS
+    if serialization_codecs.orjson is not None:                        # 未安裝時退回標準函式庫，位元組相同
+        assert CODECS['orjson'].encode(RECORDS) != CODECS['json'].encode(RECORDS)
+
+
+def test_save_stocks_data_writes_every_market_in_chosen_codec(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stocks = [{'代號': '2330', '市場': '上市'}, {'代號': 'AAPL', '市場': 'NASDAQ', 'CIK': 320193}]
+    StockDataCollector().save_stocks_data(stocks, filename='all.jsonl', codec='json')
+
+    assert read_records('all.jsonl') == [
+        {'代號': '2330', '市場': '上市', 'CIK': None},
+        {'代號': 'AAPL', '市場': 'NASDAQ', 'CIK': 320193},
+    ]
+    market_files = sorted(p.name for p in tmp_path.glob('stocks_*.jsonl'))
+    assert len(market_files) == 2 and market_files[0].startswith('stocks_nasdaq_')
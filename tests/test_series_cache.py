@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+W-TinyLFU 序列快取測試：位元組預算、抗掃描、檔案改寫失效與統計
+"""
+
+import os
+import json
+
+import numpy as np
+
+from series_cache import SeriesCache, FrequencySketch, cached_series, cached_indicators
+
+
+def blob(kb):
+    return {'close': np.zeros(kb * 128)}   # kb KB 的 float64 陣列
+
+
+def test_byte_budget_is_respected():
+    cache = SeriesCache(max_bytes=1024 * 1024)
+    for i in range(100):
+        cache.put(f"s{i}", blob(64))
+        assert cache.stats()['bytes'] <= 1024 * 1024
+    assert 0 < len(cache) <= 16
+    cache.put('huge', blob(2048))
+    assert 'huge' not in cache
+
+
+def test_hot_symbols_survive_a_one_off_scan():
+    cache = SeriesCache(max_bytes=2 * 1024 * 1024)
+    hot = ['2330', '0050', 'AAPL', 'NVDA', 'TSLA']
+    for _ in range(5):
+        for key in hot:
+            if cache.get(key) is None:
+                cache.put(key, blob(100))
+
+    for i in range(2000):   # 全市場掃描，每檔只讀一次
+        key = f"scan{i}"
+        if cache.get(key) is None:
+            cache.put(key, blob(100))
+
+    assert all(cache.get(key) is not None for key in hot)
+    assert cache.stats()['rejections'] > 0
+
+
+def test_version_change_invalidates():
+    cache = SeriesCache(max_bytes=1024 * 1024)
+    cache.put('k', 'old', weight=10, version=(1, 100))
+    assert cache.get('k', version=(1, 100)) == 'old'
+    assert cache.get('k', version=(2, 120)) is None
+    stats = cache.stats()
+    assert stats['invalidations'] == 1 and stats['hits'] == 1 and stats['misses'] == 1
+
+
+def test_sketch_counts_and_ages():
+    sketch = FrequencySketch(16)
+    for _ in range(20):
+        sketch.increment('a')
+    assert sketch.frequency('a') == 15
+    assert sketch.frequency('never') <= 15
+    for i in range(sketch.sample_size):
+        sketch.increment(i)
+    assert sketch.frequency('a') < 15
+
+
+def test_cached_series_reloads_when_file_changes(tmp_path):
+    path = tmp_path / 'cache' / 'TW' / '2330' / '1d.json'
+    path.parent.mkdir(parents=True)
+    candles = [{'time': f"2024-01-0{d}", 'open': d, 'high': d, 'low': d, 'close': d, 'volume': 1} for d in range(1, 4)]
+    path.write_text(json.dumps({'lastUpdated': 'a', 'data': candles}))
+    cache = SeriesCache(max_bytes=1024 * 1024)
+
+    first = cached_series('TW', '2330', base_dir=str(tmp_path), cache=cache)
+    assert len(cache) == 1                                  # 空的快取也要用呼叫端傳入的那一份
+    assert cached_series('TW', '2330', base_dir=str(tmp_path), cache=cache) is first
+
+    path.write_text(json.dumps({'lastUpdated': 'b', 'data': candles[:2]}))
+    os.utime(path, ns=(1, 1))
+    second = cached_series('TW', '2330', base_dir=str(tmp_path), cache=cache)
+    assert second['lastUpdated'] == 'b' and len(second['close']) == 2
+
+    ind = tmp_path / 'indicators' / 'TW' / '2330' / 'D_indicators.json'
+    ind.parent.mkdir(parents=True)
+    ind.write_text(json.dumps({'indicators': {'rsi': [None, 50.0], 'macd': {'histogram': [None, 1.0]}}}))
+    arrays = cached_indicators('TW', '2330', base_dir=str(tmp_path), cache=cache)
+    assert len(cache) == 2
+    assert np.isnan(arrays['rsi'][0]) and arrays['macd']['histogram'][1] == 1.0
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+K 線日期索引測試：寫入端產生索引、區間讀取、既有檔案建索引與失效重建
+"""
+
+import json
+from datetime import date, timedelta
+
+from series_index import write_series, build_index, load_index, read_range, index_path
+from ohlcv_store import load_series
+
+
+def make_payload(days=400):
+    start = date(2023, 11, 1)
+    candles = [{'time': (start + timedelta(days=i)).isoformat(), 'open': i, 'high': i + 1, 'low': i - 1,
+                'close': i + 0.5, 'volume': i * 10} for i in range(days)]
+    return {'market': 'TW', 'symbol': '2330', 'interval': '1d', 'lastUpdated': '2024-12-05T00:00:00Z', 'data': candles}
+
+
+def expected(payload, start, end):
+    return [c for c in payload['data'] if (not start or c['time'] >= start) and (not end or c['time'] <= end)]
+
+
+def test_written_file_is_plain_json_with_valid_index(tmp_path):
+    path = str(tmp_path / '1d.json')
+    payload = make_payload()
+    write_series(path, payload)
+
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f) == payload
+    index = load_index(path, rebuild=False)
+    assert index['rows'] == 400 and index['meta']['symbol'] == '2330'
+    assert index['entries'][0] == ['2023-11', 0, index['entries'][0][2]]
+    assert len(index['entries']) == 14
+
+
+def test_read_range_matches_full_filter(tmp_path):
+    path = str(tmp_path / '1d.json')
+    payload = make_payload()
+    write_series(path, payload)
+    for start, end in [('2024-02-10', '2024-03-05'), ('2024-03-01', '2024-03-31'), (None, '2023-11-03'),
+                       ('2024-12-01', None), ('2020-01-01', '2020-12-31'), ('2030-01-01', None), (None, None)]:
+        assert read_range(path, start, end) == expected(payload, start, end), (start, end)
+
+
+def test_index_for_foreign_file_and_rebuild_after_rewrite(tmp_path):
+    path = tmp_path / '1d.json'
+    payload = make_payload(60)
+    path.write_text(json.dumps(payload, indent=2))   # 模擬前端以 JSON.stringify 寫入
+    assert build_index(str(path))['rows'] == 60
+    assert read_range(str(path), '2023-12-15', '2023-12-20') == expected(payload, '2023-12-15', '2023-12-20')
+
+    payload['data'] = payload['data'][:10]
+    path.write_text(json.dumps(payload))
+    assert load_index(str(path), rebuild=False) is None
+    assert read_range(str(path), '2023-11-05') == expected(payload, '2023-11-05', None)
+    assert load_index(str(path), rebuild=False)['rows'] == 10
+    assert index_path(str(path)).endswith('1d.idx')
+
+
+def test_load_series_uses_index_for_windows(tmp_path):
+    write_series(str(tmp_path / 'cache' / 'TW' / '2330' / '1d.json'), make_payload())
+    series = load_series('TW', '2330', base_dir=str(tmp_path), start='2024-06-01', end='2024-06-30')
+    assert len(series['close']) == 30
+    assert str(series['time'][0]) == '2024-06-01'
+    assert series['lastUpdated'] == '2024-12-05T00:00:00Z'
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+共用市場面板測試：對齊、唯讀掛載、世代更新與跨行程使用
+"""
+
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from shared_panel import publish_panel, attach_panel, SharedPanel, read_registry
+from walk_forward_optimizer import FeatureCache, WalkForwardOptimizer
+
+
+def write_candles(base_dir, symbol, start, closes):
+    path = os.path.join(base_dir, 'cache', 'TW', symbol, '1d.json')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    day = np.datetime64(start)
+    data = [{'time': str(day + i), 'open': c, 'high': c + 1, 'low': c - 1, 'close': c, 'volume': 1000 + i}
+            for i, c in enumerate(closes)]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'market': 'TW', 'symbol': symbol, 'interval': '1d', 'data': data}, f)
+
+
+def column_sum(args):
+    panel_dir, symbol = args
+    panel = attach_panel('TW', panel_dir)
+    return float(np.nansum(panel.fields['close'][:, panel.column(symbol)]))
+
+
+def test_panel_aligns_symbols_and_is_read_only(tmp_path):
+    base, panels = str(tmp_path / 'data'), str(tmp_path / 'panels')
+    write_candles(base, '2330', '2024-01-01', [10.0, 11.0, 12.0, 13.0])
+    write_candles(base, '2317', '2024-01-03', [50.0, 51.0])
+
+    registry = publish_panel('TW', panel_dir=panels, base_dir=base)
+    assert registry['shape'] == [4, 2] and registry['symbols'] == ['2317', '2330']
+
+    panel = SharedPanel('TW', panels)
+    close = panel.fields['close']
+    assert np.isnan(close[0, panel.column('2317')])
+    assert close[3, panel.column('2330')] == 13.0
+    assert close.flags.f_contiguous and not close.flags.writeable
+    with pytest.raises(ValueError):
+        close[0, 0] = 1.0
+
+    series = panel.series('2317')
+    assert list(series['time'].astype(str)) == ['2024-01-03', '2024-01-04']
+    assert list(series['close']) == [50.0, 51.0] and np.shares_memory(series['close'], close)
+
+
+def test_refresh_swaps_generation_without_breaking_attached_readers(tmp_path):
+    base, panels = str(tmp_path / 'data'), str(tmp_path / 'panels')
+    write_candles(base, '2330', '2024-01-01', [10.0, 11.0])
+    publish_panel('TW', panel_dir=panels, base_dir=base)
+    old = attach_panel('TW', panels)
+
+    write_candles(base, '2330', '2024-01-01', [10.0, 11.0, 12.0])
+    publish_panel('TW', panel_dir=panels, base_dir=base, keep=1)
+    assert old.is_stale()
+    assert list(old.fields['close'][:, 0]) == [10.0, 11.0]     # 舊世代已刪除，掛載中的 mmap 仍可讀
+    assert not os.path.exists(os.path.join(panels, 'TW', 'g000001'))
+
+    new = attach_panel('TW', panels)
+    assert new.generation == read_registry('TW', panels)['generation'] == 2
+    assert list(new.fields['close'][:, 0]) == [10.0, 11.0, 12.0]
+    assert old.reload().generation == 2
+
+
+def test_worker_processes_attach_and_walk_forward_uses_panel(tmp_path):
+    base, panels = str(tmp_path / 'data'), str(tmp_path / 'panels')
+    rng = np.random.default_rng(3)
+    for symbol in ('AAA', 'BBB'):
+        write_candles(base, symbol, '2020-01-01', list(100 * np.cumprod(1 + rng.normal(0, 0.01, 300))))
+    publish_panel('TW', panel_dir=panels, base_dir=base)
+    panel = attach_panel('TW', panels)
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        sums = list(executor.map(column_sum, [(panels, 'AAA'), (panels, 'BBB')]))
+    assert sums == [float(np.nansum(panel.fields['close'][:, i])) for i in range(2)]
+
+    grid = {'short': [5], 'long': [20], 'rsi_period': [14], 'rsi_upper': [70]}
+    series_list = [panel.series(symbol) for symbol in panel.symbols]
+    shared = WalkForwardOptimizer(grid, train_size=150, test_size=50, workers=2, panel_dir=panels,
+                                  cache=FeatureCache(str(tmp_path / 'features'))).run(series_list)
+    local = WalkForwardOptimizer(grid, train_size=150, test_size=50, workers=1,
+                                 cache=FeatureCache(str(tmp_path / 'features2'))).run(series_list)
+    assert shared['folds'] == local['folds'] and len(shared['folds']) == 2 * 3
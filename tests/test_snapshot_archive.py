@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+快照封存測試
+"""
+
+import json
+
+import pytest
+
+pytest.importorskip('zstandard')
+
+from snapshot_archive import SnapshotArchive, reference
+from serialization_codecs import read_records, write_records
+
+
+def snapshot(n, market='NASDAQ'):
+    return [{'代號': f"S{i:04d}", '名稱': f"Stock {i}", '市場': market, '交易所': 'US', 'ETF': None}
+            for i in range(n)]
+
+
+def test_archive_round_trip_and_random_access(tmp_path):
+    archive_dir = str(tmp_path / 'archive')
+    runs = {'20250819_093615': snapshot(300), '20250819_200643': snapshot(320), '20250820_093000': snapshot(310)}
+    for timestamp, records in runs.items():
+        path = tmp_path / f"stocks_nasdaq_{timestamp}.jsonl"
+        write_records(records, str(path))
+
+    archive = SnapshotArchive(archive_dir)
+    assert archive.add_files([str(p) for p in tmp_path.glob('stocks_nasdaq_*.jsonl')], remove=True) == 3
+    assert not list(tmp_path.glob('stocks_nasdaq_*.jsonl'))
+
+    assert archive.timestamps('nasdaq') == sorted(runs)
+    assert read_records(reference('nasdaq', '20250819_200643', archive_dir)) == runs['20250819_200643']
+    # 只給日期或時間介於兩份快照之間時，取當時最新的一份
+    assert read_records(reference('nasdaq', '20250819', archive_dir)) == runs['20250819_200643']
+    assert read_records(reference('nasdaq', archive_dir=archive_dir)) == runs['20250820_093000']
+    with pytest.raises(KeyError):
+        archive.resolve('nasdaq', '20250101_000000')
+
+    raw = sum(len(json.dumps(r, ensure_ascii=False)) for records in runs.values() for r in records)
+    assert archive.stats()[0]['stored'] < raw / 5
+
+
+def test_empty_first_snapshot_is_stored_without_a_dictionary(tmp_path):
+    archive = SnapshotArchive(str(tmp_path))
+    assert archive.add_bytes('nasdaq', '20250819_093615', b'')
+    assert archive.index('nasdaq')['snapshots']['20250819_093615']['dictId'] == 0
+    assert archive.read_bytes('nasdaq', '20250819_093615') == b''
+
+    # 下一份有內容的快照才建立市場字典，空快照仍可讀出
+    data = ''.join(json.dumps(r) + '\n' for r in snapshot(50)).encode()
+    assert archive.add_bytes('nasdaq', '20250819_200643', data)
+    assert archive.index('nasdaq')['dictId']
+    assert archive.read_bytes('nasdaq') == data
+    assert SnapshotArchive(str(tmp_path)).read_bytes('nasdaq', '20250819_093615') == b''
+
+
+def test_collector_writes_directly_into_archive(tmp_path):
+    from stock_data_collector import StockDataCollector
+
+    archive_dir = str(tmp_path / 'archive')
+    stocks = snapshot(50) + snapshot(20, market='上市')
+    StockDataCollector().save_stocks_data(stocks, archive_dir=archive_dir)
+
+    archive = SnapshotArchive(archive_dir)
+    assert archive.groups() == ['data', 'nasdaq', '上市']
+    assert read_records(reference('data', archive_dir=archive_dir)) == stocks
+    assert len(read_records(reference('上市', archive_dir=archive_dir))) == 20
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+SQL 查詢層測試（離線，使用暫存目錄中的小型資料）
+"""
+
+import os
+import json
+
+from stock_query import StockQueryEngine, SOURCE_TABLES
+
+
+def write_json(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False)
+
+
+def make_store(root):
+    data_dir = os.path.join(root, 'data')
+    closes = [100 - i * 0.1 for i in range(300)]
+    write_json(os.path.join(data_dir, 'cache', 'TW', '0056', '1d.json'), {
+        'market': 'TW', 'symbol': '0056', 'interval': '1d',
+        'data': [{'time': f"2024-{1 + i // 28:02d}-{1 + i % 28:02d}", 'open': c, 'high': c, 'low': c,
+                  'close': c, 'volume': 1000} for i, c in enumerate(closes)],
+    })
+    write_json(os.path.join(data_dir, 'scores', 'TW-scores-latest.json'), {
+        'date': '2025-08-26', 'market': 'TW',
+        'scores': [{'symbol': '0056', 'market': 'TW', 'name': '元大高股息', 'overallScore': 65,
+                    'quote': {'price': 70.1}}],
+    })
+    with open(os.path.join(root, 'stocks_data_20250819_200643.jsonl'), 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'代號': '0056', '名稱': '元大高股息', '市場': '上市', '交易所': 'TW',
+                            'yahoo_symbol': '0056.TW', 'ETF': True}, ensure_ascii=False) + '\n')
+    return data_dir
+
+
+def test_refresh_is_incremental_and_answers_cross_table_questions(tmp_path):
+    data_dir = make_store(str(tmp_path))
+    engine = StockQueryEngine(str(tmp_path / 'q.sqlite'), data_dir, snapshot_dirs=(str(tmp_path),))
+
+    assert engine.refresh()['loaded'] == 3
+    assert engine.refresh() == {'loaded': 0, 'skipped': 3, 'removed': 0}
+
+    rows = engine.query("""
+        SELECT l.symbol, s.overallScore, st.drawdown_52w
+        FROM listings l
+        JOIN ohlcv_stats st ON st.market = l.market AND st.symbol = l.symbol
+        JOIN scores s ON s.market = l.market AND s.symbol = l.symbol
+        WHERE l.market = 'TW' AND l.etf = 1 AND st.drawdown_52w <= -0.2 AND s.overallScore > 60
+    """)
+    assert [r['symbol'] for r in rows] == ['0056']
+
+    os.remove(os.path.join(data_dir, 'scores', 'TW-scores-latest.json'))
+    assert engine.refresh()['removed'] == 1
+    assert engine.query('SELECT COUNT(*) AS n FROM scores')[0]['n'] == 0
+    engine.close()
+
+
+def test_delete_by_source_uses_an_index(tmp_path):
+    engine = StockQueryEngine(str(tmp_path / 'q.sqlite'), str(tmp_path / 'data'), snapshot_dirs=())
+    for table in SOURCE_TABLES:
+        plan = ' '.join(row[-1] for row in engine.conn.execute(
+            f"EXPLAIN QUERY PLAN DELETE FROM {table} WHERE source = 'x'"))
+        assert f"idx_{table}_source" in plan
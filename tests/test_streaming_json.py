@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+串流 JSON 讀取器測試
+"""
+
+import io
+import json
+import itertools
+
+import pytest
+
+import streaming_json as sj
+from streaming_json import JSONStreamReader
+
+DOC = {
+    'market': 'US',
+    'collectedStocks': [
+        {'symbol': 'A[1]', 'name': '引號 \\" 與 {括號}', 'marketCap': 0},
+        {'symbol': 'B', 'name': 'Beta', 'tags': [[], {}, [1.5e3, -2, None, True]]},
+    ],
+    'indicators': {'macd': {'macd': [None, 1.25], 'histogram': [None, -0.5]}, 'rsi': [None, 55.5]},
+    'failedStocks': [],
+}
+
+
+def reader_for(payload, chunk_size):
+    return JSONStreamReader(io.BytesIO(payload.encode('utf-8')), chunk_size=chunk_size)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 5, 17, 4096])
+def test_matches_json_module_across_buffer_boundaries(chunk_size):
+    text = json.dumps(DOC, ensure_ascii=False, indent=2)
+
+    reader = reader_for(text, chunk_size)
+    reader.enter(('collectedStocks',))
+    assert list(reader.iter_array()) == DOC['collectedStocks']
+
+    reader = reader_for(text, chunk_size)
+    reader.enter(('indicators', 'macd'))
+    assert dict(reader.iter_object()) == DOC['indicators']['macd']
+
+    reader = reader_for(text, chunk_size)
+    reader.enter(('failedStocks',))
+    assert list(reader.iter_array()) == []
+
+
+def test_file_helpers_seek_and_tolerate_trailing_garbage(tmp_path):
+    path = tmp_path / 'US-stocks-latest.json'
+    path.write_text(json.dumps(DOC, ensure_ascii=False, indent=2) + '\n}', encoding='utf-8')
+
+    assert [s['symbol'] for s in sj.iter_collected_stocks(str(path), limit=1)] == ['A[1]']
+    assert sj.read_indicator(str(path), 'macd.histogram') == [None, -0.5]
+
+    offset = sj.locate(str(path), 'indicators.rsi')
+    assert path.read_bytes()[offset:offset + 1] == b'['
+    assert sj.read_value(str(path), None, offset=offset) == [None, 55.5]
+
+    with pytest.raises(KeyError):
+        sj.locate(str(path), 'missing')
+
+
+def test_memory_is_bounded_by_chunk_size():
+    text = json.dumps({'collectedStocks': [{'symbol': f"S{i}", 'name': 'x' * 50} for i in range(2000)]})
+    reader = reader_for(text, 1024)
+    reader.enter(('collectedStocks',))
+    largest = 0
+    for _ in itertools.islice(reader.iter_array(), 1500):
+        largest = max(largest, len(reader.buf))
+    assert largest < 4 * 1024
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+成交串流彙總測試：K 線彙總、環形緩衝區、線上指標與批次版一致、重播
+"""
+
+import json
+
+import numpy as np
+
+import technical_indicators as ti
+from tick_stream import (BarRing, OnlineEMA, OnlineRSI, RollingExtreme, TickAggregator, ReplayFeed,
+                         QuoteSnapshotFeed, synthetic_ticks)
+
+
+def test_online_kernels_match_batch_indicators():
+    rng = np.random.default_rng(0)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.01, 300))
+
+    ema, rsi = OnlineEMA(21), OnlineRSI(14)
+    high, low = RollingExtreme(20, 'max'), RollingExtreme(20, 'min')
+    online = np.array([[np.nan if v is None else v for v in (ema.update(x), rsi.update(x), high.update(x), low.update(x))]
+                       for x in close])
+
+    np.testing.assert_allclose(online[:, 0], ti.ema(close, 21), equal_nan=True)
+    np.testing.assert_allclose(online[:, 1], ti.rsi(close, 14), equal_nan=True)
+    np.testing.assert_allclose(online[:, 2], ti.rolling_max(close, 20), equal_nan=True)
+    np.testing.assert_allclose(online[:, 3], ti.rolling_min(close, 20), equal_nan=True)
+
+
+def test_ring_buffer_keeps_the_latest_bars_in_order():
+    ring = BarRing(capacity=4)
+    for i in range(6):
+        ring.append([i, i, i, i, i, i])
+    assert len(ring) == 4
+    assert ring.to_dict()['time'].tolist() == [2, 3, 4, 5]
+    assert ring.last(2)[:, 0].tolist() == [4, 5] and ring.latest()[0] == 5
+
+
+def test_ticks_aggregate_into_bars_and_vwap():
+    closed = []
+    agg = TickAggregator(intervals=(60, 300), on_bar=lambda *args: closed.append(args))
+    base = 1756170000 - 1756170000 % 300
+    agg.ingest_many([
+        ('2330', base + 1, 100.0, 10), ('2330', base + 30, 103.0, 10), ('2330', base + 59, 99.0, 20),
+        ('2330', base + 61, 101.0, 5),
+        ('2330', base + 50, 500.0, 1),                # 亂序：1 分 K 已收盤而略過，5 分 K 仍計入
+    ])
+    assert len(closed) == 1
+    symbol, interval, bar, indicators = closed[0]
+    assert (symbol, interval) == ('2330', 60)
+    assert bar == [base, 100.0, 103.0, 99.0, 99.0, 40]
+    assert indicators['vwap'] == (103.0 + 99.0 + 99.0) / 3
+    assert agg.late == 1
+
+    agg.flush(now=base + 120)      # 沒有新成交：1 分 K 到時收盤，5 分 K 尚未
+    snap = agg.snapshot('2330', 300)
+    assert snap['bar'] is None and snap['partial']['high'] == 500.0 and snap['partial']['volume'] == 46
+    assert agg.bars_of('2330', 60)['close'].tolist() == [99.0, 101.0]
+
+
+def test_replay_matches_direct_ingest_and_quote_feed_converts_volume(tmp_path):
+    ticks = list(synthetic_ticks(['AAPL', 'NVDA'], 2000, step=1.0))
+    path = tmp_path / 'ticks.jsonl'
+    path.write_text(''.join(json.dumps(dict(zip(('symbol', 'ts', 'price', 'volume'), t))) + '\n' for t in ticks))
+
+    direct, replayed = TickAggregator(), TickAggregator()
+    direct.ingest_many(ticks)
+    replayed.ingest_many(ReplayFeed(str(path)))
+    assert direct.snapshot('NVDA', 60) == replayed.snapshot('NVDA', 60)
+    assert direct.bars == replayed.bars > 0
+
+    quotes = tmp_path / 'yahoo' / 'US' / 'quotes'
+    quotes.mkdir(parents=True)
+    feed = QuoteSnapshotFeed(str(tmp_path / 'yahoo'), markets=('US',))
+    for ts, volume in ((1000, 500), (1000, 500), (1060, 800)):
+        (quotes / 'AAPL.json').write_text(json.dumps(
+            {'symbol': 'AAPL', 'timestamp': ts, 'regularMarketPrice': 200.0, 'regularMarketVolume': volume}))
+        polled = feed.poll()
+    assert polled == [('AAPL', 1060, 200.0, 300.0)]
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+交易日曆測試：休市日、颱風假、半日市與缺漏比對
+"""
+
+from datetime import date, time
+
+import numpy as np
+import pytest
+
+from trading_calendar import calendar
+
+
+def test_holidays_and_typhoon_closures_are_not_sessions():
+    tw = calendar('TW')
+    assert not tw.is_session('2024-07-24') and tw.closure_reason('2024-07-24') == '凱米颱風'
+    assert not tw.is_session(date(2026, 10, 9)) and not tw.is_session('2026-10-10')
+    assert tw.is_session('2024-07-26')
+    sessions = tw.expected_sessions('2024-07-22', '2024-07-28')
+    assert [str(d) for d in sessions] == ['2024-07-22', '2024-07-23', '2024-07-26']
+    assert tw.sessions.dtype == np.int32 and np.all(np.diff(tw.sessions) > 0)
+
+
+def test_last_next_and_shift():
+    us = calendar('US')
+    assert us.last_session('2025-01-20') == date(2025, 1, 17)        # MLK 假日
+    assert us.next_session('2025-01-08') == date(2025, 1, 10)        # 1/9 國喪休市
+    assert us.shift('2025-01-10', -2) == date(2025, 1, 7)
+    assert us.close_time('2026-11-27') == time(13, 0) and us.close_time('2026-11-30') == time(16, 0)
+    with pytest.raises(ValueError):
+        us.last_session('1980-01-01')
+
+
+def test_missing_sessions_and_fetch_range():
+    tw = calendar('TW')
+    dates = np.array(['2024-07-22', '2024-07-26', '2024-07-29', '2024-07-31'], dtype='datetime64[D]')
+    assert [str(d) for d in tw.missing_sessions(dates)] == ['2024-07-23', '2024-07-30']
+    # 只在已驗證的年份比對
+    assert len(tw.missing_sessions(np.array(['2005-01-03', '2005-01-10'], dtype='datetime64[D]'))) == 0
+
+    # 只隔了國慶連假：不需要抓
+    assert tw.fetch_range(['2026-10-08'], '2026-10-11') is None
+    assert tw.fetch_range(['2026-10-08'], '2026-10-13') == (date(2026, 10, 12), date(2026, 10, 13))
+    assert tw.fetch_range(['2026-10-08'], '2026-10-13', overlap=2) == (date(2026, 10, 7), date(2026, 10, 13))
+    assert tw.fetch_range([], '2026-10-13') == (None, date(2026, 10, 13))
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Walk-forward 最佳化器測試（離線，使用合成資料）
+"""
+
+import numpy as np
+
+from walk_forward_optimizer import (
+    FeatureCache, WalkForwardOptimizer, walk_forward_splits, expand_grid, required_features,
+)
+
+
+def make_series(symbol='TEST', length=400, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.01, length))
+    return {
+        'market': 'TW',
+        'symbol': symbol,
+        'time': np.datetime64('2020-01-01') + np.arange(length),
+        'open': close, 'high': close * 1.01, 'low': close * 0.99, 'close': close,
+        'volume': rng.integers(1000, 5000, length).astype(float),
+    }
+
+
+def test_walk_forward_splits_are_rolling_and_non_overlapping():
+    splits = walk_forward_splits(100, train_size=40, test_size=20)
+    assert splits == [(0, 40, 40, 60), (20, 60, 60, 80), (40, 80, 80, 100)]
+
+
+def test_required_features_are_deduplicated():
+    combos = expand_grid({'short': [5, 10], 'long': [10, 20], 'rsi_period': [14], 'rsi_upper': [70, 80]})
+    assert all(c['short'] < c['long'] for c in combos)
+    assert required_features(combos) == ['ma10', 'ma20', 'ma5', 'rsi14']
+
+
+def test_each_feature_is_computed_once_and_results_reproduce_from_cache(tmp_path):
+    series_list = [make_series('AAA', seed=1), make_series('BBB', seed=2)]
+    grid = {'short': [5, 10], 'long': [20], 'rsi_period': [14], 'rsi_upper': [70, 80]}
+
+    first = WalkForwardOptimizer(grid, train_size=200, test_size=50, workers=1,
+                                 cache=FeatureCache(str(tmp_path)))
+    report = first.run(series_list)
+    assert report['cacheStats']['computed'] == 2 * 4
+    assert len(report['folds']) == 2 * 4
+
+    second = WalkForwardOptimizer(grid, train_size=200, test_size=50, workers=1,
+                                  cache=FeatureCache(str(tmp_path)))
+    replay = second.run(series_list)
+    assert replay['cacheStats']['computed'] == 0
+    assert replay['folds'] == report['folds']
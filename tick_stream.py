@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+即時成交 → K 線的串流處理
+消費成交 / 報價串流（任何產生 (代號, 時間戳記, 價格, 量) 的可迭代物件），
+依代號彙總成 1 分 / 5 分 K，每根 K 線收盤時以 O(1) 的線上演算法更新指標，
+不必重跑批次計算就能得到盤中訊號：
+
+    EMA          與 technical_indicators.ema 相同（前 period 根的平均作為種子）
+    RSI          Wilder 平滑，與 technical_indicators.rsi 相同
+    VWAP         當日累計，換日時重設（以 UTC 日期為準，台股與美股的交易時段都不跨 UTC 日界）
+    最高 / 最低  N 根內的滾動極值（單調佇列，攤銷 O(1)）
+
+每個代號每個週期的 K 線存在固定大小的環形緩衝區（預先配置的 NumPy 陣列），記憶體不會隨時間成長。
+
+資料來源：
+    QuoteSnapshotFeed   輪詢 data/yahoo-finance/<市場>/quotes/*.json（可 --record 錄成 JSONL）
+    ReplayFeed          重播錄下的 JSONL / CSV，測試與回放用
+    synthetic_ticks     產生隨機成交，量測吞吐量
+
+用法：
+    python3 tick_stream.py --replay data/ticks/2025-08-26.jsonl
+    python3 tick_stream.py --poll --record data/ticks/today.jsonl
+    python3 tick_stream.py --benchmark 2000
+"""
+
+import os
+import csv
+import glob
+import json
+import time
+import argparse
+from collections import deque
+from datetime import datetime, timezone
+
+import numpy as np
+
+INTERVALS = (60, 300)          # 秒：1 分 K、5 分 K
+RING_CAPACITY = 240            # 每個代號每個週期保留的 K 線根數
+EMA_PERIODS = (9, 21)
+RSI_PERIOD = 14
+EXTREME_PERIOD = 20
+QUOTES_DIR = os.path.join('data', 'yahoo-finance')
+
+BAR_FIELDS = ('time', 'open', 'high', 'low', 'close', 'volume')
+
+
+class BarRing:
+    """固定容量的 K 線環形緩衝區；欄位依 BAR_FIELDS 存在一個 (容量 x 6) 的 float64 陣列"""
+
+    def __init__(self, capacity=RING_CAPACITY):
+        self.capacity = capacity
+        self.data = np.zeros((capacity, len(BAR_FIELDS)))
+        self.head = 0          # 下一個寫入位置
+        self.count = 0
+
+    def append(self, bar):
+        self.data[self.head] = bar
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def last(self, n=None):
+        """最近 n 根（依時間排序）；未繞回時為視圖，否則為複本"""
+        n = self.count if n is None else min(n, self.count)
+        start = (self.head - n) % self.capacity
+        if start + n <= self.capacity:
+            return self.data[start:start + n]
+        return np.concatenate([self.data[start:], self.data[:self.head]])
+
+    def latest(self):
+        return self.data[(self.head - 1) % self.capacity] if self.count else None
+
+    def to_dict(self, n=None):
+        rows = self.last(n)
+        return {field: rows[:, i] for i, field in enumerate(BAR_FIELDS)}
+
+
+class OnlineEMA:
+    def __init__(self, period):
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.count = 0
+        self.total = 0.0
+        self.value = None
+
+    def update(self, x):
+        if self.value is not None:
+            self.value = x * self.k + self.value * (1 - self.k)
+        else:
+            self.count += 1
+            self.total += x
+            if self.count == self.period:
+                self.value = self.total / self.period
+        return self.value
+
+
+class OnlineRSI:
+    """Wilder RSI；前 period 個漲跌的平均作為種子"""
+
+    def __init__(self, period=RSI_PERIOD):
+        self.period = period
+        self.prev = None
+        self.count = 0
+        self.avg_gain = self.avg_loss = 0.0
+        self.value = None
+
+    def update(self, x):
+        if self.prev is None:
+            self.prev = x
+            return None
+        change = x - self.prev
+        self.prev = x
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        if self.count < self.period:
+            self.count += 1
+            self.avg_gain += gain / self.period
+            self.avg_loss += loss / self.period
+            if self.count < self.period:
+                return None
+        else:
+            self.avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+            self.avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+        self.value = 100.0 if self.avg_loss == 0 else 100 - 100 / (1 + self.avg_gain / self.avg_loss)
+        return self.value
+
+
+class OnlineVWAP:
+    """當日成交量加權平均價；session 改變（換日）時重設"""
+
+    def __init__(self):
+        self.session = None
+        self.pv = self.volume = 0.0
+        self.value = None
+
+    def update(self, price, volume, session):
+        if session != self.session:
+            self.session = session
+            self.pv = self.volume = 0.0
+            self.value = None
+        self.pv += price * volume
+        self.volume += volume
+        if self.volume > 0:
+            self.value = self.pv / self.volume
+        elif self.value is None:
+            self.value = price
+        return self.value
+
+
+class RollingExtreme:
+    """最近 period 個值的最大（或最小）值；單調佇列保存 (序號, 值)"""
+
+    def __init__(self, period=EXTREME_PERIOD, mode='max'):
+        self.period = period
+        self.is_max = mode == 'max'
+        self.window = deque()
+        self.index = 0
+        self.value = None
+
+    def update(self, x):
+        window = self.window
+        if self.is_max:
+            while window and window[-1][1] <= x:
+                window.pop()
+        else:
+            while window and window[-1][1] >= x:
+                window.pop()
+        window.append((self.index, x))
+        if window[0][0] <= self.index - self.period:
+            window.popleft()
+        self.index += 1
+        self.value = window[0][1] if self.index >= self.period else None
+        return self.value
+
+
+class IntervalState:
+    """單一代號單一週期：目前未收盤的 K 線、環形緩衝區與線上指標"""
+
+    __slots__ = ('interval', 'bucket', 'bar', 'ring', 'emas', 'rsi', 'vwap', 'high', 'low')
+
+    def __init__(self, interval, capacity):
+        self.interval = interval
+        self.bucket = None
+        self.bar = None          # [time, open, high, low, close, volume]
+        self.ring = BarRing(capacity)
+        self.emas = {period: OnlineEMA(period) for period in EMA_PERIODS}
+        self.rsi = OnlineRSI(RSI_PERIOD)
+        self.vwap = OnlineVWAP()
+        self.high = RollingExtreme(EXTREME_PERIOD, 'max')
+        self.low = RollingExtreme(EXTREME_PERIOD, 'min')
+
+    def close_bar(self):
+        """收盤目前的 K 線：寫入緩衝區並更新指標，回傳該根 K 線"""
+        bar = self.bar
+        self.ring.append(bar)
+        close = bar[4]
+        for ema in self.emas.values():
+            ema.update(close)
+        self.rsi.update(close)
+        typical = (bar[2] + bar[3] + close) / 3
+        self.vwap.update(typical, bar[5], int(bar[0]) // 86400)
+        self.high.update(bar[2])
+        self.low.update(bar[3])
+        self.bar = None
+        return bar
+
+    def indicators(self):
+        values = {f"ema{period}": ema.value for period, ema in self.emas.items()}
+        values.update({
+            f"rsi{RSI_PERIOD}": self.rsi.value,
+            'vwap': self.vwap.value,
+            f"high{EXTREME_PERIOD}": self.high.value,
+            f"low{EXTREME_PERIOD}": self.low.value,
+        })
+        return values
+
+
+class TickAggregator:
+    """
+    依代號與週期把成交彙總成 K 線。
+    on_bar(symbol, interval, bar, indicators) 在每根 K 線收盤、指標更新後呼叫
+    """
+
+    def __init__(self, intervals=INTERVALS, capacity=RING_CAPACITY, on_bar=None):
+        self.intervals = tuple(intervals)
+        self.capacity = capacity
+        self.on_bar = on_bar
+        self.states = {}
+        self.ticks = 0
+        self.bars = 0
+        self.late = 0
+
+    def _states(self, symbol):
+        states = self.states.get(symbol)
+        if states is None:
+            states = self.states[symbol] = [IntervalState(interval, self.capacity) for interval in self.intervals]
+        return states
+
+    def ingest(self, symbol, ts, price, volume=0.0):
+        """處理一筆成交；ts 為 Unix 秒數"""
+        self.ticks += 1
+        for state in self._states(symbol):
+            bucket = int(ts) // state.interval
+            bar = state.bar
+            if bucket == state.bucket and bar is not None:
+                if price > bar[2]:
+                    bar[2] = price
+                elif price < bar[3]:
+                    bar[3] = price
+                bar[4] = price
+                bar[5] += volume
+            elif state.bucket is None or bucket > state.bucket:
+                if bar is not None:
+                    self._close(symbol, state)
+                state.bucket = bucket
+                state.bar = [bucket * state.interval, price, price, price, price, volume]
+            else:
+                # 亂序：所屬的 K 線已收盤，略過
+                self.late += 1
+
+    def ingest_many(self, ticks):
+        ingest = self.ingest
+        for tick in ticks:
+            ingest(*tick)
+        return self.ticks
+
+    def _close(self, symbol, state):
+        bar = state.close_bar()
+        self.bars += 1
+        if self.on_bar is not None:
+            self.on_bar(symbol, state.interval, bar, state.indicators())
+
+    def flush(self, now=None):
+        """收盤所有已過週期結束時間的 K 線（沒有新成交的代號靠這個收盤）；now 省略時全部收盤"""
+        closed = 0
+        for symbol, states in self.states.items():
+            for state in states:
+                if state.bar is not None and (now is None or now >= (state.bucket + 1) * state.interval):
+                    self._close(symbol, state)
+                    closed += 1
+        return closed
+
+    def bars_of(self, symbol, interval, n=None):
+        """最近 n 根已收盤 K 線：{time, open, high, low, close, volume} 陣列"""
+        return self._state(symbol, interval).ring.to_dict(n)
+
+    def snapshot(self, symbol, interval):
+        """最新一根已收盤 K 線、未收盤 K 線與指標"""
+        state = self._state(symbol, interval)
+        latest = state.ring.latest()
+        return {
+            'symbol': symbol,
+            'interval': interval,
+            'bar': None if latest is None else dict(zip(BAR_FIELDS, latest.tolist())),
+            'partial': None if state.bar is None else dict(zip(BAR_FIELDS, state.bar)),
+            'indicators': state.indicators(),
+        }
+
+    def _state(self, symbol, interval):
+        return self.states[symbol][self.intervals.index(interval)]
+
+
+# ---- 資料來源 ----
+
+def _read_ticks(path):
+    if path.endswith('.csv'):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                yield row['symbol'], float(row['ts']), float(row['price']), float(row.get('volume') or 0)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    tick = json.loads(line)
+                    yield tick['symbol'], tick['ts'], tick['price'], tick.get('volume', 0)
+
+
+class ReplayFeed:
+    """
+    重播錄下的成交（JSONL：{"symbol","ts","price","volume"}，或同欄位的 CSV）。
+    speed 為 None 時盡快送出；否則依時間戳記間隔除以 speed 等待
+    """
+
+    def __init__(self, path, speed=None, sleep=time.sleep):
+        self.path = path
+        self.speed = speed
+        self.sleep = sleep
+
+    def __iter__(self):
+        previous = None
+        for tick in _read_ticks(self.path):
+            if self.speed and previous is not None and tick[1] > previous:
+                self.sleep((tick[1] - previous) / self.speed)
+            previous = tick[1]
+            yield tick
+
+
+class QuoteSnapshotFeed:
+    """
+    輪詢 data/yahoo-finance/<市場>/quotes/*.json 的報價快照；快照的時間戳記變動時產生一筆成交。
+    regularMarketVolume 是當日累計量，轉成與上一筆的差額
+    """
+
+    def __init__(self, base_dir=QUOTES_DIR, markets=('TW', 'US'), interval=5.0, sleep=time.sleep, record=None):
+        self.base_dir = base_dir
+        self.markets = markets
+        self.interval = interval
+        self.sleep = sleep
+        self.record = record
+        self.seen = {}       # 代號 -> (時間戳記, 累計量)
+
+    def poll(self):
+        ticks = []
+        for market in self.markets:
+            for path in glob.glob(os.path.join(self.base_dir, market, 'quotes', '*.json')):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        quote = json.load(f)
+                except (OSError, ValueError):
+                    continue      # 寫入中的檔案，下一輪再讀
+                symbol, ts, price = quote.get('symbol'), quote.get('timestamp'), quote.get('regularMarketPrice')
+                if not symbol or ts is None or price is None:
+                    continue
+                cumulative = quote.get('regularMarketVolume') or 0
+                last = self.seen.get(symbol)
+                if last is not None and ts <= last[0]:
+                    continue
+                volume = cumulative - last[1] if last is not None and cumulative >= last[1] else 0
+                self.seen[symbol] = (ts, cumulative)
+                ticks.append((symbol, ts, float(price), float(volume)))
+        ticks.sort(key=lambda tick: tick[1])
+        if self.record and ticks:
+            with open(self.record, 'a', encoding='utf-8') as f:
+                for symbol, ts, price, volume in ticks:
+                    f.write(json.dumps({'symbol': symbol, 'ts': ts, 'price': price, 'volume': volume}) + '\n')
+        return ticks
+
+    def __iter__(self):
+        while True:
+            yield from self.poll()
+            self.sleep(self.interval)
+
+
+def synthetic_ticks(symbols, count, start=None, step=0.005, seed=0):
+    """產生隨機漫步的成交（每筆時間前進 step 秒，代號輪流），用來量測吞吐量"""
+    rng = np.random.default_rng(seed)
+    start = start or int(datetime(2025, 8, 26, 1, 0, tzinfo=timezone.utc).timestamp())
+    prices = dict(zip(symbols, rng.uniform(10, 500, len(symbols)).tolist()))
+    moves = rng.normal(0, 0.001, count).tolist()
+    volumes = rng.integers(1, 50, count).tolist()
+    n = len(symbols)
+    for i in range(count):
+        symbol = symbols[i % n]
+        prices[symbol] *= 1 + moves[i]
+        yield symbol, start + i * step, prices[symbol], float(volumes[i])
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='成交串流彙總成 K 線與線上指標')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--replay', help='重播 JSONL / CSV 成交檔')
+    source.add_argument('--poll', action='store_true', help='輪詢 data/yahoo-finance 的報價快照')
+    source.add_argument('--benchmark', type=int, metavar='SYMBOLS', help='以隨機成交量測吞吐量')
+    parser.add_argument('--speed', type=float, default=None, help='重播倍速（省略為盡快）')
+    parser.add_argument('--record', default=None, help='輪詢時把成交錄成 JSONL')
+    parser.add_argument('--ticks', type=int, default=1_000_000, help='benchmark 的成交筆數')
+    parser.add_argument('--show', nargs='*', default=[], help='結束時列出這些代號的 1 分 K 指標')
+    parser.add_argument('--store', action='store_true', help='把收盤的 1m / 5m K 線寫入 data/intraday')
+    args = parser.parse_args()
+
+    print("📈 成交串流彙總")
+    print("=" * 60)
+    sink = None
+    if args.store and not args.benchmark:
+        from intraday_store import BarSink
+        sink = BarSink()
+    aggregator = TickAggregator(on_bar=sink)
+
+    if args.benchmark:
+        symbols = [f"S{i:04d}" for i in range(args.benchmark)]
+        ticks = list(synthetic_ticks(symbols, args.ticks))
+        started = time.perf_counter()
+        aggregator.ingest_many(ticks)
+        aggregator.flush()
+        elapsed = time.perf_counter() - started
+        print(f"⚡ {args.benchmark} 檔、{len(ticks):,} 筆成交、{aggregator.bars:,} 根 K 線："
+              f"{elapsed:.2f} 秒（每秒 {len(ticks) / elapsed:,.0f} 筆）")
+        return
+
+    feed = ReplayFeed(args.replay, args.speed) if args.replay else QuoteSnapshotFeed(record=args.record)
+    try:
+        for tick in feed:
+            aggregator.ingest(*tick)
+            if args.poll:
+                aggregator.flush(time.time())
+    except KeyboardInterrupt:
+        pass
+    aggregator.flush()
+    if sink is not None:
+        sink.flush()
+    print(f"✅ {aggregator.ticks:,} 筆成交、{len(aggregator.states)} 檔、{aggregator.bars:,} 根 K 線"
+          f"（亂序略過 {aggregator.late}）")
+    for symbol in args.show:
+        if symbol in aggregator.states:
+            print(f"   {symbol}: {aggregator.snapshot(symbol, INTERVALS[0])['indicators']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+台股（TWSE / TPEx）與美股（NYSE / NASDAQ）交易日曆
+每個市場的交易日存成排序好的 int32 日序號陣列（1970-01-01 起算的天數），
+查詢都是 searchsorted，不逐日迴圈：
+
+    cal = calendar('TW')
+    cal.expected_sessions('2025-01-01', '2025-03-31')    # 區間內應有的交易日（datetime64[D]）
+    cal.last_session('2025-02-01')                        # 該日（含）以前最近的交易日
+    cal.missing_sessions(series['time'])                  # K 線缺少的交易日
+    cal.fetch_range(series['time'], '2025-08-20')         # 增量更新只需抓的區間，已是最新時為 None
+
+休市日分為例假日（HOLIDAYS）與臨時休市（CLOSURES，例如颱風假、國喪）；
+半日市記錄在 EARLY_CLOSES。只有 VERIFIED_YEARS 內的年份有完整的休市資料，
+範圍外的年份以週一到週五近似，missing_sessions 也只在已驗證的範圍內比對，避免把舊假日當成缺資料。
+"""
+
+import argparse
+from datetime import date, datetime, time as dtime
+
+import numpy as np
+
+FIRST_YEAR = 1990
+LAST_YEAR = 2027
+VERIFIED_YEARS = (2022, 2026)     # 休市資料完整的年份（含），每年需依證交所與 NYSE 公告更新
+
+# 例假日（週末以外的休市日）；台股春節前僅辦理結算交割、不交易的日子也列在這裡
+HOLIDAYS = {
+    'TW': [
+        '2022-01-27', '2022-01-28', '2022-01-31', '2022-02-01', '2022-02-02', '2022-02-03', '2022-02-04',
+        '2022-02-28', '2022-04-04', '2022-04-05', '2022-05-02', '2022-06-03', '2022-09-09', '2022-10-10',
+        '2023-01-02', '2023-01-18', '2023-01-19', '2023-01-20', '2023-01-23', '2023-01-24', '2023-01-25',
+        '2023-01-26', '2023-01-27', '2023-02-27', '2023-02-28', '2023-04-03', '2023-04-04', '2023-04-05',
+        '2023-05-01', '2023-06-22', '2023-06-23', '2023-09-29', '2023-10-09', '2023-10-10',
+        '2024-01-01', '2024-02-06', '2024-02-07', '2024-02-08', '2024-02-09', '2024-02-12', '2024-02-13',
+        '2024-02-14', '2024-02-28', '2024-04-04', '2024-04-05', '2024-05-01', '2024-06-10', '2024-09-17',
+        '2024-10-10',
+        '2025-01-01', '2025-01-23', '2025-01-24', '2025-01-27', '2025-01-28', '2025-01-29', '2025-01-30',
+        '2025-01-31', '2025-02-28', '2025-04-03', '2025-04-04', '2025-05-01', '2025-05-30', '2025-09-29',
+        '2025-10-06', '2025-10-10', '2025-10-24', '2025-12-25',
+        '2026-01-01', '2026-02-12', '2026-02-13', '2026-02-16', '2026-02-17', '2026-02-18', '2026-02-19',
+        '2026-02-20', '2026-02-27', '2026-04-03', '2026-04-06', '2026-05-01', '2026-06-19', '2026-09-25',
+        '2026-09-28', '2026-10-09', '2026-10-26', '2026-12-25',
+    ],
+    'US': [
+        '2022-01-17', '2022-02-21', '2022-04-15', '2022-05-30', '2022-06-20', '2022-07-04', '2022-09-05',
+        '2022-11-24', '2022-12-26',
+        '2023-01-02', '2023-01-16', '2023-02-20', '2023-04-07', '2023-05-29', '2023-06-19', '2023-07-04',
+        '2023-09-04', '2023-11-23', '2023-12-25',
+        '2024-01-01', '2024-01-15', '2024-02-19', '2024-03-29', '2024-05-27', '2024-06-19', '2024-07-04',
+        '2024-09-02', '2024-11-28', '2024-12-25',
+        '2025-01-01', '2025-01-20', '2025-02-17', '2025-04-18', '2025-05-26', '2025-06-19', '2025-07-04',
+        '2025-09-01', '2025-11-27', '2025-12-25',
+        '2026-01-01', '2026-01-19', '2026-02-16', '2026-04-03', '2026-05-25', '2026-06-19', '2026-07-03',
+        '2026-09-07', '2026-11-26', '2026-12-25',
+    ],
+}
+
+# 臨時休市：颱風假（依台北市停班停課公告）、國喪日等
+CLOSURES = {
+    'TW': {
+        '2023-08-03': '卡努颱風',
+        '2024-07-24': '凱米颱風',
+        '2024-07-25': '凱米颱風',
+        '2024-10-02': '山陀兒颱風',
+        '2024-10-03': '山陀兒颱風',
+        '2024-10-31': '康芮颱風',
+    },
+    'US': {
+        '2025-01-09': 'National Day of Mourning (Carter)',
+    },
+}
+
+# 半日市（提早收盤）
+EARLY_CLOSES = {
+    'TW': {},
+    'US': {
+        '2022-11-25': dtime(13, 0),
+        '2023-07-03': dtime(13, 0), '2023-11-24': dtime(13, 0),
+        '2024-07-03': dtime(13, 0), '2024-11-29': dtime(13, 0), '2024-12-24': dtime(13, 0),
+        '2025-07-03': dtime(13, 0), '2025-11-28': dtime(13, 0), '2025-12-24': dtime(13, 0),
+        '2026-11-27': dtime(13, 0), '2026-12-24': dtime(13, 0),
+    },
+}
+
+REGULAR_CLOSE = {'TW': dtime(13, 30), 'US': dtime(16, 0)}
+EPOCH = date(1970, 1, 1)
+
+
+def day_number(value):
+    """date、'YYYY-MM-DD' 或 datetime64 轉成 1970-01-01 起算的天數"""
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return (value - EPOCH).days
+    return int(np.datetime64(str(value)[:10], 'D').astype(np.int64))
+
+
+def to_date(number):
+    return date.fromordinal(EPOCH.toordinal() + int(number))
+
+
+class TradingCalendar:
+    """單一市場的交易日曆"""
+
+    def __init__(self, market, holidays=(), closures=None, early_closes=None, regular_close=None,
+                 verified_years=VERIFIED_YEARS, first_year=FIRST_YEAR, last_year=LAST_YEAR):
+        self.market = market
+        self.closures = dict(closures or {})
+        self.early_closes = dict(early_closes or {})
+        self.regular_close = regular_close
+        off_days = np.array(sorted(set(holidays) | set(self.closures)), dtype='datetime64[D]')
+        days = np.arange(np.datetime64(f"{first_year}-01-01"), np.datetime64(f"{last_year + 1}-01-01"))
+        sessions = days[np.is_busday(days, holidays=off_days)]
+        self.sessions = sessions.astype(np.int64).astype(np.int32)
+        self.first = day_number(f"{first_year}-01-01")
+        self.last = day_number(f"{last_year}-12-31")
+        self.verified_start = day_number(f"{verified_years[0]}-01-01")
+        self.verified_end = day_number(f"{verified_years[1]}-12-31")
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def _check(self, number):
+        if not self.first <= number <= self.last:
+            raise ValueError(f"{self.market} 交易日曆只涵蓋 {to_date(self.first)} ~ {to_date(self.last)}")
+        return number
+
+    def is_session(self, day):
+        number = self._check(day_number(day))
+        index = np.searchsorted(self.sessions, number)
+        return index < len(self.sessions) and self.sessions[index] == number
+
+    def close_time(self, day):
+        """該日的收盤時間（半日市提早）"""
+        return self.early_closes.get(to_date(day_number(day)).isoformat(), self.regular_close)
+
+    def closure_reason(self, day):
+        return self.closures.get(to_date(day_number(day)).isoformat())
+
+    def _slice(self, start, end):
+        lo = 0 if start is None else np.searchsorted(self.sessions, self._check(day_number(start)), 'left')
+        hi = len(self.sessions) if end is None else np.searchsorted(self.sessions, self._check(day_number(end)), 'right')
+        return self.sessions[lo:hi]
+
+    def expected_sessions(self, start, end):
+        """[start, end]（含）之間的交易日，datetime64[D] 陣列"""
+        return self._slice(start, end).astype('datetime64[D]')
+
+    def count_sessions(self, start, end):
+        return len(self._slice(start, end))
+
+    def last_session(self, asof):
+        """asof 當日（含）以前最近的交易日"""
+        index = np.searchsorted(self.sessions, self._check(day_number(asof)), 'right') - 1
+        if index < 0:
+            raise ValueError(f"{asof} 之前沒有交易日")
+        return to_date(self.sessions[index])
+
+    def next_session(self, after):
+        """after 之後（不含）的下一個交易日"""
+        index = np.searchsorted(self.sessions, self._check(day_number(after)), 'right')
+        if index >= len(self.sessions):
+            raise ValueError(f"{self.market} 交易日曆只涵蓋到 {to_date(self.last)}")
+        return to_date(self.sessions[index])
+
+    def shift(self, day, sessions):
+        """往前（負數）或往後移動若干個交易日；day 不是交易日時以前一個交易日為起點"""
+        index = np.searchsorted(self.sessions, self._check(day_number(day)), 'right') - 1 + sessions
+        return to_date(self.sessions[min(max(index, 0), len(self.sessions) - 1)])
+
+    def missing_sessions(self, dates, start=None, end=None):
+        """
+        dates（K 線日期）在 [start, end] 內缺少的交易日。
+        start 預設為第一根 K 線，end 預設為最後一根；只比對已驗證的年份
+        """
+        numbers = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+        if start is None:
+            if not len(numbers):
+                return np.array([], dtype='datetime64[D]')
+            start = numbers.min()
+        else:
+            start = day_number(start)
+        if end is None:
+            end = numbers.max() if len(numbers) else start
+        else:
+            end = day_number(end)
+        lo, hi = max(int(start), self.verified_start), min(int(end), self.verified_end)
+        if hi < lo:
+            return np.array([], dtype='datetime64[D]')
+        expected = self._slice(to_date(lo), to_date(hi)).astype(np.int64)
+        return expected[~np.isin(expected, numbers)].astype('datetime64[D]')
+
+    def fetch_range(self, dates, through, overlap=0):
+        """
+        增量更新要抓的 (起日, 迄日)：最後一根 K 線之後到 through 為止的交易日；
+        沒有缺少的交易日（例如只隔了假日）時回傳 None；尚無 K 線時起日為 None（由呼叫端決定初始範圍）。
+        overlap 為往前多抓的交易日數
+        """
+        numbers = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+        through = self.last_session(through)
+        if len(numbers) and numbers.max() >= day_number(through):
+            return None
+        if not len(numbers):
+            return None, through
+        first_missing = self.next_session(to_date(numbers.max()))
+        start = self.shift(first_missing, -overlap) if overlap else first_missing
+        return start, through
+
+
+_CALENDARS = {}
+
+
+def calendar(market):
+    """取得市場的交易日曆（每個行程只建立一次）"""
+    if market not in _CALENDARS:
+        if market not in HOLIDAYS:
+            raise KeyError(f"沒有 {market} 的交易日曆")
+        _CALENDARS[market] = TradingCalendar(market, HOLIDAYS[market], CLOSURES.get(market),
+                                             EARLY_CLOSES.get(market), REGULAR_CLOSE.get(market))
+    return _CALENDARS[market]
+
+
+def main():
+    """主程式：列出區間內的交易日，或檢查 K 線缺少的交易日"""
+    parser = argparse.ArgumentParser(description='台股 / 美股交易日曆')
+    parser.add_argument('market', choices=sorted(HOLIDAYS))
+    parser.add_argument('--start', default=None)
+    parser.add_argument('--end', default=date.today().isoformat())
+    parser.add_argument('--check', nargs='*', metavar='SYMBOL', help='檢查 data/cache 中這些股票缺少的交易日')
+    args = parser.parse_args()
+
+    cal = calendar(args.market)
+    start = args.start or date(date.today().year, 1, 1).isoformat()
+    if args.check is None:
+        sessions = cal.expected_sessions(start, args.end)
+        print(f"📅 {args.market} {start} ~ {args.end}: {len(sessions)} 個交易日，"
+              f"最近一個為 {cal.last_session(args.end)}")
+        for day in np.arange(np.datetime64(start), np.datetime64(args.end) + 1):
+            if np.is_busday(day) and not cal.is_session(str(day)):
+                reason = cal.closure_reason(str(day))
+                print(f"   🚫 {day}{'（' + reason + '）' if reason else ''}")
+        return
+
+    from ohlcv_store import load_series, list_symbols
+    for symbol in args.check or list_symbols(args.market):
+        series = load_series(args.market, symbol)
+        missing = cal.missing_sessions(series['time'], start=args.start, end=args.end)
+        status = '✅' if not len(missing) else '⚠️'
+        print(f"{status} {symbol}: 缺 {len(missing)} 個交易日 {', '.join(str(d) for d in missing[:10])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Walk-forward 參數最佳化
+將每檔股票的歷史切成滾動的訓練/測試區間，在訓練區間挑選最佳參數，
+並回報測試區間（樣本外）的績效。每個指標（例如 ma20、rsi14）每檔股票只計算一次，
+結果依資料指紋存在特徵快取中，重跑時可直接從快取重現。
+"""
+
+import os
+import re
+import json
+import hashlib
+import argparse
+import itertools
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import technical_indicators as ti
+from ohlcv_store import load_series, list_symbols
+from sampling_profiler import add_profile_arguments, profile_from_args
+from shared_panel import PANEL_DIR, attach_panel, read_registry, publish_panel
+
+FEATURE_CACHE_DIR = os.path.join('data', 'feature-cache')
+RESULTS_DIR = 'backtest-results'
+
+# 預設參數網格：均線交叉 + RSI 過熱過濾（與 scripts/simple-backtest.js 的策略相同）
+DEFAULT_PARAM_GRID = {
+    'short': [5, 10, 20],
+    'long': [20, 50, 60],
+    'rsi_period': [14],
+    'rsi_upper': [70, 80],
+}
+
+# 指標名稱 -> 計算函式；名稱中的數字即為期間
+FEATURE_BUILDERS = [
+    (re.compile(r'^ma(\d+)$'), lambda s, p: ti.sma(s['close'], p)),
+    (re.compile(r'^ema(\d+)$'), lambda s, p: ti.ema(s['close'], p)),
+    (re.compile(r'^rsi(\d+)$'), lambda s, p: ti.rsi(s['close'], p)),
+    (re.compile(r'^volz(\d+)$'), lambda s, p: ti.volume_zscore(s['volume'], p)),
+]
+
+
+def compute_feature(series, key):
+    """依指標名稱計算指標陣列"""
+    for pattern, builder in FEATURE_BUILDERS:
+        match = pattern.match(key)
+        if match:
+            return builder(series, int(match.group(1)))
+    raise ValueError(f"未知的指標: {key}")
+
+
+def series_fingerprint(series):
+    """以日期與價量內容計算資料指紋，資料有任何變動指紋就會不同"""
+    digest = hashlib.sha1()
+    digest.update(series['time'].astype('datetime64[D]').astype(np.int64).tobytes())
+    for field in ('open', 'high', 'low', 'close', 'volume'):
+        digest.update(np.ascontiguousarray(series[field]).tobytes())
+    return digest.hexdigest()[:16]
+
+
+class FeatureCache:
+    """指標特徵快取：記憶體 -> 磁碟 (.npy) -> 計算"""
+
+    def __init__(self, cache_dir=FEATURE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.memory = {}
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'computed': 0}
+
+    def feature_path(self, series, key, fingerprint=None):
+        fingerprint = fingerprint or series_fingerprint(series)
+        return os.path.join(self.cache_dir, series['market'], series['symbol'],
+                            fingerprint, f"{key}.npy")
+
+    def get(self, series, key, fingerprint=None):
+        """取得指標；同一份資料的同一個指標只會計算一次"""
+        fingerprint = fingerprint or series_fingerprint(series)
+        memo_key = (series['market'], series['symbol'], fingerprint, key)
+        if memo_key in self.memory:
+            self.stats['memory_hits'] += 1
+            return self.memory[memo_key]
+
+        path = self.feature_path(series, key, fingerprint)
+        if os.path.exists(path):
+            values = np.load(path, mmap_mode='r')
+            self.stats['disk_hits'] += 1
+        else:
+            values = compute_feature(series, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp.npy"
+            np.save(tmp_path, values)
+            os.replace(tmp_path, path)
+            self.stats['computed'] += 1
+
+        self.memory[memo_key] = values
+        return values
+
+    def get_many(self, series, keys):
+        fingerprint = series_fingerprint(series)
+        return {key: self.get(series, key, fingerprint) for key in keys}
+
+
+def expand_grid(param_grid):
+    """展開參數網格，排除短均線不小於長均線的組合"""
+    names = sorted(param_grid)
+    combos = []
+    for values in itertools.product(*(param_grid[name] for name in names)):
+        params = dict(zip(names, values))
+        if params['short'] < params['long']:
+            combos.append(params)
+    return combos
+
+
+def required_features(combos):
+    """參數組合所需的所有不重複指標"""
+    keys = set()
+    for params in combos:
+        keys.add(f"ma{params['short']}")
+        keys.add(f"ma{params['long']}")
+        keys.add(f"rsi{params['rsi_period']}")
+    return sorted(keys)
+
+
+def walk_forward_splits(length, train_size, test_size, step=None):
+    """產生 (train_start, train_end, test_start, test_end) 滾動區間，end 不含"""
+    step = step or test_size
+    splits = []
+    start = 0
+    while start + train_size + test_size <= length:
+        train_end = start + train_size
+        splits.append((start, train_end, train_end, train_end + test_size))
+        start += step
+    return splits
+
+
+def strategy_positions(features, params):
+    """均線多頭排列且 RSI 未過熱時持有，否則空手"""
+    short_ma = features[f"ma{params['short']}"]
+    long_ma = features[f"ma{params['long']}"]
+    rsi_values = features[f"rsi{params['rsi_period']}"]
+    with np.errstate(invalid='ignore'):
+        signal = (short_ma > long_ma) & (rsi_values < params['rsi_upper'])
+    return signal.astype(np.float64)
+
+
+def evaluate(close, positions, start, end):
+    """計算 [start, end) 區間的策略績效；訊號於隔日生效"""
+    if end - start < 2:
+        return {'totalReturn': 0.0, 'sharpe': 0.0, 'maxDrawdown': 0.0, 'trades': 0}
+
+    window = close[start:end]
+    daily = np.diff(window) / window[:-1]
+    held = positions[start:end - 1]
+    returns = held * daily
+
+    equity = np.cumprod(1 + returns)
+    peak = np.maximum.accumulate(equity)
+    std = returns.std()
+
+    return {
+        'totalReturn': float(equity[-1] - 1),
+        'sharpe': float(returns.mean() / std * np.sqrt(252)) if std > 0 else 0.0,
+        'maxDrawdown': float((1 - equity / peak).max()),
+        'trades': int(np.count_nonzero(np.diff(held))),
+    }
+
+
+# 子行程中的特徵快取，同一個 worker 重複處理同一檔股票時不必重新讀檔
+_WORKER_FEATURES = {}
+
+
+def _load_worker_features(task):
+    memo_key = (task['market'], task['symbol'], task['fingerprint'])
+    if memo_key not in _WORKER_FEATURES:
+        features = {key: np.load(path, mmap_mode='r') for key, path in task['feature_paths'].items()}
+        if 'panel' in task:
+            # 收盤價直接取自共用面板（所有 worker 共用同一份 mmap）
+            panel = attach_panel(task['market'], task['panel']['dir'], task['panel']['generation'])
+            close = panel.series(task['symbol'])['close']
+        else:
+            close = np.load(task['close_path'], mmap_mode='r')
+        _WORKER_FEATURES[memo_key] = (close, features)
+    return _WORKER_FEATURES[memo_key]
+
+
+def run_fold(task):
+    """在訓練區間挑出最佳參數，並於測試區間評估（於子行程執行）"""
+    close, features = _load_worker_features(task)
+    train_start, train_end, test_start, test_end = task['split']
+
+    best_params, best_train = None, None
+    for params in task['combos']:
+        positions = strategy_positions(features, params)
+        metrics = evaluate(close, positions, train_start, train_end)
+        if best_train is None or metrics[task['objective']] > best_train[task['objective']]:
+            best_params, best_train = params, metrics
+
+    positions = strategy_positions(features, best_params)
+    return {
+        'market': task['market'],
+        'symbol': task['symbol'],
+        'fold': task['fold'],
+        'train': task['period'][:2],
+        'test': task['period'][2:],
+        'bestParams': best_params,
+        'inSample': best_train,
+        'outOfSample': evaluate(close, positions, test_start, test_end),
+    }
+
+
+class WalkForwardOptimizer:
+    """Walk-forward 最佳化器"""
+
+    def __init__(self, param_grid=None, train_size=504, test_size=126, step=None,
+                 objective='sharpe', cache=None, workers=None, panel_dir=None):
+        self.param_grid = param_grid or DEFAULT_PARAM_GRID
+        self.train_size = train_size
+        self.test_size = test_size
+        self.step = step
+        self.objective = objective
+        self.cache = cache or FeatureCache()
+        self.workers = workers
+        self.panel_dir = panel_dir
+
+    def build_tasks(self, series):
+        """準備單一股票的所有 fold 任務；指標在此一次算好並寫入快取"""
+        combos = expand_grid(self.param_grid)
+        keys = required_features(combos)
+        fingerprint = series_fingerprint(series)
+        self.cache.get_many(series, keys)
+
+        # 來自共用面板的序列：worker 從面板掛載收盤價，不必另存一份
+        source = {}
+        if self.panel_dir and 'generation' in series:
+            source['panel'] = {'dir': self.panel_dir, 'generation': series['generation']}
+        else:
+            source['close_path'] = self.cache.feature_path(series, 'close', fingerprint)
+            if not os.path.exists(source['close_path']):
+                os.makedirs(os.path.dirname(source['close_path']), exist_ok=True)
+                np.save(source['close_path'], series['close'])
+
+        dates = [str(d) for d in series['time']]
+        splits = walk_forward_splits(len(dates), self.train_size, self.test_size, self.step)
+        return [dict(source, **{
+            'market': series['market'],
+            'symbol': series['symbol'],
+            'fingerprint': fingerprint,
+            'feature_paths': {key: self.cache.feature_path(series, key, fingerprint) for key in keys},
+            'combos': combos,
+            'objective': self.objective,
+            'split': split,
+            'fold': index,
+            'period': [dates[split[0]], dates[split[1] - 1], dates[split[2]], dates[split[3] - 1]],
+        }) for index, split in enumerate(splits)]
+
+    def run(self, series_list):
+        """對多檔股票執行 walk-forward，回傳包含每個 fold 樣本外績效的報告"""
+        tasks = []
+        fingerprints = {}
+        for series in series_list:
+            symbol_tasks = self.build_tasks(series)
+            if not symbol_tasks:
+                print(f"⚠️ {series['symbol']} 資料不足，跳過")
+                continue
+            fingerprints[series['symbol']] = symbol_tasks[0]['fingerprint']
+            tasks.extend(symbol_tasks)
+
+        if self.workers == 1:
+            folds = [run_fold(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                folds = list(executor.map(run_fold, tasks, chunksize=4))
+
+        return {
+            'generatedAt': datetime.now().isoformat(),
+            'config': {
+                'paramGrid': self.param_grid,
+                'trainSize': self.train_size,
+                'testSize': self.test_size,
+                'step': self.step or self.test_size,
+                'objective': self.objective,
+            },
+            'fingerprints': fingerprints,
+            'cacheStats': dict(self.cache.stats),
+            'summary': summarize_folds(folds),
+            'folds': folds,
+        }
+
+
+def summarize_folds(folds):
+    """彙總每檔股票的樣本外績效"""
+    summary = {}
+    for fold in folds:
+        item = summary.setdefault(fold['symbol'], {'folds': 0, 'compoundedReturn': 1.0, 'avgSharpe': 0.0})
+        item['folds'] += 1
+        item['compoundedReturn'] *= 1 + fold['outOfSample']['totalReturn']
+        item['avgSharpe'] += fold['outOfSample']['sharpe']
+
+    for item in summary.values():
+        item['compoundedReturn'] -= 1
+        item['avgSharpe'] /= item['folds']
+    return summary
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='Walk-forward 參數最佳化')
+    parser.add_argument('--market', default='TW')
+    parser.add_argument('--symbols', nargs='*', help='預設為該市場全部股票')
+    parser.add_argument('--train', type=int, default=504, help='訓練區間長度（交易日）')
+    parser.add_argument('--test', type=int, default=126, help='測試區間長度（交易日）')
+    parser.add_argument('--step', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--panel', action='store_true',
+                        help='從共用市場面板讀取 K 線（尚未建立時先建立），worker 不再各自載入')
+    parser.add_argument('--panel-dir', default=PANEL_DIR)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profile_from_args(args, 'walk_forward_optimizer')
+
+    print("🎯 Walk-forward 參數最佳化")
+    print("=" * 60)
+
+    if args.panel:
+        if read_registry(args.market, args.panel_dir) is None:
+            publish_panel(args.market, panel_dir=args.panel_dir)
+        panel = attach_panel(args.market, args.panel_dir)
+        print(f"🧱 使用共用面板世代 {panel.generation}（{panel.shape[1]} 檔 x {panel.shape[0]} 天）")
+        symbols = [symbol for symbol in (args.symbols or panel.symbols) if symbol in panel]
+        series_list = [panel.series(symbol) for symbol in symbols]
+    else:
+        symbols = args.symbols or list_symbols(args.market)
+        series_list = [load_series(args.market, symbol) for symbol in symbols]
+
+    optimizer = WalkForwardOptimizer(train_size=args.train, test_size=args.test, step=args.step,
+                                     workers=args.workers, panel_dir=args.panel_dir if args.panel else None)
+    report = optimizer.run(series_list)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"walk-forward-{args.market}-{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ 共 {len(report['folds'])} 個 fold，指標快取: {report['cacheStats']}")
+    for symbol, item in report['summary'].items():
+        print(f"  {symbol}: 樣本外報酬 {item['compoundedReturn']:.2%}，平均 Sharpe {item['avgSharpe']:.2f}")
+    print(f"📁 報告已儲存: {output}")
+
+
+if __name__ == "__main__":
+    main()